@@ -0,0 +1 @@
+# This file makes Python treat the directory benchmarks/ as a package.
@@ -0,0 +1,130 @@
+# benchmarks/bench_classifier_concurrency.py
+"""
+Benchmark: TaskClassifier throughput, one call at a time vs. concurrent classify_tasks, against a
+local fake OpenAI server.
+
+The fake server answers /v1/chat/completions with an extract_task_details function call after
+`--latency` seconds. It enforces `--server-rpm` requests per minute (429 with Retry-After when
+exceeded) and fails `--error-rate` of requests with 503, so the rate limiter and the retries are
+exercised as well. Every concurrent result is checked to come back in input order.
+
+Usage (from the project root):
+    python -m benchmarks.bench_classifier_concurrency --messages 100 --latency 0.5
+    python -m benchmarks.bench_classifier_concurrency --messages 200 --concurrency 16 --server-rpm 600 --error-rate 0.05
+"""
+import argparse
+import contextlib
+import io
+import json
+import random
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+with contextlib.redirect_stdout(io.StringIO()): # The classifier prints on import
+    from extract_nlp.classifiers import TaskClassifier
+    from extract_nlp.rate_limit import AdaptiveRateLimiter
+
+
+class FakeOpenAIHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _reply(self, status, payload, headers=None):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+        server = self.server
+        with server.lock:
+            server.requests += 1
+            now = time.monotonic()
+            while server.recent and now - server.recent[0] > 60:
+                server.recent.popleft()
+            over_limit = server.rpm and len(server.recent) >= server.rpm
+            if not over_limit:
+                server.recent.append(now)
+            else:
+                server.rejected += 1
+        if over_limit:
+            retry_after_s = max(0.05, 60 - (now - server.recent[0]))
+            self._reply(429, {"error": {"message": "Rate limit reached", "type": "requests", "code": "rate_limit_exceeded"}},
+                        {"retry-after-ms": str(int(retry_after_s * 1000))})
+            return
+        time.sleep(server.latency_s)
+        if random.random() < server.error_rate:
+            self._reply(503, {"error": {"message": "Service unavailable", "type": "server_error"}})
+            return
+        text = request["messages"][-1]["content"].split("---\n")[1].rsplit("\n---", 1)[0]
+        arguments = {"is_task": True, "task_type": "other", "title": text.split("\n")[0], "body_summary": text[:80]}
+        self._reply(200, {
+            "id": f"chatcmpl-{server.requests}", "object": "chat.completion", "created": int(time.time()),
+            "model": request["model"],
+            "choices": [{"index": 0, "finish_reason": "function_call", "message": {
+                "role": "assistant", "content": None,
+                "function_call": {"name": "extract_task_details", "arguments": json.dumps(arguments)}}}],
+            "usage": {"prompt_tokens": 300, "completion_tokens": 40, "total_tokens": 340},
+        })
+
+
+def start_fake_server(latency_s: float, rpm: int, error_rate: float) -> ThreadingHTTPServer:
+    server = ThreadingHTTPServer(("127.0.0.1", 0), FakeOpenAIHandler)
+    server.daemon_threads = True
+    server.latency_s, server.rpm, server.error_rate = latency_s, rpm, error_rate
+    server.lock, server.recent, server.requests, server.rejected = threading.Lock(), deque(), 0, 0
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--messages", type=int, default=100, help="Messages classified per mode.")
+    parser.add_argument("--latency", type=float, default=0.5, help="Fake server response time in seconds.")
+    parser.add_argument("--concurrency", type=int, default=8, help="Concurrent calls in the concurrent mode.")
+    parser.add_argument("--rpm", type=float, default=3500, help="Client-side requests-per-minute limit.")
+    parser.add_argument("--tpm", type=float, default=0, help="Client-side tokens-per-minute limit (0: no limit).")
+    parser.add_argument("--server-rpm", type=int, default=0, help="Requests per minute the fake server accepts (0: no limit).")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of requests answered with 503.")
+    args = parser.parse_args()
+
+    server = start_fake_server(args.latency, args.server_rpm, args.error_rate)
+    base_url = f"http://127.0.0.1:{server.server_address[1]}/v1"
+    texts = [(f"Message {i}: please submit report {i} by Friday 5pm.", f"bench_{i}") for i in range(args.messages)]
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        classifier = TaskClassifier(api_key="bench-key", base_url=base_url)
+        start = time.perf_counter()
+        sequential = [classifier.classify_task(text, source_id) for text, source_id in texts]
+        sequential_s = time.perf_counter() - start
+
+        limiter = AdaptiveRateLimiter(args.concurrency, args.rpm, args.tpm)
+        start = time.perf_counter()
+        concurrent = classifier.classify_tasks(texts, limiter=limiter)
+        concurrent_s = time.perf_counter() - start
+        classifier.close()
+    server.shutdown()
+
+    in_order = [r and r["source_id"] for r in concurrent] == [source_id for _, source_id in texts] and \
+        all(r and r["title"] == text for r, (text, _) in zip(concurrent, texts))
+    print(f"Fake server: {args.latency:.2f}s latency, {args.server_rpm or 'no'} RPM limit, {args.error_rate:.0%} 503s; "
+          f"{server.requests} requests, {server.rejected} answered 429")
+    print(f"{'mode':<14}{'seconds':>10}{'msgs/s':>10}{'speedup':>10}{'classified':>12}")
+    for name, results, seconds in (("sequential", sequential, sequential_s), ("concurrent", concurrent, concurrent_s)):
+        print(f"{name:<14}{seconds:>10.2f}{len(texts) / seconds:>10.1f}{sequential_s / seconds:>9.1f}x"
+              f"{sum(1 for r in results if r):>12}")
+    print(f"Concurrent results in input order: {in_order}; retries: {classifier.retry_stats}; "
+          f"peak in flight: {limiter.stats['peak_in_flight']}; final concurrency limit: {limiter.concurrency_limit:.1f}")
+
+
+if __name__ == "__main__":
+    main()
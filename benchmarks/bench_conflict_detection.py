@@ -0,0 +1,111 @@
+# benchmarks/bench_conflict_detection.py
+"""
+Benchmark: tagging the time conflicts of a pipeline batch, the old way (per new task, one
+crud.get_tasks_on_same_day_with_time query, whose cast(due_dt) filters cannot use the due_dt
+index, and a pairwise check with two tag writes per conflict) vs. the conflict engine
+(dedup_conflict.resolver.tag_new_task_conflicts: one due_dt query for the windows around the new
+tasks, a binary search per new task and one tag write).
+
+Each `--stored` size gets a fresh on-disk database configured like the app's engine, holding open
+timed tasks spread over `--days` days. `--batches` batches of `--batch-size` new tasks are then
+inserted and tagged, each in its own transaction, rolled back afterwards so both modes see the same
+data. "tagged" is the number of tasks tagged per batch. On SQLite the old query finds nothing
+(CAST(due_dt AS DATE) yields a number there, never equal to the date), so the per-task mode tags
+no task: it measures the queries only.
+
+Usage (from the project root):
+    python -m benchmarks.bench_conflict_detection --stored 10000,100000
+    python -m benchmarks.bench_conflict_detection --stored 50000 --batch-size 500 --days 30
+"""
+import argparse
+import contextlib
+import io
+import os
+import random
+import shutil
+import tempfile
+import time
+from datetime import datetime, time as dt_time, timedelta
+
+from sqlalchemy.orm import sessionmaker
+
+with contextlib.redirect_stdout(io.StringIO()): # The CRUD module prints on import
+    from dedup_conflict.resolver import CONFLICT_TAG, tag_new_task_conflicts
+    from persistence import crud
+    from persistence.database import create_app_engine
+    from persistence.models import Base, Task
+
+START = datetime(2025, 1, 1)
+
+
+def task_rows(rng: random.Random, count: int, days: int, prefix: str) -> list:
+    return [{"source": f"{prefix}_{i}", "title": f"Task {i}",
+             "due_dt": START + timedelta(days=rng.randrange(days), minutes=rng.randrange(8 * 60, 20 * 60))}
+            for i in range(count)]
+
+
+def tag_per_task(db, tasks: list):
+    """The pipelines' previous conflict tagging, kept here as the baseline."""
+    for task in tasks:
+        if not task.due_dt or task.due_dt.time() == dt_time(0, 0, 0):
+            continue
+        for existing_task in crud.get_tasks_on_same_day_with_time(db, task.due_dt.date(), exclude_task_id=task.id):
+            if existing_task.due_dt and abs(task.due_dt - existing_task.due_dt) < timedelta(hours=1):
+                crud.update_task_tags(db, task.id, CONFLICT_TAG, commit=False)
+                crud.update_task_tags(db, existing_task.id, CONFLICT_TAG, commit=False)
+
+
+def tag_engine(db, tasks: list):
+    tag_new_task_conflicts(db, tasks)
+
+
+def run_mode(db, tag, args, batches: list) -> tuple:
+    """Seconds spent tagging, and the ids tagged, over all batches."""
+    elapsed, tagged = 0.0, []
+    for rows in batches:
+        created = [task for task in crud.create_tasks_bulk(db, rows, commit=False) if task]
+        start = time.perf_counter()
+        tag(db, created)
+        db.flush()
+        elapsed += time.perf_counter() - start
+        tagged.append({task_id for (task_id,) in db.query(Task.id).filter(Task.tags.like(f"%{CONFLICT_TAG}%"))})
+        db.rollback()
+    return elapsed, tagged
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--stored", default="10000,100000", help="Comma-separated numbers of stored tasks.")
+    parser.add_argument("--days", type=int, default=365, help="Days the stored and new tasks are spread over.")
+    parser.add_argument("--batch-size", type=int, default=100, help="New tasks per pipeline batch.")
+    parser.add_argument("--batches", type=int, default=5, help="Batches tagged per mode.")
+    args = parser.parse_args()
+
+    print(f"{'stored':>8}  {'mode':<10}{'ms/batch':>10}{'speedup':>9}{'tagged':>8}")
+    for stored in (int(n) for n in args.stored.split(",") if n.strip()):
+        db_dir = tempfile.mkdtemp(prefix="conflict_detection_")
+        engine = create_app_engine(f"sqlite:///{os.path.join(db_dir, 'agenda.db')}")
+        db = sessionmaker(autocommit=False, autoflush=False, bind=engine)()
+        try:
+            rng = random.Random(42)
+            with contextlib.redirect_stdout(io.StringIO()):
+                Base.metadata.create_all(bind=engine)
+                for start in range(0, stored, 5000):
+                    crud.create_tasks_bulk(db, task_rows(rng, min(5000, stored - start), args.days, f"stored_{start}"))
+            batches = [task_rows(rng, args.batch_size, args.days, f"new_{b}") for b in range(args.batches)]
+
+            baseline_s = None
+            for name, tag in (("per-task", tag_per_task), ("engine", tag_engine)):
+                with contextlib.redirect_stdout(io.StringIO()):
+                    elapsed, tagged = run_mode(db, tag, args, batches)
+                if baseline_s is None: baseline_s = elapsed
+                print(f"{stored:>8}  {name:<10}{elapsed * 1000 / args.batches:>10.1f}{baseline_s / elapsed:>8.1f}x"
+                      f"{sum(len(ids) for ids in tagged) // args.batches:>8}")
+        finally:
+            db.close()
+            engine.dispose()
+            shutil.rmtree(db_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
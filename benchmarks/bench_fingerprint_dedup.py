@@ -0,0 +1,124 @@
+# benchmarks/bench_fingerprint_dedup.py
+"""
+Benchmark: checking a batch of task fingerprints for duplicates against stored tasks, one SELECT
+per fingerprint (crud.get_task_by_fingerprint, the old pipeline path) vs. one IN (...) query per
+batch vs. the in-process fingerprint index ("set" and "bloom") that only sends possible
+duplicates to the IN query.
+
+Each `--stored` size gets a fresh on-disk database configured like the app's engine. Batches of
+`--batch-size` fingerprints are checked `--batches` times; `--duplicate-rate` of each batch are
+fingerprints of stored tasks. Every mode must report the same duplicates. Index rows also show
+the time taken to load the index from the database and the Python heap it keeps.
+
+Usage (from the project root):
+    python -m benchmarks.bench_fingerprint_dedup --stored 10000,100000
+    python -m benchmarks.bench_fingerprint_dedup --stored 100000 --batch-size 500 --duplicate-rate 0.2
+"""
+import argparse
+import contextlib
+import hashlib
+import io
+import os
+import random
+import shutil
+import tempfile
+import time
+import tracemalloc
+
+from sqlalchemy.orm import sessionmaker
+
+with contextlib.redirect_stdout(io.StringIO()): # The CRUD module prints on import
+    import config
+    from dedup_conflict.fingerprints import FingerprintIndex
+    from persistence import crud
+    from persistence.database import create_app_engine
+    from persistence.models import Base
+
+
+def fingerprint(i: int, prefix: str = "stored") -> str:
+    return hashlib.sha256(f"{prefix}_{i}".encode()).hexdigest() # Same shape as generate_task_fingerprint
+
+
+def seed(db, count: int):
+    for start in range(0, count, 5000):
+        crud.create_tasks_bulk(db, [{"source": "bench", "title": f"Task {i}", "fingerprint": fingerprint(i)}
+                                    for i in range(start, min(count, start + 5000))])
+
+
+def batches(stored: int, args) -> list:
+    rng = random.Random(42)
+    result = []
+    for b in range(args.batches):
+        batch = [fingerprint(rng.randrange(stored)) if rng.random() < args.duplicate_rate
+                 else fingerprint(b * args.batch_size + i, prefix="new") for i in range(args.batch_size)]
+        result.append(batch)
+    return result
+
+
+def check_per_item(db, batch, index=None) -> set:
+    return {fp for fp in batch if crud.get_task_by_fingerprint(db, fp)}
+
+
+def check_in_query(db, batch, index=None) -> set:
+    candidates = [fp for fp in batch if index is None or index.might_contain(fp)]
+    return set(crud.get_task_ids_by_fingerprints(db, candidates)) if candidates else set()
+
+
+def load_index(db, bloom_capacity=None) -> tuple:
+    """Loads the index twice: once timed, once under tracemalloc for the heap it keeps."""
+    start = time.perf_counter()
+    index = FingerprintIndex(bloom_capacity, config.FINGERPRINT_BLOOM_ERROR_RATE)
+    index.load(crud.iter_task_fingerprints(db))
+    elapsed = time.perf_counter() - start
+    tracemalloc.start()
+    measured = FingerprintIndex(bloom_capacity, config.FINGERPRINT_BLOOM_ERROR_RATE)
+    measured.load(crud.iter_task_fingerprints(db))
+    retained, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del measured
+    return index, elapsed, retained
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--stored", default="10000,100000", help="Comma-separated numbers of stored tasks.")
+    parser.add_argument("--batch-size", type=int, default=100, help="Fingerprints per batch (a pipeline window).")
+    parser.add_argument("--batches", type=int, default=20, help="Batches checked per mode.")
+    parser.add_argument("--duplicate-rate", type=float, default=0.05, help="Share of each batch already stored.")
+    args = parser.parse_args()
+
+    print(f"{'stored':>8}  {'mode':<12}{'us/item':>9}{'speedup':>9}{'db checks':>11}{'load s':>8}{'index MB':>10}")
+    for stored in (int(n) for n in args.stored.split(",") if n.strip()):
+        db_dir = tempfile.mkdtemp(prefix="fingerprint_dedup_")
+        engine = create_app_engine(f"sqlite:///{os.path.join(db_dir, 'agenda.db')}")
+        db = sessionmaker(autocommit=False, autoflush=False, bind=engine)()
+        try:
+            with contextlib.redirect_stdout(io.StringIO()):
+                Base.metadata.create_all(bind=engine)
+                seed(db, stored)
+            work = batches(stored, args)
+            items = sum(len(batch) for batch in work)
+            modes = [("per-item", check_per_item, None, None), ("in-query", check_in_query, None, None)]
+            for name, capacity in (("set", None), ("bloom", max(stored * 2, config.FINGERPRINT_BLOOM_CAPACITY))):
+                index, load_s, heap = load_index(db, capacity)
+                modes.append((name, check_in_query, index, (load_s, heap)))
+
+            expected, baseline_s = None, None
+            for name, check, index, load in modes:
+                start = time.perf_counter()
+                found = [check(db, batch, index) for batch in work]
+                elapsed = time.perf_counter() - start
+                if expected is None: expected, baseline_s = found, elapsed
+                elif found != expected: print(f"  {name}: duplicates differ from per-item lookups")
+                db_checks = index.stats["maybe"] if index else items
+                load_cols = f"{load[0]:>8.2f}{load[1] / 1e6:>10.1f}" if load else f"{'-':>8}{'-':>10}"
+                print(f"{stored:>8}  {name:<12}{elapsed * 1e6 / items:>9.1f}{baseline_s / elapsed:>8.1f}x"
+                      f"{db_checks:>11}{load_cols}")
+        finally:
+            db.close()
+            engine.dispose()
+            shutil.rmtree(db_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
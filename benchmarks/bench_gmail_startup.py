@@ -0,0 +1,85 @@
+# benchmarks/bench_gmail_startup.py
+"""
+Offline benchmark: startup-to-first-fetch latency of the Gmail pipeline, with and without the
+process-level service cache.
+
+Each run creates a fresh GmailAgent (as every pipeline run does), authenticates it from a
+SourceToken stored in a temporary SQLite database, and sends the first messages.list call over
+RecordedGmailTransport. "uncached" is the previous behavior (DB read, Credentials rebuild and
+service build on every run); "cached" serves the service built by the first run.
+
+Usage (from the project root):
+    python -m benchmarks.bench_gmail_startup --runs 50
+"""
+import argparse
+import contextlib
+import io
+import os
+import statistics
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+# Point the persistence layer at a throwaway database before it is imported.
+_DB_DIR = tempfile.mkdtemp(prefix="bench_gmail_startup_")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_DB_DIR, 'bench.db')}"
+
+import config
+from ingestion.agents import GmailAgent
+from ingestion.service_cache import gmail_service_cache
+from ingestion.stub_transport import RecordedGmailTransport, synthetic_message
+from persistence import crud as persistence_crud
+from persistence.database import SessionLocal, create_db_tables
+
+BENCH_USER = "bench_user"
+
+
+def seed_token():
+    with contextlib.redirect_stdout(io.StringIO()):
+        create_db_tables()
+        db = SessionLocal()
+        try:
+            persistence_crud.save_token(db, user_identifier=BENCH_USER, platform='gmail', token_info={
+                'access_token': "bench-access-token", 'refresh_token': None,
+                'expires_dt': datetime.utcnow() + timedelta(hours=1), 'scopes': GmailAgent.SCOPES,
+                'token_uri': 'https://oauth2.googleapis.com/token',
+                'client_id': "bench-client-id", 'client_secret': "bench-client-secret",
+            })
+        finally:
+            db.close()
+
+
+def startup_to_first_fetch(transport: RecordedGmailTransport) -> float:
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        agent = GmailAgent(credentials_file='credentials.json')
+        if not agent.authenticate_gmail(app_user_id=BENCH_USER):
+            raise RuntimeError("Authentication against the seeded token failed.")
+        agent.service.users().messages().list(userId='me', maxResults=10).execute(http=transport)
+    return time.perf_counter() - start
+
+
+def measure(runs: int, cache_enabled: bool, transport: RecordedGmailTransport) -> list:
+    config.GMAIL_SERVICE_CACHE_ENABLED = cache_enabled
+    gmail_service_cache.clear()
+    return [startup_to_first_fetch(transport) for _ in range(runs)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=50, help="Pipeline starts to time per mode.")
+    args = parser.parse_args()
+
+    seed_token()
+    transport = RecordedGmailTransport({m['id']: m for m in (synthetic_message(i, body_chars=100) for i in range(10))})
+
+    print(f"{'mode':<12}{'first run ms':>14}{'median ms':>12}{'p95 ms':>10}")
+    for label, cache_enabled in (("uncached", False), ("cached", True)):
+        timings_ms = [t * 1000 for t in measure(args.runs, cache_enabled, transport)]
+        p95 = sorted(timings_ms)[max(0, int(len(timings_ms) * 0.95) - 1)]
+        print(f"{label:<12}{timings_ms[0]:>14.2f}{statistics.median(timings_ms):>12.2f}{p95:>10.2f}")
+    gmail_service_cache.clear()
+
+
+if __name__ == "__main__":
+    main()
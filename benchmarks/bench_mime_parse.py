@@ -0,0 +1,112 @@
+# benchmarks/bench_mime_parse.py
+"""
+Micro-benchmark: GmailAgent._parse_email_parts against the previous recursive implementation.
+
+Payloads are synthetic `format='full'` MIME trees:
+  * nested       - multipart/mixed wrappers nested `--depth` levels deep around a text/html pair
+  * attachments  - a text/html pair followed by `--attachments` base64 application/pdf parts
+  * single-part  - a single-part application/octet-stream body (decoded as text by the old parser)
+
+Usage (from the project root):
+    python -m benchmarks.bench_mime_parse --iterations 200 --depth 30 --attachments 20
+"""
+import argparse
+import base64
+import contextlib
+import io
+import time
+
+from ingestion.agents import GmailAgent
+
+
+def _b64(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).decode('ascii')
+
+
+def _text_pair(index: int) -> list:
+    text = f"Level {index}: please submit the report by Friday 5pm. " * 20
+    return [
+        {'mimeType': 'text/plain', 'body': {'data': _b64(text.encode('utf-8'))}},
+        {'mimeType': 'text/html', 'body': {'data': _b64(f"<p>{text}</p>".encode('utf-8'))}},
+    ]
+
+
+def nested_payload(depth: int) -> dict:
+    payload = {'mimeType': 'multipart/alternative', 'parts': _text_pair(depth)}
+    for level in range(depth - 1, -1, -1):
+        payload = {'mimeType': 'multipart/mixed', 'parts': _text_pair(level) + [payload]}
+    return payload
+
+
+def attachment_payload(attachments: int, attachment_kb: int) -> dict:
+    blob = _b64(b'%PDF-1.4 ' + b'\x00\x01\x02binary' * (attachment_kb * 1024 // 9))
+    parts = _text_pair(0) + [
+        {'mimeType': 'application/pdf', 'filename': f"doc{i}.pdf", 'body': {'size': len(blob), 'data': blob}}
+        for i in range(attachments)
+    ]
+    return {'mimeType': 'multipart/mixed', 'parts': parts}
+
+
+def single_part_binary_payload(size_kb: int) -> dict:
+    blob = _b64(b'x' * size_kb * 1024)
+    return {'mimeType': 'application/octet-stream', 'body': {'size': size_kb * 1024, 'data': blob}}
+
+
+def legacy_parse_email_parts(payload):
+    """The recursive parser GmailAgent used before the iterative walker, kept as the baseline."""
+    plain_text_body = ""
+    html_body = ""
+    if not payload: return "", ""
+    parts_to_process = []
+    if 'parts' in payload: parts_to_process.extend(payload['parts'])
+    elif 'body' in payload and 'data' in payload['body']: parts_to_process.append(payload)
+    for part in parts_to_process:
+        mime_type = part.get('mimeType', '')
+        body_data = part.get('body', {}).get('data')
+        if body_data:
+            try:
+                decoded_data = base64.urlsafe_b64decode(body_data).decode('utf-8')
+                if mime_type == 'text/plain': plain_text_body += decoded_data + "\n"
+                elif mime_type == 'text/html': html_body += decoded_data + "\n"
+                elif not payload.get('parts') and mime_type not in ['text/plain', 'text/html']:
+                    plain_text_body += decoded_data + "\n"
+            except Exception as e: print(f"Error decoding part (MIME: {mime_type}): {e}")
+        if 'parts' in part:
+            nested_plain, nested_html = legacy_parse_email_parts(part)
+            if nested_plain: plain_text_body += nested_plain + "\n"
+            if nested_html: html_body += nested_html + "\n"
+    return plain_text_body.strip(), html_body.strip()
+
+
+def time_parser(parse, payload, iterations: int) -> float:
+    with contextlib.redirect_stdout(io.StringIO()): # Decode errors and truncation notices are printed
+        start = time.perf_counter()
+        for _ in range(iterations):
+            parse(payload)
+        return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=200)
+    parser.add_argument("--depth", type=int, default=30, help="Nesting depth of the nested payload.")
+    parser.add_argument("--attachments", type=int, default=20, help="Attachment parts in the attachment payload.")
+    parser.add_argument("--attachment-kb", type=int, default=256, help="Size of each attachment.")
+    args = parser.parse_args()
+
+    agent = GmailAgent()
+    payloads = [
+        (f"nested (depth {args.depth})", nested_payload(args.depth)),
+        (f"attachments ({args.attachments} x {args.attachment_kb} KB)", attachment_payload(args.attachments, args.attachment_kb)),
+        (f"single-part binary ({args.attachment_kb} KB)", single_part_binary_payload(args.attachment_kb)),
+    ]
+    print(f"{'payload':<34}{'recursive ms':>14}{'iterative ms':>14}{'speedup':>10}")
+    for label, payload in payloads:
+        legacy_s = time_parser(legacy_parse_email_parts, payload, args.iterations)
+        walker_s = time_parser(agent._parse_email_parts, payload, args.iterations)
+        per_call = 1000.0 / args.iterations
+        print(f"{label:<34}{legacy_s * per_call:>14.3f}{walker_s * per_call:>14.3f}{legacy_s / walker_s:>9.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+# benchmarks/bench_normalizer.py
+"""
+Benchmark: HTML-to-text throughput (MB/s) of each preprocessing.normalizer backend.
+
+The corpus is either every *.html / *.htm file under `--corpus DIR` (e.g. saved email bodies)
+or `--documents` synthetic newsletter-style emails: table layouts, inline <style> blocks,
+tracking pixels, MSO conditional comments and entity-heavy text. Every backend's output is
+checked against the BeautifulSoup backend before timing.
+
+Usage (from the project root):
+    python -m benchmarks.bench_normalizer --documents 200 --rounds 5
+    python -m benchmarks.bench_normalizer --corpus ./saved_email_bodies
+"""
+import argparse
+import contextlib
+import io
+import pathlib
+import time
+
+with contextlib.redirect_stdout(io.StringIO()): # The normalizer prints on import
+    from preprocessing.normalizer import HTML_BACKENDS
+
+REFERENCE_BACKEND = 'beautifulsoup'
+
+
+def synthetic_newsletter(index: int, items: int = 30) -> str:
+    rows = "".join(
+        f"<tr><td class=\"item\" style=\"padding:8px;font-family:Arial\">"
+        f"<a href=\"https://example.com/track?u={index}&amp;i={i}\">Item {i} &ndash; save 20&#37; today</a>"
+        f"<p>Reply by Friday 5pm &amp; submit the report for week {i}.&nbsp;</p></td></tr>"
+        for i in range(items)
+    )
+    return (
+        "<!DOCTYPE html><html><head><meta charset=\"utf-8\"><title>Weekly digest</title>"
+        "<style>td.item{padding:8px} a{color:#06c} @media (max-width:600px){.col{width:100%}}</style>"
+        "<script>window.dataLayer=window.dataLayer||[];</script></head><body>"
+        "<!--[if mso]><table><tr><td><![endif]-->"
+        f"<div style=\"display:none\">Preview text for digest {index}</div>"
+        f"<table role=\"presentation\" width=\"600\">{rows}</table>"
+        f"<img src=\"https://example.com/open.gif?u={index}\" width=\"1\" height=\"1\" alt=\"\">"
+        "<!--[if mso]></td></tr></table><![endif]--></body></html>"
+    )
+
+
+def load_corpus(corpus_dir, documents: int) -> list:
+    if corpus_dir:
+        paths = sorted(p for p in pathlib.Path(corpus_dir).rglob("*") if p.suffix.lower() in (".html", ".htm"))
+        return [p.read_text(encoding="utf-8", errors="replace") for p in paths]
+    return [synthetic_newsletter(i) for i in range(documents)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--corpus", help="Directory of .html files to use instead of the synthetic corpus.")
+    parser.add_argument("--documents", type=int, default=200, help="Synthetic documents when --corpus is not given.")
+    parser.add_argument("--rounds", type=int, default=5, help="Passes over the corpus per backend; the best is reported.")
+    args = parser.parse_args()
+
+    corpus = load_corpus(args.corpus, args.documents)
+    if not corpus:
+        parser.error(f"No .html files found under {args.corpus}.")
+    corpus_mb = sum(len(doc.encode("utf-8")) for doc in corpus) / 1e6
+    reference = [HTML_BACKENDS[REFERENCE_BACKEND](doc) for doc in corpus]
+    print(f"Corpus: {len(corpus)} documents, {corpus_mb:.2f} MB")
+
+    print(f"{'backend':<16}{'best s':>10}{'MB/s':>10}{'speedup':>10}{'equal output':>14}")
+    reference_s = None
+    for name, backend in sorted(HTML_BACKENDS.items(), key=lambda item: item[0] != REFERENCE_BACKEND):
+        equal = all(backend(doc) == expected for doc, expected in zip(corpus, reference))
+        best_s = float("inf")
+        for _ in range(args.rounds):
+            start = time.perf_counter()
+            for doc in corpus:
+                backend(doc)
+            best_s = min(best_s, time.perf_counter() - start)
+        reference_s = reference_s or best_s
+        print(f"{name:<16}{best_s:>10.3f}{corpus_mb / best_s:>10.2f}{reference_s / best_s:>9.1f}x{str(equal):>14}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,294 @@
+# benchmarks/bench_pipeline_replay.py
+"""
+Benchmark: end-to-end replay of run_gmail_ingestion_pipeline without Gmail or OpenAI.
+
+Recorded (or synthetic) `format='full'` Gmail payloads are served by RecordedGmailTransport with
+no latency. The real GmailAgent parses them, and TaskClassifier answers each message with a
+canned extract_task_details function call instead of calling the API. Everything else is the
+production code path: normalize, token budget, pre-classifier gate, classify, resolve_date,
+fingerprint dedup, persist and conflict tagging, against a temporary SQLite database that is
+created fresh for every scale.
+
+Reported per scale: wall time, messages per second, seconds spent in each stage, and the peak
+Python heap (tracemalloc) of a second, separately timed run. Time not attributed to a stage
+(logging, summary bookkeeping, the loop itself) is shown as "other". `--rerun` also times a
+second run over the same mailbox and database, where the processed-source ledger skips every
+message the first run handled except the gated ones, which are scored again.
+
+Synthetic mailboxes mix meeting/deadline requests with due dates in several formats, repeated
+requests (fingerprint duplicates), informational mail the classifier rejects, and promotions
+with bulk headers that the gate skips. With `--recording`, canned answers come from
+`--responses` (a JSON object of message ID -> extract_task_details arguments, or null for
+"not a task"); messages without an entry are answered "not a task".
+
+Usage (from the project root):
+    python -m benchmarks.bench_pipeline_replay
+    python -m benchmarks.bench_pipeline_replay --scales 100,1000 --json replay_results.json
+    python -m benchmarks.bench_pipeline_replay --scales 1000 --rerun --no-memory
+    python -m benchmarks.bench_pipeline_replay --recording gmail_recording.json --responses canned.json --scales 0
+"""
+import argparse
+import base64
+import json
+import os
+import shutil
+import tempfile
+import time
+import tracemalloc
+import contextlib
+import logging
+from unittest.mock import patch
+
+from openai.types.chat import ChatCompletion
+from sqlalchemy.orm import sessionmaker
+
+# Several modules print on import; scheduler.jobs also logs its circular import of main.
+logging.disable(logging.CRITICAL)
+with open(os.devnull, "w") as _devnull, contextlib.redirect_stdout(_devnull):
+    import main
+    import config
+    from extract_nlp.classifiers import TaskClassifier
+    from extract_nlp.gate import PreClassifier
+    from ingestion.agents import GmailAgent
+    from ingestion.stub_transport import RecordedGmailTransport, build_stub_gmail_service, synthetic_message
+    from persistence import crud as persistence_crud
+    from persistence.database import create_app_engine
+    from persistence.models import Base
+
+# Stages in pipeline order, and the functions whose time is attributed to each.
+STAGES = ("fetch", "ledger", "normalize", "budget", "gate", "classify", "resolve_date", "fingerprint", "persist", "conflict")
+_DUE_FORMATS = ("2025-{month:02d}-{day:02d} {hour:02d}:{minute:02d}", "{month}/{day}/2025 {hour}:{minute:02d}",
+                "tomorrow at {hour}pm", "next Friday {hour}:{minute:02d}", "March {day}, 2025", None)
+
+
+def _b64(text: str) -> str:
+    return base64.urlsafe_b64encode(text.encode("utf-8")).decode("ascii")
+
+
+def synthetic_mailbox(count: int, body_chars: int = 2000):
+    """Returns (messages, responses): payloads in mailbox order and the canned answer per message ID."""
+    messages, responses = {}, {}
+    for i in range(count):
+        message = synthetic_message(i, body_chars=body_chars)
+        kind = i % 10
+        if kind in (8, 9): # Promotions: bulk headers and a no-reply sender, which the gate skips
+            text = (f"(광고) 주말 특가! 전 품목 {10 + i % 40}% 할인 쿠폰을 받으세요. 수신거부는 여기를 누르세요. "
+                    * (body_chars // 60 + 1))[:body_chars]
+            message["payload"]["headers"][:2] = [{"name": "Subject", "value": f"주말 특가 이벤트 {i}"},
+                                                 {"name": "From", "value": "Shop <no-reply@shop.example>"}]
+            message["payload"]["headers"].append({"name": "List-Unsubscribe", "value": "<mailto:u@shop.example>"})
+            message["payload"]["parts"] = [{"mimeType": "text/plain", "body": {"size": len(text), "data": _b64(text)}}]
+            responses[message["id"]] = {"is_task": False}
+        elif kind == 7: # Informational mail the classifier rejects
+            responses[message["id"]] = {"is_task": False}
+        else:
+            # Every fifth request repeats an earlier one (same title and due date), so it is a fingerprint duplicate.
+            key = i - 5 if kind == 5 and i >= 5 else i
+            due_format = _DUE_FORMATS[key % len(_DUE_FORMATS)]
+            due = due_format and due_format.format(month=key % 12 + 1, day=key % 28 + 1,
+                                                   hour=9 + key % 9, minute=(key * 7) % 4 * 15)
+            responses[message["id"]] = {"is_task": True, "task_type": "meeting" if key % 2 else "assignment",
+                                        "title": f"Project sync {key}", "due_date_description": due,
+                                        "body_summary": f"Prepare notes for project sync {key}."}
+        messages[message["id"]] = message
+    return messages, responses
+
+
+class StageTimer:
+    """Accumulates wall time and call counts per stage for wrapped functions."""
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.seconds = {stage: 0.0 for stage in STAGES}
+        self.calls = {stage: 0 for stage in STAGES}
+
+    def wrap(self, stage: str, function):
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                self.seconds[stage] += time.perf_counter() - start
+                self.calls[stage] += 1
+        return timed
+
+    def wrap_iterator(self, stage: str, iterator):
+        iterator = iter(iterator)
+        while True:
+            start = time.perf_counter()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+            finally:
+                self.seconds[stage] += time.perf_counter() - start
+            self.calls[stage] += 1
+            yield item
+
+
+class ReplayGmailAgent(GmailAgent):
+    """GmailAgent over a zero-latency RecordedGmailTransport that lists the whole recording."""
+
+    def __init__(self, transport: RecordedGmailTransport, timer: StageTimer, **kwargs):
+        super().__init__(**kwargs)
+        self.transport = transport
+        self.timer = timer
+
+    def authenticate_gmail(self, app_user_id="default_user"):
+        self.service = build_stub_gmail_service(self.transport)
+        return self.service
+
+    def iter_messages(self, *args, **kwargs):
+        kwargs["max_results"] = None # The pipeline caps a full sync at 500 messages
+        return self.timer.wrap_iterator("fetch", super().iter_messages(*args, **kwargs))
+
+
+class _CannedCompletions:
+    def __init__(self, classifier: "ReplayClassifier"):
+        self.classifier = classifier
+
+    def create(self, **request_kwargs):
+        arguments = self.classifier.responses.get(self.classifier.current_source_id) or {"is_task": False}
+        return ChatCompletion.model_validate({
+            "id": "replay", "object": "chat.completion", "created": 0, "model": request_kwargs["model"],
+            "choices": [{"index": 0, "finish_reason": "function_call", "message": {
+                "role": "assistant", "content": None,
+                "function_call": {"name": "extract_task_details", "arguments": json.dumps(arguments)}}}],
+            "usage": {"prompt_tokens": 300, "completion_tokens": 40, "total_tokens": 340},
+        })
+
+
+class ReplayClassifier(TaskClassifier):
+    """TaskClassifier whose chat completions are canned answers keyed by source ID ('gmail_<id>')."""
+
+    def __init__(self, responses: dict, cache=None):
+        super().__init__(api_key="replay-key", cache=cache)
+        self.responses = responses
+        self.current_source_id = None
+        self.client.chat.completions = _CannedCompletions(self)
+
+    def _classify_uncached(self, text, source_id, cache_key):
+        self.current_source_id = source_id
+        return super()._classify_uncached(text, source_id, cache_key)
+
+
+def replay(messages: dict, responses: dict, trace_memory: bool = False, rerun: bool = False) -> dict:
+    """
+    Runs the Gmail pipeline once over `messages` against a fresh temporary database. With `rerun`,
+    a first untimed run fills the database and the timed run is the overlapping second one.
+    """
+    timer = StageTimer()
+    transport = RecordedGmailTransport(messages)
+    canned = {f"gmail_{message_id}": arguments for message_id, arguments in responses.items()}
+    db_dir = tempfile.mkdtemp(prefix="replay_db_")
+    engine = create_app_engine(f"sqlite:///{os.path.join(db_dir, 'agenda.db')}")
+    Base.metadata.create_all(bind=engine)
+
+    crud_stages = {"get_task_by_fingerprint": "fingerprint", "get_task_ids_by_fingerprints": "fingerprint",
+                   "iter_task_fingerprints": "fingerprint", "get_processed_source_ids": "ledger",
+                   "record_processed_sources": "persist", "create_task": "persist", "create_tasks_bulk": "persist",
+                   "save_classification_outcome": "persist", "get_classification_outcomes": "gate"}
+    patches = [
+        patch.object(main, "SessionLocal", sessionmaker(autocommit=False, autoflush=False, bind=engine)),
+        patch.object(main, "GmailAgent", lambda **kwargs: ReplayGmailAgent(transport, timer, **kwargs)),
+        patch.object(main, "TaskClassifier", lambda cache=None: ReplayClassifier(canned, cache)),
+        patch.object(main, "get_classification_cache", lambda: None), # Every run classifies every message
+        patch.object(main, "normalize_with_stats", timer.wrap("normalize", main.normalize_with_stats)),
+        patch.object(main, "budget_content", timer.wrap("budget", main.budget_content)),
+        patch.object(main, "resolve_date", timer.wrap("resolve_date", main.resolve_date)),
+        patch.object(main, "generate_task_fingerprint", timer.wrap("fingerprint", main.generate_task_fingerprint)),
+        patch.object(main, "tag_new_task_conflicts", timer.wrap("conflict", main.tag_new_task_conflicts)),
+        patch.object(PreClassifier, "decide", timer.wrap("gate", PreClassifier.decide)),
+        patch.object(ReplayClassifier, "classify_task", timer.wrap("classify", TaskClassifier.classify_task)),
+        patch.multiple(config, CLASSIFIER_CONCURRENCY=1, CLASSIFIER_BATCH_SIZE=1, GMAIL_PREFILTER_ENABLED=False,
+                       CLASSIFIER_GATE_ENABLED=True, CLASSIFIER_GATE_RECORD_OUTCOMES=True, # Both opt-in; replayed on
+                       CLASSIFIER_GATE_AUDIT_RATE=0.0),
+    ] + [patch.object(persistence_crud, name, timer.wrap(stage, getattr(persistence_crud, name)))
+         for name, stage in crud_stages.items()]
+
+    peak_bytes = None
+    try:
+        with contextlib.ExitStack() as stack, open(os.devnull, "w") as devnull:
+            for p in patches: stack.enter_context(p)
+            stack.enter_context(contextlib.redirect_stdout(devnull))
+            if rerun:
+                main.run_gmail_ingestion_pipeline(app_user_id="replay_user", incremental=False)
+                timer.reset()
+            if trace_memory: tracemalloc.start()
+            start = time.perf_counter()
+            summary = main.run_gmail_ingestion_pipeline(app_user_id="replay_user", incremental=False)
+            elapsed = time.perf_counter() - start
+            if trace_memory:
+                peak_bytes = tracemalloc.get_traced_memory()[1]
+                tracemalloc.stop()
+    finally:
+        engine.dispose()
+        shutil.rmtree(db_dir, ignore_errors=True)
+
+    return {"messages": len(messages), "seconds": elapsed, "messages_per_s": len(messages) / elapsed if elapsed else 0.0,
+            "stages": dict(timer.seconds), "stage_calls": dict(timer.calls), "peak_bytes": peak_bytes,
+            "tasks_created": summary["tasks_created"], "gate_skipped": summary["gate_skipped"],
+            "already_processed": summary["already_processed"], "rerun": rerun,
+            "success": summary["success"], "error": summary["error"]}
+
+
+def print_result(result: dict):
+    memory = f"{result['peak_bytes'] / 1e6:.1f} MB" if result["peak_bytes"] is not None else "not measured"
+    print(f"\n{result['messages']} messages{' (overlapping re-run)' if result['rerun'] else ''}: "
+          f"{result['seconds']:.2f}s, {result['messages_per_s']:.1f} msgs/s, "
+          f"peak Python heap {memory}; {result['tasks_created']} tasks created, {result['gate_skipped']} skipped by the gate, "
+          f"{result['already_processed']} already processed"
+          + ("" if result["success"] else f"; FAILED: {result['error']}"))
+    print(f"{'stage':<14}{'seconds':>10}{'share':>8}{'ms/msg':>10}{'calls':>8}")
+    other_s = result["seconds"] - sum(result["stages"].values())
+    for stage, seconds in list(result["stages"].items()) + [("other", other_s)]:
+        print(f"{stage:<14}{seconds:>10.3f}{seconds / result['seconds']:>8.1%}"
+              f"{1000 * seconds / max(1, result['messages']):>10.3f}{result['stage_calls'].get(stage, ''):>8}")
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scales", default="100,1000,10000",
+                        help="Comma-separated synthetic mailbox sizes; 0 replays the whole --recording.")
+    parser.add_argument("--body-chars", type=int, default=2000, help="Body length of synthetic messages.")
+    parser.add_argument("--recording", help="Recording written by ingestion.stub_transport.save_recording.")
+    parser.add_argument("--responses", help="JSON object of message ID -> canned extract_task_details arguments.")
+    parser.add_argument("--no-memory", action="store_true", help="Skip the second, tracemalloc-instrumented run.")
+    parser.add_argument("--rerun", action="store_true",
+                        help="Also time a second run over the same mailbox and database, as overlapping runs do.")
+    parser.add_argument("--json", help="Also write the results to this JSON file, e.g. to compare against a baseline.")
+    args = parser.parse_args()
+
+    if args.recording:
+        recorded = RecordedGmailTransport.from_recording(args.recording).messages
+        responses = {}
+        if args.responses:
+            with open(args.responses, "r", encoding="utf-8") as f:
+                responses = json.load(f)
+    results = []
+    for scale in (int(s) for s in args.scales.split(",") if s.strip()):
+        if args.recording:
+            ids = list(recorded)[:scale] if scale else list(recorded)
+            messages = {message_id: recorded[message_id] for message_id in ids}
+        else:
+            messages, responses = synthetic_mailbox(scale, body_chars=args.body_chars)
+        result = replay(messages, responses)
+        if not args.no_memory:
+            result["peak_bytes"] = replay(messages, responses, trace_memory=True)["peak_bytes"]
+        print_result(result)
+        results.append(result)
+        if args.rerun:
+            result = replay(messages, responses, rerun=True)
+            print_result(result)
+            results.append(result)
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+        print(f"\nResults written to {args.json}")
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,160 @@
+# benchmarks/bench_sqlite_concurrency.py
+"""
+Benchmark: CLI read latency while a pipeline writes, per SQLite connection profile ("legacy":
+SQLite's rollback journal and default pragmas; "performance": WAL, synchronous=NORMAL, mmap,
+cache and busy_timeout, see SQLITE_PROFILE in config.py).
+
+Each profile gets a fresh on-disk database seeded with `--seed-rows` tasks. `--readers` threads
+then repeat what `cli list` does (a session, crud.get_tasks with limit 1000, close), first alone
+and then while a writer process, like the scheduler next to a CLI, saves `--batches` pipeline
+write batches of `--batch-size` tasks (crud.create_tasks_bulk, #conflict tags, one commit per
+batch, as main.py does). Read latencies are reported as p50/p95/max; "locked" counts reads that
+failed with "database is locked", and "failed" the write batches rolled back for the same reason. The database lives under `--dir` (the current directory by
+default, since a tmpfs /tmp hides the cost of syncing to disk).
+
+Usage (from the project root):
+    python -m benchmarks.bench_sqlite_concurrency
+    python -m benchmarks.bench_sqlite_concurrency --readers 4 --batches 40 --batch-size 500
+"""
+import argparse
+import contextlib
+import io
+import multiprocessing
+import os
+import shutil
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import sessionmaker
+
+with contextlib.redirect_stdout(io.StringIO()): # The CRUD module prints on import
+    from persistence import crud
+    from persistence.database import create_app_engine
+    from persistence.models import Base
+
+
+def task_rows(start: int, count: int) -> list:
+    base = datetime(2025, 1, 1, 9, 0)
+    return [{"source": f"bench_{i}", "title": f"Task {i}", "body": "Benchmark task body.",
+             "due_dt": base + timedelta(hours=i % 2000), "fingerprint": f"fp_{i}"} for i in range(start, start + count)]
+
+
+def percentile(values: list, fraction: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))] if ordered else 0.0
+
+
+class Readers:
+    """`count` threads running the CLI list query until stopped."""
+
+    def __init__(self, session_factory, count: int):
+        self.session_factory = session_factory
+        self.count = count
+        self.latencies = []
+        self.locked = 0
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._threads = []
+
+    def _read_loop(self):
+        while not self._stop.is_set():
+            start = time.perf_counter()
+            db = self.session_factory()
+            try:
+                crud.get_tasks(db, skip=0, limit=1000)
+                with self._lock: self.latencies.append(time.perf_counter() - start)
+            except OperationalError:
+                with self._lock: self.locked += 1
+            finally:
+                db.close()
+
+    def __enter__(self):
+        self._threads = [threading.Thread(target=self._read_loop, daemon=True) for _ in range(self.count)]
+        for thread in self._threads: thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stop.set()
+        for thread in self._threads: thread.join()
+
+
+def write_batches(database_url: str, profile: str, args, results) -> None:
+    """
+    Runs in the writer process: saves the pipeline write batches and puts (tasks per second, failed
+    batches) on `results`. Like the pipelines, a batch that cannot be committed is rolled back.
+    """
+    engine = create_app_engine(database_url, profile=profile)
+    db = sessionmaker(autocommit=False, autoflush=False, bind=engine)()
+    start, written, failed = time.perf_counter(), 0, 0
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            for batch in range(args.batches):
+                try:
+                    created = crud.create_tasks_bulk(db, task_rows(args.seed_rows + batch * args.batch_size,
+                                                                   args.batch_size), commit=False)
+                    for task in created[::10]:
+                        if task: crud.update_task_tags(db, task.id, "#conflict", commit=False)
+                    db.commit()
+                    written += sum(1 for task in created if task)
+                except OperationalError:
+                    db.rollback()
+                    failed += 1
+    finally:
+        db.close()
+        engine.dispose()
+    results.put((written / (time.perf_counter() - start), failed))
+
+
+def run(profile: str, args) -> dict:
+    db_dir = tempfile.mkdtemp(prefix="sqlite_concurrency_", dir=args.dir)
+    database_url = f"sqlite:///{os.path.join(db_dir, 'agenda.db')}"
+    engine = create_app_engine(database_url, profile=profile)
+    session_factory = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    try:
+        Base.metadata.create_all(bind=engine)
+        with contextlib.redirect_stdout(io.StringIO()):
+            seed = session_factory()
+            crud.create_tasks_bulk(seed, task_rows(0, args.seed_rows))
+            seed.close()
+
+            with Readers(session_factory, args.readers) as idle:
+                time.sleep(args.idle_s)
+            results = multiprocessing.Queue()
+            writer = multiprocessing.Process(target=write_batches, args=(database_url, profile, args, results))
+            with Readers(session_factory, args.readers) as busy:
+                writer.start()
+                writer.join()
+            tasks_per_s, failed = results.get(timeout=5)
+    finally:
+        engine.dispose()
+        shutil.rmtree(db_dir, ignore_errors=True)
+    return {"idle": idle, "busy": busy, "tasks_per_s": tasks_per_s, "failed": failed}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--profiles", default="legacy,performance", help="Comma-separated connection profiles.")
+    parser.add_argument("--readers", type=int, default=2, help="Concurrent CLI reader threads.")
+    parser.add_argument("--seed-rows", type=int, default=2000, help="Tasks in the database before the run.")
+    parser.add_argument("--batches", type=int, default=20, help="Pipeline write batches saved during the run.")
+    parser.add_argument("--batch-size", type=int, default=100, help="Tasks per write batch.")
+    parser.add_argument("--dir", default=".", help="Directory for the temporary databases.")
+    parser.add_argument("--idle-s", type=float, default=2.0, help="Seconds of reads measured without the writer.")
+    args = parser.parse_args()
+
+    print(f"{'profile':<13}{'phase':<8}{'reads':>7}{'p50 ms':>9}{'p95 ms':>9}{'max ms':>9}{'locked':>8}{'writes/s':>10}{'failed':>8}")
+    for profile in (p.strip() for p in args.profiles.split(",") if p.strip()):
+        result = run(profile, args)
+        for phase in ("idle", "busy"):
+            readers = result[phase]
+            writes = f"{result['tasks_per_s']:>10.0f}{result['failed']:>8}" if phase == "busy" else f"{'-':>10}{'-':>8}"
+            print(f"{profile:<13}{phase:<8}{len(readers.latencies):>7}{percentile(readers.latencies, 0.5) * 1000:>9.1f}"
+                  f"{percentile(readers.latencies, 0.95) * 1000:>9.1f}{max(readers.latencies, default=0) * 1000:>9.1f}"
+                  f"{readers.locked:>8}{writes}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+# benchmarks/bench_task_writes.py
+"""
+Benchmark: tasks per second written to an on-disk SQLite database, one commit per task
+(crud.create_task + crud.update_task_tags) vs. one transaction per batch (crud.create_tasks_bulk
+with savepoints, tags flushed into the same transaction).
+
+Every `--tag-every`-th task also gets a #conflict tag. The pipelines drop fingerprint duplicates
+before writing, so by default every row is new; `--duplicate-every N` makes every Nth row reuse
+an earlier fingerprint, which sends its batch down the bulk path's per-row savepoint fallback.
+Each mode writes into a fresh database file configured like the app's engine.
+
+Usage (from the project root):
+    python -m benchmarks.bench_task_writes --rows 1000,10000
+    python -m benchmarks.bench_task_writes --rows 10000 --batch-size 500 --duplicate-every 50
+"""
+import argparse
+import contextlib
+import io
+import os
+import shutil
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy.orm import sessionmaker
+
+with contextlib.redirect_stdout(io.StringIO()): # The CRUD module prints on import
+    import config
+    from persistence import crud
+    from persistence.database import create_app_engine
+    from persistence.models import Base
+
+
+def task_rows(count: int, duplicate_every: int) -> list:
+    base = datetime(2025, 1, 1, 9, 0)
+    rows = []
+    for i in range(count):
+        key = i - 1 if duplicate_every and i and i % duplicate_every == 0 else i
+        rows.append({"source": f"bench_{i}", "title": f"Task {i}", "body": "Benchmark task body.",
+                     "due_dt": base + timedelta(hours=i % 2000), "fingerprint": f"fp_{key}"})
+    return rows
+
+
+def write_per_task(db, rows: list, tag_every: int) -> int:
+    written = 0
+    for i, row in enumerate(rows):
+        try:
+            task = crud.create_task(db, dict(row))
+        except Exception:
+            db.rollback(); continue
+        written += 1
+        if tag_every and i % tag_every == 0:
+            crud.update_task_tags(db, task.id, "#conflict")
+    return written
+
+
+def write_bulk(db, rows: list, tag_every: int, batch_size: int) -> int:
+    written = 0
+    for start in range(0, len(rows), batch_size):
+        created = crud.create_tasks_bulk(db, rows[start:start + batch_size], commit=False)
+        for i, task in enumerate(created, start):
+            if task and tag_every and i % tag_every == 0:
+                crud.update_task_tags(db, task.id, "#conflict", commit=False)
+        db.commit()
+        written += sum(1 for task in created if task)
+    return written
+
+
+def run(mode: str, rows: list, args) -> tuple:
+    db_dir = tempfile.mkdtemp(prefix="task_writes_")
+    engine = create_app_engine(f"sqlite:///{os.path.join(db_dir, 'agenda.db')}")
+    Base.metadata.create_all(bind=engine)
+    db = sessionmaker(autocommit=False, autoflush=False, bind=engine)()
+    try:
+        with contextlib.redirect_stdout(io.StringIO()): # Duplicate rows print an error each
+            start = time.perf_counter()
+            if mode == "per-task": written = write_per_task(db, rows, args.tag_every)
+            else: written = write_bulk(db, rows, args.tag_every, args.batch_size)
+            elapsed = time.perf_counter() - start
+    finally:
+        db.close()
+        engine.dispose()
+        shutil.rmtree(db_dir, ignore_errors=True)
+    return elapsed, written
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", default="1000,10000", help="Comma-separated row counts.")
+    parser.add_argument("--batch-size", type=int, default=config.TASK_WRITE_BATCH_SIZE, help="Rows per bulk transaction.")
+    parser.add_argument("--tag-every", type=int, default=10, help="Tag every Nth task with #conflict (0: never).")
+    parser.add_argument("--duplicate-every", type=int, default=0, help="Every Nth row repeats a fingerprint (0: never).")
+    args = parser.parse_args()
+
+    print(f"{'rows':>8}{'mode':>12}{'seconds':>10}{'tasks/s':>10}{'written':>9}{'speedup':>9}")
+    for count in (int(n) for n in args.rows.split(",") if n.strip()):
+        rows = task_rows(count, args.duplicate_every)
+        per_task_s, written = run("per-task", rows, args)
+        print(f"{count:>8}{'per-task':>12}{per_task_s:>10.2f}{written / per_task_s:>10.0f}{written:>9}{1.0:>8.1f}x")
+        bulk_s, written = run("bulk", rows, args)
+        print(f"{count:>8}{'bulk':>12}{bulk_s:>10.2f}{written / bulk_s:>10.0f}{written:>9}{per_task_s / bulk_s:>8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -3,7 +3,7 @@ import typer
 from typing_extensions import Annotated
 from rich.console import Console
 from rich.table import Table
-from datetime import datetime, date, time as dt_time # Ensure date and time are imported
+from datetime import datetime, date, time as dt_time, timedelta # Ensure date and time are imported
 
 # --- Backend Logic Imports ---
 from persistence.database import SessionLocal, create_db_tables
@@ -11,6 +11,7 @@ from persistence import crud
 from extract_nlp.utils import generate_task_fingerprint
 from extract_nlp.classifiers import resolve_date # For parsing date strings from CLI
 from persistence.models import TaskStatus, Task # For status enum and type hints
+from dedup_conflict.resolver import CONFLICT_TAG, detect_conflicts, tag_conflicts
 import os # For path operations
 
 # --- New imports for Obsidian Sync ---
@@ -307,6 +308,46 @@ def reopen_task_cmd(task_id: Annotated[int, typer.Argument(help="ID of the task.
     finally:
         next(db_gen, None)
 
+@app.command(name="conflicts", help="List open tasks due less than CONFLICT_WINDOW_MINUTES apart on the same day.")
+def conflicts_cmd(
+    from_str: Annotated[str, typer.Option("--from", help="First day to check (YYYY-MM-DD). Default: today.")] = None,
+    to_str: Annotated[str, typer.Option("--to", help="Last day to check (YYYY-MM-DD). Default: 7 days after --from.")] = None,
+    tag: Annotated[bool, typer.Option("--tag", help="Also tag the conflicting tasks with #conflict.")] = False
+):
+    db_gen = get_db_session()
+    db = next(db_gen)
+    try:
+        strict = {'STRICT_PARSING': True, 'REQUIRE_PARTS': ['year', 'month', 'day']}
+        start = resolve_date(from_str, custom_settings=strict) if from_str else datetime.now()
+        end = resolve_date(to_str, custom_settings=strict) if to_str else (start + timedelta(days=7) if start else None)
+        if not start or not end:
+            console.print(f"[bold red]Error: Could not parse date '{to_str if start else from_str}'. Use YYYY-MM-DD.[/bold red]")
+            raise typer.Exit(code=1)
+
+        pairs = detect_conflicts(db, start.date(), end.date())
+        if not pairs:
+            console.print(f"[green]No conflicts between {start.date()} and {end.date()}.[/green]")
+            return
+
+        table = Table(title=f"Conflicts {start.date()} - {end.date()}")
+        table.add_column("Due Date", width=16)
+        table.add_column("ID", style="dim", width=5, justify="right")
+        table.add_column("Title", style="bold", min_width=20, overflow="fold")
+        table.add_column("Conflicts With", min_width=20, overflow="fold")
+        for task, other in pairs:
+            table.add_row(task.due_dt.strftime("%Y-%m-%d %H:%M"), str(task.id), task.title,
+                          f"{other.id}: {other.title} ({other.due_dt.strftime('%H:%M')})")
+        console.print(table)
+
+        if tag:
+            tagged = tag_conflicts(db, pairs)
+            if tagged is None:
+                console.print("[bold red]Error: Could not tag the conflicting tasks.[/bold red]")
+                raise typer.Exit(code=1)
+            console.print(f"[green]Tagged {len(tagged)} task(s) with {CONFLICT_TAG}.[/green]")
+    finally:
+        next(db_gen, None)
+
 @app.command(name="delete", help="Delete a task permanently.")
 def delete_task_cli_cmd(task_id: Annotated[int, typer.Argument(help="ID of the task to delete.")]):
     db_gen = get_db_session()
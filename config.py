@@ -7,6 +7,22 @@ load_dotenv()
 
 # --- General Configurations ---
 DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./agenda.db")
+# SQLite connection profile (persistence.database). "performance" applies the pragmas below on every
+# connection: WAL lets the CLI read while a pipeline or the scheduler writes, synchronous=NORMAL
+# syncs at checkpoints instead of every commit (safe with WAL), and busy_timeout makes a second
+# writer wait instead of failing with "database is locked". "legacy" keeps SQLite's defaults except
+# busy_timeout, which every profile sets: the scheduled job writes from several account pipelines.
+SQLITE_PROFILE = os.getenv("SQLITE_PROFILE", "performance").lower()
+SQLITE_JOURNAL_MODE = os.getenv("SQLITE_JOURNAL_MODE", "WAL")
+SQLITE_SYNCHRONOUS = os.getenv("SQLITE_SYNCHRONOUS", "NORMAL")
+SQLITE_MMAP_SIZE_MB = int(os.getenv("SQLITE_MMAP_SIZE_MB", "256"))
+SQLITE_CACHE_SIZE_MB = int(os.getenv("SQLITE_CACHE_SIZE_MB", "64")) # Page cache per connection
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+# Connection pool for file databases: DB_POOL_SIZE connections are kept open, DB_MAX_OVERFLOW more
+# may be opened under load, and a session waits up to DB_POOL_TIMEOUT_S for a free one.
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT_S = float(os.getenv("DB_POOL_TIMEOUT_S", "30"))
 
 
 # --- OpenAI API Key Configuration ---
@@ -18,17 +34,162 @@ TELEGRAM_BOT_TOKEN = os.getenv("TELEGRAM_BOT_TOKEN", "YOUR_TELEGRAM_BOT_TOKEN_HE
 TELEGRAM_CHAT_ID = os.getenv("TELEGRAM_CHAT_ID", "YOUR_TELEGRAM_CHAT_ID_HERE")
 
 
+# --- Gmail Ingestion Configuration ---
+# Number of message detail requests grouped into one Gmail batch HTTP call (max 100).
+# Set to 0 to fall back to one messages.get round trip per message.
+GMAIL_FETCH_BATCH_SIZE = int(os.getenv("GMAIL_FETCH_BATCH_SIZE", "50"))
+
+# Opt-in concurrent detail fetching, used when GMAIL_FETCH_BATCH_SIZE is 0. Each worker thread
+# gets its own authorized HTTP client. Requests are capped at GMAIL_FETCH_RATE_LIMIT_PER_S across
+# workers (messages.get costs 5 of the 250 quota units/s Gmail allows per user); 0 = no cap.
+GMAIL_FETCH_WORKERS = int(os.getenv("GMAIL_FETCH_WORKERS", "0"))
+GMAIL_FETCH_RATE_LIMIT_PER_S = float(os.getenv("GMAIL_FETCH_RATE_LIMIT_PER_S", "40"))
+
+# Messages listed per messages.list page (max 500). The pipeline processes one page while
+# holding only that page in memory, so this bounds peak memory during a run.
+GMAIL_LIST_PAGE_SIZE = int(os.getenv("GMAIL_LIST_PAGE_SIZE", "100"))
+# List and fetch the next page in a background thread while the current one is classified, so the
+# fetch overlaps the classification calls (at most two pages in memory).
+GMAIL_LIST_PREFETCH = os.getenv("GMAIL_LIST_PREFETCH", "true").lower() in ("1", "true", "yes")
+
+# Incremental sync: only pull messages added since the last stored Gmail historyId.
+# When the stored cursor has expired, resync at most GMAIL_RESYNC_MAX_RESULTS messages
+# from the last GMAIL_RESYNC_DAYS days. The cursor only advances after a run in which every email
+# was listed, fetched, classified and saved; otherwise the next run fetches the same messages again.
+GMAIL_INCREMENTAL_SYNC = os.getenv("GMAIL_INCREMENTAL_SYNC", "true").lower() in ("1", "true", "yes")
+GMAIL_RESYNC_DAYS = int(os.getenv("GMAIL_RESYNC_DAYS", "7"))
+GMAIL_RESYNC_MAX_RESULTS = int(os.getenv("GMAIL_RESYNC_MAX_RESULTS", "500"))
+
+# The scheduled job ingests every Gmail account with a stored token, running at most this many
+# account pipelines at the same time.
+GMAIL_ACCOUNT_CONCURRENCY = int(os.getenv("GMAIL_ACCOUNT_CONCURRENCY", "4"))
+
+# Authenticated Gmail services are cached per app user for the life of the process and reused
+# until GMAIL_TOKEN_REFRESH_AHEAD_S seconds before the access token expires; a background timer
+# refreshes the token at that point.
+GMAIL_SERVICE_CACHE_ENABLED = os.getenv("GMAIL_SERVICE_CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+GMAIL_TOKEN_REFRESH_AHEAD_S = float(os.getenv("GMAIL_TOKEN_REFRESH_AHEAD_S", "300"))
+
+# Two-phase fetch: a cheap format='metadata' pass (From, Subject, labels) decides which messages
+# get a full fetch. Lists are comma-separated. Sender entries match a full address, "@domain" or
+# "domain" (subdomains included); allowlisted senders bypass every other rule. Subject patterns are
+# case-insensitive regular expressions. Off by default, since skipped mail is never classified; the
+# default skip labels are only SPAM and TRASH (add e.g. CATEGORY_PROMOTIONS,CATEGORY_SOCIAL to skip
+# Gmail's category tabs, which also hold invitations and requests).
+GMAIL_PREFILTER_ENABLED = os.getenv("GMAIL_PREFILTER_ENABLED", "false").lower() in ("1", "true", "yes")
+GMAIL_SENDER_ALLOWLIST = os.getenv("GMAIL_SENDER_ALLOWLIST", "")
+GMAIL_SENDER_DENYLIST = os.getenv("GMAIL_SENDER_DENYLIST", "")
+GMAIL_SKIP_LABELS = os.getenv("GMAIL_SKIP_LABELS", "SPAM,TRASH")
+GMAIL_SKIP_SUBJECT_PATTERNS = os.getenv(
+    "GMAIL_SKIP_SUBJECT_PATTERNS",
+    r"\bnewsletter\b,^\s*[\(\[]광고[\)\]]"
+)
+
+
 # --- KakaoTalk Agent Configuration (New) ---
 # Name of the KakaoTalk chat room to monitor for messages.
 # Example: your "Chat with myself" or a specific group chat name.
 KAKAOTALK_CHAT_NAME_TO_MONITOR = os.getenv("KAKAOTALK_CHAT_NAME_TO_MONITOR", "My Notes Chat") # Default example
 
+# Optional: Comma-separated list of chat rooms to monitor, e.g. "My Notes Chat,Team Project".
+# If unset, only KAKAOTALK_CHAT_NAME_TO_MONITOR is monitored.
+KAKAOTALK_CHAT_NAMES_TO_MONITOR = [
+    name.strip() for name in os.getenv("KAKAOTALK_CHAT_NAMES_TO_MONITOR", "").split(",") if name.strip()
+] or [KAKAOTALK_CHAT_NAME_TO_MONITOR]
+# Number of browser pages (in one browser context) used to read chats side by side.
+KAKAOTALK_PAGE_POOL_SIZE = int(os.getenv("KAKAOTALK_PAGE_POOL_SIZE", "3"))
+
 # Optional: Path to a Playwright user data directory for persistent browser sessions for KakaoTalk.
 # If set, KakaoAgent will try to use it.
 # If None or empty string, a temporary context will be used by Playwright.
 # Example path: "./kakaotalk_playwright_user_data" (ensure this is in .gitignore if used)
 KAKAOTALK_USER_DATA_DIR = os.getenv("KAKAOTALK_USER_DATA_DIR", None)
 
+# Keep one logged-in browser session alive between scheduler runs instead of launching Chromium
+# on every run. The session is health-checked before each run and relaunched only if it died.
+KAKAOTALK_PERSISTENT_SESSION = os.getenv("KAKAOTALK_PERSISTENT_SESSION", "true").lower() in ("1", "true", "yes")
+KAKAOTALK_HEADLESS = os.getenv("KAKAOTALK_HEADLESS", "false").lower() in ("1", "true", "yes")
+
+# Incremental reading: each run scrolls back (at most KAKAOTALK_MAX_SCROLL_ATTEMPTS times) until it
+# reaches the last message processed in that chat, and processes at most the newest
+# KAKAOTALK_MAX_MESSAGES_PER_RUN messages after it.
+KAKAOTALK_MAX_SCROLL_ATTEMPTS = int(os.getenv("KAKAOTALK_MAX_SCROLL_ATTEMPTS", "10"))
+KAKAOTALK_MAX_MESSAGES_PER_RUN = int(os.getenv("KAKAOTALK_MAX_MESSAGES_PER_RUN", "100"))
+
+
+
+# --- Preprocessing Configuration ---
+# HTML-to-text backend used by preprocessing.normalizer: "streaming" (stdlib HTMLParser events,
+# no tree) or "beautifulsoup" (full BeautifulSoup tree). Both produce the same text.
+NORMALIZER_HTML_BACKEND = os.getenv("NORMALIZER_HTML_BACKEND", "streaming")
+# Drop quoted replies, signatures and legal/newsletter footers before text is sent to the LLM.
+# Emojis are always removed.
+NORMALIZER_STRIP_BOILERPLATE = os.getenv("NORMALIZER_STRIP_BOILERPLATE", "true").lower() in ("1", "true", "yes")
+# Estimated token budget of the text sent to TaskClassifier per item (subject, sender and the most
+# task-relevant paragraphs are kept). 0 disables budgeting.
+CLASSIFIER_MAX_INPUT_TOKENS = int(os.getenv("CLASSIFIER_MAX_INPUT_TOKENS", "1500"))
+# Cache of classification results keyed by model, prompt version and text, so identical texts are
+# sent to OpenAI only once. The SQLite file defaults to classification_cache.db next to agenda.db.
+CLASSIFICATION_CACHE_ENABLED = os.getenv("CLASSIFICATION_CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+CLASSIFICATION_CACHE_PATH = os.getenv("CLASSIFICATION_CACHE_PATH", "")
+CLASSIFICATION_CACHE_TTL_S = float(os.getenv("CLASSIFICATION_CACHE_TTL_S", str(30 * 24 * 3600)))
+CLASSIFICATION_CACHE_MAX_ENTRIES = int(os.getenv("CLASSIFICATION_CACHE_MAX_ENTRIES", "10000"))
+# Concurrent classification of Gmail messages: up to CLASSIFIER_CONCURRENCY OpenAI calls in flight,
+# kept under the account's requests- and tokens-per-minute limits for the model (set these to your
+# tier's limits; 0 disables a limit). Calls answered with 429 or 5xx are retried up to
+# CLASSIFIER_MAX_RETRIES times with jittered backoff. 1 classifies one message at a time. These are
+# process-wide: when the scheduler runs several Gmail accounts at once, each account pipeline gets
+# an equal share of the concurrency and of both limits.
+CLASSIFIER_CONCURRENCY = int(os.getenv("CLASSIFIER_CONCURRENCY", "8"))
+CLASSIFIER_RPM_LIMIT = float(os.getenv("CLASSIFIER_RPM_LIMIT", "3500"))
+CLASSIFIER_TPM_LIMIT = float(os.getenv("CLASSIFIER_TPM_LIMIT", "200000"))
+CLASSIFIER_MAX_RETRIES = int(os.getenv("CLASSIFIER_MAX_RETRIES", "5"))
+# Batched classification: up to CLASSIFIER_BATCH_SIZE consecutive texts (and about
+# CLASSIFIER_BATCH_MAX_TOKENS estimated tokens of text) share one request, so short KakaoTalk lines
+# and brief emails do not each pay for the system prompt and function schema. 1 disables batching.
+CLASSIFIER_BATCH_SIZE = int(os.getenv("CLASSIFIER_BATCH_SIZE", "10"))
+CLASSIFIER_BATCH_MAX_TOKENS = int(os.getenv("CLASSIFIER_BATCH_MAX_TOKENS", "2000"))
+# Local pre-classifier gate (Gmail): emails whose estimated task probability, from sender, bulk-mail
+# header and Korean/English keyword features, is below CLASSIFIER_GATE_THRESHOLD are not sent to
+# OpenAI. CLASSIFIER_GATE_AUDIT_RATE of them are classified anyway to estimate missed tasks.
+# With CLASSIFIER_GATE_RECORD_OUTCOMES (defaults to CLASSIFIER_GATE_ENABLED; set it alone to collect
+# training data before turning the gate on), outcomes and a text excerpt of each email are recorded
+# in the classification_outcomes table; once it holds CLASSIFIER_GATE_MODEL_MIN_SAMPLES rows of
+# both classes, a logistic model trained on them replaces the hand-set weights. Off by default: the hand-set weights are not validated on real
+# mailboxes, so the gate is opt-in. Gated emails are recorded in the processed-source ledger as
+# 'gated', which does not count as processed, so they are evaluated again on later runs.
+CLASSIFIER_GATE_ENABLED = os.getenv("CLASSIFIER_GATE_ENABLED", "false").lower() in ("1", "true", "yes")
+CLASSIFIER_GATE_THRESHOLD = float(os.getenv("CLASSIFIER_GATE_THRESHOLD", "0.25"))
+CLASSIFIER_GATE_AUDIT_RATE = float(os.getenv("CLASSIFIER_GATE_AUDIT_RATE", "0.05"))
+CLASSIFIER_GATE_RECORD_OUTCOMES = os.getenv("CLASSIFIER_GATE_RECORD_OUTCOMES",
+                                            str(CLASSIFIER_GATE_ENABLED)).lower() in ("1", "true", "yes")
+CLASSIFIER_GATE_MODEL_ENABLED = os.getenv("CLASSIFIER_GATE_MODEL_ENABLED", "true").lower() in ("1", "true", "yes")
+CLASSIFIER_GATE_MODEL_MIN_SAMPLES = int(os.getenv("CLASSIFIER_GATE_MODEL_MIN_SAMPLES", "200"))
+# Due-date resolution (extract_nlp.dates): common shapes such as ISO dates, "tomorrow 3pm",
+# "내일 오후 3시" and "다음주 월요일" are resolved by precompiled fast paths; everything else goes to
+# dateparser restricted to DATE_LANGUAGES (comma-separated codes; empty lets it detect the language
+# among all locales, which is much slower). Results are memoized per text, reference date and settings.
+DATE_LANGUAGES = [code.strip() for code in os.getenv("DATE_LANGUAGES", "en,ko").split(",") if code.strip()]
+DATE_RESOLVER_FAST_PATHS = os.getenv("DATE_RESOLVER_FAST_PATHS", "true").lower() in ("1", "true", "yes")
+DATE_RESOLVER_CACHE_SIZE = int(os.getenv("DATE_RESOLVER_CACHE_SIZE", "4096"))
+# Emails classified one at a time are saved in one database transaction per TASK_WRITE_BATCH_SIZE
+# emails (concurrent classification saves each classification window in one transaction).
+TASK_WRITE_BATCH_SIZE = int(os.getenv("TASK_WRITE_BATCH_SIZE", "100"))
+# Duplicate detection (dedup_conflict.fingerprints): the pipelines keep the fingerprints of stored
+# tasks in an in-process index, refreshed at each run, and only look up in the database (one IN query
+# per batch) the fingerprints it may contain. "set" holds every fingerprint; "bloom" is a Bloom filter
+# sized for FINGERPRINT_BLOOM_CAPACITY fingerprints (rebuilt larger when outgrown) that needs far less
+# memory; "off" looks up every fingerprint of the batch.
+FINGERPRINT_INDEX = os.getenv("FINGERPRINT_INDEX", "set").lower()
+FINGERPRINT_BLOOM_CAPACITY = int(os.getenv("FINGERPRINT_BLOOM_CAPACITY", "100000"))
+FINGERPRINT_BLOOM_ERROR_RATE = float(os.getenv("FINGERPRINT_BLOOM_ERROR_RATE", "0.01"))
+# Processed-source ledger (processed_sources table): Gmail and KakaoTalk messages already ingested,
+# including those classified as non-tasks, are skipped before normalization and classification.
+# Set to false to re-classify every fetched message (e.g. after changing the classification prompt).
+PROCESSED_SOURCE_LEDGER_ENABLED = os.getenv("PROCESSED_SOURCE_LEDGER_ENABLED", "true").lower() in ("1", "true", "yes")
+# Time conflicts (dedup_conflict.resolver): open tasks due on the same day less than this many minutes
+# apart are tagged #conflict, by both pipelines and by `cli conflicts --tag`.
+CONFLICT_WINDOW_MINUTES = int(os.getenv("CONFLICT_WINDOW_MINUTES", "60"))
 
 # --- Feedback on Configurations (Helper Function) ---
 def print_config_feedback():
@@ -40,6 +201,13 @@ def print_config_feedback():
         console_lines.append("INFO: Using default SQLite database (agenda.db).")
     else:
         console_lines.append(f"INFO: DATABASE_URL is set to: {DATABASE_URL}")
+    if DATABASE_URL.startswith("sqlite"):
+        if SQLITE_PROFILE == "performance":
+            console_lines.append(f"INFO: SQLite performance profile is ON (journal_mode={SQLITE_JOURNAL_MODE}, "
+                                 f"synchronous={SQLITE_SYNCHRONOUS}, busy_timeout={SQLITE_BUSY_TIMEOUT_MS} ms).")
+        else:
+            console_lines.append(f"INFO: SQLite performance profile is OFF. Connections use SQLite's default pragmas "
+                                 f"(busy_timeout={SQLITE_BUSY_TIMEOUT_MS} ms).")
 
     # OpenAI
     if OPENAI_API_KEY == "YOUR_API_KEY_HERE" or not OPENAI_API_KEY:
@@ -47,6 +215,16 @@ def print_config_feedback():
         console_lines.append("         Refer to docs/llm_setup.md to configure it (e.g., via OPENAI_API_KEY env var).")
     else:
         console_lines.append("INFO: OpenAI API Key is SET.")
+    if CLASSIFIER_CONCURRENCY > 1:
+        console_lines.append(f"INFO: Gmail messages are classified by up to {CLASSIFIER_CONCURRENCY} concurrent OpenAI calls "
+                             f"(limits: {CLASSIFIER_RPM_LIMIT:g} RPM, {CLASSIFIER_TPM_LIMIT:g} TPM).")
+    if CLASSIFIER_BATCH_SIZE > 1:
+        console_lines.append(f"INFO: Up to {CLASSIFIER_BATCH_SIZE} short messages share one classification request.")
+    if CLASSIFIER_GATE_ENABLED:
+        console_lines.append(f"INFO: Pre-classifier gate is ON. Emails scoring below {CLASSIFIER_GATE_THRESHOLD} are not sent to OpenAI.")
+    if CLASSIFIER_GATE_RECORD_OUTCOMES:
+        console_lines.append("INFO: Classification outcomes (with text excerpts) are recorded for training the pre-classifier gate.")
+    console_lines.append(f"INFO: Due dates are parsed with dateparser languages: {', '.join(DATE_LANGUAGES) or 'all (auto-detect)'}.")
 
     # Telegram
     telegram_token_is_placeholder = TELEGRAM_BOT_TOKEN == "YOUR_TELEGRAM_BOT_TOKEN_HERE" or not TELEGRAM_BOT_TOKEN
@@ -62,12 +240,31 @@ def print_config_feedback():
     else:
         console_lines.append("INFO: Telegram Bot Token and Chat ID are SET.")
 
+    # Gmail ingestion
+    if GMAIL_FETCH_BATCH_SIZE > 0:
+        console_lines.append(f"INFO: Gmail message details are fetched in batches of {GMAIL_FETCH_BATCH_SIZE}.")
+    elif GMAIL_FETCH_WORKERS > 1:
+        console_lines.append(f"INFO: Gmail message details are fetched by {GMAIL_FETCH_WORKERS} concurrent workers.")
+    else:
+        console_lines.append("INFO: GMAIL_FETCH_BATCH_SIZE is 0. Gmail message details are fetched one request at a time.")
+    if GMAIL_INCREMENTAL_SYNC:
+        console_lines.append(f"INFO: Gmail incremental sync is ON (expired cursors resync the last {GMAIL_RESYNC_DAYS} day(s)).")
+    else:
+        console_lines.append("INFO: Gmail incremental sync is OFF. Each run re-lists mail from the last day.")
+    if GMAIL_PREFILTER_ENABLED:
+        console_lines.append(f"INFO: Gmail metadata prefilter is ON (skipping labels: {GMAIL_SKIP_LABELS or 'none'}).")
+    else:
+        console_lines.append("INFO: Gmail metadata prefilter is OFF. Every listed message is fetched in full.")
+
     # KakaoTalk
     if KAKAOTALK_CHAT_NAME_TO_MONITOR == "My Notes Chat": # Default example value
         console_lines.append("INFO: KAKAOTALK_CHAT_NAME_TO_MONITOR is set to the default 'My Notes Chat'.")
         console_lines.append("      Update this in config.py or via environment variable if monitoring a different chat.")
     else:
         console_lines.append(f"INFO: KAKAOTALK_CHAT_NAME_TO_MONITOR is set to: '{KAKAOTALK_CHAT_NAME_TO_MONITOR}'.")
+    if len(KAKAOTALK_CHAT_NAMES_TO_MONITOR) > 1:
+        console_lines.append(f"INFO: Monitoring {len(KAKAOTALK_CHAT_NAMES_TO_MONITOR)} KakaoTalk chats "
+                             f"({KAKAOTALK_PAGE_POOL_SIZE} browser page(s) at a time): {', '.join(KAKAOTALK_CHAT_NAMES_TO_MONITOR)}.")
 
     if KAKAOTALK_USER_DATA_DIR is None or KAKAOTALK_USER_DATA_DIR == "": # Check for None or empty string explicitly
         console_lines.append("INFO: KAKAOTALK_USER_DATA_DIR is not set. Playwright will use a temporary browser context for KakaoAgent.")
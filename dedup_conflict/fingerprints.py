@@ -0,0 +1,124 @@
+# dedup_conflict/fingerprints.py
+"""
+In-process index of stored task fingerprints, so the pipelines' duplicate check does not need a
+database round trip per classified item.
+
+The index answers "might a stored task have this fingerprint?". A "no" is trusted; a "maybe" is
+confirmed with one `IN (...)` query for the whole batch (crud.get_task_ids_by_fingerprints), which
+also covers tasks deleted since they were indexed. The index is loaded on first use, refreshed at
+the start of each pipeline run with the tasks added since (by other processes too), and told
+about every task the pipelines insert. A fingerprint set by another process after the last refresh
+is missed until the next one; the insert then fails on the unique constraint and create_tasks_bulk
+skips that row.
+
+The default backend is a set of the fingerprints. A Bloom filter (FINGERPRINT_INDEX=bloom) uses
+far less memory for the same answer, at the price of `error_rate` false "maybe"s, which only cost
+a database lookup.
+"""
+import hashlib
+import math
+import threading
+from typing import Iterable, Optional, Tuple
+
+import config
+from persistence import crud as persistence_crud
+
+
+class BloomFilter:
+    """Fixed-size Bloom filter over strings, sized for `capacity` items at `error_rate` false positives."""
+
+    def __init__(self, capacity: int, error_rate: float = 0.01):
+        self.capacity = max(1, capacity)
+        self.size_bits = max(8, int(-self.capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hash_count = max(1, round(self.size_bits / self.capacity * math.log(2)))
+        self._bits = bytearray((self.size_bits + 7) // 8)
+
+    def _positions(self, item: str) -> list:
+        digest = hashlib.blake2b(item.encode("utf-8"), digest_size=16).digest()
+        h1, h2 = int.from_bytes(digest[:8], "little"), int.from_bytes(digest[8:], "little") | 1
+        size_bits = self.size_bits
+        return [(h1 + i * h2) % size_bits for i in range(self.hash_count)]
+
+    def add(self, item: str):
+        bits = self._bits
+        for position in self._positions(item):
+            bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, item: str) -> bool:
+        bits = self._bits
+        for position in self._positions(item):
+            if not bits[position >> 3] & (1 << (position & 7)):
+                return False
+        return True
+
+
+class FingerprintIndex:
+    """
+    Args:
+        bloom_capacity: Use a Bloom filter sized for this many fingerprints instead of a set.
+        bloom_error_rate: False positive rate of the Bloom filter at `bloom_capacity` entries.
+    """
+
+    def __init__(self, bloom_capacity: Optional[int] = None, bloom_error_rate: float = 0.01):
+        self._members = BloomFilter(bloom_capacity, bloom_error_rate) if bloom_capacity else set()
+        self.bloom_capacity = bloom_capacity
+        self.max_task_id = 0 # Highest task id loaded; the next refresh starts after it
+        self.count = 0
+        self._lock = threading.Lock()
+        self.stats = {"checked": 0, "maybe": 0}
+
+    @property
+    def saturated(self) -> bool:
+        """True once a Bloom filter holds more than it was sized for, so its false positive rate climbs."""
+        return bool(self.bloom_capacity) and self.count > self.bloom_capacity
+
+    def load(self, rows: Iterable[Tuple[int, str]]):
+        """Adds (task id, fingerprint) rows, as returned by crud.iter_task_fingerprints."""
+        with self._lock:
+            for task_id, fingerprint in rows:
+                self._members.add(fingerprint)
+                self.count += 1
+                self.max_task_id = max(self.max_task_id, task_id)
+
+    def add(self, fingerprint: str):
+        if not fingerprint: return
+        with self._lock:
+            self._members.add(fingerprint)
+            self.count += 1
+
+    def might_contain(self, fingerprint: str) -> bool:
+        with self._lock:
+            self.stats["checked"] += 1
+            if fingerprint in self._members:
+                self.stats["maybe"] += 1
+                return True
+            return False
+
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+
+def get_fingerprint_index(db) -> Optional[FingerprintIndex]:
+    """
+    The process-wide index for the database `db` is bound to, refreshed with the tasks stored since
+    the last call; None when FINGERPRINT_INDEX is "off" or the index cannot be loaded.
+    """
+    backend = config.FINGERPRINT_INDEX
+    if backend not in ("set", "bloom"):
+        return None
+    key = (str(db.get_bind().url), backend)
+    with _indexes_lock:
+        index = _indexes.get(key)
+        try:
+            if index is None or index.saturated:
+                capacity = config.FINGERPRINT_BLOOM_CAPACITY if backend == "bloom" else None
+                if index is not None: capacity = index.count * 2 # Rebuilt from the database at twice the size
+                index = FingerprintIndex(capacity, config.FINGERPRINT_BLOOM_ERROR_RATE)
+            index.load(persistence_crud.iter_task_fingerprints(db, after_id=index.max_task_id))
+        except Exception as e:
+            print(f"Could not load the fingerprint index: {e}. Checking every fingerprint in the database.")
+            _indexes.pop(key, None)
+            return None
+        _indexes[key] = index
+        return index
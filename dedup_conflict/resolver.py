@@ -1,2 +1,105 @@
-# Placeholder for deduplication and conflict resolver
-print("Deduplication and conflict resolver initialized")
+# dedup_conflict/resolver.py
+"""
+Time conflict detection: two open tasks conflict when they are due on the same day, at a time
+other than midnight (a date-only due), less than CONFLICT_WINDOW_MINUTES apart.
+
+The open tasks of the affected time ranges are loaded with one query on due_dt
+(crud.get_active_tasks_due_between, or crud.get_active_task_times_between for just the times) and
+sorted, instead of a query per task. find_conflicts lists the conflicting pairs with a sweep over
+the sorted tasks (for the CLI). The pipelines only query the window either side of each new task,
+and tag_new_task_conflicts finds each one's conflicts by bisection, so a run costs O(n log n)
+however many pairs there are. The conflicting tasks not tagged yet are then tagged in one write
+(crud.add_tag_to_tasks).
+"""
+from bisect import bisect_left, bisect_right
+from datetime import date, datetime, time, timedelta
+from typing import Iterable, List, Optional, Set, Tuple
+
+import config
+from persistence import crud as persistence_crud
+
+CONFLICT_TAG = "#conflict"
+
+
+def _is_timed(task) -> bool:
+    return task.due_dt is not None and task.due_dt.time() != time(0, 0, 0)
+
+
+def find_conflicts(tasks: Iterable, window: Optional[timedelta] = None) -> List[Tuple]:
+    """
+    Pairs (earlier, later) of `tasks` due on the same day less than `window` apart
+    (CONFLICT_WINDOW_MINUTES by default). Tasks without a due time are ignored.
+    """
+    window = window if window is not None else timedelta(minutes=config.CONFLICT_WINDOW_MINUTES)
+    timed = sorted((task for task in tasks if _is_timed(task)), key=lambda task: task.due_dt)
+    dues = [task.due_dt for task in timed]
+    pairs = []
+    for i, due in enumerate(dues):
+        # A later task conflicts while it is due before this end; the next midnight keeps it to the same day.
+        end = min(due + window, datetime.combine(due.date() + timedelta(days=1), time(0, 0, 0)))
+        j = i + 1
+        while j < len(dues) and dues[j] < end:
+            pairs.append((timed[i], timed[j]))
+            j += 1
+    return pairs
+
+
+def _merge_ranges(ranges: Iterable[Tuple]) -> List[Tuple]:
+    """Sorted [start, end) ranges with the overlapping and adjacent ones merged."""
+    merged = []
+    for start, end in sorted(ranges):
+        if merged and start <= merged[-1][1]:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def _window_ranges(tasks: Iterable, window: timedelta) -> List[Tuple[datetime, datetime]]:
+    """The due_dt ranges a task of `tasks` can conflict with: `window` either side, within its day."""
+    ranges = []
+    for task in tasks:
+        day_start = datetime.combine(task.due_dt.date(), time(0, 0, 0))
+        ranges.append((max(day_start, task.due_dt - window), min(day_start + timedelta(days=1), task.due_dt + window)))
+    return _merge_ranges(ranges)
+
+
+def detect_conflicts(db, start_date: date, end_date: date, window: Optional[timedelta] = None) -> List[Tuple]:
+    """Conflicting pairs among the open tasks due from `start_date` to `end_date` (inclusive)."""
+    ranges = [(datetime.combine(start_date, time(0, 0, 0)), datetime.combine(end_date + timedelta(days=1), time(0, 0, 0)))]
+    return find_conflicts(persistence_crud.get_active_tasks_due_between(db, ranges), window)
+
+
+def tag_conflicts(db, pairs: List[Tuple], tag: str = CONFLICT_TAG, commit: bool = True) -> Optional[list]:
+    """Tags both tasks of every pair in one write; returns the tasks whose tags changed (None if the write failed)."""
+    task_ids = [task.id for pair in pairs for task in pair]
+    return persistence_crud.add_tag_to_tasks(db, task_ids, tag, commit=commit) if task_ids else []
+
+
+def tag_new_task_conflicts(db, new_tasks: List, tag: str = CONFLICT_TAG, commit: bool = False) -> Set[int]:
+    """
+    Tags `new_tasks` (already flushed) and the open tasks they conflict with. The open tasks due
+    within the conflict window of a new task are loaded once, in merged ranges, and sorted; each
+    new task's conflicts are then a slice of that list found by bisection, so the cost does not
+    grow with the number of pairs. Not committed by default, so it joins the pipeline's batch
+    transaction. Returns the ids of the tasks in a conflict.
+    """
+    timed = [task for task in new_tasks if _is_timed(task)]
+    if not timed:
+        return set()
+    window = timedelta(minutes=config.CONFLICT_WINDOW_MINUTES)
+    candidates = [row for row in persistence_crud.get_active_task_times_between(db, _window_ranges(timed, window))
+                  if _is_timed(row)]
+    dues = [task.due_dt for task in candidates]
+    conflicting = []
+    for task in timed:
+        day_start = datetime.combine(task.due_dt.date(), time(0, 0, 0))
+        lo = max(bisect_right(dues, task.due_dt - window), bisect_left(dues, day_start))
+        hi = bisect_left(dues, min(task.due_dt + window, day_start + timedelta(days=1)))
+        if hi - lo > 1: # The new task itself is in the slice
+            conflicting.append((lo, hi))
+    conflicting_rows = [candidates[i] for lo, hi in _merge_ranges(conflicting) for i in range(lo, hi)]
+    untagged_ids = [row.id for row in conflicting_rows if tag not in (row.tags or "").split(",")]
+    if untagged_ids:
+        persistence_crud.add_tag_to_tasks(db, untagged_ids, tag, commit=commit)
+    return {row.id for row in conflicting_rows}
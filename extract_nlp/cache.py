@@ -0,0 +1,142 @@
+# extract_nlp/cache.py
+"""
+Persistent, content-addressed cache of TaskClassifier results.
+
+Re-runs, forwarded mail and repeated KakaoTalk messages produce byte-identical normalized text.
+Results are stored in a small SQLite file next to the main database, keyed by a SHA-256 of
+the model, the prompt version and the text, so a hit skips the OpenAI call entirely. Both
+"task" and "not a task" outcomes are cached; API errors are not. Entries expire after a TTL,
+and the least recently used entries are evicted once the cache holds more than `max_entries`.
+
+Lookups do not write: hits are remembered in memory and their last_used_at is written in one
+transaction right before an eviction (and on close), the only time it is read. Puts keep a count of
+the entries instead of counting them; expired entries are purged every `evict_interval` puts, and a
+full cache is trimmed to 90% of `max_entries` so the next eviction is some puts away.
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Optional, Tuple
+
+import config
+
+
+class ClassificationCache:
+    """
+    Args:
+        path: SQLite file for the cache (":memory:" for a process-local cache).
+        ttl_s: Seconds an entry stays valid; 0 or negative disables expiry.
+        max_entries: Entries kept before least recently used ones are evicted.
+        evict_interval: Puts between purges of the expired entries.
+    """
+
+    def __init__(self, path: str, ttl_s: float = 30 * 24 * 3600, max_entries: int = 10000, evict_interval: int = 100):
+        self.path = path
+        self.ttl_s = ttl_s
+        self.max_entries = max_entries
+        self.evict_interval = evict_interval
+        self._lock = threading.Lock()
+        self._pending_touches = {} # key -> last use not written yet
+        self._puts_since_evict = 0
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS classification_cache ("
+            " key TEXT PRIMARY KEY, result_json TEXT NOT NULL,"
+            " created_at REAL NOT NULL, last_used_at REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS ix_classification_cache_last_used "
+                           "ON classification_cache (last_used_at)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS ix_classification_cache_created "
+                           "ON classification_cache (created_at)")
+        # At least the number of rows: replaced keys are counted again until the next recount.
+        self._entry_count = self._conn.execute("SELECT COUNT(*) FROM classification_cache").fetchone()[0]
+
+    @staticmethod
+    def make_key(text: str, model: str, prompt_version: str) -> str:
+        return hashlib.sha256(f"{model}\0{prompt_version}\0{text}".encode('utf-8')).hexdigest()
+
+    def get(self, key: str) -> Tuple[bool, Optional[dict]]:
+        """Returns (found, result); result is the cached dict, or None for a cached "not a task"."""
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute("SELECT result_json, created_at FROM classification_cache WHERE key = ?",
+                                     (key,)).fetchone()
+            if row is None or (self.ttl_s > 0 and now - row[1] > self.ttl_s):
+                if row is not None:
+                    self._conn.execute("DELETE FROM classification_cache WHERE key = ?", (key,))
+                    self._pending_touches.pop(key, None)
+                    self._entry_count -= 1
+                return False, None
+            self._pending_touches[key] = now
+        return True, json.loads(row[0])
+
+    def put(self, key: str, result: Optional[dict]):
+        now = time.time()
+        with self._lock:
+            self._conn.execute("INSERT OR REPLACE INTO classification_cache VALUES (?, ?, ?, ?)",
+                               (key, json.dumps(result, ensure_ascii=False), now, now))
+            self._pending_touches.pop(key, None)
+            self._entry_count += 1
+            self._puts_since_evict += 1
+            if self._entry_count > self.max_entries or self._puts_since_evict >= self.evict_interval:
+                self._evict(now)
+
+    def _flush_touches(self):
+        if not self._pending_touches:
+            return
+        self._conn.execute("BEGIN")
+        self._conn.executemany("UPDATE classification_cache SET last_used_at = ? WHERE key = ?",
+                               [(used_at, key) for key, used_at in self._pending_touches.items()])
+        self._conn.execute("COMMIT")
+        self._pending_touches.clear()
+
+    def _evict(self, now: float):
+        self._puts_since_evict = 0
+        if self.ttl_s > 0:
+            self._conn.execute("DELETE FROM classification_cache WHERE created_at < ?", (now - self.ttl_s,))
+        self._entry_count = self._conn.execute("SELECT COUNT(*) FROM classification_cache").fetchone()[0]
+        if self._entry_count <= self.max_entries:
+            return
+        self._flush_touches()
+        overflow = self._entry_count - (self.max_entries - self.max_entries // 10)
+        self._conn.execute("DELETE FROM classification_cache WHERE key IN ("
+                           " SELECT key FROM classification_cache ORDER BY last_used_at LIMIT ?)", (overflow,))
+        self._entry_count -= overflow
+
+    def close(self):
+        with self._lock:
+            self._flush_touches()
+            self._conn.close()
+
+
+def default_cache_path() -> str:
+    """The cache file sits next to the SQLite database from DATABASE_URL (./ for other databases)."""
+    if config.CLASSIFICATION_CACHE_PATH:
+        return config.CLASSIFICATION_CACHE_PATH
+    database_dir = "."
+    if config.DATABASE_URL.startswith("sqlite:///") and not config.DATABASE_URL.endswith(":memory:"):
+        database_dir = os.path.dirname(config.DATABASE_URL[len("sqlite:///"):]) or "."
+    return os.path.join(database_dir, "classification_cache.db")
+
+
+_shared_cache: Optional[ClassificationCache] = None
+_shared_cache_lock = threading.Lock()
+
+
+def get_classification_cache() -> Optional[ClassificationCache]:
+    """The process-wide cache, or None when CLASSIFICATION_CACHE_ENABLED is off or the file cannot be opened."""
+    global _shared_cache
+    if not config.CLASSIFICATION_CACHE_ENABLED:
+        return None
+    with _shared_cache_lock:
+        if _shared_cache is None:
+            try:
+                _shared_cache = ClassificationCache(default_cache_path(), ttl_s=config.CLASSIFICATION_CACHE_TTL_S,
+                                                    max_entries=config.CLASSIFICATION_CACHE_MAX_ENTRIES)
+            except sqlite3.Error as e:
+                print(f"Could not open classification cache: {e}. Classifying without a cache.")
+                return None
+        return _shared_cache
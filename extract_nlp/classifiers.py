@@ -1,37 +1,120 @@
-import dateparser # Keep for resolve_date
 from datetime import datetime # Keep for resolve_date
 import os # For API Key
 import json # For parsing LLM JSON output
+import sqlite3
+import asyncio
+from typing import Dict, List, Tuple
 import openai # New import
 from openai import OpenAIError # New import for error handling
 
+from extract_nlp.cache import ClassificationCache
+from extract_nlp.dates import get_date_resolver
+from extract_nlp.rate_limit import AdaptiveRateLimiter, backoff_delay_s
+from preprocessing.budget import estimate_tokens
+
 # --- Import configuration for API Key ---
 import config
 # --- End import for configuration ---
 
-# Existing resolve_date function - keep as is
 def resolve_date(text_with_date: str, custom_settings: dict = None) -> datetime | None:
-    if not text_with_date: return None
-    # Example of how default settings could be structured if needed:
-    # settings = {'PREFER_DATES_FROM': 'current_period'}
-    # if custom_settings:
-    #    settings.update(custom_settings)
-    # else:
-    #    settings = custom_settings
-    try:
-        parsed_date = dateparser.parse(text_with_date, settings=custom_settings)
-        return parsed_date
-    except Exception as e:
-        print(f"Dateparser error for input '{text_with_date}': {e}")
-        return None
+    """
+    Resolves a due-date description to a datetime, or None. Common shapes take the fast paths in
+    extract_nlp.dates; the rest go to dateparser with `custom_settings` (a 'LANGUAGES' entry there
+    overrides config.DATE_LANGUAGES). Results are memoized.
+    """
+    return get_date_resolver().resolve(text_with_date, custom_settings)
 
 
 class TaskClassifier:
-    def __init__(self, api_key: str = None):
+    MODEL = "gpt-3.5-turbo-0125"
+    # Bump whenever the system prompt or function schema changes, so cached results are not reused.
+    PROMPT_VERSION = "1"
+    # Completion tokens assumed per call when budgeting against the tokens-per-minute limit.
+    ESTIMATED_COMPLETION_TOKENS = 150
+    RETRY_BACKOFF_S = 0.5
+    RETRY_BACKOFF_MAX_S = 30.0
+
+    FUNCTION_SCHEMA = {
+        "name": "extract_task_details",
+        "description": "Extracts task details from a given text if it represents a task, assignment, meeting, or personal appointment.",
+        "parameters": {
+            "type": "object",
+            "properties": {
+                "is_task": {
+                    "type": "boolean",
+                    "description": "True if the text describes an actionable task, assignment, meeting, or appointment. False otherwise."
+                },
+                "task_type": {
+                    "type": "string",
+                    "enum": ["meeting", "assignment", "personal", "reminder", "other"],
+                    "description": "The type of task (e.g., meeting, assignment, personal errand, general reminder)."
+                },
+                "title": {
+                    "type": "string",
+                    "description": "A concise title for the task (max 10-15 words)."
+                },
+                "due_date_description": {
+                    "type": "string",
+                    "description": "The due date and time as described in the text (e.g., 'next Monday at 3pm', '2024-12-25 10:00 EST', 'in two weeks'). If no specific time, can be just the date. If no date, this can be null or omitted."
+                },
+                "body_summary": {
+                    "type": "string",
+                    "description": "A brief summary of the task details or context (1-2 sentences)."
+                }
+            },
+            "required": ["is_task"]
+        }
+    }
+
+    SYSTEM_PROMPT = """You are an intelligent assistant helping to extract structured task information from text.
+Analyze the provided text and determine if it describes an actionable task, assignment, meeting, or personal appointment.
+If it is, extract the details. If not, indicate it's not a task.
+Focus on specific commitments or actions. General statements or questions without clear actions are not tasks.
+If a due date is mentioned, extract it as described. If a specific time is part of the due date, include it.
+The title should be short and to the point. The body summary should capture key details.
+If 'is_task' is true, 'title', 'task_type', and 'body_summary' should ideally be provided. 'due_date_description' is optional.
+"""
+
+    # Batch mode: one request for several short texts, answered with one extract_task_details result per text.
+    BATCH_FUNCTION_SCHEMA = {
+        "name": "extract_task_details_batch",
+        "description": "Extracts task details from each of several numbered texts.",
+        "parameters": {
+            "type": "object",
+            "properties": {
+                "results": {
+                    "type": "array",
+                    "description": "Exactly one entry per input text, identified by the text's index.",
+                    "items": {
+                        "type": "object",
+                        "properties": {
+                            "index": {
+                                "type": "integer",
+                                "description": "The [index] of the input text this entry describes."
+                            },
+                            **FUNCTION_SCHEMA["parameters"]["properties"]
+                        },
+                        "required": ["index", "is_task"]
+                    }
+                }
+            },
+            "required": ["results"]
+        }
+    }
+
+    BATCH_SYSTEM_PROMPT = SYSTEM_PROMPT + """You will receive several texts, each introduced by a '--- [index] ---' line.
+Analyze each text on its own, as if it were the only text, and return exactly one result per text with its index.
+"""
+    # Estimated tokens of the '--- [index] ---' separator and the result's index field per batched text.
+    BATCH_ITEM_OVERHEAD_TOKENS = 10
+
+    def __init__(self, api_key: str = None, cache: ClassificationCache | None = None, base_url: str | None = None):
         """
         Initializes the TaskClassifier with an OpenAI API client.
         Args:
             api_key: OpenAI API key. If None, attempts to load from config.py or environment.
+            cache: Optional ClassificationCache; identical texts are then classified only once.
+            base_url: Optional OpenAI-compatible API endpoint (the client's default otherwise).
         """
         effective_api_key = api_key or getattr(config, 'OPENAI_API_KEY', "YOUR_API_KEY_HERE")
 
@@ -42,13 +125,59 @@ class TaskClassifier:
         if not effective_api_key or effective_api_key == "YOUR_API_KEY_HERE": # Check again after env fallback
             raise ValueError("OpenAI API key not configured. Please set it in config.py or as an environment variable OPENAI_API_KEY.")
 
+        # Token usage reported by the API across all calls made by this instance.
+        self.usage = {"calls": 0, "prompt_tokens": 0, "completion_tokens": 0}
+        self.cache = cache
+        self.cache_stats = {"hits": 0, "misses": 0}
+        # Retried attempts of classify_task_async, by cause.
+        self.retry_stats = {"rate_limited": 0, "server_errors": 0}
+        # Batched requests made, texts sent in them, and texts re-classified alone after a bad batch result.
+        self.batch_stats = {"batches": 0, "batched_items": 0, "fallbacks": 0}
+        # Sources whose None result came from an error rather than a "not a task" answer.
+        self.failed_source_ids = set()
+        self._api_key = effective_api_key
+        self._base_url = base_url
+        self._schema_tokens = estimate_tokens(json.dumps(self.FUNCTION_SCHEMA))
+        self._batch_schema_tokens = estimate_tokens(json.dumps(self.BATCH_FUNCTION_SCHEMA))
+        self.async_client = None # Created on first use by classify_tasks, on its event loop
+        self._event_loop = None
+
         try:
-            self.client = openai.OpenAI(api_key=effective_api_key)
+            self.client = openai.OpenAI(api_key=effective_api_key, base_url=base_url)
             print("TaskClassifier initialized with OpenAI client.")
         except Exception as e:
             raise ValueError(f"Failed to initialize OpenAI client: {e}")
 
 
+    def _record_usage(self, response):
+        self.usage["calls"] += 1
+        usage = getattr(response, 'usage', None)
+        for key in ("prompt_tokens", "completion_tokens"):
+            value = getattr(usage, key, None)
+            if isinstance(value, int): self.usage[key] += value
+
+    def _cache_lookup(self, cache_key: str | None):
+        if cache_key is None:
+            return False, None
+        try:
+            found, cached_result = self.cache.get(cache_key)
+        except sqlite3.Error as e:
+            print(f"Classification cache read failed: {e}. Calling the API.")
+            return False, None
+        self.cache_stats["hits" if found else "misses"] += 1
+        return found, cached_result
+
+    def _cache_store(self, cache_key: str | None, result: dict | None):
+        if cache_key is None:
+            return
+        try:
+            self.cache.put(cache_key, result)
+        except sqlite3.Error as e:
+            print(f"Classification cache write failed: {e}")
+
+    def _cache_key(self, text: str) -> str | None:
+        return self.cache.make_key(text, self.MODEL, self.PROMPT_VERSION) if self.cache is not None else None
+
     def classify_task(self, text: str, source_id: str = "unknown") -> dict | None:
         """
         Classifies text to extract task details using the OpenAI API (GPT model).
@@ -64,114 +193,399 @@ class TaskClassifier:
         """
         print(f"TaskClassifier.classify_task called with text (first 100 chars): '{text[:100].replace(chr(10), ' ')}...'")
 
-        function_schema = {
-            "name": "extract_task_details",
-            "description": "Extracts task details from a given text if it represents a task, assignment, meeting, or personal appointment.",
-            "parameters": {
-                "type": "object",
-                "properties": {
-                    "is_task": {
-                        "type": "boolean",
-                        "description": "True if the text describes an actionable task, assignment, meeting, or appointment. False otherwise."
-                    },
-                    "task_type": {
-                        "type": "string",
-                        "enum": ["meeting", "assignment", "personal", "reminder", "other"],
-                        "description": "The type of task (e.g., meeting, assignment, personal errand, general reminder)."
-                    },
-                    "title": {
-                        "type": "string",
-                        "description": "A concise title for the task (max 10-15 words)."
-                    },
-                    "due_date_description": {
-                        "type": "string",
-                        "description": "The due date and time as described in the text (e.g., 'next Monday at 3pm', '2024-12-25 10:00 EST', 'in two weeks'). If no specific time, can be just the date. If no date, this can be null or omitted."
-                    },
-                    "body_summary": {
-                        "type": "string",
-                        "description": "A brief summary of the task details or context (1-2 sentences)."
-                    }
-                },
-                "required": ["is_task"]
-            }
-        }
+        cache_key = self._cache_key(text)
+        found, cached_result = self._cache_lookup(cache_key)
+        if found:
+            print("Classification cache hit. Skipping OpenAI API call.")
+            return dict(cached_result, source_id=source_id) if cached_result else None
+        return self._classify_uncached(text, source_id, cache_key)
 
-        system_prompt = """You are an intelligent assistant helping to extract structured task information from text.
-Analyze the provided text and determine if it describes an actionable task, assignment, meeting, or personal appointment.
-If it is, extract the details. If not, indicate it's not a task.
-Focus on specific commitments or actions. General statements or questions without clear actions are not tasks.
-If a due date is mentioned, extract it as described. If a specific time is part of the due date, include it.
-The title should be short and to the point. The body summary should capture key details.
-If 'is_task' is true, 'title', 'task_type', and 'body_summary' should ideally be provided. 'due_date_description' is optional.
-"""
+    def _classify_uncached(self, text: str, source_id: str, cache_key: str | None) -> dict | None:
+        try:
+            print("Calling OpenAI API for task classification...")
+            response = self.client.chat.completions.create(**self._request_kwargs(text))
+            return self._parse_response(response, text, source_id, cache_key)
+        except OpenAIError as e:
+            self._print_api_error(e)
+            self.failed_source_ids.add(source_id)
+            return None
+        except Exception as e:
+            print(f"An unexpected error occurred during task classification: {e}")
+            self.failed_source_ids.add(source_id)
+            return None
 
+    def _request_kwargs(self, text: str) -> dict:
         user_prompt = f"Please analyze the following text and extract task details if applicable:\n\n---\n{text}\n---"
+        return {
+            "model": self.MODEL,
+            "messages": [
+                {"role": "system", "content": self.SYSTEM_PROMPT},
+                {"role": "user", "content": user_prompt}
+            ],
+            "functions": [self.FUNCTION_SCHEMA],
+            "function_call": {"name": "extract_task_details"}
+        }
+
+    def _parse_response(self, response, text: str, source_id: str, cache_key: str | None) -> dict | None:
+        """Turns a chat completion into a task dict (or None), recording usage and caching the outcome."""
+        self._record_usage(response)
+        message = response.choices[0].message
+        if message.function_call:
+            function_args_str = message.function_call.arguments
+            print(f"LLM raw function call arguments: {function_args_str}")
+            try:
+                extracted_data = json.loads(function_args_str)
+            except json.JSONDecodeError as json_err:
+                print(f"Error: LLM returned invalid JSON for function arguments: {function_args_str}. Error: {json_err}")
+                self.failed_source_ids.add(source_id)
+                return None
+            return self._result_from_extracted(extracted_data, text, source_id, cache_key)
+        else:
+            print("LLM did not call the function. No task details extracted.")
+            self.failed_source_ids.add(source_id)
+            return None
 
+    def _result_from_extracted(self, extracted_data: dict, text: str, source_id: str, cache_key: str | None,
+                               verbose: bool = True) -> dict | None:
+        """Builds the task dict from extract_task_details arguments and caches the outcome."""
+        is_task = extracted_data.get("is_task", False)
+        if not is_task:
+            if verbose: print("LLM determined the text is not a task.")
+            self._cache_store(cache_key, None)
+            return None
+
+        title = extracted_data.get("title")
+        if not title:
+            if verbose: print("LLM marked as task but provided no title. Discarding as non-actionable.")
+            self._cache_store(cache_key, None)
+            return None
+
+        task_type = extracted_data.get("task_type") or "other"
+        due_description = extracted_data.get("due_date_description")
+        body_summary = extracted_data.get("body_summary") or text[:250] # Fallback for body
+
+        # Confidence can be set high if is_task is true and title exists
+        confidence = 0.90 # Default high confidence if LLM forced function call & title exists
+
+        result = {
+            "type": task_type.lower(),
+            "title": title,
+            "due": due_description,
+            "body": body_summary,
+            "source_id": source_id,
+            "confidence": confidence
+        }
+        if verbose: print(f"LLM classification successful: Type='{result['type']}', Title='{result['title']}'")
+        self._cache_store(cache_key, result)
+        return result
+
+    @staticmethod
+    def _print_api_error(e: OpenAIError):
+        print(f"OpenAI API error during task classification: {e}")
+        # Specific error details if available
+        if hasattr(e, 'response') and e.response:
+             print(f"API Response Error Details: {e.response.text}")
+        elif hasattr(e, 'body') and e.body: # For newer versions of openai lib
+             print(f"API Error Body: {e.body}")
+
+    # --- Batched classification ---
+
+    def _batch_request_kwargs(self, texts: List[str]) -> dict:
+        numbered_texts = "".join(f"--- [{index}] ---\n{text}\n" for index, text in enumerate(texts))
+        user_prompt = (f"Please analyze each of the following {len(texts)} texts and extract task details if applicable:"
+                       f"\n\n{numbered_texts}--- end ---")
+        return {
+            "model": self.MODEL,
+            "messages": [
+                {"role": "system", "content": self.BATCH_SYSTEM_PROMPT},
+                {"role": "user", "content": user_prompt}
+            ],
+            "functions": [self.BATCH_FUNCTION_SCHEMA],
+            "function_call": {"name": "extract_task_details_batch"}
+        }
+
+    @classmethod
+    def _valid_batch_entry(cls, entry, count: int) -> bool:
+        """True if `entry` is a well-formed extract_task_details result for one of `count` inputs."""
+        if not isinstance(entry, dict):
+            return False
+        index = entry.get("index")
+        if not isinstance(index, int) or isinstance(index, bool) or not 0 <= index < count:
+            return False
+        if not isinstance(entry.get("is_task"), bool):
+            return False
+        for key in ("task_type", "title", "due_date_description", "body_summary"):
+            if entry.get(key) is not None and not isinstance(entry[key], str):
+                return False
+        if not entry["is_task"]:
+            return True
+        task_types = cls.FUNCTION_SCHEMA["parameters"]["properties"]["task_type"]["enum"]
+        return bool((entry.get("title") or "").strip()) and entry.get("task_type") in (None, *task_types)
+
+    def _parse_batch_response(self, response, count: int) -> Dict[int, dict]:
+        """Valid per-input results of a batch completion by input index; malformed or duplicated entries are left out."""
+        self._record_usage(response)
+        function_call = response.choices[0].message.function_call
+        if not function_call:
+            print("LLM did not call the batch function.")
+            return {}
         try:
-            print("Calling OpenAI API for task classification...")
-            response = self.client.chat.completions.create(
-                model="gpt-3.5-turbo-0125",
-                messages=[
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": user_prompt}
-                ],
-                functions=[function_schema],
-                function_call={"name": "extract_task_details"}
-            )
-
-            message = response.choices[0].message
-            if message.function_call:
-                function_args_str = message.function_call.arguments
-                print(f"LLM raw function call arguments: {function_args_str}")
-                try:
-                    extracted_data = json.loads(function_args_str)
-                except json.JSONDecodeError as json_err:
-                    print(f"Error: LLM returned invalid JSON for function arguments: {function_args_str}. Error: {json_err}")
-                    return None
+            entries = json.loads(function_call.arguments).get("results")
+        except (json.JSONDecodeError, AttributeError) as e:
+            print(f"Error: LLM returned invalid JSON for batch function arguments: {e}")
+            return {}
+        if not isinstance(entries, list):
+            return {}
+        extracted_by_index, duplicated = {}, set()
+        for entry in entries:
+            if not self._valid_batch_entry(entry, count):
+                continue
+            if entry["index"] in extracted_by_index: duplicated.add(entry["index"])
+            extracted_by_index[entry["index"]] = entry
+        for index in duplicated: # Conflicting answers for one input are not trusted either
+            del extracted_by_index[index]
+        return extracted_by_index
 
-                is_task = extracted_data.get("is_task", False)
-                if not is_task:
-                    print("LLM determined the text is not a task.")
-                    return None
+    def _apply_batch_results(self, extracted_by_index: Dict[int, dict], pending: List[int],
+                             items: List[Tuple[str, str]], cache_keys: List[str | None], results: list) -> List[int]:
+        """Fills `results` for the pending inputs that got a valid entry; returns the inputs to classify one by one."""
+        fallbacks = []
+        for batch_index, item_index in enumerate(pending):
+            extracted_data = extracted_by_index.get(batch_index)
+            if extracted_data is None:
+                fallbacks.append(item_index)
+                continue
+            text, source_id = items[item_index]
+            results[item_index] = self._result_from_extracted(extracted_data, text, source_id,
+                                                              cache_keys[item_index], verbose=False)
+        self.batch_stats["batches"] += 1
+        self.batch_stats["batched_items"] += len(pending)
+        self.batch_stats["fallbacks"] += len(fallbacks)
+        if fallbacks: print(f"{len(fallbacks)} of {len(pending)} batch result(s) missing or malformed. Classifying them one by one.")
+        return fallbacks
 
-                title = extracted_data.get("title")
-                if not title:
-                    print("LLM marked as task but provided no title. Discarding as non-actionable.")
-                    return None
+    def _batch_cache_lookups(self, items: List[Tuple[str, str]]) -> Tuple[list, List[str | None], List[int]]:
+        """Cached results, cache keys, and the indices of the inputs that still need the API."""
+        results, cache_keys, pending = [None] * len(items), [], []
+        for index, (text, source_id) in enumerate(items):
+            cache_keys.append(self._cache_key(text))
+            found, cached_result = self._cache_lookup(cache_keys[-1])
+            if found: results[index] = dict(cached_result, source_id=source_id) if cached_result else None
+            else: pending.append(index)
+        return results, cache_keys, pending
 
-                task_type = extracted_data.get("task_type", "other")
-                due_description = extracted_data.get("due_date_description")
-                body_summary = extracted_data.get("body_summary", text[:250]) # Fallback for body
+    def classify_batch(self, items: List[Tuple[str, str]]) -> List[dict | None]:
+        """
+        Classifies several `(text, source_id)` pairs with one request that pays for the system prompt
+        and function schema once, and returns the results in input order.
 
-                # Confidence can be set high if is_task is true and title exists
-                confidence = 0.90 # Default high confidence if LLM forced function call & title exists
+        The model answers with one extract_task_details result per input index. Each is validated;
+        inputs whose result is missing, malformed or duplicated are classified with classify_task instead.
+        """
+        results, cache_keys, pending = self._batch_cache_lookups(items)
+        if len(pending) == 1:
+            text, source_id = items[pending[0]]
+            results[pending[0]] = self._classify_uncached(text, source_id, cache_keys[pending[0]])
+        elif pending:
+            try:
+                print(f"Calling OpenAI API for a batch of {len(pending)} texts...")
+                response = self.client.chat.completions.create(**self._batch_request_kwargs([items[i][0] for i in pending]))
+                extracted_by_index = self._parse_batch_response(response, len(pending))
+            except OpenAIError as e:
+                self._print_api_error(e)
+                self.failed_source_ids.update(items[i][1] for i in pending)
+                return results
+            except Exception as e:
+                print(f"An unexpected error occurred during batch classification: {e}")
+                extracted_by_index = {}
+            for index in self._apply_batch_results(extracted_by_index, pending, items, cache_keys, results):
+                text, source_id = items[index]
+                results[index] = self._classify_uncached(text, source_id, cache_keys[index])
+        return results
 
-                result = {
-                    "type": task_type.lower(),
-                    "title": title,
-                    "due": due_description,
-                    "body": body_summary,
-                    "source_id": source_id,
-                    "confidence": confidence
-                }
-                print(f"LLM classification successful: Type='{result['type']}', Title='{result['title']}'")
-                return result
-            else:
-                print("LLM did not call the function. No task details extracted.")
+    @classmethod
+    def pack_batches(cls, items: List[Tuple[str, str]], batch_size: int, max_batch_tokens: int | None = None) -> List[List[int]]:
+        """
+        Groups consecutive inputs into batches of at most `batch_size` inputs and about
+        `max_batch_tokens` estimated text tokens (default CLASSIFIER_BATCH_MAX_TOKENS); an input over
+        the token limit gets a batch of its own.
+        """
+        max_batch_tokens = config.CLASSIFIER_BATCH_MAX_TOKENS if max_batch_tokens is None else max_batch_tokens
+        batches, batch_tokens = [], 0
+        for index, (text, _) in enumerate(items):
+            tokens = estimate_tokens(text) + cls.BATCH_ITEM_OVERHEAD_TOKENS
+            if not batches or len(batches[-1]) >= batch_size or \
+               (max_batch_tokens > 0 and batch_tokens + tokens > max_batch_tokens):
+                batches.append([])
+                batch_tokens = 0
+            batches[-1].append(index)
+            batch_tokens += tokens
+        return batches
+
+    # --- Concurrent classification ---
+
+    def _estimated_call_tokens(self, text: str) -> int:
+        """Tokens a call for `text` is expected to count against the TPM limit (prompt plus completion)."""
+        return estimate_tokens(self.SYSTEM_PROMPT) + self._schema_tokens + estimate_tokens(text) + \
+            self.ESTIMATED_COMPLETION_TOKENS
+
+    def _estimated_batch_call_tokens(self, texts: List[str]) -> int:
+        return estimate_tokens(self.BATCH_SYSTEM_PROMPT) + self._batch_schema_tokens + \
+            sum(estimate_tokens(text) + self.BATCH_ITEM_OVERHEAD_TOKENS + self.ESTIMATED_COMPLETION_TOKENS for text in texts)
+
+    def _get_async_client(self):
+        if self.async_client is None:
+            # Retries are done by _call_async, which also tells the rate limiter about 429s.
+            self.async_client = openai.AsyncOpenAI(api_key=self._api_key, base_url=self._base_url, max_retries=0)
+        return self.async_client
+
+    async def _call_async(self, request_kwargs: dict, estimated_tokens: int, limiter: AdaptiveRateLimiter | None,
+                          max_retries: int, label: str):
+        """
+        Makes one chat completion call, retrying 429, 5xx and connection errors up to `max_retries`
+        times with jittered exponential backoff. Returns the response, or None if the call failed.
+        """
+        client = self._get_async_client()
+        for attempt in range(max_retries + 1):
+            if limiter: await limiter.acquire(estimated_tokens)
+            try:
+                response = await client.chat.completions.create(**request_kwargs)
+            except OpenAIError as e:
+                rate_limited = getattr(e, 'status_code', None) == 429
+                retry_after_s = _retry_after_s(e)
+                if limiter: await limiter.release(rate_limited=rate_limited, retry_after_s=retry_after_s)
+                if not _is_retryable(e) or attempt == max_retries:
+                    print(f"Giving up on {label} after {attempt + 1} attempt(s).")
+                    self._print_api_error(e)
+                    return None
+                self.retry_stats["rate_limited" if rate_limited else "server_errors"] += 1
+                await asyncio.sleep(backoff_delay_s(attempt, self.RETRY_BACKOFF_S, self.RETRY_BACKOFF_MAX_S, retry_after_s))
+                continue
+            except Exception as e:
+                if limiter: await limiter.release()
+                print(f"An unexpected error occurred during task classification: {e}")
                 return None
 
-        except OpenAIError as e:
-            print(f"OpenAI API error during task classification: {e}")
-            # Specific error details if available
-            if hasattr(e, 'response') and e.response:
-                 print(f"API Response Error Details: {e.response.text}")
-            elif hasattr(e, 'body') and e.body: # For newer versions of openai lib
-                 print(f"API Error Body: {e.body}")
+            if limiter:
+                total_tokens = getattr(getattr(response, 'usage', None), 'total_tokens', None)
+                await limiter.release(estimated_tokens=estimated_tokens,
+                                      actual_tokens=total_tokens if isinstance(total_tokens, int) else None)
+            return response
+        return None
+
+    async def classify_task_async(self, text: str, source_id: str = "unknown",
+                                  limiter: AdaptiveRateLimiter | None = None, max_retries: int | None = None) -> dict | None:
+        """
+        Async variant of classify_task for use with other concurrent calls.
+
+        Calls answered with 429 or 5xx, and connection errors, are retried up to `max_retries` times
+        (default CLASSIFIER_MAX_RETRIES) with jittered exponential backoff. If `limiter` is given,
+        every attempt waits for a slot and rate budget from it first.
+        """
+        cache_key = self._cache_key(text)
+        found, cached_result = self._cache_lookup(cache_key)
+        if found:
+            return dict(cached_result, source_id=source_id) if cached_result else None
+        return await self._classify_uncached_async(text, source_id, cache_key, limiter, max_retries)
+
+    async def _classify_uncached_async(self, text: str, source_id: str, cache_key: str | None,
+                                       limiter: AdaptiveRateLimiter | None, max_retries: int | None) -> dict | None:
+        max_retries = config.CLASSIFIER_MAX_RETRIES if max_retries is None else max_retries
+        response = await self._call_async(self._request_kwargs(text), self._estimated_call_tokens(text),
+                                          limiter, max_retries, source_id)
+        if response is None:
+            self.failed_source_ids.add(source_id)
             return None
+        try:
+            return self._parse_response(response, text, source_id, cache_key)
         except Exception as e:
             print(f"An unexpected error occurred during task classification: {e}")
+            self.failed_source_ids.add(source_id)
             return None
 
+    async def classify_batch_async(self, items: List[Tuple[str, str]], limiter: AdaptiveRateLimiter | None = None,
+                                   max_retries: int | None = None) -> List[dict | None]:
+        """Async variant of classify_batch, with the retries and rate limiting of classify_task_async."""
+        max_retries = config.CLASSIFIER_MAX_RETRIES if max_retries is None else max_retries
+        results, cache_keys, pending = self._batch_cache_lookups(items)
+        fallbacks = pending if len(pending) == 1 else []
+        if len(pending) > 1:
+            texts = [items[i][0] for i in pending]
+            response = await self._call_async(self._batch_request_kwargs(texts), self._estimated_batch_call_tokens(texts),
+                                              limiter, max_retries, f"a batch of {len(pending)} texts")
+            if response is None:
+                self.failed_source_ids.update(items[i][1] for i in pending)
+                return results
+            try:
+                extracted_by_index = self._parse_batch_response(response, len(pending))
+            except Exception as e:
+                print(f"An unexpected error occurred during batch classification: {e}")
+                extracted_by_index = {}
+            fallbacks = self._apply_batch_results(extracted_by_index, pending, items, cache_keys, results)
+        fallback_results = await asyncio.gather(*(
+            self._classify_uncached_async(items[i][0], items[i][1], cache_keys[i], limiter, max_retries) for i in fallbacks))
+        for index, result in zip(fallbacks, fallback_results):
+            results[index] = result
+        return results
+
+    def classify_tasks(self, items: List[Tuple[str, str]], limiter: AdaptiveRateLimiter | None = None,
+                       batch_size: int = 1) -> List[dict | None]:
+        """
+        Classifies `(text, source_id)` pairs concurrently and returns the results in input order.
+
+        With `batch_size` above 1, consecutive inputs are packed into batched requests (see
+        classify_batch and pack_batches), which then run concurrently.
+        Runs on an event loop owned by this instance, so it must not be called from a running loop.
+        Without a `limiter`, one is built from CLASSIFIER_CONCURRENCY and the RPM/TPM limits in config.
+        """
+        if not items:
+            return []
+        if limiter is None:
+            limiter = AdaptiveRateLimiter(config.CLASSIFIER_CONCURRENCY, config.CLASSIFIER_RPM_LIMIT, config.CLASSIFIER_TPM_LIMIT)
+        if self._event_loop is None:
+            self._event_loop = asyncio.new_event_loop()
+
+        async def classify_all():
+            if batch_size <= 1:
+                return await asyncio.gather(*(self.classify_task_async(text, source_id, limiter)
+                                              for text, source_id in items))
+            batches = self.pack_batches(items, batch_size)
+            batch_results = await asyncio.gather(*(self.classify_batch_async([items[i] for i in batch], limiter)
+                                                   for batch in batches))
+            return [result for results in batch_results for result in results]
+
+        return list(self._event_loop.run_until_complete(classify_all()))
+
+    def close(self):
+        """Closes the async client and event loop used by classify_tasks, if they were started."""
+        if self._event_loop is None:
+            return
+        if self.async_client is not None:
+            self._event_loop.run_until_complete(self.async_client.close())
+            self.async_client = None
+        self._event_loop.close()
+        self._event_loop = None
+
+
+def _is_retryable(e: OpenAIError) -> bool:
+    if isinstance(e, openai.APIConnectionError): # Includes timeouts
+        return True
+    status_code = getattr(e, 'status_code', None)
+    if status_code == 429:
+        # An exhausted quota is also a 429, but waiting does not help.
+        return getattr(e, 'code', None) != 'insufficient_quota'
+    return isinstance(status_code, int) and status_code >= 500
+
+
+def _retry_after_s(e: OpenAIError) -> float | None:
+    headers = getattr(getattr(e, 'response', None), 'headers', None) or {}
+    try:
+        if headers.get('retry-after-ms'): return float(headers['retry-after-ms']) / 1000
+        if headers.get('retry-after'): return float(headers['retry-after'])
+    except (TypeError, ValueError): # HTTP-date form of Retry-After
+        pass
+    return None
+
 
 if __name__ == '__main__':
     print("--- Testing DateResolver ---")
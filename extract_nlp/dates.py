@@ -0,0 +1,223 @@
+# extract_nlp/dates.py
+"""
+Due-date resolution behind `extract_nlp.classifiers.resolve_date`.
+
+dateparser is accurate but slow: the first call loads its locale data, and text it cannot place
+is tried against every known language, which takes seconds. Most due strings the classifier
+returns are in a handful of shapes, so `DateResolver` first tries precompiled fast paths:
+
+* ISO dates and "YYYY-MM-DD HH:MM[:SS]" (also with '/' or 'T' separators),
+* "today" / "tomorrow" / "the day after tomorrow" / "next <weekday>" / "this <weekday>",
+  optionally with a time ("at 3pm", "3:30 pm", "15:00"), and "in N days|weeks|hours|minutes",
+* Korean 오늘 / 내일 / 모레 / 글피 / 이번주·다음주 X요일, optionally with "오후 3시", "오전 9시 30분",
+  "3시 반" or "15:00", and "N일|N주|N시간 후".
+
+Only settings that cannot change the result of those shapes may be present, otherwise (and for
+everything else) dateparser is called with its languages restricted to `DATE_LANGUAGES`. Results,
+including None, are memoized per (text, reference date, settings). Relative phrases without a time
+keep the time of day of the reference, as dateparser does, so without a RELATIVE_BASE (the reference
+is then the current time) only the results that cannot depend on the time of day are memoized: the
+fast-path shapes other than "in N ..." and a bare day offset, and strings dateparser rejects.
+"""
+import re
+import threading
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Optional
+
+import dateparser
+
+import config
+
+# Settings that leave the fast-path shapes unchanged. DATE_ORDER is not among them: with 'DMY',
+# dateparser rejects even "2025-07-15".
+_FAST_PATH_SETTINGS = frozenset({'PREFER_DATES_FROM', 'PREFER_DAY_OF_MONTH', 'PREFER_MONTH_OF_YEAR', 'RELATIVE_BASE'})
+# Absolute dates with year, month and day also satisfy strict parsing.
+_ABSOLUTE_FAST_PATH_SETTINGS = _FAST_PATH_SETTINGS | {'STRICT_PARSING', 'REQUIRE_PARTS'}
+
+_NO_MATCH = object()
+
+_ISO_RE = re.compile(r"^(\d{4})[-/](\d{1,2})[-/](\d{1,2})(?:[ t](\d{1,2}):(\d{2})(?::(\d{2}))?)?$")
+
+_WEEKDAYS_EN = {name: i for i, names in enumerate((
+    ("monday", "mon"), ("tuesday", "tue", "tues"), ("wednesday", "wed"), ("thursday", "thu", "thur", "thurs"),
+    ("friday", "fri"), ("saturday", "sat"), ("sunday", "sun"))) for name in names}
+_WEEKDAYS_KO = {name: i for i, name in enumerate("월화수목금토일")}
+_DAY_OFFSETS = {"today": 0, "tomorrow": 1, "the day after tomorrow": 2, "day after tomorrow": 2,
+                "오늘": 0, "금일": 0, "내일": 1, "명일": 1, "모레": 2, "내일모레": 2, "글피": 3}
+
+_TIME_EN = r"(?:at\s+)?(?:(?P<h12>\d{1,2})(?::(?P<m12>\d{2}))?\s*(?P<ampm>[ap])\.?m\.?|(?P<h24>\d{1,2}):(?P<m24>\d{2})|(?P<noon>noon))"
+_TIME_KO = (r"(?:(?P<mer>오전|오후|아침|저녁|밤)\s*)?(?:(?P<kh>\d{1,2})\s*시(?:\s*(?P<km>\d{1,2})\s*분|\s*(?P<half>반))?"
+            r"|(?P<kh24>\d{1,2}):(?P<km24>\d{2}))")
+_DAY_EN = (r"(?P<offset>today|tomorrow|(?:the\s+)?day\s+after\s+tomorrow)"
+           r"|(?P<which>next|this)\s+(?P<weekday>" + "|".join(sorted(_WEEKDAYS_EN, key=len, reverse=True)) + r")")
+_DAY_KO = r"(?P<ko_offset>내일모레|오늘|금일|내일|명일|모레|글피)|(?P<ko_week>이번\s*주|금주|다음\s*주|차주)\s*(?P<ko_weekday>[월화수목금토일])요일"
+
+_EN_DAY_TIME_RE = re.compile(rf"^(?:{_DAY_EN})(?:\s*,?\s*{_TIME_EN})?$", re.IGNORECASE)
+_EN_TIME_DAY_RE = re.compile(rf"^{_TIME_EN}\s+(?:{_DAY_EN})$", re.IGNORECASE)
+_KO_DAY_TIME_RE = re.compile(rf"^(?:{_DAY_KO})(?:\s*{_TIME_KO})?(?:\s*까지)?$")
+_IN_DELTA_RE = re.compile(r"^in\s+(?P<n>\d{1,3})\s+(?P<unit>minute|hour|day|week)s?$"
+                          r"|^(?P<kn>\d{1,3})\s*(?P<kunit>분|시간|일|주)\s*(?:후|뒤)$", re.IGNORECASE)
+_DELTA_UNITS = {"minute": "minutes", "hour": "hours", "day": "days", "week": "weeks",
+                "분": "minutes", "시간": "hours", "일": "days", "주": "weeks"}
+
+
+def _time_of(match) -> Optional[tuple]:
+    """(hour, minute) from the time groups of `match`, None if there is no time, _NO_MATCH if ambiguous or invalid."""
+    groups = match.groupdict()
+    if groups.get("noon"):
+        return 12, 0
+    if groups.get("h12"):
+        hour, minute = int(groups["h12"]), int(groups["m12"] or 0)
+        if not 1 <= hour <= 12: return _NO_MATCH
+        hour = hour % 12 + (12 if groups["ampm"].lower() == "p" else 0)
+    elif groups.get("h24"):
+        hour, minute = int(groups["h24"]), int(groups["m24"])
+    elif groups.get("kh24"):
+        hour, minute = int(groups["kh24"]), int(groups["km24"])
+    elif groups.get("kh"):
+        hour, minute = int(groups["kh"]), 30 if groups.get("half") else int(groups.get("km") or 0)
+        meridiem = groups.get("mer")
+        if meridiem:
+            if not 1 <= hour <= 12: return _NO_MATCH
+            hour = hour % 12 + (0 if meridiem in ("오전", "아침") else 12)
+        elif hour <= 12:
+            return _NO_MATCH # "3시" may be 3am or 3pm; left to dateparser
+    else:
+        return None
+    return (hour, minute) if hour < 24 and minute < 60 else _NO_MATCH
+
+
+def _at(day: datetime, time_of_day: Optional[tuple], midnight: bool) -> datetime:
+    if time_of_day is not None:
+        return day.replace(hour=time_of_day[0], minute=time_of_day[1], second=0, microsecond=0)
+    return day.replace(hour=0, minute=0, second=0, microsecond=0) if midnight else day
+
+
+def _upcoming_weekday(reference: datetime, weekday: int, include_today: bool) -> datetime:
+    days_ahead = (weekday - reference.weekday()) % 7
+    if days_ahead == 0 and not include_today: days_ahead = 7
+    return reference + timedelta(days=days_ahead)
+
+
+def fast_path(text: str, reference: datetime, absolute_only: bool = False):
+    """
+    Resolves the common shapes listed in the module docstring. Returns a datetime, None for a
+    malformed ISO date (which dateparser rejects too), or _NO_MATCH to defer to dateparser.
+    """
+    iso = _ISO_RE.match(text)
+    if iso:
+        try: return datetime(*(int(part) for part in iso.groups() if part is not None))
+        except ValueError: return None
+    if absolute_only:
+        return _NO_MATCH
+
+    delta = _IN_DELTA_RE.match(text)
+    if delta:
+        unit = _DELTA_UNITS[(delta.group("unit") or delta.group("kunit")).lower()]
+        return reference + timedelta(**{unit: int(delta.group("n") or delta.group("kn"))})
+
+    for pattern in (_EN_DAY_TIME_RE, _EN_TIME_DAY_RE, _KO_DAY_TIME_RE):
+        match = pattern.match(text)
+        if not match:
+            continue
+        time_of_day = _time_of(match)
+        if time_of_day is _NO_MATCH:
+            return _NO_MATCH
+        groups = match.groupdict()
+        if groups.get("offset") or groups.get("ko_offset"):
+            offset = _DAY_OFFSETS[re.sub(r"\s+", " ", (groups.get("offset") or groups["ko_offset"]).lower())]
+            return _at(reference + timedelta(days=offset), time_of_day, midnight=False)
+        if groups.get("weekday"):
+            day = _upcoming_weekday(reference, _WEEKDAYS_EN[groups["weekday"].lower()],
+                                    include_today=groups["which"].lower() == "this")
+            return _at(day, time_of_day, midnight=True)
+        weekday = _WEEKDAYS_KO[groups["ko_weekday"]]
+        monday = reference - timedelta(days=reference.weekday())
+        weeks = 0 if re.sub(r"\s+", "", groups["ko_week"]) in ("이번주", "금주") else 1
+        return _at(monday + timedelta(weeks=weeks, days=weekday), time_of_day, midnight=True)
+    return _NO_MATCH
+
+
+def _keeps_reference_time(text: str) -> bool:
+    """True for the fast-path shapes whose result carries the time of day of the reference ("in 2 hours", "tomorrow")."""
+    if _IN_DELTA_RE.match(text):
+        return True
+    for pattern in (_EN_DAY_TIME_RE, _EN_TIME_DAY_RE, _KO_DAY_TIME_RE):
+        match = pattern.match(text)
+        if match:
+            groups = match.groupdict()
+            return bool(groups.get("offset") or groups.get("ko_offset")) and _time_of(match) is None
+    return False
+
+
+class DateResolver:
+    """
+    Args:
+        languages: dateparser languages; None uses config.DATE_LANGUAGES at call time (an empty
+                   list lets dateparser detect the language among all locales).
+        cache_size: Memoized results kept before the least recently used are dropped; 0 disables memoization.
+        fast_paths: Set False to send every string to dateparser.
+    """
+
+    def __init__(self, languages=None, cache_size: int = 4096, fast_paths: bool = True):
+        self.languages = languages
+        self.cache_size = cache_size
+        self.fast_paths = fast_paths
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {"cache_hits": 0, "fast_path": 0, "dateparser": 0}
+
+    def resolve(self, text: str, custom_settings: Optional[dict] = None) -> Optional[datetime]:
+        if not text: return None
+        settings = dict(custom_settings or {})
+        # dateparser takes languages as an argument, not a setting
+        languages = settings.pop('LANGUAGES', None) or (config.DATE_LANGUAGES if self.languages is None else self.languages)
+        relative_base = settings.get('RELATIVE_BASE')
+        reference = relative_base or datetime.now()
+        normalized = re.sub(r"\s+", " ", text.strip().lower()).rstrip(".")
+        key = (normalized, reference.date(), tuple(sorted((name, repr(value)) for name, value in settings.items())),
+               tuple(languages or ()))
+        with self._lock:
+            if key in self._cache:
+                self._cache.move_to_end(key)
+                self.stats["cache_hits"] += 1
+                return self._cache[key]
+
+        result, from_fast_path = _NO_MATCH, False
+        if self.fast_paths and set(settings) <= _ABSOLUTE_FAST_PATH_SETTINGS:
+            result = fast_path(normalized, reference, absolute_only=not set(settings) <= _FAST_PATH_SETTINGS)
+        if result is _NO_MATCH:
+            self.stats["dateparser"] += 1
+            try:
+                result = dateparser.parse(text, languages=languages or None, settings=settings or None)
+            except Exception as e:
+                print(f"Dateparser error for input '{text}': {e}")
+                return None
+        else:
+            from_fast_path = True
+            self.stats["fast_path"] += 1
+
+        # Without a RELATIVE_BASE the key only holds the current date; a result that moves with the clock is not kept.
+        time_independent = (relative_base or result is None
+                            or (from_fast_path and not _keeps_reference_time(normalized)))
+        if self.cache_size > 0 and time_independent:
+            with self._lock:
+                self._cache[key] = result
+                if len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+        return result
+
+
+_shared_resolver = None
+_shared_resolver_lock = threading.Lock()
+
+
+def get_date_resolver() -> DateResolver:
+    """The process-wide resolver used by resolve_date, sized by DATE_RESOLVER_CACHE_SIZE."""
+    global _shared_resolver
+    with _shared_resolver_lock:
+        if _shared_resolver is None:
+            _shared_resolver = DateResolver(cache_size=config.DATE_RESOLVER_CACHE_SIZE,
+                                            fast_paths=config.DATE_RESOLVER_FAST_PATHS)
+        return _shared_resolver
@@ -0,0 +1,212 @@
+# extract_nlp/gate.py
+"""
+Local, CPU-only pre-classifier that skips obvious non-tasks before they reach TaskClassifier.
+
+Receipts, promotions, newsletters and automated notifications make up most of a mailbox and
+almost always come back `is_task: false`. `PreClassifier.score` estimates the probability that a
+message is a task from cheap features: the sender (no-reply and notification addresses), bulk
+mail headers (List-Unsubscribe, List-Id, Precedence, Auto-Submitted) and Korean/English keywords
+in the subject and body. Only messages scoring at least the threshold are sent to the LLM.
+
+Hand-set weights are used until enough past classifier outcomes (the classification_outcomes
+table) exist to train `LogisticModel`, a small logistic regression over the same features plus
+sender domain and words. A random share of the skipped messages is still classified ("audited"),
+which gives an estimate of the tasks the gate misses.
+"""
+import math
+import random
+import re
+from email.utils import parseaddr
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import config
+
+# Headers that mark list, bulk or machine-generated mail. GmailAgent keeps them in 'headers'.
+BULK_HEADERS = ('list-unsubscribe', 'list-id', 'precedence', 'auto-submitted')
+
+_AUTOMATED_SENDER_RE = re.compile(
+    r"^(?:no-?reply|do-?not-?reply|donotreply|mailer-daemon|notifications?|alerts?|news(?:letter)?|marketing"
+    r"|promo(?:tions?)?|info|billing|receipts?|orders?|accounts?|security|support|hello|team)\b", re.IGNORECASE)
+_WORD_RE = re.compile(r"[0-9a-z]+|[가-힣]+", re.IGNORECASE)
+
+# Keyword features, matched against the subject and the start of the body.
+_KEYWORD_FEATURES = {
+    "kw:receipt": re.compile(
+        r"\b(?:receipt|invoice|order (?:confirm|number|#)|your order|payment (?:received|confirm)|shipped|delivered"
+        r"|tracking number|refund)\b|영수증|결제 ?(?:완료|내역)|주문 ?(?:완료|확인|번호)|배송|청구서|환불", re.IGNORECASE),
+    "kw:promo": re.compile(
+        r"\b(?:sale|discount|\d+% off|coupon|promo(?:tion)?|deal|special offer|limited time|free shipping)\b"
+        r"|\(광고\)|할인|쿠폰|특가|이벤트|프로모션|혜택", re.IGNORECASE),
+    "kw:notification": re.compile(
+        r"\b(?:verification code|security alert|new sign-in|sign-in attempt|password (?:reset|changed)"
+        r"|your (?:code|otp) is|login alert)\b|인증 ?번호|로그인 알림|비밀번호 (?:변경|재설정)|보안 알림", re.IGNORECASE),
+    "kw:newsletter": re.compile(r"\b(?:newsletter|digest|weekly roundup|this week in|view in browser)\b|뉴스레터",
+                                re.IGNORECASE),
+    "kw:unsubscribe": re.compile(r"\bunsubscribe\b|수신 ?거부|구독 ?취소", re.IGNORECASE),
+    "kw:deadline": re.compile(r"\b(?:due|deadline|submit|submission)\b|\bby (?:mon|tue|wed|thu|fri|sat|sun|tomorrow|today|eod|end of)"
+                              r"|마감|제출|까지", re.IGNORECASE),
+    "kw:meeting": re.compile(r"\b(?:meeting|meet|call|appointment|interview|schedule[ds]?|agenda|rsvp)\b"
+                             r"|회의|미팅|면담|약속|일정", re.IGNORECASE),
+    "kw:request": re.compile(r"\b(?:please|could you|can you|would you|let me know|action required|reminder)\b"
+                             r"|부탁|해 ?주세요|해주시기|바랍니다|확인 ?(?:부탁|요청)", re.IGNORECASE),
+    "kw:date": re.compile(r"\b(?:today|tonight|tomorrow|next week|mon(?:day)?|tue(?:sday)?|wed(?:nesday)?"
+                          r"|thu(?:rsday)?|fri(?:day)?|\d{1,2}(?::\d{2})?\s?(?:am|pm)|\d{4}-\d{2}-\d{2})\b"
+                          r"|오늘|내일|모레|다음 ?주|\d{1,2}시|\d{1,2}월 ?\d{1,2}일", re.IGNORECASE),
+}
+_REPLY_SUBJECT_RE = re.compile(r"^\s*(?:re|fw|fwd|답장|회신|전달)\s*:", re.IGNORECASE)
+
+# Hand-set log-odds: the bias scores a featureless message at ~0.62, so only clear non-task signals skip it.
+HEURISTIC_BIAS = 0.5
+HEURISTIC_WEIGHTS = {
+    "sender:automated": -1.5, "header:list": -1.5, "header:auto-submitted": -1.5,
+    "kw:receipt": -1.5, "kw:promo": -1.5, "kw:notification": -2.0, "kw:newsletter": -1.0, "kw:unsubscribe": -1.0,
+    "kw:deadline": 1.5, "kw:meeting": 1.5, "kw:request": 1.0, "kw:date": 0.5, "subject:reply": 1.0,
+}
+
+
+def _sigmoid(x: float) -> float:
+    if x < -35: return 0.0
+    return 1.0 / (1.0 + math.exp(-x))
+
+
+def extract_features(text: str, sender: str = "", subject: str = "", bulk_headers: Iterable[str] = (),
+                     body_chars: int = 2000) -> Dict[str, float]:
+    """
+    Binary features of one message.
+
+    Args:
+        text: Normalized body.
+        sender: From header.
+        subject: Subject header.
+        bulk_headers: Names (lowercase) of the BULK_HEADERS present on the message; a Precedence
+                      header counts only with a bulk/list/junk value, so pass it as 'precedence' only then.
+        body_chars: Leading characters of the body that are looked at.
+    """
+    features = {}
+    address = parseaddr(sender or "")[1].lower()
+    local_part, _, domain = address.rpartition('@')
+    if _AUTOMATED_SENDER_RE.match(local_part): features["sender:automated"] = 1.0
+    if domain: features[f"sender_domain:{domain}"] = 1.0
+    bulk_headers = set(bulk_headers)
+    if bulk_headers & {'list-unsubscribe', 'list-id', 'precedence'}: features["header:list"] = 1.0
+    if 'auto-submitted' in bulk_headers: features["header:auto-submitted"] = 1.0
+    if subject and _REPLY_SUBJECT_RE.match(subject): features["subject:reply"] = 1.0
+
+    content = f"{subject or ''}\n{(text or '')[:body_chars]}"
+    for name, pattern in _KEYWORD_FEATURES.items():
+        if pattern.search(content): features[name] = 1.0
+    for word in _WORD_RE.findall((subject or "").lower()):
+        features[f"subject_word:{word}"] = 1.0
+    for word in _WORD_RE.findall((text or "")[:body_chars // 4].lower()):
+        features[f"word:{word}"] = 1.0
+    return features
+
+
+def bulk_headers_of(headers: Dict[str, str]) -> List[str]:
+    """The BULK_HEADERS present in a lowercase-keyed header dict, in the form extract_features expects."""
+    present = [name for name in BULK_HEADERS if headers.get(name)]
+    if 'precedence' in present and headers['precedence'].strip().lower() not in ('bulk', 'list', 'junk'):
+        present.remove('precedence')
+    return present
+
+
+class LogisticModel:
+    """Sparse logistic regression over extract_features() dictionaries, trained with plain SGD."""
+
+    def __init__(self, weights: Optional[Dict[str, float]] = None, bias: float = 0.0):
+        self.weights = weights or {}
+        self.bias = bias
+
+    def predict(self, features: Dict[str, float]) -> float:
+        return _sigmoid(self.bias + sum(self.weights.get(name, 0.0) * value for name, value in features.items()))
+
+    @classmethod
+    def train(cls, samples: List[Tuple[Dict[str, float], bool]], epochs: int = 15, learning_rate: float = 0.2,
+              l2: float = 1e-4, seed: int = 0) -> "LogisticModel":
+        """
+        Args:
+            samples: (features, is_task) pairs.
+            epochs: Passes over the shuffled samples.
+            learning_rate: Initial step size, decayed per epoch.
+            l2: L2 penalty applied to the weights touched by each sample.
+        """
+        model = cls(weights=dict(HEURISTIC_WEIGHTS), bias=HEURISTIC_BIAS) # Start from the hand-set weights
+        order = list(range(len(samples)))
+        rng = random.Random(seed)
+        for epoch in range(epochs):
+            rng.shuffle(order)
+            step = learning_rate / (1 + epoch)
+            for i in order:
+                features, is_task = samples[i]
+                error = model.predict(features) - (1.0 if is_task else 0.0)
+                model.bias -= step * error
+                for name, value in features.items():
+                    weight = model.weights.get(name, 0.0)
+                    model.weights[name] = weight - step * (error * value + l2 * weight)
+        return model
+
+
+class PreClassifier:
+    """
+    Args:
+        threshold: Messages scoring below this estimated task probability are skipped.
+        model: Trained LogisticModel; hand-set weights are used without one.
+        audit_rate: Share of would-be-skipped messages that are classified anyway to measure misses.
+        rng: Random source for audit sampling.
+    """
+
+    def __init__(self, threshold: float = 0.25, model: Optional[LogisticModel] = None, audit_rate: float = 0.0,
+                 rng: Optional[random.Random] = None):
+        self.threshold = threshold
+        self.model = model or LogisticModel(weights=dict(HEURISTIC_WEIGHTS), bias=HEURISTIC_BIAS)
+        self.trained = model is not None
+        self.audit_rate = audit_rate
+        self.rng = rng or random.Random()
+        self.stats = {"scored": 0, "skipped": 0, "audited": 0, "skipped_score_sum": 0.0}
+
+    @classmethod
+    def from_config(cls, outcomes: Optional[Iterable] = None) -> "PreClassifier":
+        """
+        Builds the gate from the CLASSIFIER_GATE_* settings. `outcomes` are past classification
+        outcome rows (with sender, subject, text_excerpt, bulk_headers and is_task); a model is
+        trained from them when CLASSIFIER_GATE_MODEL_ENABLED is on and enough of both classes exist.
+        """
+        model = None
+        samples = [(extract_features(o.text_excerpt or "", o.sender or "", o.subject or "",
+                                     (o.bulk_headers or "").split(",")), bool(o.is_task)) for o in (outcomes or [])]
+        positives = sum(1 for _, is_task in samples if is_task)
+        if config.CLASSIFIER_GATE_MODEL_ENABLED and len(samples) >= config.CLASSIFIER_GATE_MODEL_MIN_SAMPLES \
+           and 0 < positives < len(samples):
+            model = LogisticModel.train(samples)
+            print(f"Pre-classifier gate trained on {len(samples)} past outcomes ({positives} tasks).")
+        return cls(threshold=config.CLASSIFIER_GATE_THRESHOLD, model=model, audit_rate=config.CLASSIFIER_GATE_AUDIT_RATE)
+
+    def score(self, text: str, sender: str = "", subject: str = "", bulk_headers: Iterable[str] = ()) -> float:
+        """Estimated probability that the message is a task."""
+        return self.model.predict(extract_features(text, sender, subject, bulk_headers))
+
+    def decide(self, text: str, sender: str = "", subject: str = "", bulk_headers: Iterable[str] = ()) -> Tuple[bool, float, bool]:
+        """
+        Returns:
+            (classify, score, audited): whether the message should go to the LLM, its score, and
+            whether it goes only because it was sampled for an audit.
+        """
+        score = self.score(text, sender, subject, bulk_headers)
+        self.stats["scored"] += 1
+        if score >= self.threshold:
+            return True, score, False
+        if self.audit_rate > 0 and self.rng.random() < self.audit_rate:
+            self.stats["audited"] += 1
+            return True, score, True
+        self.stats["skipped"] += 1
+        self.stats["skipped_score_sum"] += score
+        return False, score, False
+
+    def false_negatives_estimate(self, audited_tasks: int = 0) -> float:
+        """
+        Estimated tasks among the skipped messages: the audit hit rate times the skipped count when
+        messages were audited, otherwise the sum of the skipped messages' scores.
+        """
+        if self.stats["audited"]:
+            return audited_tasks / self.stats["audited"] * self.stats["skipped"]
+        return self.stats["skipped_score_sum"]
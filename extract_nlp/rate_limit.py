@@ -0,0 +1,130 @@
+# extract_nlp/rate_limit.py
+"""
+Rate-limit-aware scheduling of concurrent OpenAI calls.
+
+OpenAI limits each account to a number of requests per minute (RPM) and tokens per minute (TPM)
+per model. `AdaptiveRateLimiter` keeps concurrent classification calls under both: every call
+takes a concurrency slot and draws one request and its estimated tokens from two token buckets
+that refill continuously at RPM/60 and TPM/60 per second. If the API still answers 429, the
+concurrency limit is halved and all callers pause for the server's Retry-After; successful calls
+raise the limit again by about one slot per round of calls, up to `max_concurrency`.
+"""
+import asyncio
+import random
+import time
+from typing import Optional
+
+
+class _TokenBucket:
+    """Continuously refilled bucket holding at most `burst_s` seconds of the per-minute rate."""
+
+    def __init__(self, per_minute: float, burst_s: float):
+        self.rate_per_s = per_minute / 60.0
+        self.capacity = max(1.0, self.rate_per_s * burst_s)
+        self.level = self.capacity
+        self._updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.level = min(self.capacity, self.level + (now - self._updated) * self.rate_per_s)
+        self._updated = now
+
+    def wait_s(self, amount: float) -> float:
+        """Seconds until `amount` (at most the capacity) is available; 0 if it can be drawn now."""
+        self._refill()
+        needed = min(amount, self.capacity)
+        return 0.0 if self.level >= needed else (needed - self.level) / self.rate_per_s
+
+    def draw(self, amount: float):
+        # May go below zero for calls larger than the capacity; later callers wait until it refills.
+        self._refill()
+        self.level -= amount
+
+    def credit(self, amount: float):
+        self._refill()
+        self.level = min(self.capacity, self.level + amount)
+
+
+class AdaptiveRateLimiter:
+    """
+    asyncio limiter for concurrent API calls. Use from a single event loop:
+
+        await limiter.acquire(estimated_tokens)
+        try: response = await client.chat.completions.create(...)
+        finally: await limiter.release(...)
+
+    Args:
+        max_concurrency: Upper bound on calls in flight.
+        requests_per_minute: RPM limit; 0 or negative disables the request bucket.
+        tokens_per_minute: TPM limit; 0 or negative disables the token bucket.
+        burst_s: Seconds of the per-minute rates that may be spent at once.
+    """
+
+    def __init__(self, max_concurrency: int, requests_per_minute: float = 0, tokens_per_minute: float = 0,
+                 burst_s: float = 1.0):
+        self.max_concurrency = max(1, int(max_concurrency))
+        self.concurrency_limit = float(self.max_concurrency)
+        self._requests = _TokenBucket(requests_per_minute, burst_s) if requests_per_minute > 0 else None
+        self._tokens = _TokenBucket(tokens_per_minute, burst_s) if tokens_per_minute > 0 else None
+        self._in_flight = 0
+        self._paused_until = 0.0
+        self._condition = asyncio.Condition()
+        self.stats = {"calls": 0, "rate_limited": 0, "peak_in_flight": 0, "wait_s": 0.0}
+
+    def _wait_s(self, tokens: int) -> Optional[float]:
+        """Seconds to wait before a call of `tokens` may start; None to wait for a slot to be released."""
+        pause_s = self._paused_until - time.monotonic()
+        if pause_s > 0:
+            return pause_s
+        if self._in_flight >= int(self.concurrency_limit):
+            return None
+        return max(self._requests.wait_s(1) if self._requests else 0.0,
+                   self._tokens.wait_s(tokens) if self._tokens else 0.0)
+
+    async def acquire(self, tokens: int = 0):
+        """Waits for a concurrency slot and for rate budget for one call of about `tokens` tokens."""
+        started = time.monotonic()
+        async with self._condition:
+            while True:
+                wait_s = self._wait_s(tokens)
+                if wait_s is not None and wait_s <= 0:
+                    break
+                try: await asyncio.wait_for(self._condition.wait(), timeout=wait_s)
+                except asyncio.TimeoutError: pass
+            if self._requests: self._requests.draw(1)
+            if self._tokens: self._tokens.draw(tokens)
+            self._in_flight += 1
+            self.stats["calls"] += 1
+            self.stats["peak_in_flight"] = max(self.stats["peak_in_flight"], self._in_flight)
+        self.stats["wait_s"] += time.monotonic() - started
+
+    async def release(self, estimated_tokens: int = 0, actual_tokens: Optional[int] = None,
+                      rate_limited: bool = False, retry_after_s: Optional[float] = None):
+        """
+        Frees the slot taken by acquire().
+
+        Args:
+            estimated_tokens: Tokens drawn by acquire(); with `actual_tokens`, the difference is settled.
+            actual_tokens: Tokens the API reported for the call, if it completed.
+            rate_limited: True if the API answered 429; shrinks the concurrency limit and pauses callers.
+            retry_after_s: Server-requested pause for a 429.
+        """
+        async with self._condition:
+            self._in_flight -= 1
+            if self._tokens and actual_tokens is not None:
+                if actual_tokens < estimated_tokens: self._tokens.credit(estimated_tokens - actual_tokens)
+                else: self._tokens.draw(actual_tokens - estimated_tokens)
+            if rate_limited:
+                self.stats["rate_limited"] += 1
+                self.concurrency_limit = max(1.0, self.concurrency_limit / 2)
+                self._paused_until = max(self._paused_until, time.monotonic() + (retry_after_s or 1.0))
+            else:
+                self.concurrency_limit = min(float(self.max_concurrency),
+                                             self.concurrency_limit + 1.0 / self.concurrency_limit)
+            self._condition.notify_all()
+
+
+def backoff_delay_s(attempt: int, base_s: float, max_s: float, retry_after_s: Optional[float] = None) -> float:
+    """Full-jitter exponential backoff for retry `attempt` (0-based), never shorter than the server's Retry-After."""
+    delay_s = random.uniform(0, min(max_s, base_s * (2 ** attempt)))
+    return max(delay_s, retry_after_s or 0.0)
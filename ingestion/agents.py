@@ -5,34 +5,117 @@ from google.oauth2.credentials import Credentials
 from google_auth_oauthlib.flow import InstalledAppFlow
 from googleapiclient.discovery import build
 from googleapiclient.errors import HttpError
+from google_auth_httplib2 import AuthorizedHttp
+import httplib2
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta # Keep for fetch_messages and potentially token expiry logic
 
 # --- Integration with persistence layer ---
-from persistence.database import SessionLocal # To get a DB session
+from persistence.database import SessionLocal, begin_write # To get a DB session
 from persistence import crud as persistence_crud # To call get_token, save_token
 # --- End integration ---
+from ingestion.service_cache import gmail_service_cache
+import config
 
 import base64 # For decoding message body in _parse_email_parts
+import re
 
 # --- Imports for KakaoAgent ---
 from playwright.sync_api import Playwright, BrowserContext, Page, Browser, Error as PlaywrightError, Locator
-from typing import List, Dict, Optional
+from typing import List, Dict, Optional, Iterator, Tuple
 import hashlib
 import time # For small delays if needed
 import sys # For logger fallback
 import logging # For KakaoAgent logger
 # --- End Imports for KakaoAgent ---
 
+class _RateLimiter:
+    """Thread-safe limiter spacing calls evenly at no more than `rate_per_s` per second."""
+
+    def __init__(self, rate_per_s: float):
+        self.interval_s = 1.0 / rate_per_s
+        self._next_slot = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        with self._lock:
+            now = time.monotonic()
+            wait_s = self._next_slot - now
+            self._next_slot = max(now, self._next_slot) + self.interval_s
+        if wait_s > 0:
+            time.sleep(wait_s)
+
+
+_CHARSET_RE = re.compile(r'charset\s*=\s*"?([^";\s]+)', re.IGNORECASE)
+
+
+class HistoryIdExpiredError(Exception):
+    """Raised when a stored Gmail historyId cursor is too old for history.list (HTTP 404)."""
+
+
 class GmailAgent:
     SCOPES = ['https://www.googleapis.com/auth/gmail.readonly']
+    # Gmail rejects batches of more than 100 calls; around 50 avoids per-batch rate limiting.
+    BATCH_FETCH_MAX_SIZE = 100
+    LIST_MAX_PAGE_SIZE = 500 # messages.list maxResults upper bound
+    BATCH_RETRY_BACKOFF_S = 1.0
+    RETRYABLE_STATUSES = (429, 500, 502, 503, 504)
+    # Partial-response mask for full fetches after a prefilter pass: drops labelIds, historyId,
+    # sizeEstimate and raw, which _build_email_details never reads.
+    FULL_FETCH_FIELDS = 'id,threadId,internalDate,snippet,payload'
+    # Decoded text kept per message; the normalizer and classifier only look at the first few KB.
+    MAX_DECODED_BODY_BYTES = 256 * 1024
 
     def __init__(self, config=None, credentials_file='credentials.json'): # token_file removed from __init__
         self.config = config
         self.credentials_file = credentials_file
         self.service = None
+        self.credentials = None
+        # Optional zero-argument callable returning a fresh Gmail service object for a worker thread.
+        # Defaults to building one from self.credentials with its own httplib2 client.
+        self.worker_service_factory = None
+        self._worker_local = threading.local()
+        # Optional ingestion.prefilter.GmailPrefilter. When set, details are fetched in two phases:
+        # a cheap format='metadata' pass decides which messages get a full fetch.
+        self.prefilter = None
+        # Approximate JSON bytes received per phase, filled in while a prefilter is active.
+        self.fetch_stats = {'metadata_bytes': 0, 'full_bytes': 0,
+                            'prefilter_skipped': 0, 'skipped_size_estimate_bytes': 0}
+        # IDs listed by the current iter_messages/fetch_messages_since_history call whose details
+        # could not be fetched or parsed; a caller keeping a sync cursor must not move past them.
+        self.failed_message_ids = set()
         # print("GmailAgent initialized")
 
+    @staticmethod
+    def _token_info_for_db(creds) -> dict:
+        return {
+            'access_token': creds.token, 'refresh_token': creds.refresh_token,
+            'expires_dt': creds.expiry, 'scopes': creds.scopes,
+            'token_uri': creds.token_uri, 'client_id': creds.client_id,
+            'client_secret': creds.client_secret,
+        }
+
+    @classmethod
+    def _persist_refreshed_token(cls, app_user_id: str, creds):
+        """Saves a token refreshed in the background by the service cache."""
+        db = SessionLocal()
+        try:
+            begin_write(db)
+            persistence_crud.save_token(db, user_identifier=app_user_id, platform='gmail', token_info=cls._token_info_for_db(creds))
+        except Exception as e:
+            print(f"Error saving refreshed Gmail token for '{app_user_id}': {e}")
+        finally:
+            db.close()
+
     def authenticate_gmail(self, app_user_id="default_user"): # app_user_id for DB operations
+        if config.GMAIL_SERVICE_CACHE_ENABLED:
+            cached = gmail_service_cache.get(app_user_id)
+            if cached:
+                self.service, self.credentials = cached
+                print(f"Using cached Gmail API service for user '{app_user_id}'.")
+                return self.service
+
         creds = None
         db = SessionLocal() # Get a DB session
 
@@ -122,13 +205,9 @@ class GmailAgent:
 
             if creds:
                 try:
-                    token_info_for_db = {
-                        'access_token': creds.token, 'refresh_token': creds.refresh_token,
-                        'expires_dt': creds.expiry, 'scopes': creds.scopes,
-                        'token_uri': creds.token_uri, 'client_id': creds.client_id,
-                        'client_secret': creds.client_secret,
-                    }
+                    token_info_for_db = self._token_info_for_db(creds)
                     print(f"Attempting to save token for user '{app_user_id}', platform 'gmail' to DB.")
+                    begin_write(db) # The token was read before the network refresh
                     persistence_crud.save_token(db, user_identifier=app_user_id, platform='gmail', token_info=token_info_for_db)
                     print(f"Token for '{app_user_id}' (re)saved to DB.")
                 except Exception as e:
@@ -140,8 +219,12 @@ class GmailAgent:
             return None
 
         try:
-            self.service = build('gmail', 'v1', credentials=creds)
+            # The discovery document bundled with google-api-python-client is used; no network fetch.
+            self.service = build('gmail', 'v1', credentials=creds, static_discovery=True, cache_discovery=False)
+            self.credentials = creds
             print(f"Gmail API service built successfully for user '{app_user_id}'.")
+            if config.GMAIL_SERVICE_CACHE_ENABLED:
+                gmail_service_cache.put(app_user_id, self.service, creds, on_refresh=self._persist_refreshed_token)
             db.close()
             return self.service
         except HttpError as error:
@@ -155,38 +238,360 @@ class GmailAgent:
             self.service = None
             return None
 
-    def _parse_email_parts(self, payload):
-        plain_text_body = ""
-        html_body = ""
+    @staticmethod
+    def _part_charset(part: dict) -> str:
+        """Charset from the part's Content-Type header, defaulting to UTF-8."""
+        for header in part.get('headers', []):
+            if header.get('name', '').lower() == 'content-type':
+                match = _CHARSET_RE.search(header.get('value', ''))
+                if match: return match.group(1).lower()
+        return 'utf-8'
+
+    def _parse_email_parts(self, payload, max_decoded_bytes: Optional[int] = None):
+        """
+        Walks the MIME tree iteratively (depth-first, document order) and returns the
+        (plain, html) bodies. Only text parts are base64-decoded; in multipart messages that means
+        text/plain and text/html, in single-part messages any text/* type (non-HTML goes to plain).
+        At most `max_decoded_bytes` (default MAX_DECODED_BODY_BYTES) are decoded per message;
+        each part is decoded with the charset from its own Content-Type header.
+        """
         if not payload: return "", ""
-        parts_to_process = []
-        if 'parts' in payload: parts_to_process.extend(payload['parts'])
-        elif 'body' in payload and 'data' in payload['body']: parts_to_process.append(payload)
-        for part in parts_to_process:
-            mime_type = part.get('mimeType', '')
+        limit = self.MAX_DECODED_BODY_BYTES if max_decoded_bytes is None else max_decoded_bytes
+        budget = limit
+        plain_chunks: List[str] = []
+        html_chunks: List[str] = []
+        is_single_part = 'parts' not in payload
+        stack = [payload] if is_single_part else list(reversed(payload['parts']))
+
+        while stack and budget > 0:
+            part = stack.pop()
+            if 'parts' in part:
+                stack.extend(reversed(part['parts']))
+            mime_type = part.get('mimeType', '').lower()
+            if mime_type == 'text/html': chunks = html_chunks
+            elif mime_type == 'text/plain' or (is_single_part and mime_type.startswith('text/')): chunks = plain_chunks
+            else: continue
             body_data = part.get('body', {}).get('data')
-            if body_data:
+            if not body_data: continue
+            try:
+                # Every 4 base64 characters decode to 3 bytes, so only the prefix within budget is decoded.
+                max_chars = -(-budget // 3) * 4
+                raw_bytes = base64.urlsafe_b64decode(body_data[:max_chars])
+                truncated = len(body_data) > max_chars or len(raw_bytes) > budget
+                raw_bytes = raw_bytes[:budget]
+                budget -= len(raw_bytes)
+                charset = self._part_charset(part)
+                try: decoded_text = raw_bytes.decode(charset, errors='replace')
+                except LookupError: decoded_text = raw_bytes.decode('utf-8', errors='replace')
+                if truncated:
+                    decoded_text = decoded_text.rstrip('\ufffd') # Drop a multi-byte character cut in half
+                    print(f"Email body truncated at {limit} decoded bytes.")
+                chunks.append(decoded_text)
+            except Exception as e: print(f"Error decoding part (MIME: {mime_type}): {e}")
+        return "\n".join(plain_chunks).strip(), "\n".join(html_chunks).strip()
+
+    def _build_email_details(self, msg_id: str, message_data: dict) -> dict:
+        headers_dict = {
+            h['name'].lower(): h['value'] for h in message_data.get('payload', {}).get('headers', [])
+            if h['name'].lower() in ['subject', 'from', 'to', 'date', 'return-path', 'message-id',
+                                     'list-unsubscribe', 'list-id', 'precedence', 'auto-submitted']
+        }
+        plain_body, html_body = self._parse_email_parts(message_data.get('payload'))
+        return {
+            'id': msg_id, 'thread_id': message_data.get('threadId'),
+            'internal_date_ts': message_data.get('internalDate'),
+            'snippet': message_data.get('snippet', ''), 'headers': headers_dict,
+            'body_plain': plain_body, 'body_html': html_body, 'source': 'gmail'
+        }
+
+    def _build_emails(self, msg_ids: List[str], message_data_by_id: Dict[str, dict]) -> List[Dict]:
+        """
+        Parses fetched payloads into email dicts, in `msg_ids` order, skipping failed fetches; their
+        IDs are added to failed_message_ids.
+        """
+        fetched_emails = []
+        for msg_id in msg_ids:
+            if msg_id not in message_data_by_id:
+                self.failed_message_ids.add(msg_id); continue
+            try: fetched_emails.append(self._build_email_details(msg_id, message_data_by_id[msg_id]))
+            except Exception as e:
+                print(f'Unexpected error processing message ID {msg_id}: {e}')
+                self.failed_message_ids.add(msg_id)
+        return fetched_emails
+
+    def _fetch_raw_sequential(self, user_id: str, msg_ids: List[str], get_kwargs: dict) -> Dict[str, dict]:
+        """One `messages.get` round trip per message ID."""
+        message_data_by_id: Dict[str, dict] = {}
+        for msg_id in msg_ids:
+            try:
+                message_data_by_id[msg_id] = self.service.users().messages().get(
+                    userId=user_id, id=msg_id, **get_kwargs).execute()
+            except HttpError as error: print(f'Error fetching details for message ID {msg_id}: {error}')
+            except Exception as e: print(f'Unexpected error processing message ID {msg_id}: {e}')
+        return message_data_by_id
+
+    def _fetch_raw_batched(self, user_id: str, msg_ids: List[str], get_kwargs: dict,
+                           batch_size: int = 50, max_retries: int = 2) -> Dict[str, dict]:
+        """
+        Fetches messages through the Gmail batch endpoint, `batch_size` gets per HTTP request.
+        Items that fail with a retryable status (429/5xx), or whole batches whose HTTP call fails,
+        are re-sent in a new batch up to `max_retries` times with exponential backoff.
+        """
+        batch_size = max(1, min(batch_size, self.BATCH_FETCH_MAX_SIZE))
+        message_data_by_id: Dict[str, dict] = {}
+
+        for chunk_start in range(0, len(msg_ids), batch_size):
+            pending_ids = msg_ids[chunk_start:chunk_start + batch_size]
+            attempt = 0
+            while pending_ids:
+                retry_ids: List[str] = []
+
+                def on_response(request_id, response, exception):
+                    if exception is None:
+                        message_data_by_id[request_id] = response
+                    elif isinstance(exception, HttpError) and exception.resp.status in self.RETRYABLE_STATUSES:
+                        retry_ids.append(request_id)
+                    else:
+                        print(f'Error fetching details for message ID {request_id}: {exception}')
+
+                batch = self.service.new_batch_http_request(callback=on_response)
+                for msg_id in pending_ids:
+                    batch.add(self.service.users().messages().get(userId=user_id, id=msg_id, **get_kwargs),
+                              request_id=msg_id)
                 try:
-                    decoded_data = base64.urlsafe_b64decode(body_data).decode('utf-8')
-                    if mime_type == 'text/plain': plain_text_body += decoded_data + "\n"
-                    elif mime_type == 'text/html': html_body += decoded_data + "\n"
-                    elif not payload.get('parts') and mime_type not in ['text/plain', 'text/html']:
-                        plain_text_body += decoded_data + "\n"
-                except Exception as e: print(f"Error decoding part (MIME: {mime_type}): {e}")
-            if 'parts' in part:
-                nested_plain, nested_html = self._parse_email_parts(part)
-                if nested_plain: plain_text_body += nested_plain + "\n"
-                if nested_html: html_body += nested_html + "\n"
-        return plain_text_body.strip(), html_body.strip()
+                    batch.execute()
+                except Exception as e:
+                    print(f'Error executing batch of {len(pending_ids)} message gets: {e}')
+                    retry_ids = [mid for mid in pending_ids if mid not in message_data_by_id]
+
+                if not retry_ids:
+                    break
+                if attempt >= max_retries:
+                    print(f"Giving up on {len(retry_ids)} message(s) after {max_retries} batch retries: {retry_ids}")
+                    break
+                attempt += 1
+                backoff_s = self.BATCH_RETRY_BACKOFF_S * (2 ** (attempt - 1))
+                print(f"Retrying {len(retry_ids)} message(s) in {backoff_s:.1f}s (attempt {attempt}/{max_retries})...")
+                time.sleep(backoff_s)
+                pending_ids = retry_ids
+        return message_data_by_id
+
+    def _worker_service(self):
+        """Returns this thread's own Gmail service; googleapiclient/httplib2 objects are not thread-safe."""
+        service = getattr(self._worker_local, 'service', None)
+        if service is None:
+            if self.worker_service_factory:
+                service = self.worker_service_factory()
+            elif self.credentials:
+                authorized_http = AuthorizedHttp(self.credentials, http=httplib2.Http())
+                service = build('gmail', 'v1', http=authorized_http, static_discovery=True, cache_discovery=False)
+            else:
+                raise RuntimeError("No credentials or worker_service_factory available to build a worker Gmail service.")
+            self._worker_local.service = service
+        return service
+
+    def _fetch_raw_concurrent(self, user_id: str, msg_ids: List[str], get_kwargs: dict, max_workers: int,
+                              rate_limit_per_s: Optional[float] = None) -> Dict[str, dict]:
+        """
+        Fetches messages with `max_workers` threads, each using its own service object
+        and HTTP client. Requests are spaced to at most `rate_limit_per_s` across all workers.
+        """
+        rate_limiter = _RateLimiter(rate_limit_per_s) if rate_limit_per_s else None
+
+        def fetch_one(msg_id: str) -> Optional[dict]:
+            if rate_limiter: rate_limiter.acquire()
+            try:
+                return self._worker_service().users().messages().get(
+                    userId=user_id, id=msg_id, **get_kwargs).execute()
+            except HttpError as error: print(f'Error fetching details for message ID {msg_id}: {error}')
+            except Exception as e: print(f'Unexpected error processing message ID {msg_id}: {e}')
+            return None
 
-    def fetch_messages(self, user_id='me', max_results=10, since_date_str=None):
+        with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="gmail-fetch") as executor:
+            results = list(executor.map(fetch_one, msg_ids))
+        return {msg_id: message_data for msg_id, message_data in zip(msg_ids, results) if message_data is not None}
+
+    def _fetch_raw(self, user_id: str, msg_ids: List[str], get_kwargs: dict, batch_size: Optional[int],
+                   batch_max_retries: int, max_workers: Optional[int] = None,
+                   rate_limit_per_s: Optional[float] = None) -> Dict[str, dict]:
+        """Fetches `messages.get(**get_kwargs)` for every ID with the configured strategy; returns ID -> response."""
+        if batch_size:
+            return self._fetch_raw_batched(user_id, msg_ids, get_kwargs, batch_size=batch_size, max_retries=batch_max_retries)
+        if max_workers and max_workers > 1:
+            return self._fetch_raw_concurrent(user_id, msg_ids, get_kwargs, max_workers, rate_limit_per_s)
+        return self._fetch_raw_sequential(user_id, msg_ids, get_kwargs)
+
+    def _fetch_details_sequential(self, user_id: str, msg_ids: List[str]) -> List[Dict]:
+        return self._build_emails(msg_ids, self._fetch_raw_sequential(user_id, msg_ids, {'format': 'full'}))
+
+    def _fetch_details_batched(self, user_id: str, msg_ids: List[str],
+                               batch_size: int = 50, max_retries: int = 2) -> List[Dict]:
+        """Batched full fetch. Returns email dicts in the same order as `msg_ids`, like the sequential path."""
+        return self._build_emails(msg_ids, self._fetch_raw_batched(
+            user_id, msg_ids, {'format': 'full'}, batch_size=batch_size, max_retries=max_retries))
+
+    def _fetch_details_concurrent(self, user_id: str, msg_ids: List[str], max_workers: int,
+                                  rate_limit_per_s: Optional[float] = None) -> List[Dict]:
+        """Concurrent full fetch. Output order matches `msg_ids` regardless of completion order."""
+        return self._build_emails(msg_ids, self._fetch_raw_concurrent(
+            user_id, msg_ids, {'format': 'full'}, max_workers, rate_limit_per_s))
+
+    def _prefilter_ids(self, user_id: str, msg_ids: List[str], batch_size: Optional[int],
+                       batch_max_retries: int, max_workers: Optional[int] = None,
+                       rate_limit_per_s: Optional[float] = None) -> List[str]:
+        """
+        Phase one of the two-phase fetch: pulls only the headers and labels the prefilter needs
+        (`format='metadata'` plus a `fields` mask) and returns the IDs worth a full fetch.
+        IDs whose metadata could not be fetched are kept, so a failed cheap call never drops mail.
+        """
+        metadata_by_id = self._fetch_raw(user_id, msg_ids, {
+            'format': 'metadata', 'metadataHeaders': self.prefilter.METADATA_HEADERS,
+            'fields': self.prefilter.METADATA_FIELDS,
+        }, batch_size, batch_max_retries, max_workers, rate_limit_per_s)
+        self.fetch_stats['metadata_bytes'] += sum(len(json.dumps(m)) for m in metadata_by_id.values())
+
+        survivors = []
+        for msg_id in msg_ids:
+            metadata = metadata_by_id.get(msg_id)
+            skip_reason = self.prefilter.evaluate(metadata) if metadata else None
+            if skip_reason:
+                self.fetch_stats['prefilter_skipped'] += 1
+                self.fetch_stats['skipped_size_estimate_bytes'] += int(metadata.get('sizeEstimate', 0))
+                print(f"Prefilter skipped message ID {msg_id}: {skip_reason}")
+            else:
+                survivors.append(msg_id)
+        return survivors
+
+    def _fetch_details(self, user_id: str, msg_ids: List[str], batch_size: Optional[int],
+                       batch_max_retries: int, max_workers: Optional[int] = None,
+                       rate_limit_per_s: Optional[float] = None) -> List[Dict]:
+        if self.prefilter:
+            msg_ids = self._prefilter_ids(user_id, msg_ids, batch_size, batch_max_retries, max_workers, rate_limit_per_s)
+            print(f"{len(msg_ids)} message(s) passed the metadata prefilter. Fetching full details...")
+            if not msg_ids: return []
+            message_data_by_id = self._fetch_raw(user_id, msg_ids, {'format': 'full', 'fields': self.FULL_FETCH_FIELDS},
+                                                 batch_size, batch_max_retries, max_workers, rate_limit_per_s)
+            self.fetch_stats['full_bytes'] += sum(len(json.dumps(m)) for m in message_data_by_id.values())
+            return self._build_emails(msg_ids, message_data_by_id)
+        if batch_size:
+            print(f"Fetching full details in batches of {batch_size}...")
+            return self._fetch_details_batched(user_id, msg_ids, batch_size=batch_size, max_retries=batch_max_retries)
+        if max_workers and max_workers > 1:
+            print(f"Fetching full details with {max_workers} worker threads...")
+            return self._fetch_details_concurrent(user_id, msg_ids, max_workers, rate_limit_per_s)
+        print("Fetching full details...")
+        return self._fetch_details_sequential(user_id, msg_ids)
+
+    def get_current_history_id(self, user_id='me') -> Optional[str]:
+        """Returns the mailbox's current historyId (a cursor for fetch_messages_since_history), or None on error."""
+        try:
+            profile = self.service.users().getProfile(userId=user_id).execute()
+            return str(profile['historyId'])
+        except HttpError as error: print(f'Error reading Gmail profile historyId: {error}'); return None
+        except Exception as e: print(f'Unexpected error reading Gmail profile historyId: {e}'); return None
+
+    def fetch_messages_since_history(self, start_history_id: str, user_id='me',
+                                     batch_size: Optional[int] = None, batch_max_retries: int = 2,
+                                     max_workers: Optional[int] = None, rate_limit_per_s: Optional[float] = None):
+        """
+        Fetches only messages added to the mailbox after `start_history_id`, following
+        `history.list` page tokens.
+
+        Returns:
+            A tuple (emails, latest_history_id). latest_history_id is the cursor to store for the
+            next run, unless failed_message_ids lists messages whose details could not be fetched.
+
+        Raises:
+            HistoryIdExpiredError: if Gmail no longer has history for `start_history_id` (404).
+                The caller should fall back to a bounded full resync.
+            HttpError or any other listing error, so a failed listing is not mistaken for an
+                empty mailbox; the caller should keep the old cursor and report the run as failed.
+        """
+        self.failed_message_ids = set()
+        msg_ids: List[str] = []
+        seen_ids = set()
+        latest_history_id = None
+        page_token = None
+        try:
+            print(f"Listing Gmail history since historyId {start_history_id}...")
+            while True:
+                results = self.service.users().history().list(
+                    userId=user_id, startHistoryId=start_history_id,
+                    historyTypes=['messageAdded'], pageToken=page_token).execute()
+                latest_history_id = str(results.get('historyId', latest_history_id or start_history_id))
+                for history_record in results.get('history', []):
+                    for added in history_record.get('messagesAdded', []):
+                        msg_id = added.get('message', {}).get('id')
+                        if msg_id and msg_id not in seen_ids:
+                            seen_ids.add(msg_id)
+                            msg_ids.append(msg_id)
+                page_token = results.get('nextPageToken')
+                if not page_token: break
+        except HttpError as error:
+            if error.resp.status == 404:
+                raise HistoryIdExpiredError(f"Gmail historyId {start_history_id} is no longer available.") from error
+            print(f'Error listing Gmail history: {error}'); raise
+
+        if not msg_ids:
+            print("No messages added since last sync.")
+            return [], latest_history_id
+        print(f"Found {len(msg_ids)} message(s) added since historyId {start_history_id}.")
+        fetched_emails = self._fetch_details(user_id, msg_ids, batch_size, batch_max_retries,
+                                             max_workers, rate_limit_per_s)
+        print(f"\nFinished fetching details for {len(fetched_emails)} messages.")
+        return fetched_emails, latest_history_id
+
+    def iter_messages(self, user_id='me', since_date_str=None, page_size: Optional[int] = 100,
+                      max_results: Optional[int] = None, batch_size: Optional[int] = None,
+                      batch_max_retries: int = 2, max_workers: Optional[int] = None,
+                      rate_limit_per_s: Optional[float] = None, prefetch: bool = False) -> Iterator[Dict]:
+        """
+        Lazily lists messages (optionally `after:since_date_str`) page by page, following
+        `nextPageToken`, and yields parsed email dicts as each page's details arrive.
+        Only one page of messages is held in memory at a time (two with `prefetch`). Stops after
+        `max_results` messages when given, otherwise when the listing is exhausted. A `page_size`
+        of None lists LIST_MAX_PAGE_SIZE messages per page. A listing error is raised, so it is not
+        mistaken for the end of the mailbox; messages whose details could not be fetched are
+        skipped and collected in failed_message_ids.
+
+        With `prefetch`, the next page is listed and fetched in a background thread while the
+        caller processes the current one. That thread is then the only one using this agent's
+        service, so the caller must not use the agent until the iterator is exhausted or closed.
+        """
+        pages = self._iter_message_pages(user_id, since_date_str, page_size, max_results, batch_size,
+                                         batch_max_retries, max_workers, rate_limit_per_s)
+        if prefetch:
+            pages = self._prefetch_pages(pages)
+        total_yielded = 0
+        for page in pages:
+            for email_details in page:
+                total_yielded += 1
+                yield email_details
+        print(f"\nFinished fetching details for {total_yielded} messages.")
+
+    @staticmethod
+    def _prefetch_pages(pages: Iterator[List[Dict]]) -> Iterator[List[Dict]]:
+        """Advances `pages` in a background thread, one page ahead of the consumer."""
+        with ThreadPoolExecutor(max_workers=1, thread_name_prefix="gmail-prefetch") as executor:
+            next_page = executor.submit(next, pages, None)
+            while True:
+                page = next_page.result()
+                if page is None:
+                    return
+                next_page = executor.submit(next, pages, None)
+                yield page
+
+    def _iter_message_pages(self, user_id: str, since_date_str: Optional[str], page_size: Optional[int],
+                            max_results: Optional[int], batch_size: Optional[int], batch_max_retries: int,
+                            max_workers: Optional[int], rate_limit_per_s: Optional[float]) -> Iterator[List[Dict]]:
+        """The email dicts of each messages.list page, fetched when the page is requested."""
+        self.failed_message_ids = set()
         if not self.service:
             print("Gmail service not authenticated. Attempting to authenticate with default user...")
             if not self.authenticate_gmail():
                 print("Authentication failed. Cannot fetch messages.")
-                return []
+                return
 
-        fetched_emails = []
         query = None
         if since_date_str:
             try:
@@ -196,37 +601,45 @@ class GmailAgent:
             except ValueError:
                 print(f"Invalid since_date_str format: {since_date_str}. Must be YYYY/MM/DD. Ignoring date filter.")
 
-        try:
-            print(f"Fetching list of messages with query: '{query if query else 'None'}' (max: {max_results})...")
-            results = self.service.users().messages().list(
-                userId=user_id, maxResults=max_results, q=query).execute()
+        page_size = max(1, min(page_size or self.LIST_MAX_PAGE_SIZE, self.LIST_MAX_PAGE_SIZE))
+        remaining = max_results
+        page_token = None
+        page_number = 0
+        print(f"Fetching list of messages with query: '{query if query else 'None'}' (max: {max_results if max_results else 'all'})...")
+        while remaining is None or remaining > 0:
+            list_kwargs = {'userId': user_id, 'maxResults': page_size if remaining is None else min(page_size, remaining), 'q': query}
+            if page_token: list_kwargs['pageToken'] = page_token
+            try:
+                results = self.service.users().messages().list(**list_kwargs).execute()
+            except Exception as e: print(f'Error listing messages (page {page_number + 1}): {e}'); raise
+
             messages = results.get('messages', [])
-            if not messages: print("No messages found matching criteria."); return []
-            print(f"Found {len(messages)} message(s) in list. Fetching full details...")
-            for msg_summary in messages:
-                msg_id = msg_summary['id']
-                try:
-                    message_data = self.service.users().messages().get(
-                        userId=user_id, id=msg_id, format='full').execute()
-                    headers_dict = {
-                        h['name'].lower(): h['value'] for h in message_data.get('payload', {}).get('headers', [])
-                        if h['name'].lower() in ['subject', 'from', 'to', 'date', 'return-path', 'message-id']
-                    }
-                    plain_body, html_body = self._parse_email_parts(message_data.get('payload'))
-                    email_details = {
-                        'id': msg_id, 'thread_id': message_data.get('threadId'),
-                        'internal_date_ts': message_data.get('internalDate'),
-                        'snippet': message_data.get('snippet', ''), 'headers': headers_dict,
-                        'body_plain': plain_body, 'body_html': html_body, 'source': 'gmail'
-                    }
-                    fetched_emails.append(email_details)
-                    # print(f"Successfully processed message ID: {msg_id}, Subject: '{headers_dict.get('subject', 'N/A')[:50]}...'")
-                except HttpError as error: print(f'Error fetching details for message ID {msg_id}: {error}')
-                except Exception as e: print(f'Unexpected error processing message ID {msg_id}: {e}')
-            print(f"\nFinished fetching details for {len(fetched_emails)} messages.")
-            return fetched_emails
-        except HttpError as error: print(f'Error listing messages: {error}'); return []
-        except Exception as e: print(f'Unexpected error during message listing phase: {e}'); return []
+            page_number += 1
+            if not messages:
+                if page_number == 1: print("No messages found matching criteria.")
+                break
+            msg_ids = [msg_summary['id'] for msg_summary in messages]
+            print(f"Found {len(messages)} message(s) in list page {page_number}.")
+            yield self._fetch_details(user_id, msg_ids, batch_size, batch_max_retries, max_workers, rate_limit_per_s)
+
+            if remaining is not None: remaining -= len(msg_ids)
+            page_token = results.get('nextPageToken')
+            if not page_token: break
+
+    def fetch_messages(self, user_id='me', max_results=10, since_date_str=None,
+                       batch_size: Optional[int] = None, batch_max_retries: int = 2,
+                       max_workers: Optional[int] = None, rate_limit_per_s: Optional[float] = None):
+        """
+        Lists up to `max_results` messages (all when None; optionally `after:since_date_str`) and
+        returns their full details as a list. With `batch_size` set, details are fetched through the Gmail
+        batch endpoint instead of one `messages.get` round trip per message; with `max_workers`
+        above 1 they are fetched concurrently, at most `rate_limit_per_s` requests per second.
+        """
+        return list(self.iter_messages(
+            user_id=user_id, since_date_str=since_date_str, page_size=max_results, max_results=max_results,
+            batch_size=batch_size, batch_max_retries=batch_max_retries,
+            max_workers=max_workers, rate_limit_per_s=rate_limit_per_s
+        ))
 
 if __name__ == '__main__':
     print("Testing GmailAgent with DB Token Storage...")
@@ -264,6 +677,13 @@ class KakaoAgent:
         "message_timestamp_selector": "span[data-testid='message-timestamp']",
     }
     # --- END CONCEPTUAL SELECTORS ---
+    SCROLL_SETTLE_MS = 500 # Time for the client to render older messages after a scroll
+
+    # Runs in the page: one round trip returns the fields of every bubble matched by the locator.
+    _BUBBLE_EXTRACT_JS = """(bubbles, selectors) => bubbles.map(el => {
+        const field = sel => { const node = el.querySelector(sel); return node ? node.textContent : null; };
+        return {sender: field(selectors.sender), text: field(selectors.text), timestamp: field(selectors.timestamp)};
+    })"""
 
     def __init__(self, playwright_instance: Playwright, user_data_dir: Optional[str] = None, headless: bool = False):
         self.pw_instance = playwright_instance
@@ -272,6 +692,7 @@ class KakaoAgent:
         self.browser: Optional[Browser] = None
         self.context: Optional[BrowserContext] = None
         self.page: Optional[Page] = None
+        self.page_pool: List[Page] = [] # self.page plus extra pages opened by read_chats
         self.logger = self._get_logger()
         self.logger.info(f"KakaoAgent initialized. User data dir: {self.user_data_dir}, Headless: {self.headless}")
 
@@ -327,14 +748,27 @@ class KakaoAgent:
             self.close()
             return False
 
-    def select_chat(self, chat_name: str, timeout_ms: int = 30000) -> bool:
+    def is_healthy(self) -> bool:
+        """Cheap liveness probe for a reused session: the page is open and its JS context still answers."""
+        if not self.page or not self.context:
+            return False
+        try:
+            if self.page.is_closed(): return False
+            if self.browser and not self.browser.is_connected(): return False
+            return self.page.evaluate("() => document.readyState") is not None
+        except Exception as e:
+            self.logger.warning(f"KakaoAgent health check failed: {e}")
+            return False
+
+    def select_chat(self, chat_name: str, timeout_ms: int = 30000, page: Optional[Page] = None) -> bool:
         self.logger.info(f"Attempting to select chat: '{chat_name}' (timeout: {timeout_ms}ms)...")
-        if not self.page:
+        page = page or self.page
+        if not page:
             self.logger.error("Page object not available. Login must be successful first.")
             return False
 
         try:
-            chat_item_locator = self.page.get_by_role(
+            chat_item_locator = page.get_by_role(
                 self.CONCEPTUAL_SELECTORS["chat_list_item_role"], name=chat_name
             ).first
 
@@ -351,48 +785,110 @@ class KakaoAgent:
             self.logger.error(f"Unexpected error selecting chat '{chat_name}': {e}", exc_info=True)
             return False
 
-    def read_messages(self, num_messages_to_capture: int = 20, scroll_attempts: int = 0) -> List[Dict]:
-        self.logger.info(f"Reading up to {num_messages_to_capture} messages (scroll attempts: {scroll_attempts})...")
+    def _extract_visible_messages(self, page: Optional[Page] = None) -> List[Dict]:
+        """
+        Extracts sender/text/timestamp of every bubble in the DOM with a single evaluate_all round trip.
+
+        Message ids hash the sender, the (minute-resolution) timestamp and the start of the text.
+        Bubbles with the same key, e.g. a message repeated within a minute, are told apart by their
+        ordinal among the identical keys in the list; the first keeps the plain key, so ids stored
+        as cursors or ledger entries before the ordinal was added still match.
+        """
+        page = page or self.page
+        raw_bubbles = page.locator(self.CONCEPTUAL_SELECTORS["message_bubble_role"]).evaluate_all(
+            self._BUBBLE_EXTRACT_JS, {
+                "sender": self.CONCEPTUAL_SELECTORS["message_sender_selector"],
+                "text": self.CONCEPTUAL_SELECTORS["message_text_selector"],
+                "timestamp": self.CONCEPTUAL_SELECTORS["message_timestamp_selector"],
+            })
+        messages: List[Dict] = []
+        key_counts: Dict[str, int] = {}
+        for i, bubble in enumerate(raw_bubbles or []):
+            sender = (bubble.get('sender') or "").strip() or "Unknown Sender"
+            text = (bubble.get('text') or "").strip()
+            timestamp_str = (bubble.get('timestamp') or "").strip() or "Unknown Time"
+            if not text and sender == "Unknown Sender":
+                self.logger.debug(f"Skipping message element {i+1} due to empty text and unknown sender.")
+                continue
+            msg_id_str = f"{sender}_{timestamp_str}_{text[:30]}"
+            ordinal = key_counts.get(msg_id_str, 0)
+            key_counts[msg_id_str] = ordinal + 1
+            if ordinal: msg_id_str = f"{msg_id_str}_{ordinal}"
+            msg_id = f"k_{hashlib.sha1(msg_id_str.encode('utf-8')).hexdigest()[:12]}"
+            messages.append({'id': msg_id, 'sender': sender, 'timestamp_str': timestamp_str, 'text': text})
+        return messages
+
+    def _scroll_message_area_up(self, page: Optional[Page] = None, settle: bool = True):
+        """Scrolls the message list to its top so the client loads older messages."""
+        page = page or self.page
+        page.locator(self.CONCEPTUAL_SELECTORS["message_area_container"]).evaluate("el => { el.scrollTop = 0; }")
+        if settle:
+            page.wait_for_timeout(self.SCROLL_SETTLE_MS)
+
+    def _load_until_marks(self, pages: Dict[str, Page], since_message_ids: Dict[str, Optional[str]],
+                          scroll_attempts: int) -> Dict[str, List[Dict]]:
+        """
+        Extracts the loaded messages of each page (keyed by chat) and scrolls up the pages whose
+        high-water mark is not loaded yet. All pending pages are scrolled before a single settle
+        wait, so the client renders older messages in every chat at once.
+        """
+        loaded = {key: self._extract_visible_messages(page) for key, page in pages.items()}
+        pending = [key for key in pages if since_message_ids.get(key)
+                   and all(m['id'] != since_message_ids[key] for m in loaded[key])]
+        attempts = 0
+        while pending and attempts < scroll_attempts:
+            attempts += 1
+            for key in pending:
+                self._scroll_message_area_up(pages[key], settle=False)
+            pages[pending[0]].wait_for_timeout(self.SCROLL_SETTLE_MS)
+            still_pending = []
+            for key in pending:
+                batch = self._extract_visible_messages(pages[key])
+                batch_ids = {m['id'] for m in batch}
+                # Virtualized lists may drop the newest bubbles while scrolling up; keep them.
+                merged = batch + [m for m in loaded[key] if m['id'] not in batch_ids]
+                if len(merged) == len(loaded[key]):
+                    self.logger.info(f"Reached the top of the chat history of '{key}' without finding the last read message.")
+                    continue
+                loaded[key] = merged
+                if all(m['id'] != since_message_ids[key] for m in merged):
+                    still_pending.append(key)
+            pending = still_pending
+        return loaded
+
+    def _messages_after_mark(self, loaded: List[Dict], since_message_id: Optional[str],
+                             num_messages_to_capture: int) -> List[Dict]:
+        if since_message_id:
+            mark_index = next((i for i, m in enumerate(loaded) if m['id'] == since_message_id), None)
+            if mark_index is not None:
+                loaded = loaded[mark_index + 1:]
+            else:
+                self.logger.warning(f"Last read message {since_message_id} not found in the loaded history.")
+        return loaded[-num_messages_to_capture:] if num_messages_to_capture else loaded
+
+    def read_messages(self, num_messages_to_capture: int = 20, scroll_attempts: int = 0,
+                      since_message_id: Optional[str] = None) -> List[Dict]:
+        """
+        Reads messages from the selected chat, oldest first.
+
+        Without `since_message_id`, returns the last `num_messages_to_capture` visible messages.
+        With it (the high-water mark from the previous run), scrolls up at most `scroll_attempts`
+        times until that message is in view and returns only the messages after it, capped to the
+        newest `num_messages_to_capture`. If the mark is never found (e.g. it was deleted), everything
+        loaded is treated as new.
+        """
+        self.logger.info(f"Reading up to {num_messages_to_capture} messages (scroll attempts: {scroll_attempts}, "
+                         f"since: {since_message_id or 'none'})...")
         if not self.page:
             self.logger.error("Page not available. A chat must be selected first.")
             return []
 
-        if scroll_attempts > 0:
-            self.logger.info(f"Scrolling ({scroll_attempts} attempts) is not yet implemented. Reading visible messages only.")
-
         messages: List[Dict] = []
         try:
-            message_elements_locator = self.page.locator(
-                self.CONCEPTUAL_SELECTORS["message_bubble_role"]
-            )
-            all_message_locators = message_elements_locator.all()
-            self.logger.info(f"Found {len(all_message_locators)} potential message elements in DOM using conceptual selector.")
-            elements_to_process = all_message_locators[-num_messages_to_capture:]
-
-            for i, msg_locator in enumerate(elements_to_process):
-                try:
-                    sender_loc = msg_locator.locator(self.CONCEPTUAL_SELECTORS["message_sender_selector"])
-                    text_loc = msg_locator.locator(self.CONCEPTUAL_SELECTORS["message_text_selector"])
-                    timestamp_loc = msg_locator.locator(self.CONCEPTUAL_SELECTORS["message_timestamp_selector"])
-
-                    sender = sender_loc.text_content(timeout=500).strip() if sender_loc.count() > 0 else "Unknown Sender"
-                    text = text_loc.text_content(timeout=500).strip() if text_loc.count() > 0 else ""
-                    timestamp_str = timestamp_loc.text_content(timeout=500).strip() if timestamp_loc.count() > 0 else "Unknown Time"
-
-                    if not text and sender == "Unknown Sender":
-                        self.logger.debug(f"Skipping message element {i+1} due to empty text and unknown sender.")
-                        continue
-
-                    msg_id_str = f"{sender}_{timestamp_str}_{text[:30]}"
-                    msg_id = f"k_{hashlib.sha1(msg_id_str.encode('utf-8')).hexdigest()[:12]}"
-
-                    messages.append({'id': msg_id, 'sender': sender, 'timestamp_str': timestamp_str, 'text': text})
-                    self.logger.debug(f"Extracted: Sender='{sender}', Time='{timestamp_str}', Text='{text[:30].replace(chr(10), ' ')}...'")
-                except PlaywrightError as e_msg:
-                    self.logger.warning(f"Playwright error extracting details for a message element: {e_msg}")
-                except Exception as e_u:
-                    self.logger.warning(f"Unexpected error extracting details for a message element: {e_u}", exc_info=True)
-
+            key = "selected chat"
+            loaded = self._load_until_marks({key: self.page}, {key: since_message_id}, scroll_attempts)[key]
+            self.logger.info(f"Found {len(loaded)} messages in DOM.")
+            messages = self._messages_after_mark(loaded, since_message_id, num_messages_to_capture)
             self.logger.info(f"Successfully extracted {len(messages)} messages.")
         except PlaywrightError as e:
             self.logger.error(f"Playwright error locating message list or messages: {e}")
@@ -400,9 +896,73 @@ class KakaoAgent:
             self.logger.error(f"Unexpected error reading messages: {e}", exc_info=True)
         return messages
 
+    def _pool_page(self, index: int) -> Page:
+        """Returns page `index` of the page pool, opening it in the shared browser context on first use."""
+        while len(self.page_pool) <= index:
+            if not self.page_pool:
+                self.page_pool.append(self.page)
+                continue
+            page = self.context.new_page()
+            if self.page.url and self.page.url != "about:blank":
+                page.goto(self.page.url)
+            self.page_pool.append(page)
+        return self.page_pool[index]
+
+    def read_chats(self, chat_names: List[str], since_message_ids: Optional[Dict[str, Optional[str]]] = None,
+                   num_messages_to_capture: int = 20, scroll_attempts: int = 0,
+                   pool_size: int = 1) -> Dict[str, Tuple[List[Dict], Optional[str]]]:
+        """
+        Reads several chats through a pool of up to `pool_size` pages in the same browser context.
+
+        Each chat in a group of `pool_size` chats is opened on its own page, so the chats are
+        selected and scrolled side by side instead of one after another on a single page.
+        `since_message_ids` maps chat name to its high-water mark (see read_messages).
+
+        Returns:
+            {chat_name: (messages, error_message)}, in `chat_names` order. A chat that could not be
+            selected or read has an empty message list and an error; the other chats are unaffected.
+        """
+        since_message_ids = since_message_ids or {}
+        results: Dict[str, Tuple[List[Dict], Optional[str]]] = {}
+        if not self.page or not self.context:
+            self.logger.error("Page not available. Login must be successful first.")
+            return {chat: ([], "KakaoTalk browser page is not available.") for chat in chat_names}
+
+        pool_size = max(1, pool_size)
+        for start in range(0, len(chat_names), pool_size):
+            group = chat_names[start:start + pool_size]
+            pages: Dict[str, Page] = {}
+            try:
+                for i, chat in enumerate(group):
+                    page = self._pool_page(i)
+                    if self.select_chat(chat, page=page):
+                        pages[chat] = page
+                    else:
+                        results[chat] = ([], f"Failed to select KakaoTalk chat: '{chat}'.")
+                loaded = self._load_until_marks(pages, since_message_ids, scroll_attempts)
+                for chat in pages:
+                    messages = self._messages_after_mark(loaded[chat], since_message_ids.get(chat), num_messages_to_capture)
+                    self.logger.info(f"Extracted {len(messages)} messages from chat '{chat}'.")
+                    results[chat] = (messages, None)
+            except PlaywrightError as e:
+                self.logger.error(f"Playwright error reading chats {group}: {e}")
+                # Includes the chats not reached yet, e.g. when opening a pool page failed.
+                for chat in group:
+                    results.setdefault(chat, ([], f"Playwright error reading KakaoTalk chat '{chat}': {e}"))
+            except Exception as e:
+                self.logger.error(f"Unexpected error reading chats {group}: {e}", exc_info=True)
+                for chat in group:
+                    results.setdefault(chat, ([], f"Unexpected error reading KakaoTalk chat '{chat}': {e}"))
+        return {chat: results[chat] for chat in chat_names}
+
     def close(self):
         self.logger.info("Closing browser resources...")
         closed_something = False
+        for pool_page in self.page_pool:
+            if pool_page is self.page: continue
+            try: pool_page.close(); closed_something = True
+            except Exception as e: self.logger.error(f"Error closing pooled page: {e}", exc_info=True)
+        self.page_pool = []
         if self.page:
             try: self.page.close(); closed_something = True; self.logger.debug("Page closed.")
             except Exception as e: self.logger.error(f"Error closing page: {e}", exc_info=True)
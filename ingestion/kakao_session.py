@@ -0,0 +1,128 @@
+# ingestion/kakao_session.py
+"""
+Long-lived KakaoTalk browser session shared across scheduler ticks.
+
+Starting Playwright, launching Chromium and logging in takes seconds, so instead of doing it on
+every pipeline run the session manager keeps one KakaoAgent alive for the life of the process.
+Each run probes it with KakaoAgent.is_healthy() and relaunches only if the probe fails.
+
+Playwright's sync API is bound to the thread that started it, while APScheduler runs jobs on
+pool threads, so all browser work happens on one dedicated session thread:
+
+    messages = get_kakao_session_manager().run(lambda agent: agent.read_messages())
+"""
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Optional, TypeVar
+
+from playwright.sync_api import sync_playwright, Error as PlaywrightError
+
+import config
+from ingestion.agents import KakaoAgent
+
+logger = logging.getLogger(f"agenda_manager.{__name__}")
+
+T = TypeVar("T")
+
+
+class KakaoSessionError(Exception):
+    """Raised when the KakaoTalk browser session cannot be (re)launched."""
+
+
+class KakaoSessionManager:
+    """
+    Owns one Playwright driver and one logged-in KakaoAgent on a dedicated thread.
+
+    Args:
+        user_data_dir: Passed to KakaoAgent for a persistent browser profile.
+        headless: Passed to KakaoAgent.
+        playwright_factory: Zero-argument callable returning a started sync Playwright instance.
+                            Defaults to `sync_playwright().start()`.
+    """
+
+    def __init__(self, user_data_dir: Optional[str] = None, headless: bool = False,
+                 playwright_factory: Optional[Callable] = None):
+        self.user_data_dir = user_data_dir
+        self.headless = headless
+        self.playwright_factory = playwright_factory or (lambda: sync_playwright().start())
+        self.agent: Optional[KakaoAgent] = None
+        self.launch_count = 0
+        self._playwright = None
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="kakao-session")
+
+    def run(self, operation: Callable[[KakaoAgent], T]) -> T:
+        """Runs `operation(agent)` on the session thread with a healthy, logged-in agent and returns its result."""
+        return self._executor.submit(self._run_on_session_thread, operation).result()
+
+    def close(self):
+        """Closes the browser, stops Playwright and the session thread."""
+        try:
+            self._executor.submit(self._teardown).result()
+        finally:
+            self._executor.shutdown(wait=True)
+
+    # --- Session thread only ---
+
+    def _run_on_session_thread(self, operation: Callable[[KakaoAgent], T]) -> T:
+        agent = self._ensure_agent()
+        try:
+            return operation(agent)
+        except PlaywrightError:
+            # The browser may be gone; the next run relaunches instead of probing a dead session.
+            self._teardown()
+            raise
+
+    def _ensure_agent(self) -> KakaoAgent:
+        if self.agent is not None:
+            if self.agent.is_healthy():
+                logger.info("Reusing warm KakaoTalk browser session.")
+                return self.agent
+            logger.warning("KakaoTalk browser session is unhealthy. Relaunching...")
+            self._teardown()
+
+        if self._playwright is None:
+            self._playwright = self.playwright_factory()
+        agent = KakaoAgent(playwright_instance=self._playwright, user_data_dir=self.user_data_dir, headless=self.headless)
+        if not agent.login():
+            agent.close()
+            self._stop_playwright()
+            raise KakaoSessionError("KakaoTalk login/setup failed by agent.")
+        self.agent = agent
+        self.launch_count += 1
+        return agent
+
+    def _teardown(self):
+        if self.agent is not None:
+            self.agent.close()
+            self.agent = None
+        self._stop_playwright()
+
+    def _stop_playwright(self):
+        if self._playwright is not None:
+            try: self._playwright.stop()
+            except Exception as e: logger.error(f"Error stopping Playwright: {e}")
+            self._playwright = None
+
+
+_session_manager: Optional[KakaoSessionManager] = None
+_session_manager_lock = threading.Lock()
+
+
+def get_kakao_session_manager() -> KakaoSessionManager:
+    """Returns the process-wide session manager, creating it from config on first use."""
+    global _session_manager
+    with _session_manager_lock:
+        if _session_manager is None:
+            _session_manager = KakaoSessionManager(user_data_dir=config.KAKAOTALK_USER_DATA_DIR,
+                                                   headless=config.KAKAOTALK_HEADLESS)
+        return _session_manager
+
+
+def shutdown_kakao_session_manager():
+    """Closes the process-wide session, if one was started. Called when the scheduler exits."""
+    global _session_manager
+    with _session_manager_lock:
+        manager, _session_manager = _session_manager, None
+    if manager is not None:
+        manager.close()
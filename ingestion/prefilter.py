@@ -0,0 +1,93 @@
+# ingestion/prefilter.py
+"""
+Metadata-only prefilter for Gmail ingestion.
+
+GmailAgent asks this filter about each listed message using a `format='metadata'` response
+(From and Subject headers plus labelIds), and only messages it keeps are fetched with
+`format='full'`. This avoids downloading whole MIME trees for mail that would never become
+a task, such as promotions, social notifications or newsletters.
+"""
+import re
+from email.utils import parseaddr
+from typing import Iterable, List, Optional
+
+import config
+
+
+def _split_csv(value: Optional[str]) -> List[str]:
+    return [item.strip() for item in (value or "").split(",") if item.strip()]
+
+
+class GmailPrefilter:
+    # Headers requested with metadataHeaders and the partial-response mask for the metadata pass.
+    METADATA_HEADERS = ['From', 'Subject']
+    METADATA_FIELDS = 'id,labelIds,sizeEstimate,payload/headers'
+
+    def __init__(self, sender_allowlist: Optional[Iterable[str]] = None,
+                 sender_denylist: Optional[Iterable[str]] = None,
+                 skip_labels: Optional[Iterable[str]] = None,
+                 skip_subject_patterns: Optional[Iterable[str]] = None):
+        """
+        Args:
+            sender_allowlist: Addresses or domains always fetched in full, bypassing the other rules.
+            sender_denylist: Addresses or domains never fetched in full.
+            skip_labels: Gmail label IDs (e.g. 'CATEGORY_PROMOTIONS') whose messages are skipped.
+            skip_subject_patterns: Case-insensitive regular expressions; a matching subject is skipped.
+        """
+        self.sender_allowlist = [s.lower() for s in (sender_allowlist or [])]
+        self.sender_denylist = [s.lower() for s in (sender_denylist or [])]
+        self.skip_labels = {label.upper() for label in (skip_labels or [])}
+        self.skip_subject_patterns = [re.compile(p, re.IGNORECASE) for p in (skip_subject_patterns or [])]
+
+    @classmethod
+    def from_config(cls) -> "GmailPrefilter":
+        """Builds a prefilter from the GMAIL_* prefilter settings in config.py."""
+        return cls(
+            sender_allowlist=_split_csv(config.GMAIL_SENDER_ALLOWLIST),
+            sender_denylist=_split_csv(config.GMAIL_SENDER_DENYLIST),
+            skip_labels=_split_csv(config.GMAIL_SKIP_LABELS),
+            skip_subject_patterns=_split_csv(config.GMAIL_SKIP_SUBJECT_PATTERNS),
+        )
+
+    @staticmethod
+    def _sender_matches(address: str, entries: List[str]) -> bool:
+        """True if `address` equals an entry, or its domain is (a subdomain of) an entry's domain."""
+        if not address:
+            return False
+        domain = address.rpartition('@')[2]
+        for entry in entries:
+            if '@' in entry and not entry.startswith('@'):
+                if address == entry: return True
+                continue
+            entry_domain = entry.lstrip('@')
+            if domain == entry_domain or domain.endswith('.' + entry_domain):
+                return True
+        return False
+
+    def evaluate(self, metadata: dict) -> Optional[str]:
+        """
+        Decides whether a message is worth a full fetch.
+
+        Args:
+            metadata: A `users.messages.get(format='metadata')` response.
+
+        Returns:
+            A short reason string if the message should be skipped, otherwise None.
+        """
+        headers = {h['name'].lower(): h['value'] for h in metadata.get('payload', {}).get('headers', [])}
+        sender_address = parseaddr(headers.get('from', ''))[1].lower()
+
+        if self._sender_matches(sender_address, self.sender_allowlist):
+            return None
+        if self._sender_matches(sender_address, self.sender_denylist):
+            return f"sender {sender_address} is denylisted"
+
+        matched_labels = self.skip_labels.intersection(metadata.get('labelIds', []))
+        if matched_labels:
+            return f"label {sorted(matched_labels)[0]}"
+
+        subject = headers.get('subject', '')
+        for pattern in self.skip_subject_patterns:
+            if pattern.search(subject):
+                return f"subject matches '{pattern.pattern}'"
+        return None
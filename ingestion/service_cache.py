@@ -0,0 +1,113 @@
+# ingestion/service_cache.py
+"""
+Process-level cache of authenticated Gmail API services.
+
+Building a service means a DB read of the SourceToken, possibly reading credentials.json,
+reconstructing Credentials and parsing the discovery document. GmailAgent.authenticate_gmail
+stores the result here per app user, so later pipeline runs in the same process (scheduler
+ticks, CLI commands) reuse it until shortly before the access token expires. A daemon timer
+refreshes the token ahead of expiry so a warm entry rarely goes stale.
+"""
+import threading
+from datetime import datetime, timedelta
+from typing import Callable, Dict, Optional, Tuple
+
+from google.auth.transport.requests import Request as GoogleAuthRequest
+
+import config
+
+
+class _CacheEntry:
+    def __init__(self, service, credentials, on_refresh: Optional[Callable]):
+        self.service = service
+        self.credentials = credentials
+        self.on_refresh = on_refresh
+        self.timer: Optional[threading.Timer] = None
+
+
+class GmailServiceCache:
+    """
+    Thread-safe map of app_user_id -> (service, credentials).
+
+    Args:
+        refresh_ahead_s: Entries are treated as stale this many seconds before `credentials.expiry`,
+                         and the background refresh fires at that point.
+        background_refresh: If False, no refresh timers are started; stale entries are simply misses.
+    """
+
+    def __init__(self, refresh_ahead_s: float = 300.0, background_refresh: bool = True):
+        self.refresh_ahead_s = refresh_ahead_s
+        self.background_refresh = background_refresh
+        self._entries: Dict[str, _CacheEntry] = {}
+        self._lock = threading.Lock()
+
+    def _seconds_until_stale(self, credentials) -> Optional[float]:
+        """Seconds until the entry must not be served any more; None if the token has no expiry."""
+        expiry = getattr(credentials, 'expiry', None)
+        if not isinstance(expiry, datetime):
+            return None
+        return (expiry - timedelta(seconds=self.refresh_ahead_s) - datetime.utcnow()).total_seconds()
+
+    def get(self, app_user_id: str) -> Optional[Tuple[object, object]]:
+        """Returns the cached (service, credentials) for `app_user_id`, or None if absent or close to expiry."""
+        with self._lock:
+            entry = self._entries.get(app_user_id)
+        if entry is None:
+            return None
+        seconds_left = self._seconds_until_stale(entry.credentials)
+        if not entry.credentials.valid or (seconds_left is not None and seconds_left <= 0):
+            self.invalidate(app_user_id)
+            return None
+        return entry.service, entry.credentials
+
+    def put(self, app_user_id: str, service, credentials, on_refresh: Optional[Callable] = None):
+        """
+        Caches a service built from `credentials`. `on_refresh(app_user_id, credentials)` is called
+        after each successful background refresh, e.g. to persist the new access token.
+        """
+        entry = _CacheEntry(service, credentials, on_refresh)
+        with self._lock:
+            previous = self._entries.pop(app_user_id, None)
+            self._entries[app_user_id] = entry
+        if previous and previous.timer: previous.timer.cancel()
+        self._schedule_refresh(app_user_id, entry)
+
+    def invalidate(self, app_user_id: str):
+        with self._lock:
+            entry = self._entries.pop(app_user_id, None)
+        if entry and entry.timer: entry.timer.cancel()
+
+    def clear(self):
+        with self._lock:
+            entries = list(self._entries.values())
+            self._entries.clear()
+        for entry in entries:
+            if entry.timer: entry.timer.cancel()
+
+    def _schedule_refresh(self, app_user_id: str, entry: _CacheEntry):
+        if not self.background_refresh or not getattr(entry.credentials, 'refresh_token', None):
+            return
+        seconds_left = self._seconds_until_stale(entry.credentials)
+        if seconds_left is None:
+            return
+        entry.timer = threading.Timer(max(0.0, seconds_left), self._refresh, args=(app_user_id, entry))
+        entry.timer.daemon = True
+        entry.timer.start()
+
+    def _refresh(self, app_user_id: str, entry: _CacheEntry):
+        with self._lock:
+            if self._entries.get(app_user_id) is not entry:
+                return # Replaced or invalidated since the timer was scheduled
+        try:
+            entry.credentials.refresh(GoogleAuthRequest())
+            print(f"Gmail token for '{app_user_id}' refreshed ahead of expiry.")
+            if entry.on_refresh: entry.on_refresh(app_user_id, entry.credentials)
+        except Exception as e:
+            print(f"Background refresh of Gmail token for '{app_user_id}' failed: {e}. Dropping cached service.")
+            self.invalidate(app_user_id)
+            return
+        self._schedule_refresh(app_user_id, entry)
+
+
+# Shared by every GmailAgent in the process.
+gmail_service_cache = GmailServiceCache(refresh_ahead_s=config.GMAIL_TOKEN_REFRESH_AHEAD_S)
@@ -0,0 +1,211 @@
+# ingestion/stub_transport.py
+"""
+Offline stand-in for the httplib2 transport used by googleapiclient.
+
+`RecordedGmailTransport` answers Gmail `messages.list` (with page tokens), `messages.get` and
+batch (`multipart/mixed`) requests from a dict of recorded `format='full'`
+message payloads (deriving `format='metadata'` responses and honoring simple `fields=` masks), so `GmailAgent` can be exercised and benchmarked without a
+network connection or real credentials:
+
+    transport = RecordedGmailTransport.from_recording('gmail_recording.json', latency_s=0.05)
+    agent = GmailAgent()
+    agent.service = build_stub_gmail_service(transport)
+    emails = agent.fetch_messages(max_results=500, batch_size=50)
+"""
+import json
+import base64
+import time
+import threading
+from email.parser import FeedParser
+from urllib.parse import urlparse, parse_qs, unquote
+from typing import Dict, List, Optional
+
+import httplib2
+from googleapiclient.discovery import build
+
+
+class RecordedGmailTransport:
+    """
+    Minimal httplib2.Http look-alike serving recorded Gmail API responses.
+
+    Args:
+        messages: Mapping of message ID -> recorded `users.messages.get(format='full')` response.
+                  Insertion order is used as the mailbox order for list calls (newest first).
+        latency_s: Simulated network round-trip time added to every HTTP request.
+        fail_once: Mapping of message ID -> HTTP status returned the first time that message is
+                   requested (e.g. {'msg7': 429}); later requests for it succeed. Used to
+                   exercise retry paths.
+    """
+
+    def __init__(self, messages: Dict[str, dict], latency_s: float = 0.0,
+                 fail_once: Optional[Dict[str, int]] = None):
+        self.messages = dict(messages)
+        self.latency_s = latency_s
+        self.fail_once = dict(fail_once or {})
+        self.round_trips = 0
+        self.bytes_sent = 0
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_recording(cls, path: str, **kwargs) -> "RecordedGmailTransport":
+        """Loads a recording written by `save_recording`."""
+        with open(path, 'r', encoding='utf-8') as f:
+            recording = json.load(f)
+        return cls(recording.get('messages', {}), **kwargs)
+
+    # --- httplib2.Http interface ---
+
+    def request(self, uri, method="GET", body=None, headers=None, redirections=1, connection_type=None):
+        with self._lock:
+            self.round_trips += 1
+        if self.latency_s:
+            time.sleep(self.latency_s)
+
+        parsed = urlparse(uri)
+        if method == "POST" and parsed.path.startswith('/batch'):
+            status, content_type, content = self._handle_batch(body, headers or {})
+        else:
+            status, content = self._handle_single(method, parsed.path, parse_qs(parsed.query))
+            content_type = 'application/json; charset=UTF-8'
+
+        content_bytes = content.encode('utf-8')
+        with self._lock:
+            self.bytes_sent += len(content_bytes)
+        return httplib2.Response({'status': str(status), 'content-type': content_type}), content_bytes
+
+    def close(self):
+        return None
+
+    # --- Request handlers ---
+
+    def _handle_single(self, method: str, path: str, query: dict) -> tuple:
+        # Paths look like /gmail/v1/users/{userId}/messages[/{id}]
+        segments = [unquote(s) for s in path.strip('/').split('/')]
+        if method != "GET" or len(segments) < 5 or segments[:2] != ['gmail', 'v1'] or segments[4] != 'messages':
+            return 404, self._error_body(404, f"Stub transport has no route for {method} {path}")
+
+        if len(segments) == 5:
+            return 200, json.dumps(self._list_messages(query))
+
+        msg_id = segments[5]
+        with self._lock:
+            forced_status = self.fail_once.pop(msg_id, None)
+        if forced_status:
+            return forced_status, self._error_body(forced_status, f"Simulated failure for {msg_id}")
+        if msg_id not in self.messages:
+            return 404, self._error_body(404, "Requested entity was not found.")
+        message = self.messages[msg_id]
+        if query.get('format', ['full'])[0] == 'metadata':
+            message = self._metadata_view(message, query.get('metadataHeaders', []))
+        if 'fields' in query:
+            message = self._select_fields(message, query['fields'][0])
+        return 200, json.dumps(message)
+
+    @staticmethod
+    def _metadata_view(message: dict, metadata_headers: List[str]) -> dict:
+        wanted = {h.lower() for h in metadata_headers}
+        view = {k: v for k, v in message.items() if k not in ('payload', 'raw')}
+        payload = message.get('payload', {})
+        view['payload'] = {
+            'mimeType': payload.get('mimeType'),
+            'headers': [h for h in payload.get('headers', []) if not wanted or h['name'].lower() in wanted],
+        }
+        return view
+
+    @staticmethod
+    def _select_fields(message: dict, fields: str) -> dict:
+        """Applies a partial-response mask made of comma-separated `a/b` paths (no parenthesized sub-selections)."""
+        selected: dict = {}
+        for path in (f.strip() for f in fields.split(',') if f.strip()):
+            keys = path.split('/')
+            source, target = message, selected
+            for key in keys[:-1]:
+                if not isinstance(source, dict) or key not in source: break
+                source = source[key]
+                target = target.setdefault(key, {})
+            else:
+                if isinstance(source, dict) and keys[-1] in source:
+                    target[keys[-1]] = source[keys[-1]]
+        return selected
+
+    def _list_messages(self, query: dict) -> dict:
+        max_results = int(query.get('maxResults', ['100'])[0])
+        offset = int(query.get('pageToken', ['0'])[0])
+        all_ids = list(self.messages.keys())
+        ids = all_ids[offset:offset + max_results]
+        response = {'resultSizeEstimate': len(all_ids)}
+        if ids:
+            response['messages'] = [{'id': mid, 'threadId': self.messages[mid].get('threadId', mid)} for mid in ids]
+        if offset + max_results < len(all_ids):
+            response['nextPageToken'] = str(offset + max_results)
+        return response
+
+    def _handle_batch(self, body: str, headers: dict) -> tuple:
+        content_type = headers.get('content-type', '')
+        parser = FeedParser()
+        parser.feed(f"content-type: {content_type}\r\n\r\n{body}")
+        batch_message = parser.close()
+
+        boundary = "stub_batch_boundary"
+        response_parts = []
+        for part in batch_message.get_payload():
+            content_id = part['Content-ID']
+            request_line = part.get_payload().split('\n', 1)[0]
+            method, request_target, _ = request_line.split(' ', 2)
+            parsed = urlparse(request_target)
+            status, content = self._handle_single(method, parsed.path, parse_qs(parsed.query))
+            response_parts.append(
+                f"--{boundary}\r\n"
+                f"Content-Type: application/http\r\n"
+                f"Content-ID: <response-{content_id[1:-1]}>\r\n\r\n"
+                f"HTTP/1.1 {status} {'OK' if status < 300 else 'Error'}\r\n"
+                f"Content-Type: application/json; charset=UTF-8\r\n\r\n"
+                f"{content}\r\n"
+            )
+        response_parts.append(f"--{boundary}--\r\n")
+        return 200, f'multipart/mixed; boundary="{boundary}"', "".join(response_parts)
+
+    @staticmethod
+    def _error_body(status: int, message: str) -> str:
+        return json.dumps({'error': {'code': status, 'message': message}})
+
+
+def build_stub_gmail_service(transport: RecordedGmailTransport):
+    """Builds a Gmail API service object bound to the stub transport, using the bundled discovery document."""
+    return build('gmail', 'v1', http=transport, static_discovery=True, cache_discovery=False)
+
+
+def save_recording(path: str, messages: List[dict]):
+    """Writes `format='full'` message payloads (e.g. captured from a live run) to a recording file."""
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump({'messages': {m['id']: m for m in messages}}, f, ensure_ascii=False)
+
+
+def synthetic_message(index: int, body_chars: int = 2000, label_ids: Optional[List[str]] = None) -> dict:
+    """Generates a plausible multipart/alternative `format='full'` payload for benchmarks."""
+    msg_id = f"synthetic{index:06d}"
+    text = (f"Reminder {index}: project sync meeting tomorrow at 3pm. " * (body_chars // 55 + 1))[:body_chars]
+    html = f"<html><body><p>{text}</p></body></html>"
+
+    def b64(s: str) -> str:
+        return base64.urlsafe_b64encode(s.encode('utf-8')).decode('ascii')
+
+    return {
+        'id': msg_id, 'threadId': f"thread{index:06d}", 'labelIds': label_ids or ['INBOX', 'UNREAD'],
+        'snippet': text[:100], 'internalDate': str(1700000000000 + index * 1000),
+        'sizeEstimate': len(text) + len(html),
+        'payload': {
+            'mimeType': 'multipart/alternative',
+            'headers': [
+                {'name': 'Subject', 'value': f"Synthetic message {index}"},
+                {'name': 'From', 'value': f"sender{index % 17}@example.com"},
+                {'name': 'To', 'value': "me@example.com"},
+                {'name': 'Date', 'value': "Mon, 13 Nov 2023 10:00:00 +0900"},
+                {'name': 'Message-ID', 'value': f"<{msg_id}@example.com>"},
+            ],
+            'parts': [
+                {'mimeType': 'text/plain', 'body': {'size': len(text), 'data': b64(text)}},
+                {'mimeType': 'text/html', 'body': {'size': len(html), 'data': b64(html)}},
+            ],
+        },
+    }
@@ -1,35 +1,365 @@
-from datetime import datetime, timedelta, time as dt_time, date
+from datetime import datetime, timedelta, date
 import sys
 import time
+import itertools
 import typer
-from typing import Dict, Any, Optional # Ensure Dict, Any, Optional are imported
+from typing import Dict, Any, List, Optional # Ensure Dict, Any, Optional are imported
 
 # APScheduler Imports
 from apscheduler.schedulers.blocking import BlockingScheduler
 from apscheduler.triggers.cron import CronTrigger
 
 # Project module imports
-from ingestion.agents import GmailAgent, KakaoAgent
-from preprocessing.normalizer import normalize as normalize_text
+from ingestion.agents import GmailAgent, KakaoAgent, HistoryIdExpiredError
+from ingestion.prefilter import GmailPrefilter
+from ingestion.kakao_session import KakaoSessionError, get_kakao_session_manager, shutdown_kakao_session_manager
+from preprocessing.normalizer import normalize_with_stats
+from preprocessing.budget import budget_content
 from extract_nlp.classifiers import TaskClassifier, resolve_date
+from extract_nlp.cache import get_classification_cache
+from extract_nlp.rate_limit import AdaptiveRateLimiter
+from extract_nlp.gate import PreClassifier, bulk_headers_of
 from extract_nlp.utils import generate_task_fingerprint
+from dedup_conflict.fingerprints import get_fingerprint_index
+from dedup_conflict.resolver import tag_new_task_conflicts
 from openai import OpenAIError
 
-from persistence.database import SessionLocal, create_db_tables
+from persistence.database import SessionLocal, begin_write, create_db_tables
 from persistence import crud as persistence_crud
 from persistence.models import TaskStatus
 
 from scheduler.jobs import scheduled_job
 from cli.main_cli import app as cli_app
 
-from playwright.sync_api import sync_playwright, Playwright, PlaywrightError
+from playwright.sync_api import sync_playwright, Playwright, Error as PlaywrightError
 
+import config
 
-def run_gmail_ingestion_pipeline(app_user_id: str = "default_user") -> Dict[str, Any]:
+
+def gmail_fetch_options() -> Dict[str, Any]:
+    """Detail-fetch settings (batching or concurrent workers) passed to GmailAgent from config."""
+    return {
+        "batch_size": config.GMAIL_FETCH_BATCH_SIZE or None,
+        "max_workers": config.GMAIL_FETCH_WORKERS or None,
+        "rate_limit_per_s": config.GMAIL_FETCH_RATE_LIMIT_PER_S or None,
+    }
+
+
+def _fetch_gmail_emails(gmail_agent: GmailAgent, db, app_user_id: str, incremental: bool):
+    """
+    Fetches the emails a pipeline run should process.
+
+    In incremental mode with a stored historyId cursor, only messages added since that cursor
+    are pulled. Without a cursor (first run) the last day is listed; with an expired cursor a
+    bounded resync of the last GMAIL_RESYNC_DAYS days is done instead.
+
+    Returns:
+        (emails, latest_history_id, sync_mode) where emails is an iterable that may stream pages
+        lazily, and latest_history_id is the cursor to store once the emails are processed
+        (None when nothing should be stored).
+    """
+    fetch_options = gmail_fetch_options()
+    stored_history_id = None
+    if incremental:
+        try:
+            cursor = persistence_crud.get_sync_cursor(db, user_identifier=app_user_id, platform='gmail')
+            stored_history_id = cursor.cursor_value if cursor else None
+        except Exception as e:
+            print(f"Error reading Gmail sync cursor for '{app_user_id}': {e}. Falling back to date-based fetch.")
+
+    if stored_history_id:
+        try:
+            emails, latest_history_id = gmail_agent.fetch_messages_since_history(
+                stored_history_id, **fetch_options)
+            return emails, latest_history_id, "incremental"
+        except HistoryIdExpiredError as e:
+            print(f"{e} Falling back to a full resync of the last {config.GMAIL_RESYNC_DAYS} day(s).")
+            since_date = date.today() - timedelta(days=config.GMAIL_RESYNC_DAYS)
+            max_results, sync_mode = config.GMAIL_RESYNC_MAX_RESULTS, "resync"
+    else:
+        since_date = date.today() - timedelta(days=1)
+        max_results, sync_mode = 500, "full"
+
+    # Read the cursor before listing so mail arriving during this run is picked up next time.
+    latest_history_id = gmail_agent.get_current_history_id() if incremental else None
+    since_date_str_for_gmail = since_date.strftime("%Y/%m/%d")
+    print(f"Fetching Gmail emails after: {since_date_str_for_gmail}")
+    emails = gmail_agent.iter_messages(
+        since_date_str=since_date_str_for_gmail, max_results=max_results,
+        page_size=config.GMAIL_LIST_PAGE_SIZE, prefetch=config.GMAIL_LIST_PREFETCH, **fetch_options
+    )
+    return emails, latest_history_id, sync_mode
+
+
+def _advance_gmail_cursor(db, app_user_id: str, latest_history_id: Optional[str]):
+    if not latest_history_id:
+        return
+    try:
+        begin_write(db)
+        persistence_crud.save_sync_cursor(db, user_identifier=app_user_id, platform='gmail',
+                                          cursor_value=latest_history_id)
+        print(f"Gmail sync cursor for '{app_user_id}' advanced to historyId {latest_history_id}.")
+    except Exception as e:
+        print(f"Error saving Gmail sync cursor for '{app_user_id}': {e}. Next run will re-fetch from the old cursor.")
+
+
+def _record_gmail_fetch_stats(result_summary: Dict[str, Any], gmail_agent: GmailAgent):
+    """
+    Copies the two-phase fetch byte counts into the pipeline summary. The saving is estimated as the
+    skipped messages' sizeEstimate minus the bytes spent on the metadata pass; sizeEstimate is the raw
+    RFC 822 size, so it understates what a base64-encoded format='full' response would have cost.
+    """
+    stats = dict(gmail_agent.fetch_stats)
+    bytes_fetched = stats.get('metadata_bytes', 0) + stats.get('full_bytes', 0)
+    bytes_without_prefilter = stats.get('full_bytes', 0) + stats.get('skipped_size_estimate_bytes', 0)
+    bytes_saved = bytes_without_prefilter - bytes_fetched
+    result_summary["prefilter_skipped"] = stats.get('prefilter_skipped', 0)
+    result_summary["bytes_fetched"] = bytes_fetched
+    result_summary["bytes_saved_estimate"] = bytes_saved
+    result_summary["bytes_reduction_pct"] = round(100.0 * bytes_saved / bytes_without_prefilter, 1) if bytes_without_prefilter else 0.0
+
+
+def _classifier_counters(task_classifier) -> Dict[str, int]:
+    usage = getattr(task_classifier, 'usage', None)
+    cache_stats = getattr(task_classifier, 'cache_stats', None)
+    if not isinstance(usage, dict) or not isinstance(cache_stats, dict):
+        return {}
+    return {"prompt_tokens": usage.get("prompt_tokens", 0),
+            "cache_hits": cache_stats.get("hits", 0), "cache_misses": cache_stats.get("misses", 0)}
+
+
+def _record_classifier_stats(result_summary: Dict[str, Any], task_classifier, since: Optional[Dict[str, int]] = None):
+    """
+    Records the prompt tokens the API reported and the classification cache hit rate into the
+    summary, counting only what happened after the `since` snapshot (from _classifier_counters).
+    """
+    counters = _classifier_counters(task_classifier)
+    if not counters:
+        return
+    since = since or {}
+    delta = {key: value - since.get(key, 0) for key, value in counters.items()}
+    lookups = delta["cache_hits"] + delta["cache_misses"]
+    result_summary["prompt_tokens"] = delta["prompt_tokens"]
+    result_summary["classification_cache_hits"] = delta["cache_hits"]
+    result_summary["classification_cache_hit_rate"] = round(delta["cache_hits"] / lookups, 3) if lookups else 0.0
+
+
+# Emails read ahead per classification window, per request slot (CLASSIFIER_CONCURRENCY requests of up
+# to CLASSIFIER_BATCH_SIZE emails). Each window is classified concurrently, then persisted in
+# mailbox order before the next is read.
+_CLASSIFY_WINDOW_PER_SLOT = 4
+
+
+def _print_batch_stats(task_classifier):
+    batch_stats = getattr(task_classifier, 'batch_stats', None)
+    if isinstance(batch_stats, dict) and batch_stats.get("batches"):
+        print(f"Batched classification: {batch_stats['batches']} request(s) for {batch_stats['batched_items']} item(s), "
+              f"{batch_stats['fallbacks']} re-classified one by one.")
+
+
+def _build_classifier_gate(db) -> PreClassifier:
+    """The pre-classifier gate, trained on recorded outcomes when CLASSIFIER_GATE_MODEL_ENABLED is on."""
+    outcomes = None
+    if config.CLASSIFIER_GATE_MODEL_ENABLED:
+        try: outcomes = persistence_crud.get_classification_outcomes(db)
+        except Exception as e: print(f"Could not load classification outcomes for the gate: {e}. Using hand-set weights.")
+    return PreClassifier.from_config(outcomes=outcomes)
+
+
+_GATED = object()
+
+
+def _prepare_gmail_item(index: int, email_data: Dict[str, Any], result_summary: Dict[str, Any],
+                        gate: Optional[PreClassifier] = None):
+    """
+    Selects, normalizes and budgets one email's content; returns None if there is nothing to
+    classify, or _GATED if the pre-classifier `gate` skips it.
+    """
+    print(f"\nProcessing Gmail email {index+1}: ID {email_data['id']}, Subject: '{email_data['headers'].get('subject', 'N/A')[:60]}...'")
+    content_to_process = ""
+    content_type_for_normalizer = "text/plain"
+    if email_data.get('body_plain', "").strip():
+        content_to_process = email_data['body_plain']
+    elif email_data.get('body_html', "").strip():
+        content_to_process = email_data['body_html']
+        content_type_for_normalizer = "text/html"
+    elif email_data.get('snippet', "").strip():
+        content_to_process = email_data['snippet']
+    else:
+        print("Email body/snippet empty. Skipping."); return None
+    if not content_to_process.strip():
+         print("Content empty after selection. Skipping."); return None
+
+    normalized_content, chars_removed = normalize_with_stats(content_to_process, content_type=content_type_for_normalizer)
+    result_summary["chars_removed"] += chars_removed
+    if chars_removed: print(f"Normalization removed {chars_removed} characters (emojis, quotes, signatures, footers).")
+    if not normalized_content.strip():
+        print("Content empty after normalization. Skipping."); return None
+    sender, subject = email_data['headers'].get('from', ''), email_data['headers'].get('subject', '')
+    bulk_headers = bulk_headers_of(email_data['headers'])
+    gate_score, gate_audited = None, False
+    if gate is not None:
+        send_to_llm, gate_score, gate_audited = gate.decide(normalized_content, sender, subject, bulk_headers)
+        if not send_to_llm:
+            print(f"Pre-classifier gate score {gate_score:.2f} is below {gate.threshold}. Skipping."); return _GATED
+        if gate_audited: print(f"Pre-classifier gate score {gate_score:.2f} is below {gate.threshold}; classifying as an audit sample.")
+    classifier_input, content_tokens, trimmed_tokens = budget_content(
+        normalized_content, subject=email_data['headers'].get('subject'), sender=email_data['headers'].get('from'))
+    result_summary["content_tokens_estimate"] += content_tokens
+    result_summary["tokens_trimmed_estimate"] += trimmed_tokens
+    if trimmed_tokens: print(f"Token budget: kept ~{content_tokens} tokens, trimmed ~{trimmed_tokens}.")
+    return {"email": email_data, "source_id": f"gmail_{email_data['id']}",
+            "normalized_content": normalized_content, "classifier_input": classifier_input,
+            "sender": sender, "subject": subject, "bulk_headers": bulk_headers,
+            "gate_score": gate_score, "gate_audited": gate_audited}
+
+
+def _record_classification_outcome(db, item: Dict[str, Any], classification_result: Optional[dict], task_classifier):
+    """Adds the classifier's answer for one email to the pending gate training data (errors are not answers)."""
+    if item["source_id"] in task_classifier.failed_source_ids:
+        return
+    try:
+        persistence_crud.save_classification_outcome(db, item["source_id"], {
+            "sender": item["sender"], "subject": item["subject"], "text_excerpt": item["normalized_content"][:2000],
+            "bulk_headers": ",".join(item["bulk_headers"]), "is_task": classification_result is not None,
+            "gate_score": item["gate_score"],
+        }, commit=False) # Committed with the window's tasks
+    except Exception as e:
+        print(f"Could not record classification outcome: {e}")
+
+
+def _record_gate_stats(result_summary: Dict[str, Any], gate: PreClassifier, audited_tasks: int):
+    result_summary["gate_skipped"] = gate.stats["skipped"]
+    result_summary["gate_skip_rate"] = round(gate.stats["skipped"] / gate.stats["scored"], 3) if gate.stats["scored"] else 0.0
+    result_summary["gate_audited"] = gate.stats["audited"]
+    result_summary["gate_false_negatives_estimate"] = round(gate.false_negatives_estimate(audited_tasks), 1)
+
+
+def _gmail_task_data(item: Dict[str, Any], classification_result: dict) -> Dict[str, Any]:
+    """Task row for one classified email, with its resolved due date and fingerprint."""
+    task_title_from_llm = classification_result['title']
+    due_datetime = None
+    if classification_result.get('due'):
+        due_datetime = resolve_date(classification_result['due'])
+
+    task_fingerprint = None
+    if task_title_from_llm:
+        try: task_fingerprint = generate_task_fingerprint(task_title_from_llm, due_datetime)
+        except ValueError as ve: print(f"FP Gen Error: {ve}")
+        except Exception as e_fp: print(f"Unexpected FP Gen Error: {e_fp}")
+
+    return {
+        "source": item["source_id"], "title": task_title_from_llm,
+        "body": classification_result.get('body', item["normalized_content"][:1000]),
+        "due_dt": due_datetime, "created_dt": datetime.utcnow(),
+        "status": TaskStatus.TODO, "fingerprint": task_fingerprint, "tags": None
+    } # The Task model has no column for the classifier's task type
+
+
+def _drop_duplicate_tasks(db, tasks_data: List[Dict[str, Any]], fingerprint_index=None) -> List[Dict[str, Any]]:
+    """
+    Drops task rows whose fingerprint is already stored or appears earlier in `tasks_data`. Stored
+    fingerprints are found with one IN query for the batch; with a fingerprint index, only those it
+    may contain are looked up.
+    """
+    candidates = [task_data["fingerprint"] for task_data in tasks_data if task_data["fingerprint"] and
+                  (fingerprint_index is None or fingerprint_index.might_contain(task_data["fingerprint"]))]
+    stored = persistence_crud.get_task_ids_by_fingerprints(db, candidates) if candidates else {}
+    kept, seen_fingerprints = [], set()
+    for task_data in tasks_data:
+        task_fingerprint = task_data["fingerprint"]
+        if task_fingerprint:
+            if task_fingerprint in seen_fingerprints:
+                print("Duplicate task earlier in this batch by FP. Skipping."); continue
+            if task_fingerprint in stored:
+                print(f"Duplicate task (ID: {stored[task_fingerprint]}) by FP. Skipping."); continue
+            seen_fingerprints.add(task_fingerprint)
+        kept.append(task_data)
+    return kept
+
+
+def _index_created_tasks(fingerprint_index, tasks_data: List[Dict[str, Any]], created: List[Any]):
+    """Adds the fingerprints of the committed rows (create_tasks_bulk results, None for skipped rows) to the index."""
+    if fingerprint_index is None: return
+    for task_data, task in zip(tasks_data, created):
+        if task: fingerprint_index.add(task_data["fingerprint"])
+
+
+def _add_task_outcomes(processed: Dict[str, str], classified_tasks: List[Dict[str, Any]],
+                       saved_tasks: List[Dict[str, Any]], created: List[Any]):
+    """Ledger outcomes of classified tasks: 'task' if saved, 'duplicate' if dropped by fingerprint; failed inserts are retried."""
+    saved_sources = {task_data["source"] for task_data in saved_tasks}
+    processed.update({task_data["source"]: "duplicate" for task_data in classified_tasks if task_data["source"] not in saved_sources})
+    processed.update({task_data["source"]: "task" for task_data, task in zip(saved_tasks, created) if task})
+
+
+def _drop_processed_sources(db, entries: List[Any], source_ids: List[Optional[str]],
+                            result_summary: Dict[str, Any]) -> List[Any]:
+    """
+    Drops the entries whose source id is in the processed-source ledger, with one lookup for the
+    batch; entries without a stable source id (None) are kept.
+    """
+    if not config.PROCESSED_SOURCE_LEDGER_ENABLED or not entries:
+        return entries
+    processed = persistence_crud.get_processed_source_ids(db, [source_id for source_id in source_ids if source_id])
+    kept = [entry for entry, source_id in zip(entries, source_ids) if not source_id or source_id not in processed]
+    if len(kept) < len(entries):
+        print(f"Skipping {len(entries) - len(kept)} message(s) already processed in an earlier run.")
+        result_summary["already_processed"] += len(entries) - len(kept)
+    return kept
+
+
+def _save_gmail_tasks(db, items: List[Dict[str, Any]], classification_results: List[Optional[dict]],
+                      result_summary: Dict[str, Any], fingerprint_index=None, processed: Optional[Dict[str, str]] = None) -> bool:
+    """
+    Saves one window of classified emails in a single transaction: skips fingerprint duplicates
+    (already stored or earlier in the window), inserts the rest with create_tasks_bulk, tags time
+    conflicts and commits once, together with anything else the window left pending on `db`.
+    `processed` (source id -> outcome, e.g. 'not_task') is completed with the window's saved and
+    duplicate tasks and recorded in the processed-source ledger in the same transaction.
+    Returns False if the transaction was rolled back, so the caller keeps its sync cursor.
+    """
+    tasks_data = []
+    for item, classification_result in zip(items, classification_results):
+        if not classification_result:
+            print(f"No task classified for email ID {item['email']['id']}."); continue
+        tasks_data.append(_gmail_task_data(item, classification_result))
+
+    try:
+        classified_tasks = tasks_data
+        tasks_data = _drop_duplicate_tasks(db, tasks_data, fingerprint_index)
+        created = persistence_crud.create_tasks_bulk(db, tasks_data, commit=False) if tasks_data else []
+        created_tasks = [task for task in created if task]
+        tag_new_task_conflicts(db, created_tasks)
+        if processed is not None:
+            _add_task_outcomes(processed, classified_tasks, tasks_data, created)
+            persistence_crud.record_processed_sources(db, processed, commit=False)
+        db.commit()
+        _index_created_tasks(fingerprint_index, tasks_data, created)
+        result_summary["tasks_created"] += len(created_tasks)
+        return True
+    except Exception as e_save:
+        db.rollback(); print(f"Error saving {len(tasks_data)} task(s): {e_save}")
+        return False
+
+
+def run_gmail_ingestion_pipeline(app_user_id: str = "default_user", incremental: Optional[bool] = None,
+                                 rate_limit_share: int = 1) -> Dict[str, Any]:
+    """
+    Ingests one Gmail account. `rate_limit_share` is the number of account pipelines running at
+    the same time (the scheduler passes its worker count); this run's classifier concurrency and
+    RPM/TPM limits are divided by it so the process as a whole stays within the OpenAI limits.
+    """
     result_summary = {
         "success": False, "source": "Gmail",
-        "items_processed": 0, "tasks_created": 0, "error": None
+        "items_processed": 0, "tasks_created": 0, "error": None, "sync_mode": None, "chars_removed": 0,
+        "content_tokens_estimate": 0, "tokens_trimmed_estimate": 0, "prompt_tokens": 0,
+        "classification_cache_hits": 0, "classification_cache_hit_rate": 0.0,
+        "gate_skipped": 0, "gate_skip_rate": 0.0, "gate_audited": 0, "gate_false_negatives_estimate": 0.0,
+        "already_processed": 0, "failed_items": 0
     }
+    if incremental is None:
+        incremental = config.GMAIL_INCREMENTAL_SYNC
     print(f"Starting Gmail ingestion pipeline for user: {app_user_id}...")
 
     gmail_agent = GmailAgent(credentials_file='credentials.json')
@@ -49,230 +379,407 @@ def run_gmail_ingestion_pipeline(app_user_id: str = "default_user") -> Dict[str,
     task_classifier = None
     try:
         print("Initializing TaskClassifier...")
-        task_classifier = TaskClassifier()
+        task_classifier = TaskClassifier(cache=get_classification_cache())
         print("TaskClassifier initialized successfully.")
     except Exception as e:
         error_msg = f"Error initializing TaskClassifier for Gmail pipeline: {e}"
         print(error_msg); result_summary["error"] = error_msg
         return result_summary
 
-    today_date = date.today()
-    yesterday_date = today_date - timedelta(days=1)
-    since_date_str_for_gmail = yesterday_date.strftime("%Y/%m/%d")
+    if config.GMAIL_PREFILTER_ENABLED:
+        gmail_agent.prefilter = GmailPrefilter.from_config()
 
-    print(f"Fetching Gmail emails after: {since_date_str_for_gmail}")
-    fetched_emails = gmail_agent.fetch_messages(since_date_str=since_date_str_for_gmail, max_results=500)
-    result_summary["items_processed"] = len(fetched_emails)
+    db = SessionLocal()
+    try:
+        fetched_emails, latest_history_id, sync_mode = _fetch_gmail_emails(gmail_agent, db, app_user_id, incremental)
+        result_summary["sync_mode"] = sync_mode
 
-    if not fetched_emails:
-        print("No new emails found for today (Gmail).")
+        # Peek so an empty mailbox is detected without materializing a streamed listing.
+        email_iter = iter(fetched_emails)
+        first_email = next(email_iter, None)
+    except Exception as e:
+        error_msg = f"Error fetching Gmail emails: {e}"
+        print(error_msg); result_summary["error"] = error_msg
+        db.close(); task_classifier.close()
+        return result_summary
+    if first_email is None:
+        print("No new emails found (Gmail).")
+        if config.GMAIL_PREFILTER_ENABLED: _record_gmail_fetch_stats(result_summary, gmail_agent)
+        result_summary["failed_items"] = len(gmail_agent.failed_message_ids)
+        if result_summary["failed_items"]:
+            print(f"{result_summary['failed_items']} email(s) could not be fetched. "
+                  f"Keeping the Gmail sync cursor for '{app_user_id}' so the next run retries them.")
+        else:
+            _advance_gmail_cursor(db, app_user_id, latest_history_id)
+        db.close()
         result_summary["success"] = True
         return result_summary
-    print(f"Fetched {len(fetched_emails)} emails from Gmail.")
+    print(f"Processing Gmail emails as they are fetched ({sync_mode} sync).")
+
+    concurrent = config.CLASSIFIER_CONCURRENCY > 1 or config.CLASSIFIER_BATCH_SIZE > 1
+    window_size = max(1, config.CLASSIFIER_CONCURRENCY) * max(1, config.CLASSIFIER_BATCH_SIZE) * \
+        _CLASSIFY_WINDOW_PER_SLOT if concurrent else max(1, config.TASK_WRITE_BATCH_SIZE)
+    share = max(1, rate_limit_share)
+    rate_limiter = AdaptiveRateLimiter(max(1, config.CLASSIFIER_CONCURRENCY // share), config.CLASSIFIER_RPM_LIMIT / share,
+                                       config.CLASSIFIER_TPM_LIMIT / share) if concurrent else None
+    numbered_emails = enumerate(itertools.chain([first_email], email_iter))
+    gate = _build_classifier_gate(db) if config.CLASSIFIER_GATE_ENABLED else None
+    fingerprint_index = get_fingerprint_index(db)
+    audited_tasks = 0
+
+    try:
+        while True:
+            window = list(itertools.islice(numbered_emails, window_size))
+            if not window:
+                break
+            result_summary["items_processed"] = window[-1][0] + 1
+            window = _drop_processed_sources(db, window, [f"gmail_{email_data['id']}" for _, email_data in window], result_summary)
+            items, processed, window_failed = [], {}, 0
+            for i, email_data in window:
+                item = _prepare_gmail_item(i, email_data, result_summary, gate)
+                # Gated emails are recorded as 'gated', which the ledger does not count as processed:
+                # a later run without the gate, or with a retrained one, evaluates them again.
+                if item is _GATED: processed[f"gmail_{email_data['id']}"] = "gated"
+                elif item: items.append(item)
+                else: processed[f"gmail_{email_data['id']}"] = "skipped"
+            if concurrent:
+                print(f"Classifying {len(items)} email(s) concurrently...")
+                classification_results = task_classifier.classify_tasks(
+                    [(item["classifier_input"], item["source_id"]) for item in items], limiter=rate_limiter,
+                    batch_size=config.CLASSIFIER_BATCH_SIZE)
+            else:
+                classification_results = [task_classifier.classify_task(item["classifier_input"], source_id=item["source_id"])
+                                          for item in items]
+            begin_write(db)
+            for item, classification_result in zip(items, classification_results):
+                if item["gate_audited"] and classification_result: audited_tasks += 1
+                if config.CLASSIFIER_GATE_RECORD_OUTCOMES:
+                    _record_classification_outcome(db, item, classification_result, task_classifier)
+                if not classification_result:
+                    if item["source_id"] in task_classifier.failed_source_ids: window_failed += 1
+                    else: processed[item["source_id"]] = "not_task"
+            # Results come back in input order, so tasks are saved in mailbox order, one transaction per window.
+            if not _save_gmail_tasks(db, items, classification_results, result_summary, fingerprint_index,
+                                     processed if config.PROCESSED_SOURCE_LEDGER_ENABLED else None):
+                window_failed = len(window)
+            result_summary["failed_items"] += window_failed
+        # The stream is exhausted, so every email whose details could not be fetched is known by now.
+        result_summary["failed_items"] += len(gmail_agent.failed_message_ids)
+        result_summary["success"] = True
+        # A historyId cursor cannot stop partway, so any failed email holds it; the next run fetches the
+        # same messages again and the processed-source ledger skips those already handled.
+        if result_summary["failed_items"]:
+            print(f"{result_summary['failed_items']} email(s) could not be fetched, classified or saved. "
+                  f"Keeping the Gmail sync cursor for '{app_user_id}' so the next run retries them.")
+        else:
+            _advance_gmail_cursor(db, app_user_id, latest_history_id)
+    except Exception as e_pipeline:
+        error_msg = f"Error during Gmail email processing loop: {e_pipeline}"
+        print(error_msg); result_summary["error"] = error_msg
+    finally:
+        if 'db' in locals() and db.is_active:
+            db.close()
+            print("Gmail pipeline DB session closed.")
+        task_classifier.close()
+
+    _record_classifier_stats(result_summary, task_classifier)
+    if rate_limiter:
+        print(f"Concurrent classification: peak {rate_limiter.stats['peak_in_flight']} call(s) in flight, "
+              f"{rate_limiter.stats['rate_limited']} rate-limited response(s), "
+              f"{rate_limiter.stats['wait_s']:.1f}s spent waiting for rate budget.")
+    if config.CLASSIFIER_BATCH_SIZE > 1:
+        _print_batch_stats(task_classifier)
+    if gate is not None:
+        _record_gate_stats(result_summary, gate, audited_tasks)
+        print(f"Pre-classifier gate ({'trained model' if gate.trained else 'hand-set weights'}) skipped "
+              f"{result_summary['gate_skipped']} email(s) ({result_summary['gate_skip_rate']:.1%}); "
+              f"{result_summary['gate_audited']} audited; ~{result_summary['gate_false_negatives_estimate']} task(s) estimated missed.")
+    if config.GMAIL_PREFILTER_ENABLED:
+        _record_gmail_fetch_stats(result_summary, gmail_agent)
+        print(f"Gmail prefilter skipped {result_summary['prefilter_skipped']} message(s); "
+              f"{result_summary['bytes_fetched']} bytes fetched, ~{result_summary['bytes_saved_estimate']} bytes saved "
+              f"({result_summary['bytes_reduction_pct']}%).")
+    print(f"Gmail ingestion pipeline finished. Tasks created: {result_summary['tasks_created']}. "
+          f"Characters removed by normalization: {result_summary['chars_removed']}. "
+          f"Prompt tokens: {result_summary['prompt_tokens']} (content ~{result_summary['content_tokens_estimate']}, "
+          f"trimmed ~{result_summary['tokens_trimmed_estimate']}). "
+          f"Classification cache hit rate: {result_summary['classification_cache_hit_rate']:.1%}. "
+          f"Already processed: {result_summary['already_processed']}.")
+    return result_summary
+
 
+def _kakaotalk_cursor_platform(chat_name: str) -> str:
+    return f"kakaotalk:{chat_name}"
+
+
+def _load_kakaotalk_cursor(app_user_id: str, chat_name: str) -> Optional[str]:
+    """Returns the ID of the last processed message in `chat_name`, or None on the first run."""
     db = SessionLocal()
-    normalizer_func = normalize_text
-    date_resolver_func = resolve_date
+    try:
+        cursor = persistence_crud.get_sync_cursor(db, user_identifier=app_user_id,
+                                                  platform=_kakaotalk_cursor_platform(chat_name))
+        return cursor.cursor_value if cursor else None
+    except Exception as e:
+        print(f"Error loading KakaoTalk cursor for chat '{chat_name}': {e}. Reading visible messages only.")
+        return None
+    finally:
+        db.close()
 
+
+def _advance_kakaotalk_cursor(db, app_user_id: str, chat_name: str, last_message_id: Optional[str]):
+    if not last_message_id:
+        return
     try:
-        for i, email_data in enumerate(fetched_emails):
-            print(f"\nProcessing Gmail email {i+1}/{len(fetched_emails)}: ID {email_data['id']}, Subject: '{email_data['headers'].get('subject', 'N/A')[:60]}...'")
-            content_to_process = ""
-            content_type_for_normalizer = "text/plain"
-            if email_data.get('body_plain', "").strip():
-                content_to_process = email_data['body_plain']
-            elif email_data.get('body_html', "").strip():
-                content_to_process = email_data['body_html']
-                content_type_for_normalizer = "text/html"
-            elif email_data.get('snippet', "").strip():
-                content_to_process = email_data['snippet']
-            else:
-                print("Email body/snippet empty. Skipping."); continue
-            if not content_to_process.strip():
-                 print("Content empty after selection. Skipping."); continue
+        begin_write(db)
+        persistence_crud.save_sync_cursor(db, user_identifier=app_user_id, platform=_kakaotalk_cursor_platform(chat_name),
+                                          cursor_value=last_message_id)
+        print(f"KakaoTalk cursor for chat '{chat_name}' advanced to message {last_message_id}.")
+    except Exception as e:
+        print(f"Error saving KakaoTalk cursor for chat '{chat_name}': {e}. Next run will re-read from the old cursor.")
+
+
+def _read_kakaotalk_chats(chat_names: List[str], user_data_dir: Optional[str],
+                          since_message_ids: Dict[str, Optional[str]]) -> Dict[str, Any]:
+    """
+    Reads the messages after each chat's cursor in `since_message_ids` (or the visible ones for
+    chats without one). Returns {chat_name: (messages, error_message)}. With
+    KAKAOTALK_PERSISTENT_SESSION the shared warm browser session is used; otherwise a browser is
+    launched for this call and closed afterwards.
+    """
+    def read(agent: KakaoAgent):
+        return agent.read_chats(chat_names, since_message_ids=since_message_ids,
+                                num_messages_to_capture=config.KAKAOTALK_MAX_MESSAGES_PER_RUN,
+                                scroll_attempts=config.KAKAOTALK_MAX_SCROLL_ATTEMPTS,
+                                pool_size=config.KAKAOTALK_PAGE_POOL_SIZE)
+
+    if config.KAKAOTALK_PERSISTENT_SESSION:
+        return get_kakao_session_manager().run(read)
+
+    with sync_playwright() as p_instance:
+        kakao_agent_instance = KakaoAgent(playwright_instance=p_instance, user_data_dir=user_data_dir)
+        try:
+            if not kakao_agent_instance.login():
+                raise KakaoSessionError("KakaoTalk login/setup failed by agent.")
+            return read(kakao_agent_instance)
+        finally:
+            print("Closing KakaoAgent resources...")
+            kakao_agent_instance.close()
+
 
-            normalized_content = normalizer_func(content_to_process, content_type=content_type_for_normalizer)
-            task_source_id = f"gmail_{email_data['id']}"
+def _process_kakaotalk_messages(app_user_id: str, chat_name: str, fetched_messages: List[Dict[str, Any]],
+                                task_classifier_instance: TaskClassifier, result_summary: Dict[str, Any]):
+    """
+    Classifies and stores the new messages of one chat, then advances that chat's cursor after the
+    commit, up to the last message before the first one whose classification failed. If the save
+    fails the cursor is left where it was and the chat is reported as failed.
+    """
+    db_session = SessionLocal()
+    normalizer_func = normalize_with_stats
+    try:
+        # Messages without an id get a position-based source id, which is not stable across runs,
+        # so only messages with an id go through the processed-source ledger.
+        ledger_source_ids = [f"kakaotalk_{chat_name}_{msg_data['id']}" if msg_data.get('id') else None
+                             for msg_data in fetched_messages]
+        numbered_messages = _drop_processed_sources(db_session, list(enumerate(fetched_messages)), ledger_source_ids,
+                                                    result_summary)
+        items, item_indexes, processed = [], [], {}
+        for i, msg_data in numbered_messages:
+            print(f"\nProcessing KakaoTalk message {i+1}/{len(fetched_messages)} from '{chat_name}': ID {msg_data.get('id', 'N/A')}")
+            content_to_process = msg_data.get("text", "")
+            if not content_to_process.strip():
+                print("Message text empty. Skipping."); processed[ledger_source_ids[i]] = "skipped"; continue
+
+            normalized_content, chars_removed = normalizer_func(content_to_process, content_type="text/plain")
+            result_summary["chars_removed"] += chars_removed
+            items.append((msg_data, normalized_content, f"kakaotalk_{chat_name}_{msg_data.get('id', f'msgidx{i}')}"))
+            item_indexes.append(i)
+
+        # Chat lines are short, so several share one classification request; results keep message order.
+        if config.CLASSIFIER_BATCH_SIZE > 1:
+            classification_results = task_classifier_instance.classify_tasks(
+                [(normalized_content, task_source_id) for _, normalized_content, task_source_id in items],
+                batch_size=config.CLASSIFIER_BATCH_SIZE)
+            _print_batch_stats(task_classifier_instance)
+        else:
+            classification_results = [task_classifier_instance.classify_task(normalized_content, source_id=task_source_id)
+                                      for _, normalized_content, task_source_id in items]
+
+        tasks_data, failed_indexes = [], []
+        for i, (msg_data, normalized_content, task_source_id), classification_result in zip(item_indexes, items, classification_results):
             task_title_from_llm = None
-            classification_result = task_classifier.classify_task(normalized_content, source_id=task_source_id)
             if not classification_result:
-                print(f"No task classified for email ID {email_data['id']}."); continue
+                print(f"No task classified for Kakao msg ID {msg_data.get('id', 'N/A')}.")
+                if task_source_id in task_classifier_instance.failed_source_ids: failed_indexes.append(i)
+                else: processed[task_source_id] = "not_task"
+                continue
             task_title_from_llm = classification_result['title']
 
-            due_datetime = None
-            if classification_result.get('due'):
-                due_datetime = date_resolver_func(classification_result['due'])
+            due_datetime = resolve_date(classification_result.get('due')) if classification_result.get('due') else None
 
             task_fingerprint = None
             if task_title_from_llm:
                 try: task_fingerprint = generate_task_fingerprint(task_title_from_llm, due_datetime)
-                except ValueError as ve: print(f"FP Gen Error: {ve}")
-                except Exception as e_fp: print(f"Unexpected FP Gen Error: {e_fp}")
-
-            if task_fingerprint:
-                existing_task = persistence_crud.get_task_by_fingerprint(db, task_fingerprint)
-                if existing_task:
-                    print(f"Duplicate task (ID: {existing_task.id}) by FP. Skipping."); continue
+                except Exception: pass
 
-            task_data_for_db = {
+            tasks_data.append({
                 "source": task_source_id, "title": task_title_from_llm,
                 "body": classification_result.get('body', normalized_content[:1000]),
                 "due_dt": due_datetime, "created_dt": datetime.utcnow(),
-                "status": TaskStatus.TODO, "fingerprint": task_fingerprint, "tags": None,
-                "type": classification_result.get('type', 'gmail_task')
-            }
-            newly_created_task_obj = None
+                "status": TaskStatus.TODO, "fingerprint": task_fingerprint, "tags": None
+            }) # The Task model has no column for the classifier's task type
+
+        # The chat's new tasks and ledger entries are written in one transaction; a failing row is skipped on its own.
+        if tasks_data or processed:
             try:
-                newly_created_task_obj = persistence_crud.create_task(db, task_data_for_db)
-                result_summary["tasks_created"] += 1
+                begin_write(db_session)
+                fingerprint_index = get_fingerprint_index(db_session)
+                classified_tasks = tasks_data
+                tasks_data = _drop_duplicate_tasks(db_session, tasks_data, fingerprint_index)
+                created = persistence_crud.create_tasks_bulk(db_session, tasks_data, commit=False) if tasks_data else []
+                created_tasks = [task for task in created if task]
+                tag_new_task_conflicts(db_session, created_tasks)
+                if config.PROCESSED_SOURCE_LEDGER_ENABLED:
+                    _add_task_outcomes(processed, classified_tasks, tasks_data, created)
+                    stable_source_ids = {source_id for source_id in ledger_source_ids if source_id}
+                    persistence_crud.record_processed_sources(
+                        db_session, {source_id: outcome for source_id, outcome in processed.items() if source_id in stable_source_ids},
+                        commit=False)
+                db_session.commit()
+                _index_created_tasks(fingerprint_index, tasks_data, created)
+                result_summary["tasks_created"] += len(created_tasks)
             except Exception as e_save:
-                db.rollback(); print(f"Error saving task: {e_save}"); continue
-
-            if newly_created_task_obj and newly_created_task_obj.due_dt and \
-               newly_created_task_obj.due_dt.time() != dt_time(0,0,0):
-                task_date_cdt = newly_created_task_obj.due_dt.date()
-                potential_conflicts_cdt = persistence_crud.get_tasks_on_same_day_with_time(
-                    db, task_date_cdt, exclude_task_id=newly_created_task_obj.id)
-                conflict_window_cdt = timedelta(hours=1)
-                for existing_task_cdt in potential_conflicts_cdt:
-                    if existing_task_cdt.due_dt:
-                        if abs(newly_created_task_obj.due_dt - existing_task_cdt.due_dt) < conflict_window_cdt:
-                            updated_task_cdt = persistence_crud.update_task_tags(db, newly_created_task_obj.id, "#conflict")
-                            if updated_task_cdt: newly_created_task_obj = updated_task_cdt
-                            persistence_crud.update_task_tags(db, existing_task_cdt.id, "#conflict")
+                db_session.rollback()
+                result_summary["error"] = f"Error saving Kakao tasks: {e_save}. Cursor not advanced."
+                print(result_summary["error"])
+                return
         result_summary["success"] = True
-    except Exception as e_pipeline:
-        error_msg = f"Error during Gmail email processing loop: {e_pipeline}"
-        print(error_msg); result_summary["error"] = error_msg
+        # Messages after a failed one are kept for the next run; with the ledger on, those already
+        # handled are skipped then.
+        result_summary["failed_items"] = len(failed_indexes)
+        handled_messages = fetched_messages[:min(failed_indexes)] if failed_indexes else fetched_messages
+        last_message_id = next((msg_data['id'] for msg_data in reversed(handled_messages) if msg_data.get('id')), None)
+        if failed_indexes:
+            print(f"{len(failed_indexes)} KakaoTalk message(s) in '{chat_name}' could not be classified; "
+                  f"the cursor stops before the first of them.")
+        if last_message_id:
+            result_summary["cursor"] = last_message_id
+            _advance_kakaotalk_cursor(db_session, app_user_id, chat_name, last_message_id)
     finally:
-        if 'db' in locals() and db.is_active:
-            db.close()
-            print("Gmail pipeline DB session closed.")
-
-    print(f"Gmail ingestion pipeline finished. Tasks created: {result_summary['tasks_created']}")
-    return result_summary
+        if db_session.is_active:
+            db_session.close()
+            print("KakaoTalk pipeline DB session closed.")
+
+
+def _aggregate_kakaotalk_summaries(chat_summaries: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Single summary for a multi-chat run; the per-chat summaries are kept under "chats"."""
+    errors = [f"{s['chat']}: {s['error']}" for s in chat_summaries if s.get("error")]
+    return {
+        "success": all(s["success"] for s in chat_summaries), "source": "KakaoTalk (Experimental)",
+        "items_processed": sum(s["items_processed"] for s in chat_summaries),
+        "tasks_created": sum(s["tasks_created"] for s in chat_summaries),
+        "chars_removed": sum(s["chars_removed"] for s in chat_summaries),
+        "already_processed": sum(s["already_processed"] for s in chat_summaries),
+        "failed_items": sum(s["failed_items"] for s in chat_summaries),
+        "error": "; ".join(errors) or None, "chats": chat_summaries,
+    }
 
 
 def run_kakaotalk_ingestion_pipeline(
     app_user_id: str = "default_kakaotalk_user",
-    target_chat_name: Optional[str] = None
+    target_chat_name: Optional[str] = None,
+    target_chat_names: Optional[List[str]] = None
 ) -> Dict[str, Any]:
-    result_summary = {
-        "success": False, "source": "KakaoTalk (Experimental)",
-        "items_processed": 0, "tasks_created": 0, "error": None
-    }
+    """
+    Ingests `target_chat_name`, or `target_chat_names`, or by default KAKAOTALK_CHAT_NAMES_TO_MONITOR.
+    With a single chat the summary has the same shape as before plus "chat" and "cursor"; with
+    several chats the aggregate summary carries one such summary per chat under "chats".
+    """
     print(f"\n--- Starting KakaoTalk Ingestion Pipeline for user: {app_user_id} ---")
 
     try:
-        from config import KAKAOTALK_CHAT_NAME_TO_MONITOR, KAKAOTALK_USER_DATA_DIR
+        from config import KAKAOTALK_CHAT_NAMES_TO_MONITOR, KAKAOTALK_USER_DATA_DIR
     except ImportError:
-        result_summary["error"] = "KakaoTalk config import failed (KAKAOTALK_CHAT_NAME_TO_MONITOR or KAKAOTALK_USER_DATA_DIR missing from config.py)."
+        result_summary = {
+            "success": False, "source": "KakaoTalk (Experimental)", "items_processed": 0, "tasks_created": 0,
+            "error": "KakaoTalk config import failed (KAKAOTALK_CHAT_NAMES_TO_MONITOR or KAKAOTALK_USER_DATA_DIR missing from config.py)."
+        }
         print(f"Error: {result_summary['error']}")
         return result_summary
 
-    effective_target_chat_name = target_chat_name or KAKAOTALK_CHAT_NAME_TO_MONITOR
-    if not effective_target_chat_name or effective_target_chat_name == "My Notes Chat": # Default placeholder check
-        print(f"Warning: KAKAOTALK_CHAT_NAME_TO_MONITOR is not configured or is set to default ('{effective_target_chat_name}').")
-        # In a non-interactive pipeline, we might not use typer.confirm.
-        # Decide to proceed or not based on a stricter check or allow placeholder for testing.
-        # For now, let's assume if it's the placeholder, it's an error for an automated run.
-        if effective_target_chat_name == "My Notes Chat" or not effective_target_chat_name:
-             result_summary["error"] = f"Target KakaoTalk chat name is not properly configured (current: '{effective_target_chat_name}')."
-             print(f"Error: {result_summary['error']}")
-             return result_summary # Stop if not configured for a specific chat
-    print(f"Target KakaoTalk chat room: '{effective_target_chat_name}'")
-
-    kakao_agent_instance: Optional[KakaoAgent] = None
-    try:
-        with sync_playwright() as p_instance:
-            kakao_agent_instance = KakaoAgent(playwright_instance=p_instance, user_data_dir=KAKAOTALK_USER_DATA_DIR)
-            if not kakao_agent_instance.login():
-                result_summary["error"] = "KakaoTalk login/setup failed by agent."
-                print(result_summary["error"]); return result_summary # kakao_agent.close() is in finally
-            if not kakao_agent_instance.select_chat(effective_target_chat_name):
-                result_summary["error"] = f"Failed to select KakaoTalk chat: '{effective_target_chat_name}'."
-                print(result_summary["error"]); return result_summary
-
-            fetched_messages = kakao_agent_instance.read_messages(num_messages_to_capture=20) # Dummy messages for now
-            result_summary["items_processed"] = len(fetched_messages)
-            if not fetched_messages:
-                print("No new messages fetched from KakaoTalk."); result_summary["success"] = True; return result_summary
-            print(f"Fetched {len(fetched_messages)} messages from KakaoTalk.")
-
-            task_classifier_instance = None
-            try:
-                task_classifier_instance = TaskClassifier()
-                print("TaskClassifier initialized for KakaoTalk pipeline.")
-            except Exception as e_tc:
-                result_summary["error"] = f"TaskClassifier init failed for KakaoTalk: {e_tc}"
-                print(result_summary["error"]); return result_summary
-
-            db_session = SessionLocal()
-            normalizer_func = normalize_text
-            date_resolver_func = resolve_date
-            try:
-                for i, msg_data in enumerate(fetched_messages):
-                    print(f"\nProcessing KakaoTalk message {i+1}/{len(fetched_messages)}: ID {msg_data.get('id', 'N/A')}")
-                    content_to_process = msg_data.get("text", "")
-                    if not content_to_process.strip(): print("Message text empty. Skipping."); continue
-
-                    normalized_content = normalizer_func(content_to_process, content_type="text/plain")
-                    task_source_id = f"kakaotalk_{effective_target_chat_name}_{msg_data.get('id', f'msgidx{i}')}"
-                    task_title_from_llm = None
-                    classification_result = task_classifier_instance.classify_task(normalized_content, source_id=task_source_id)
-                    if not classification_result: print(f"No task classified for Kakao msg ID {msg_data.get('id', 'N/A')}."); continue
-                    task_title_from_llm = classification_result['title']
-
-                    due_datetime = resolve_date(classification_result.get('due')) if classification_result.get('due') else None
-
-                    task_fingerprint = None
-                    if task_title_from_llm:
-                        try: task_fingerprint = generate_task_fingerprint(task_title_from_llm, due_datetime)
-                        except Exception: pass
-
-                    if task_fingerprint and persistence_crud.get_task_by_fingerprint(db_session, task_fingerprint):
-                        print(f"Duplicate Kakao task by FP. Skipping."); continue
-
-                    task_data = {
-                        "source": task_source_id, "title": task_title_from_llm,
-                        "body": classification_result.get('body', normalized_content[:1000]),
-                        "due_dt": due_datetime, "created_dt": datetime.utcnow(),
-                        "status": TaskStatus.TODO, "fingerprint": task_fingerprint, "tags": None,
-                        "type": classification_result.get('type', 'kakaotalk_task')
-                    }
-                    newly_created_task_obj = None
+    chat_names = [target_chat_name] if target_chat_name else list(target_chat_names or KAKAOTALK_CHAT_NAMES_TO_MONITOR)
+    label_with_chat = len(chat_names) > 1
+    summaries: Dict[str, Dict[str, Any]] = {}
+    for chat_name in chat_names:
+        summaries[chat_name] = {
+            "success": False, "source": f"KakaoTalk ({chat_name})" if label_with_chat else "KakaoTalk (Experimental)",
+            "chat": chat_name, "cursor": None, "items_processed": 0, "tasks_created": 0, "chars_removed": 0,
+            "already_processed": 0, "failed_items": 0, "error": None
+        }
+
+    chats_to_read = []
+    for chat_name in chat_names:
+        if not chat_name or chat_name == "My Notes Chat": # Default placeholder check
+            # In a non-interactive pipeline, an unconfigured placeholder chat is an error.
+            summaries[chat_name]["error"] = f"Target KakaoTalk chat name is not properly configured (current: '{chat_name}')."
+            print(f"Error: {summaries[chat_name]['error']}")
+        else:
+            chats_to_read.append(chat_name)
+    print(f"Target KakaoTalk chat room(s): {', '.join(repr(c) for c in chats_to_read) or 'none'}")
+
+    if chats_to_read:
+        task_classifier_instance = None
+        try:
+            for chat_name in chats_to_read:
+                summaries[chat_name]["cursor"] = _load_kakaotalk_cursor(app_user_id, chat_name)
+            read_results = _read_kakaotalk_chats(chats_to_read, KAKAOTALK_USER_DATA_DIR,
+                                                 {c: summaries[c]["cursor"] for c in chats_to_read})
+
+            for chat_name in chats_to_read:
+                result_summary = summaries[chat_name]
+                fetched_messages, read_error = read_results.get(chat_name, ([], "No read result for chat."))
+                if read_error:
+                    result_summary["error"] = read_error
+                    print(result_summary["error"]); continue
+                result_summary["items_processed"] = len(fetched_messages)
+                if not fetched_messages:
+                    print(f"No new messages fetched from KakaoTalk chat '{chat_name}'."); result_summary["success"] = True; continue
+                print(f"Fetched {len(fetched_messages)} messages from KakaoTalk chat '{chat_name}'.")
+
+                if task_classifier_instance is None:
                     try:
-                        newly_created_task_obj = persistence_crud.create_task(db_session, task_data)
-                        result_summary["tasks_created"] += 1
-                    except Exception as e_save:
-                        db_session.rollback(); print(f"Error saving Kakao task: {e_save}"); continue
-
-                    if newly_created_task_obj and newly_created_task_obj.due_dt and \
-                       newly_created_task_obj.due_dt.time() != dt_time(0,0,0):
-                        # Simplified conflict detection call for brevity in this example
-                        persistence_crud.update_task_tags(db_session, newly_created_task_obj.id, "#conflict_check_needed_kakao")
-                result_summary["success"] = True
-            finally:
-                if 'db_session' in locals() and db_session.is_active:
-                    db_session.close()
-                    print("KakaoTalk pipeline DB session closed.")
-    except PlaywrightError as e_pw:
-        result_summary["error"] = f"Playwright error in KakaoTalk pipeline: {e_pw}"
-        print(result_summary["error"])
-    except ImportError as e_imp:
-        result_summary["error"] = f"ImportError in KakaoTalk pipeline (check config): {e_imp}"
-        print(result_summary["error"])
-    except Exception as e_main:
-        result_summary["error"] = f"Unexpected error in KakaoTalk pipeline: {e_main}"
-        print(result_summary["error"])
-        import traceback; traceback.print_exc()
-    finally:
-        if kakao_agent_instance:
-            print("Closing KakaoAgent resources...")
-            kakao_agent_instance.close()
-
-    print(f"KakaoTalk ingestion pipeline finished. Tasks created: {result_summary['tasks_created']}. Error: {result_summary['error']}")
-    return result_summary
+                        task_classifier_instance = TaskClassifier(cache=get_classification_cache())
+                        print("TaskClassifier initialized for KakaoTalk pipeline.")
+                    except Exception as e_tc:
+                        result_summary["error"] = f"TaskClassifier init failed for KakaoTalk: {e_tc}"
+                        print(result_summary["error"]); continue
+                counters_before = _classifier_counters(task_classifier_instance)
+                _process_kakaotalk_messages(app_user_id, chat_name, fetched_messages, task_classifier_instance, result_summary)
+                _record_classifier_stats(result_summary, task_classifier_instance, since=counters_before)
+        except KakaoSessionError as e_session:
+            error = str(e_session)
+        except PlaywrightError as e_pw:
+            error = f"Playwright error in KakaoTalk pipeline: {e_pw}"
+        except ImportError as e_imp:
+            error = f"ImportError in KakaoTalk pipeline (check config): {e_imp}"
+        except Exception as e_main:
+            error = f"Unexpected error in KakaoTalk pipeline: {e_main}"
+            import traceback; traceback.print_exc()
+        else:
+            error = None
+        if error:
+            print(error)
+            for chat_name in chats_to_read:
+                if not summaries[chat_name]["success"] and not summaries[chat_name]["error"]:
+                    summaries[chat_name]["error"] = error
+        if task_classifier_instance is not None:
+            task_classifier_instance.close()
+
+    for result_summary in summaries.values():
+        print(f"KakaoTalk chat '{result_summary['chat']}' finished. Tasks created: {result_summary['tasks_created']}. "
+              f"Error: {result_summary['error']}")
+    if not label_with_chat:
+        return summaries[chat_names[0]]
+    return _aggregate_kakaotalk_summaries(list(summaries.values()))
 
 # Main application entry point
 if __name__ == '__main__':
@@ -288,6 +795,7 @@ if __name__ == '__main__':
             print(f"DB init error before KakaoTalk run: {e_db_init}");
             sys.exit(1)
         run_kakaotalk_ingestion_pipeline()
+        shutdown_kakao_session_manager()
     else:
         print("Starting Agenda Manager Scheduler...")
         print("Ensuring database tables are created for scheduler...")
@@ -322,4 +830,5 @@ if __name__ == '__main__':
                 print("Attempting to shut down scheduler...")
                 scheduler.shutdown()
                 print("Scheduler shutdown complete.")
+            shutdown_kakao_session_manager()
             print("Application exited.")
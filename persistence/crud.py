@@ -1,12 +1,13 @@
 from sqlalchemy.orm import Session
 from persistence import models # Assuming models.py contains Task and TaskStatus
 from persistence.models import TaskStatus # Explicit import for clarity
-from datetime import datetime
+from datetime import datetime, date, time, timedelta
+from sqlalchemy import and_, cast, or_, Date as SQLDate, Time as SQLTime
 
 # Placeholder for crud.py
 print("CRUD module initialized")
 
-def create_task(db: Session, task_data: dict) -> models.Task:
+def _apply_task_defaults(task_data: dict) -> dict:
     # Ensure 'created_dt' is set, default to now if not provided
     if 'created_dt' not in task_data:
         task_data['created_dt'] = datetime.utcnow()
@@ -20,13 +21,52 @@ def create_task(db: Session, task_data: dict) -> models.Task:
     # Ensure countdown_int is present, even if it's a default or None
     if 'countdown_int' not in task_data:
         task_data['countdown_int'] = 0 # Or some other sensible default
+    return task_data
 
-    db_task = models.Task(**task_data)
+def create_task(db: Session, task_data: dict) -> models.Task:
+    db_task = models.Task(**_apply_task_defaults(task_data))
     db.add(db_task)
     db.commit()
     db.refresh(db_task)
     return db_task
 
+def create_tasks_bulk(db: Session, tasks_data: list[dict], commit: bool = True) -> list[models.Task | None]:
+    """
+    Inserts many tasks in one transaction instead of one commit (and fsync) per task.
+
+    The batch is flushed in a single multi-row INSERT inside a SAVEPOINT. If that fails (e.g. a
+    duplicate fingerprint), the savepoint is rolled back and the rows are inserted again one per
+    SAVEPOINT, so only the failing rows are dropped. The returned list is aligned with
+    `tasks_data`, with None for rows that failed. The new tasks have IDs and are visible to
+    queries on `db` right away. With commit=False the caller commits, e.g. after tagging conflicts
+    in the same transaction.
+    """
+    try:
+        with db.begin_nested():
+            created = [models.Task(**_apply_task_defaults(dict(task_data))) for task_data in tasks_data]
+            db.add_all(created)
+            db.flush()
+    except Exception:
+        created = []
+        for task_data in tasks_data:
+            try:
+                with db.begin_nested():
+                    db_task = models.Task(**_apply_task_defaults(dict(task_data)))
+                    db.add(db_task)
+                    db.flush()
+                created.append(db_task)
+            except Exception as e:
+                print(f"Error inserting task '{task_data.get('title')}' (source '{task_data.get('source')}'): {e}")
+                created.append(None)
+    if commit:
+        try:
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            print(f"Error committing {len(tasks_data)} task(s): {e}")
+            raise
+    return created
+
 def get_task(db: Session, task_id: int) -> models.Task | None:
     return db.query(models.Task).filter(models.Task.id == task_id).first()
 
@@ -122,6 +162,13 @@ def get_token(db: Session, user_identifier: str, platform: str) -> models.Source
         models.SourceToken.platform == platform
     ).first()
 
+def get_token_user_ids(db: Session, platform: str) -> list[str]:
+    """Returns the distinct user_identifiers that have a stored token for `platform`, sorted."""
+    rows = db.query(models.SourceToken.user_id).filter(
+        models.SourceToken.platform == platform
+    ).distinct().order_by(models.SourceToken.user_id).all()
+    return [row[0] for row in rows]
+
 def save_token(db: Session, user_identifier: str, platform: str, token_info: dict) -> models.SourceToken:
     """
     Saves or updates a token for a given user_identifier and platform.
@@ -229,6 +276,41 @@ def delete_token(db: Session, user_identifier: str, platform: str) -> bool:
 # If user_id is strictly an Integer, user_identifier might need to be an int or castable to int.
 
 
+# --- SyncCursor CRUD Operations ---
+
+def get_sync_cursor(db: Session, user_identifier: str, platform: str) -> models.SyncCursor | None:
+    """Retrieves the stored incremental sync cursor for a user and platform, if any."""
+    return db.query(models.SyncCursor).filter(
+        models.SyncCursor.user_id == user_identifier,
+        models.SyncCursor.platform == platform
+    ).first()
+
+def save_sync_cursor(db: Session, user_identifier: str, platform: str, cursor_value: str) -> models.SyncCursor:
+    """
+    Creates or advances the incremental sync cursor for a user and platform.
+    The cursor value is stored as a string (e.g. a Gmail historyId).
+    """
+    db_cursor = get_sync_cursor(db, user_identifier, platform)
+    if db_cursor:
+        db_cursor.cursor_value = str(cursor_value)
+        db_cursor.last_synced_dt = datetime.utcnow()
+    else:
+        db_cursor = models.SyncCursor(
+            user_id=user_identifier, platform=platform,
+            cursor_value=str(cursor_value), last_synced_dt=datetime.utcnow()
+        )
+        db.add(db_cursor)
+
+    try:
+        db.commit()
+        db.refresh(db_cursor)
+    except Exception as e:
+        db.rollback()
+        print(f"Error saving sync cursor for user '{user_identifier}', platform '{platform}': {e}")
+        raise
+    return db_cursor
+
+
 # --- Task CRUD Operations Additions ---
 
 def get_task_by_fingerprint(db: Session, fingerprint: str) -> models.Task | None:
@@ -240,6 +322,27 @@ def get_task_by_fingerprint(db: Session, fingerprint: str) -> models.Task | None
         return None
     return db.query(models.Task).filter(models.Task.fingerprint == fingerprint).first()
 
+# Bound parameters per IN (...) query; older SQLite builds allow at most 999 per statement.
+IN_QUERY_CHUNK = 500
+
+def get_task_ids_by_fingerprints(db: Session, fingerprints) -> dict[str, int]:
+    """
+    Maps each of `fingerprints` that a stored task has to that task's id, with one IN (...) query
+    per IN_QUERY_CHUNK fingerprints. Fingerprints without a task are left out.
+    """
+    wanted = list({fingerprint for fingerprint in fingerprints if fingerprint})
+    found = {}
+    for start in range(0, len(wanted), IN_QUERY_CHUNK):
+        chunk = wanted[start:start + IN_QUERY_CHUNK]
+        found.update(db.query(models.Task.fingerprint, models.Task.id).filter(models.Task.fingerprint.in_(chunk)).all())
+    return found
+
+def iter_task_fingerprints(db: Session, after_id: int = 0):
+    """(id, fingerprint) of the tasks with a fingerprint and an id above `after_id`, in id order, streamed in chunks."""
+    return db.query(models.Task.id, models.Task.fingerprint).filter(
+        models.Task.id > after_id, models.Task.fingerprint.isnot(None)
+    ).order_by(models.Task.id).yield_per(1000)
+
 def get_tasks_on_same_day_with_time(db: Session, target_date: date, exclude_task_id: int | None = None) -> list[models.Task]:
     """
     Retrieves tasks on a specific date that have a specific time component (not midnight 00:00:00).
@@ -259,22 +362,56 @@ def get_tasks_on_same_day_with_time(db: Session, target_date: date, exclude_task
     )
     return query.order_by(models.Task.due_dt).all()
 
-def update_task_tags(db: Session, task_id: int, new_tag: str) -> models.Task | None:
+def _active_tasks_due_between(db: Session, ranges, *entities) -> list:
+    ranges = list(ranges)
+    rows = []
+    for start in range(0, len(ranges), IN_QUERY_CHUNK):
+        chunk = ranges[start:start + IN_QUERY_CHUNK]
+        rows.extend(db.query(*entities).filter(
+            or_(*(and_(models.Task.due_dt >= range_start, models.Task.due_dt < range_end) for range_start, range_end in chunk)),
+            models.Task.status != TaskStatus.CANCELLED,
+            models.Task.status != TaskStatus.DONE
+        ))
+    return sorted(rows, key=lambda row: row.due_dt)
+
+def get_active_tasks_due_between(db: Session, ranges) -> list[models.Task]:
+    """
+    Open (not DONE or CANCELLED) tasks due in any of the [start, end) datetime `ranges`, ordered by
+    due_dt, with one query per IN_QUERY_CHUNK ranges. Comparing due_dt itself, not its cast date or
+    time, lets the due_dt index serve every range. The rows are sorted here: with an ORDER BY,
+    SQLite walks the whole due_dt index instead.
+    """
+    return _active_tasks_due_between(db, ranges, models.Task)
+
+def get_active_task_times_between(db: Session, ranges) -> list:
+    """Like get_active_tasks_due_between, but (id, due_dt, tags) rows, which load far faster than tasks."""
+    return _active_tasks_due_between(db, ranges, models.Task.id, models.Task.due_dt, models.Task.tags)
+
+def _add_tag(tags: str | None, new_tag: str) -> str | None:
+    """`tags` (comma-separated) with `new_tag` added, or None if it is already there."""
+    # Split by comma, strip whitespace from each tag, filter out empty strings
+    current_tags_set = set(tag.strip() for tag in (tags or "").split(',') if tag.strip())
+    if new_tag in current_tags_set:
+        return None
+    current_tags_set.add(new_tag)
+    # Store sorted for consistency and easier reading/parsing
+    return ",".join(sorted(current_tags_set))
+
+def update_task_tags(db: Session, task_id: int, new_tag: str, commit: bool = True) -> models.Task | None:
     """
     Adds a new tag to a task's tags field if not already present.
-    Assumes tags is a comma-separated string.
+    Assumes tags is a comma-separated string. With commit=False the change is only flushed,
+    so it joins the caller's transaction (see create_tasks_bulk).
     """
-    task = db.query(models.Task).filter(models.Task.id == task_id).first()
+    task = db.get(models.Task, task_id)
     if task:
-        current_tags_str = task.tags or ""
-        # Split by comma, strip whitespace from each tag, filter out empty strings
-        current_tags_set = set(tag.strip() for tag in current_tags_str.split(',') if tag.strip())
-
-        if new_tag not in current_tags_set:
-            current_tags_set.add(new_tag)
-            # Store sorted for consistency and easier reading/parsing
-            task.tags = ",".join(sorted(list(current_tags_set)))
+        new_tags = _add_tag(task.tags, new_tag)
+        if new_tags is not None:
+            task.tags = new_tags
             try:
+                if not commit:
+                    db.flush()
+                    return task
                 db.commit()
                 db.refresh(task)
             except Exception as e:
@@ -284,3 +421,140 @@ def update_task_tags(db: Session, task_id: int, new_tag: str) -> models.Task | N
                 return None
         return task # Return task (possibly updated, or unchanged if tag was already present)
     return None # Task not found
+
+def add_tag_to_tasks(db: Session, task_ids, new_tag: str, commit: bool = True) -> list[models.Task] | None:
+    """
+    update_task_tags for many tasks in one write: the tasks are loaded with one IN (...) query per
+    IN_QUERY_CHUNK ids, and tagged with a single flush (and commit, unless commit=False). Returns
+    the tasks whose tags changed, or None if the write failed.
+    """
+    wanted = list(dict.fromkeys(task_ids))
+    changed = []
+    for start in range(0, len(wanted), IN_QUERY_CHUNK):
+        chunk = wanted[start:start + IN_QUERY_CHUNK]
+        for task in db.query(models.Task).filter(models.Task.id.in_(chunk)):
+            new_tags = _add_tag(task.tags, new_tag)
+            if new_tags is not None:
+                task.tags = new_tags
+                changed.append(task)
+    if not changed:
+        return changed
+    try:
+        if not commit:
+            db.flush()
+            return changed
+        db.commit()
+    except Exception as e:
+        db.rollback()
+        print(f"Error adding tag '{new_tag}' to {len(changed)} task(s): {e}")
+        return None
+    return changed
+
+
+# --- ClassificationOutcome CRUD Operations ---
+
+def _upsert_classification_outcome(db: Session, source: str, outcome_data: dict) -> models.ClassificationOutcome:
+    db_outcome = db.query(models.ClassificationOutcome).filter(models.ClassificationOutcome.source == source).first()
+    if db_outcome is None:
+        db_outcome = models.ClassificationOutcome(source=source)
+        db.add(db_outcome)
+    for key, value in outcome_data.items():
+        setattr(db_outcome, key, value)
+    db_outcome.created_dt = datetime.utcnow()
+    return db_outcome
+
+def save_classification_outcome(db: Session, source: str, outcome_data: dict,
+                                commit: bool = True) -> models.ClassificationOutcome:
+    """
+    Creates or replaces the recorded classifier outcome for `source` (re-runs over the same message
+    update the row instead of adding a duplicate training sample). With commit=False the row is
+    flushed inside a SAVEPOINT of the caller's transaction; a failure rolls back only that row.
+    """
+    if not commit:
+        try:
+            with db.begin_nested():
+                db_outcome = _upsert_classification_outcome(db, source, outcome_data)
+                db.flush()
+        except Exception as e:
+            print(f"Error saving classification outcome for '{source}': {e}")
+            raise
+        return db_outcome
+
+    db_outcome = _upsert_classification_outcome(db, source, outcome_data)
+    try:
+        db.commit()
+        db.refresh(db_outcome)
+    except Exception as e:
+        db.rollback()
+        print(f"Error saving classification outcome for '{source}': {e}")
+        raise
+    return db_outcome
+
+def get_classification_outcomes(db: Session, limit: int = 5000) -> list[models.ClassificationOutcome]:
+    """Retrieves the most recent classifier outcomes, newest first."""
+    return db.query(models.ClassificationOutcome).order_by(models.ClassificationOutcome.created_dt.desc()).limit(limit).all()
+
+
+# --- Processed-Source Ledger ---
+
+def _processed_source_rows(db: Session, source_ids: list) -> list[models.ProcessedSource]:
+    rows = []
+    for start in range(0, len(source_ids), IN_QUERY_CHUNK):
+        chunk = source_ids[start:start + IN_QUERY_CHUNK]
+        rows.extend(db.query(models.ProcessedSource).filter(models.ProcessedSource.source_id.in_(chunk)).all())
+    return rows
+
+# Outcomes recorded for the record only: the message is evaluated again on the next run.
+NON_FINAL_OUTCOMES = ("gated",)
+
+def get_processed_source_ids(db: Session, source_ids) -> set[str]:
+    """
+    The ones of `source_ids` already in the processed-source ledger with a final outcome (not one of
+    NON_FINAL_OUTCOMES), with one IN (...) query per IN_QUERY_CHUNK ids.
+    """
+    wanted = list({source_id for source_id in source_ids if source_id})
+    found = set()
+    for start in range(0, len(wanted), IN_QUERY_CHUNK):
+        chunk = wanted[start:start + IN_QUERY_CHUNK]
+        found.update(source_id for (source_id,) in
+                     db.query(models.ProcessedSource.source_id).filter(
+                         models.ProcessedSource.source_id.in_(chunk),
+                         models.ProcessedSource.outcome.notin_(NON_FINAL_OUTCOMES)))
+    return found
+
+def _upsert_processed_sources(db: Session, outcomes: dict):
+    now = datetime.utcnow()
+    existing = {row.source_id: row for row in _processed_source_rows(db, list(outcomes))}
+    for source_id, outcome in outcomes.items():
+        row = existing.get(source_id)
+        if row is None:
+            db.add(models.ProcessedSource(source_id=source_id, outcome=outcome, processed_at=now))
+        else:
+            row.outcome, row.processed_at = outcome, now
+
+def record_processed_sources(db: Session, outcomes: dict, commit: bool = True) -> int:
+    """
+    Adds `outcomes` (source id -> outcome) to the processed-source ledger, updating ids already in
+    it. With commit=False the rows are flushed inside a SAVEPOINT of the caller's transaction, so
+    they are committed together with the tasks of the same batch. Returns the number of ids.
+    """
+    if not outcomes:
+        return 0
+    if not commit:
+        try:
+            with db.begin_nested():
+                _upsert_processed_sources(db, outcomes)
+                db.flush()
+        except Exception as e:
+            print(f"Error recording {len(outcomes)} processed source(s): {e}")
+            raise
+        return len(outcomes)
+
+    _upsert_processed_sources(db, outcomes)
+    try:
+        db.commit()
+    except Exception as e:
+        db.rollback()
+        print(f"Error recording {len(outcomes)} processed source(s): {e}")
+        raise
+    return len(outcomes)
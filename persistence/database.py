@@ -1,13 +1,89 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import make_url
 from sqlalchemy.orm import sessionmaker
 
 from persistence.models import Base # Needed for create_db_tables
 import config
 
-engine = create_engine(
-    config.DATABASE_URL,
-    connect_args={"check_same_thread": False} # Specific to SQLite
-)
+
+def sqlite_pragmas(profile: str | None = None) -> dict:
+    """
+    The pragmas each connection of a SQLite connection profile starts with (config.SQLITE_PROFILE by
+    default). Every profile waits up to SQLITE_BUSY_TIMEOUT_MS for a lock held by another connection,
+    since the scheduled job runs several Gmail account pipelines, each with its own session, at once.
+    """
+    if (profile or config.SQLITE_PROFILE).lower() != "performance":
+        return {"busy_timeout": config.SQLITE_BUSY_TIMEOUT_MS}
+    # busy_timeout goes first so that switching the journal mode waits for other connections
+    return {
+        "busy_timeout": config.SQLITE_BUSY_TIMEOUT_MS,
+        "journal_mode": config.SQLITE_JOURNAL_MODE,
+        "synchronous": config.SQLITE_SYNCHRONOUS,
+        "mmap_size": config.SQLITE_MMAP_SIZE_MB * 1024 * 1024,
+        "cache_size": -config.SQLITE_CACHE_SIZE_MB * 1024, # Negative values are KiB, not pages
+    }
+
+
+def configure_sqlite_engine(engine, pragmas: dict | None = None):
+    """
+    Lets SQLAlchemy, not the pysqlite driver, start SQLite transactions. pysqlite only issues
+    BEGIN before INSERT/UPDATE/DELETE, so a SAVEPOINT (crud.create_tasks_bulk) opened first would
+    become the outermost transaction and its RELEASE would commit every row on its own.
+    `pragmas` are set on every new connection. A connection with the execution option
+    sqlite_begin="IMMEDIATE" (see begin_write) starts its transaction with BEGIN IMMEDIATE.
+    """
+    if engine.dialect.name != "sqlite":
+        return engine
+
+    @event.listens_for(engine, "connect")
+    def _disable_pysqlite_transactions(dbapi_connection, connection_record):
+        dbapi_connection.isolation_level = None
+        if pragmas:
+            cursor = dbapi_connection.cursor()
+            try:
+                for name, value in pragmas.items():
+                    cursor.execute(f"PRAGMA {name}={value}")
+            finally:
+                cursor.close()
+
+    @event.listens_for(engine, "begin")
+    def _begin_transaction(conn):
+        mode = conn.get_execution_options().get("sqlite_begin")
+        conn.exec_driver_sql(f"BEGIN {mode}" if mode else "BEGIN")
+    return engine
+
+
+def begin_write(db):
+    """
+    Starts a write transaction on session `db`, ending the read transaction it may still have open
+    (nothing may be pending on `db`). On SQLite the transaction begins with BEGIN IMMEDIATE: under
+    WAL, a deferred transaction that reads and then writes after another connection has committed
+    fails with SQLITE_BUSY at once instead of waiting busy_timeout, while BEGIN IMMEDIATE takes the
+    write lock up front and waits for it. Call it right before a read-then-write unit of work.
+    """
+    if db.in_transaction():
+        db.commit()
+    db.connection(execution_options={"sqlite_begin": "IMMEDIATE"})
+
+
+def create_app_engine(database_url: str | None = None, profile: str | None = None):
+    """
+    Creates the engine for `database_url` (config.DATABASE_URL by default). SQLite connections get
+    the pragmas of `profile`; file and server databases get a pool sized by DB_POOL_SIZE,
+    DB_MAX_OVERFLOW and DB_POOL_TIMEOUT_S. In-memory SQLite keeps SQLAlchemy's per-thread pool,
+    since each connection would otherwise see its own empty database.
+    """
+    url = make_url(database_url or config.DATABASE_URL)
+    engine_args = {}
+    if url.get_backend_name() == "sqlite":
+        engine_args["connect_args"] = {"check_same_thread": False} # Specific to SQLite
+    if url.get_backend_name() != "sqlite" or url.database not in (None, "", ":memory:"):
+        engine_args.update(pool_size=config.DB_POOL_SIZE, max_overflow=config.DB_MAX_OVERFLOW,
+                           pool_timeout=config.DB_POOL_TIMEOUT_S)
+    return configure_sqlite_engine(create_engine(url, **engine_args), sqlite_pragmas(profile))
+
+
+engine = create_app_engine()
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
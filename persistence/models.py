@@ -1,5 +1,5 @@
 import enum
-from sqlalchemy import Column, Integer, String, DateTime, Enum as SQLAlchemyEnum, ForeignKey, UniqueConstraint
+from sqlalchemy import Column, Integer, String, DateTime, Boolean, Float, Enum as SQLAlchemyEnum, ForeignKey, UniqueConstraint
 # For server-side defaults/onupdate with func.now(), it would be needed.
 # SQLAlchemy handles Python-side defaults like datetime.utcnow automatically.
 from sqlalchemy.ext.declarative import declarative_base
@@ -81,5 +81,59 @@ class FileCursor(Base):
         return (f"<FileCursor(id={self.id}, obsidian_file='{self.obsidian_file}', "
                 f"line_no_end={self.line_no_end})>")
 
+class SyncCursor(Base):
+    """Per-user, per-source incremental sync position (e.g. the last processed Gmail historyId)."""
+    __tablename__ = "sync_cursors"
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(String, index=True, nullable=False)
+    platform = Column(String, index=True, nullable=False)
+    cursor_value = Column(String, nullable=False)
+    last_synced_dt = Column(DateTime, nullable=False, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    __table_args__ = (UniqueConstraint('user_id', 'platform', name='uq_user_platform_cursor'),)
+
+    def __repr__(self):
+        return (f"<SyncCursor(id={self.id}, user_id='{self.user_id}', "
+                f"platform='{self.platform}', cursor_value='{self.cursor_value}')>")
+
+class ClassificationOutcome(Base):
+    """
+    What TaskClassifier decided for one ingested message, with the inputs the pre-classifier gate
+    looks at. Used as training data for the gate's logistic model.
+    """
+    __tablename__ = "classification_outcomes"
+
+    id = Column(Integer, primary_key=True, index=True)
+    source = Column(String, unique=True, index=True, nullable=False) # e.g. 'gmail_messageId123'
+    sender = Column(String, nullable=True)
+    subject = Column(String, nullable=True)
+    text_excerpt = Column(String, nullable=True)
+    bulk_headers = Column(String, nullable=True) # Comma-separated names of the bulk-mail headers present
+    is_task = Column(Boolean, nullable=False)
+    gate_score = Column(Float, nullable=True)
+    created_dt = Column(DateTime, default=datetime.utcnow, nullable=False)
+
+    def __repr__(self):
+        return (f"<ClassificationOutcome(id={self.id}, source='{self.source}', "
+                f"is_task={self.is_task}, gate_score={self.gate_score})>")
+
+class ProcessedSource(Base):
+    """
+    Ledger of ingested messages by the source id the pipelines give them ('gmail_<message id>',
+    'kakaotalk_<chat>_<message id>', ...), so overlapping runs skip them before normalization and
+    classification. Messages whose classification or save failed are not recorded and are retried;
+    'gated' rows are kept for the record but do not count as processed.
+    """
+    __tablename__ = "processed_sources"
+
+    id = Column(Integer, primary_key=True, index=True)
+    source_id = Column(String, unique=True, index=True, nullable=False)
+    outcome = Column(String, nullable=False) # 'task', 'duplicate', 'not_task', 'skipped' (empty) or 'gated'
+    processed_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+
+    def __repr__(self):
+        return f"<ProcessedSource(id={self.id}, source_id='{self.source_id}', outcome='{self.outcome}')>"
+
 # Informational print statement (optional, can be removed)
-# print("Persistence models (Task, SourceToken, FileCursor) defined with SQLAlchemy Base.")
+# print("Persistence models (Task, SourceToken, FileCursor, SyncCursor) defined with SQLAlchemy Base.")
@@ -0,0 +1,116 @@
+# preprocessing/budget.py
+"""
+Token budgeting of normalized content before it is sent to TaskClassifier.
+
+Long newsletters and reply-heavy threads would otherwise become thousands of prompt tokens.
+`budget_content` keeps the subject and sender, the leading paragraph, and then the paragraphs
+that look task-related (deadlines, dates, times, requests), in their original order, until
+the token budget is spent.
+
+Token counts are local estimates: `tiktoken` is used when it is installed, otherwise a
+character-class heuristic (about 4 ASCII characters per token, one token per other character,
+which over- rather than under-counts Hangul).
+"""
+import math
+import re
+from typing import List, Optional, Tuple
+
+import config
+
+try:
+    import tiktoken
+    _ENCODING = tiktoken.get_encoding("cl100k_base")
+except Exception: # Not installed, or the encoding file cannot be loaded offline
+    _ENCODING = None
+
+_NON_ASCII_RE = re.compile(r"[^\x00-\x7f]")
+_PARAGRAPH_SPLIT_RE = re.compile(r"\n\s*\n")
+_TASK_CUE_RE = re.compile(
+    r"\b(?:due|deadline|by|until|before|submit|send|reply|rsvp|meeting|meet|call|schedule[ds]?|appointment"
+    r"|reminder|remind|please|todo|to-do|action|assign(?:ed|ment)?|review|today|tonight|tomorrow|next week"
+    r"|mon(?:day)?|tue(?:sday)?|wed(?:nesday)?|thu(?:rsday)?|fri(?:day)?|sat(?:urday)?|sun(?:day)?)\b"
+    r"|\b\d{1,2}(?::\d{2})?\s?(?:am|pm)\b|\b\d{4}-\d{2}-\d{2}\b|\b\d{1,2}/\d{1,2}\b"
+    r"|마감|제출|회의|미팅|일정|약속|까지|오늘|내일|모레|다음 ?주|부탁|확인 ?(?:바랍|부탁)|\d{1,2}시|\d{1,2}월 ?\d{1,2}일",
+    re.IGNORECASE,
+)
+
+
+def estimate_tokens(text: str) -> int:
+    """Estimated number of prompt tokens for `text`."""
+    if not text:
+        return 0
+    if _ENCODING is not None:
+        return len(_ENCODING.encode(text, disallowed_special=()))
+    non_ascii = len(_NON_ASCII_RE.findall(text))
+    return math.ceil((len(text) - non_ascii) / 4) + non_ascii
+
+
+def _truncate_to_tokens(text: str, max_tokens: int) -> str:
+    """Longest prefix of `text` estimated at no more than `max_tokens` tokens, cut at a word boundary if possible."""
+    if max_tokens <= 0:
+        return ""
+    low, high = 0, len(text)
+    while low < high: # Binary search on the prefix length
+        mid = (low + high + 1) // 2
+        if estimate_tokens(text[:mid]) <= max_tokens: low = mid
+        else: high = mid - 1
+    prefix = text[:low]
+    if low < len(text) and ' ' in prefix[len(prefix) // 2:]:
+        prefix = prefix[:prefix.rindex(' ')]
+    return prefix.rstrip()
+
+
+def _paragraphs(text: str) -> List[str]:
+    paragraphs = [p.strip() for p in _PARAGRAPH_SPLIT_RE.split(text) if p.strip()]
+    if len(paragraphs) == 1 and '\n' in paragraphs[0]:
+        # HTML-derived text has one text node per line and no blank lines between paragraphs.
+        paragraphs = [line.strip() for line in paragraphs[0].split('\n') if line.strip()]
+    return paragraphs
+
+
+def budget_content(body: str, subject: Optional[str] = None, sender: Optional[str] = None,
+                   max_tokens: Optional[int] = None) -> Tuple[str, int, int]:
+    """
+    Builds the classifier input for one item within `max_tokens` (default CLASSIFIER_MAX_INPUT_TOKENS).
+
+    Args:
+        body: Normalized text.
+        subject: Email subject, always kept (truncated only if it alone exceeds the budget).
+        sender: Sender, always kept.
+        max_tokens: Token budget; 0 or negative disables budgeting.
+
+    Returns:
+        (content, content_tokens, trimmed_tokens): the text to classify, its estimated token count,
+        and the estimated tokens left out.
+    """
+    max_tokens = config.CLASSIFIER_MAX_INPUT_TOKENS if max_tokens is None else max_tokens
+    header_lines = []
+    if subject: header_lines.append(f"Subject: {subject}")
+    if sender: header_lines.append(f"From: {sender}")
+    header = "\n".join(header_lines)
+    full_content = f"{header}\n\n{body}" if header and body else (header or body or "")
+    full_tokens = estimate_tokens(full_content)
+    if max_tokens <= 0 or full_tokens <= max_tokens:
+        return full_content, full_tokens, 0
+
+    header = _truncate_to_tokens(header, max_tokens)
+    remaining = max_tokens - estimate_tokens(header) - (2 if header else 0) # Blank line separator
+    paragraphs = _paragraphs(body or "")
+    # Leading paragraph first, then task-looking paragraphs, then the rest, each group in text order.
+    priority = sorted(range(len(paragraphs)),
+                      key=lambda i: (i != 0, not _TASK_CUE_RE.search(paragraphs[i]), i))
+    selected = {}
+    for i in priority:
+        if remaining <= 0:
+            break
+        cost = estimate_tokens(paragraphs[i]) + 1 # Newline separator
+        if cost <= remaining:
+            selected[i] = paragraphs[i]
+            remaining -= cost
+        elif i == 0:
+            selected[i] = _truncate_to_tokens(paragraphs[i], remaining - 1)
+            remaining -= estimate_tokens(selected[i]) + 1
+    kept_body = "\n".join(selected[i] for i in sorted(selected) if selected[i])
+    content = f"{header}\n\n{kept_body}" if header and kept_body else (header or kept_body)
+    content_tokens = estimate_tokens(content)
+    return content, content_tokens, max(0, full_tokens - content_tokens)
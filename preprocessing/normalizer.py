@@ -1,34 +1,262 @@
+import re
+from html.parser import HTMLParser
+
 from bs4 import BeautifulSoup
+from bs4.dammit import EntitySubstitution, UnicodeDammit
+
+import config
 
 # Placeholder for normalizer
 print("Normalizer initialized")
 
-def html_to_plaintext(html_content):
-    """Converts HTML content to plaintext."""
-    if not html_content:
-        return ""
+# Elements whose text is never shown. BeautifulSoup keeps it as Script/Stylesheet/TemplateString
+# nodes, which get_text() skips.
+_NON_TEXT_TAGS = frozenset({'script', 'style', 'template'})
+# Elements without content or end tag; a hidden one has no text to drop.
+_VOID_TAGS = frozenset({'area', 'base', 'br', 'col', 'embed', 'hr', 'img', 'input', 'link', 'meta', 'param',
+                        'source', 'track', 'wbr'})
+_HIDDEN_STYLE_RE = re.compile(r"(?:^|;)\s*(?:display\s*:\s*none|visibility\s*:\s*hidden)\s*(?:!important\s*)?(?:;|$)",
+                              re.IGNORECASE)
+_PIXEL_SIZE_RE = re.compile(r"^\s*[01](?:\.0*)?\s*(?:px)?\s*$", re.IGNORECASE)
+_STYLE_SIZE_RE = re.compile(r"(?:^|;)\s*(width|height)\s*:\s*([^;]*)", re.IGNORECASE)
+_NUMERIC_CHARREF_RE = {10: re.compile(r"^([0-9]+)(.*)"), 16: re.compile(r"^([0-9a-f]+)(.*)")}
+
+
+def _is_hidden_element(tag, attrs) -> bool:
+    """
+    Tracking markup: elements styled display:none or visibility:hidden, or with a `hidden`
+    attribute (newsletter preheaders, open-tracking blocks), and images at most 1x1 pixel.
+    """
+    attrs = dict(attrs)
+    if 'hidden' in attrs or _HIDDEN_STYLE_RE.search(attrs.get('style') or ''):
+        return True
+    if tag != 'img':
+        return False
+    sizes = {name.lower(): value for name, value in _STYLE_SIZE_RE.findall(attrs.get('style') or '')}
+    width, height = attrs.get('width') or sizes.get('width'), attrs.get('height') or sizes.get('height')
+    return bool(width and height and _PIXEL_SIZE_RE.match(width) and _PIXEL_SIZE_RE.match(height))
+
+
+class _TextExtractor(HTMLParser):
+    """
+    Streaming tag stripper: collects text nodes as the parser emits them, without building a tree.
+    Produces the same output as BeautifulSoup(html, 'html.parser').get_text('\n', strip=True), so
+    character references and text-node boundaries are handled the way BeautifulSoup's html.parser
+    builder handles them. Non-text elements and tracking markup (_is_hidden_element) are skipped
+    with their content.
+    """
+
+    def __init__(self):
+        super().__init__(convert_charrefs=False)
+        self.chunks = []
+        self._pending = [] # Data of the current text node, which ends at the next tag/comment/declaration
+        self._open_non_text_tags = [] # The skipped element and the elements opened inside it
+
+    def _end_text_node(self):
+        if self._pending:
+            text = ''.join(self._pending).strip()
+            self._pending = []
+            if text and not self._open_non_text_tags: self.chunks.append(text)
+
+    def handle_starttag(self, tag, attrs):
+        self._end_text_node()
+        # A tracking pixel is a void element: it has no text and nothing to skip.
+        if tag in _VOID_TAGS:
+            return
+        if self._open_non_text_tags or tag in _NON_TEXT_TAGS or _is_hidden_element(tag, attrs):
+            self._open_non_text_tags.append(tag)
+
+    def handle_endtag(self, tag):
+        self._end_text_node()
+        if tag in self._open_non_text_tags:
+            # Like BeautifulSoup, an end tag closes the most recent open element of that name.
+            while self._open_non_text_tags.pop() != tag:
+                pass
+
+    def handle_data(self, data):
+        self._pending.append(data)
+
+    def handle_charref(self, name):
+        base = 16 if name[:1] in ('x', 'X') else 10
+        digits = name[1:] if base == 16 else name
+        extra_data = ""
+        try:
+            codepoint = int(digits, base)
+        except ValueError:
+            match = _NUMERIC_CHARREF_RE[base].search(digits)
+            if match is None:
+                self._pending.append(digits)
+                return
+            codepoint, extra_data = int(match.group(1), base), match.group(2)
+        self._pending.append(UnicodeDammit.numeric_character_reference(codepoint)[0])
+        self._pending.append(extra_data)
+
+    def handle_entityref(self, name):
+        character = EntitySubstitution.HTML_ENTITY_TO_CHARACTER.get(name)
+        self._pending.append(character if character is not None else f"&{name}")
+
+    def handle_comment(self, data):
+        self._end_text_node()
+
+    def handle_decl(self, decl):
+        self._end_text_node()
+
+    def handle_pi(self, data):
+        self._end_text_node()
+
+    def unknown_decl(self, data):
+        self._end_text_node()
+        # <![CDATA[...]]> sections are text to BeautifulSoup as well; other declarations are not
+        if data.upper().startswith('CDATA['):
+            self._pending.append(data[6:])
+            self._end_text_node()
+
+    def close(self):
+        super().close()
+        self._end_text_node()
+
+
+def _html_to_plaintext_beautifulsoup(html_content):
     soup = BeautifulSoup(html_content, 'html.parser')
+    for element in soup.find_all(lambda element: _is_hidden_element(element.name, element.attrs.items())):
+        element.decompose()
     return soup.get_text(separator='\n', strip=True)
 
+
+def _html_to_plaintext_streaming(html_content):
+    extractor = _TextExtractor()
+    extractor.feed(html_content)
+    extractor.close()
+    return '\n'.join(extractor.chunks)
+
+
+# HTML-to-text backends by name; NORMALIZER_HTML_BACKEND in config.py selects the default.
+HTML_BACKENDS = {
+    'streaming': _html_to_plaintext_streaming,
+    'beautifulsoup': _html_to_plaintext_beautifulsoup,
+}
+
+
+def html_to_plaintext(html_content, backend=None):
+    """Converts HTML content to plaintext using `backend` (default: config.NORMALIZER_HTML_BACKEND)."""
+    if not html_content:
+        return ""
+    backend = backend or config.NORMALIZER_HTML_BACKEND
+    if backend not in HTML_BACKENDS:
+        print(f"Unknown HTML backend '{backend}'. Falling back to 'beautifulsoup'.")
+        backend = 'beautifulsoup'
+    return HTML_BACKENDS[backend](html_content)
+
+# Emoji and pictograph code points, plus the joiners, variation selectors, keycaps and tags
+# that combine them into sequences (e.g. 👍🏽, 👨‍👩‍👧, 1️⃣, flags).
+_EMOJI_RE = re.compile(
+    "["
+    "\U0001F000-\U0001FAFF" # Mahjong/cards, enclosed alphanumerics, pictographs, emoticons, transport, flags
+    "\u2600-\u27BF"         # Miscellaneous symbols and dingbats
+    "\u231A\u231B\u23E9-\u23FA\u2B05-\u2B07\u2B1B\u2B1C\u2B50\u2B55"
+    "\u200D\uFE0E\uFE0F\u20E3"
+    "\U000E0020-\U000E007F"
+    "]+"
+)
+
+# A line matching one of these starts boilerplate that runs to the end of the text:
+# reply headers, signature delimiters and mobile signatures.
+_CUTOFF_LINE_RE = re.compile(
+    r"\s*(?:"
+    r"On\s.{1,300}\swrote:"
+    r"|.{1,300}님이 작성:"
+    r"|-{2,}\s*(?:Original Message|원본 메시지)\s*-{2,}"
+    r"|--\s?$"
+    r"|Sent from my \w+"
+    r"|(?:iPhone|iPad|Galaxy|Android|모바일)에서 보냄"
+    r")",
+    re.IGNORECASE,
+)
+# Common legal/newsletter footer lines. Newsletters also put "Unsubscribe" or "You are receiving
+# this email" lines above the content, so such a line only cuts the text after some content has
+# been kept and when at most _FOOTER_MAX_LINES non-empty lines, itself included, are left.
+_FOOTER_LINE_RE = re.compile(
+    r"\s*(?:"
+    r"To unsubscribe|Unsubscribe(?:\s+(?:here|from this list)|\s*\||\s*$)"
+    r"|You (?:are receiving|received) this (?:e-?mail|message) because"
+    r"|This (?:e-?mail|message)(?: and any attachments)? (?:is|are|may be|contains?) (?:strictly )?(?:confidential|privileged)"
+    r"|CONFIDENTIALITY NOTICE"
+    r"|수신(?:을 원하지 않으시면|거부)"
+    r"|본 메일은 발신 ?전용"
+    r")",
+    re.IGNORECASE,
+)
+_FOOTER_MAX_LINES = 12
+# Reply headers that clients wrap over two lines, as (first line, next line) patterns: Gmail's
+# "On <date/time>, <name> [<address>]" with "wrote:" alone on the next line, and Outlook's
+# "From: ..." / "Sent: ..." block. The attribution needs a digit (its date or time) followed by the
+# sender, so a sentence starting with "On" is never taken for one.
+_WRAPPED_HEADERS = (
+    (re.compile(r"\s*On\s.{0,150}\d.{0,150}\s(?:<[^<>\s@]+@[^<>\s]+>|[\w.+-]+@[\w-]+(?:\.[\w-]+)+|[^\W\d]\S*)\s*$",
+                re.IGNORECASE),
+     re.compile(r"\s*wrote:\s*$", re.IGNORECASE)),
+    (re.compile(r"\s*(?:From|보낸 사람):\s.+$", re.IGNORECASE),
+     re.compile(r"\s*(?:Sent|Date|보낸 날짜):\s", re.IGNORECASE)),
+)
+_QUOTED_LINE_RE = re.compile(r"\s*>")
+
+
 def remove_emojis(text):
-    """Removes emojis from text. Placeholder for now."""
-    # TODO: Implement emoji removal logic (e.g., using a regex or a library)
-    print("Emoji removal (not implemented)")
-    return text
+    """Removes emoji characters and emoji sequences from text."""
+    if not text:
+        return text
+    return _EMOJI_RE.sub('', text)
 
-def normalize(raw_content, content_type='text/html'):
+def strip_boilerplate(text):
+    """
+    Single pass over the lines of `text` that drops quoted reply lines ("> ..."), everything from
+    the first reply header, signature or trailing footer onwards, and emojis.
+
+    Returns:
+        (cleaned_text, chars_removed)
     """
-    Normalizes raw content by stripping HTML, removing emojis (placeholder), etc.
+    if not text:
+        return text or "", 0
+    lines = text.split('\n')
+    kept_lines, has_content = [], False
+    for i, line in enumerate(lines):
+        if _CUTOFF_LINE_RE.match(line):
+            break
+        if has_content and _FOOTER_LINE_RE.match(line) and \
+                sum(1 for rest in lines[i:] if rest.strip()) <= _FOOTER_MAX_LINES:
+            break
+        if i + 1 < len(lines) and any(first_re.match(line) and next_re.match(lines[i + 1])
+                                      for first_re, next_re in _WRAPPED_HEADERS):
+            break
+        if _QUOTED_LINE_RE.match(line):
+            continue
+        kept_lines.append(remove_emojis(line).rstrip())
+        has_content = has_content or bool(kept_lines[-1].strip())
+    cleaned_text = '\n'.join(kept_lines).rstrip()
+    return cleaned_text, len(text) - len(cleaned_text)
+
+def normalize_with_stats(raw_content, content_type='text/html'):
+    """
+    Normalizes raw content by stripping HTML, emojis, quoted replies, signatures and footers.
+
+    Returns:
+        (normalized_text, chars_removed), where chars_removed counts the characters removed by the
+        cleaning stage (not the HTML markup).
     """
     processed_content = raw_content
     if content_type == 'text/html':
         processed_content = html_to_plaintext(processed_content)
 
-    processed_content = remove_emojis(processed_content)
-
-    # Future normalization steps can be added here
+    if not config.NORMALIZER_STRIP_BOILERPLATE:
+        cleaned_content = remove_emojis(processed_content)
+        return cleaned_content, len(processed_content or "") - len(cleaned_content or "")
+    return strip_boilerplate(processed_content)
 
-    return processed_content
+def normalize(raw_content, content_type='text/html'):
+    """
+    Normalizes raw content by stripping HTML, emojis, quoted replies, signatures and footers.
+    """
+    return normalize_with_stats(raw_content, content_type)[0]
 
 if __name__ == '__main__':
     # Example usage
@@ -39,5 +267,5 @@ if __name__ == '__main__':
 
     sample_text_with_emoji = "Hello from the normalizer 👋"
     no_emoji_text = normalize(sample_text_with_emoji, content_type='text/plain')
-    print("\n--- Sample Emoji Removal (Placeholder) ---")
+    print("\n--- Sample Emoji Removal ---")
     print(no_emoji_text)
@@ -3,10 +3,18 @@ import datetime
 import sys
 import logging
 import re # For Markdown escaping
+from concurrent.futures import ThreadPoolExecutor
+
+import config
+from persistence.database import SessionLocal
+from persistence import crud as persistence_crud
 
 # --- Logger for this module ---
 logger = logging.getLogger(f"agenda_manager.{__name__}")
 
+# Account ingested when no Gmail tokens are stored yet (first run authorizes it).
+DEFAULT_GMAIL_USER_ID = "default_gmail_user"
+
 
 # --- Import Pipeline Functions (with fallbacks) ---
 _using_dummy_gmail_pipeline = False
@@ -16,7 +24,7 @@ try:
 except ImportError as e:
     logger.error(f"Failed to import 'run_gmail_ingestion_pipeline' from main: {e}. Using DUMMY.")
     _using_dummy_gmail_pipeline = True
-    def run_gmail_ingestion_pipeline(app_user_id="default_user"):
+    def run_gmail_ingestion_pipeline(app_user_id="default_user", rate_limit_share=1):
         logger.info(f"DUMMY: run_gmail_ingestion_pipeline called for {app_user_id}")
         if app_user_id == "fail_gmail":
             logger.warning("DUMMY: Simulating Gmail pipeline failure as requested.")
@@ -95,11 +103,75 @@ def format_pipeline_result_for_notification(result: dict) -> str:
             (str(result["error"])[:70] + '...') if len(str(result["error"])) > 70 else str(result["error"])
         )
         details += f" \\(Error: _{error_msg_short}_\\)" # Escape parentheses for MD
+    elif result.get("success") and "chat" in result:
+        cursor_info = f"{result.get('items_processed', 0)} new, cursor {result.get('cursor') or 'none'}"
+        details += f" \\({escape_markdown_v2(cursor_info)}\\)"
     # elif result.get("success"):
     #     details += f"{escape_markdown_v2(processed_info)}{escape_markdown_v2(tasks_info)}"
     return details
 
 
+def discover_gmail_accounts() -> list:
+    """Returns the app user IDs with a stored Gmail token, or [DEFAULT_GMAIL_USER_ID] if there are none."""
+    db = SessionLocal()
+    try:
+        account_ids = persistence_crud.get_token_user_ids(db, platform='gmail')
+    except Exception as e:
+        logger.error(f"Could not list Gmail accounts from stored tokens: {e}. Using '{DEFAULT_GMAIL_USER_ID}'.")
+        account_ids = []
+    finally:
+        db.close()
+    return account_ids or [DEFAULT_GMAIL_USER_ID]
+
+
+def _run_gmail_pipeline_for_account(gmail_user_id: str, label_with_account: bool, rate_limit_share: int = 1) -> dict:
+    """
+    Runs the Gmail pipeline for one account; any exception becomes a failed result for that account only.
+    `rate_limit_share` > 1 tells the pipeline how many accounts share the classifier rate limits.
+    """
+    source_name = f"Gmail ({gmail_user_id})" if label_with_account else "Gmail"
+    logger.info(f"Starting Gmail pipeline for user: {gmail_user_id}...")
+    try:
+        if rate_limit_share > 1:
+            gmail_result_data = run_gmail_ingestion_pipeline(app_user_id=gmail_user_id, rate_limit_share=rate_limit_share)
+        else:
+            gmail_result_data = run_gmail_ingestion_pipeline(app_user_id=gmail_user_id)
+        if isinstance(gmail_result_data, dict) and "success" in gmail_result_data:
+            result = dict(gmail_result_data)
+        else: # Unexpected return value
+            result = {"success": True, "tasks_created": "N/A", "processed_items": "N/A", "error": None}
+        logger.info(f"Gmail pipeline for '{gmail_user_id}' finished (success: {result.get('success')}).")
+    except Exception as e:
+        logger.error(f"Error during Gmail pipeline execution for '{gmail_user_id}': {e}", exc_info=True)
+        result = {"success": False, "tasks_created": 0, "processed_items": 0, "error": str(e)}
+    result["source"] = source_name
+    result["account"] = gmail_user_id
+    return result
+
+
+def run_gmail_pipelines_for_accounts(account_ids: list, max_concurrency: int | None = None) -> list:
+    """
+    Ingests every Gmail account with at most `max_concurrency` (default GMAIL_ACCOUNT_CONCURRENCY)
+    pipelines running at once. Returns one result summary per account, in `account_ids` order.
+    Each pipeline writes through its own session; on SQLite, a writer waits up to
+    SQLITE_BUSY_TIMEOUT_MS for another account's transaction instead of failing with "database is
+    locked", and a window that still fails is rolled back and retried on the next run. The
+    classifier RPM/TPM limits are per process, so each concurrent pipeline gets 1/workers of them.
+    """
+    if not account_ids:
+        return []
+    max_concurrency = max_concurrency or config.GMAIL_ACCOUNT_CONCURRENCY
+    label_with_account = len(account_ids) > 1
+    workers = max(1, min(max_concurrency, len(account_ids)))
+    if workers == 1:
+        return [_run_gmail_pipeline_for_account(account_id, label_with_account) for account_id in account_ids]
+    logger.info(f"Running Gmail pipelines for {len(account_ids)} accounts, {workers} at a time...")
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="gmail-account") as executor:
+        return list(executor.map(lambda account_id: _run_gmail_pipeline_for_account(account_id, label_with_account,
+                                                                                     rate_limit_share=workers),
+                                 account_ids))
+
+
 def scheduled_job():
     """
     The job function executed by the scheduler.
@@ -112,22 +184,8 @@ def scheduled_job():
 
     pipeline_results = []
 
-    # --- Run Gmail Pipeline ---
-    gmail_user_id = "default_gmail_user"
-    logger.info(f"Starting Gmail pipeline for user: {gmail_user_id}...")
-    try:
-        # Actual pipeline functions in main.py currently do not return structured results.
-        # This will be assumed success if no exception, and counts will be "N/A".
-        # The dummy functions do return a dict, so we handle that.
-        gmail_result_data = run_gmail_ingestion_pipeline(app_user_id=gmail_user_id)
-        if isinstance(gmail_result_data, dict) and "success" in gmail_result_data:
-             pipeline_results.append(gmail_result_data)
-        else: # Real pipeline (no return value yet) or unexpected return
-             pipeline_results.append({"success": True, "source": "Gmail", "tasks_created": "N/A", "processed_items": "N/A", "error": None})
-        logger.info("Gmail pipeline finished successfully.")
-    except Exception as e:
-        logger.error(f"Error during Gmail pipeline execution: {e}", exc_info=True)
-        pipeline_results.append({"success": False, "source": "Gmail", "tasks_created": 0, "processed_items": 0, "error": str(e)})
+    # --- Run Gmail Pipelines (one per account, concurrently) ---
+    pipeline_results.extend(run_gmail_pipelines_for_accounts(discover_gmail_accounts()))
 
     # --- Run KakaoTalk Pipeline ---
     kakaotalk_user_id = "default_kakaotalk_user"
@@ -135,7 +193,8 @@ def scheduled_job():
     try:
         kakaotalk_result_data = run_kakaotalk_ingestion_pipeline(app_user_id=kakaotalk_user_id)
         if isinstance(kakaotalk_result_data, dict) and "success" in kakaotalk_result_data:
-            pipeline_results.append(kakaotalk_result_data)
+            # A multi-chat run reports one line per chat.
+            pipeline_results.extend(kakaotalk_result_data.get("chats") or [kakaotalk_result_data])
         else:
             pipeline_results.append({"success": True, "source": "KakaoTalk (Experimental)", "tasks_created": "N/A", "processed_items": "N/A", "error": None})
         logger.info("KakaoTalk pipeline finished successfully (experimental).")
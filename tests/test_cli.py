@@ -162,6 +162,25 @@ class TestCliCommands(unittest.TestCase):
         self.assertIn("#urgent_cli", result.stdout)
         mock_crud.get_tasks.assert_called_once_with(mock_db_session, skip=0, limit=1000)
 
+    @patch('cli.main_cli.tag_conflicts')
+    @patch('cli.main_cli.detect_conflicts')
+    @patch('cli.main_cli.SessionLocal')
+    def test_conflicts_lists_and_tags_pairs(self, MockSessionLocal, mock_detect, mock_tag):
+        mock_db_session = MagicMock(); MockSessionLocal.return_value = mock_db_session
+        first = Task(id=1); first.title="Dentist"; first.due_dt=datetime(2024,1,1,10,0)
+        second = Task(id=2); second.title="Team sync"; second.due_dt=datetime(2024,1,1,10,30)
+        mock_detect.return_value = [(first, second)]
+        mock_tag.return_value = [first, second]
+
+        result = runner.invoke(cli_app, ["conflicts", "--from", "2024-01-01", "--to", "2024-01-07", "--tag"])
+
+        self.assertEqual(result.exit_code, 0, f"CLI conflicts command failed: {result.stdout}")
+        self.assertIn("Dentist", result.stdout)
+        self.assertIn("2: Team sync (10:30)", result.stdout)
+        self.assertIn("Tagged 2 task(s) with #conflict.", result.stdout)
+        mock_detect.assert_called_once_with(mock_db_session, date(2024,1,1), date(2024,1,7))
+        mock_tag.assert_called_once_with(mock_db_session, [(first, second)])
+
     @patch('cli.main_cli.crud')
     @patch('cli.main_cli.SessionLocal')
     def test_show_task_success(self, MockSessionLocal, mock_crud):
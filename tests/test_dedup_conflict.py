@@ -0,0 +1,118 @@
+import unittest
+from datetime import date, datetime, timedelta
+from unittest.mock import patch
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+import config
+from dedup_conflict import fingerprints
+from dedup_conflict.fingerprints import BloomFilter, FingerprintIndex, get_fingerprint_index
+from dedup_conflict.resolver import detect_conflicts, find_conflicts, tag_new_task_conflicts
+from persistence import crud
+from persistence.models import Base, TaskStatus
+
+
+class TestFingerprintIndex(unittest.TestCase):
+
+    def test_set_index_loads_rows_and_tracks_inserts(self):
+        index = FingerprintIndex()
+        index.load([(3, "fp_a"), (8, "fp_b")])
+        index.add("fp_c")
+        self.assertEqual(index.max_task_id, 8)
+        self.assertTrue(all(index.might_contain(fp) for fp in ("fp_a", "fp_b", "fp_c")))
+        self.assertFalse(index.might_contain("fp_missing"))
+        self.assertEqual(index.stats, {"checked": 4, "maybe": 3})
+
+    def test_bloom_filter_has_no_false_negatives_and_few_false_positives(self):
+        bloom = BloomFilter(capacity=2000, error_rate=0.01)
+        for i in range(2000): bloom.add(f"stored_{i}")
+        self.assertTrue(all(f"stored_{i}" in bloom for i in range(2000)))
+        false_positives = sum(1 for i in range(10000) if f"new_{i}" in bloom)
+        self.assertLess(false_positives, 300) # ~1% expected
+
+    def test_saturated_bloom_index(self):
+        index = FingerprintIndex(bloom_capacity=2)
+        index.load([(1, "a"), (2, "b")])
+        self.assertFalse(index.saturated)
+        index.add("c")
+        self.assertTrue(index.saturated)
+
+
+class TestSharedFingerprintIndex(unittest.TestCase):
+
+    def setUp(self):
+        fingerprints._indexes.clear()
+        self.engine = create_engine("sqlite:///:memory:")
+        Base.metadata.create_all(self.engine)
+        self.db = sessionmaker(autocommit=False, autoflush=False, bind=self.engine)()
+
+    def tearDown(self):
+        self.db.close()
+        self.engine.dispose()
+        fingerprints._indexes.clear()
+
+    def test_refresh_picks_up_tasks_stored_since_the_last_run(self):
+        crud.create_task(self.db, {"title": "Stored", "source": "test", "fingerprint": "fp_stored"})
+        index = get_fingerprint_index(self.db)
+        self.assertTrue(index.might_contain("fp_stored"))
+        self.assertFalse(index.might_contain("fp_later"))
+
+        crud.create_task(self.db, {"title": "Later", "source": "other_process", "fingerprint": "fp_later"})
+        self.assertIs(get_fingerprint_index(self.db), index)
+        self.assertTrue(index.might_contain("fp_later"))
+
+    def test_off_disables_the_index(self):
+        with patch.object(config, "FINGERPRINT_INDEX", "off"):
+            self.assertIsNone(get_fingerprint_index(self.db))
+
+
+class TestConflictDetection(unittest.TestCase):
+
+    def setUp(self):
+        self.engine = create_engine("sqlite:///:memory:")
+        Base.metadata.create_all(self.engine)
+        self.db = sessionmaker(autocommit=False, autoflush=False, bind=self.engine)()
+
+    def tearDown(self):
+        self.db.close()
+        self.engine.dispose()
+
+    def _task(self, title, due_dt, status=TaskStatus.TODO):
+        return crud.create_task(self.db, {"title": title, "source": f"test_{title}", "due_dt": due_dt, "status": status})
+
+    def test_find_conflicts_pairs_same_day_tasks_within_the_window(self):
+        tasks = [self._task(title, due) for title, due in (
+            ("late", datetime(2025, 3, 3, 23, 30)), ("next_day", datetime(2025, 3, 4, 0, 15)),
+            ("a", datetime(2025, 3, 3, 9, 0)), ("b", datetime(2025, 3, 3, 9, 59)), ("c", datetime(2025, 3, 3, 10, 30)),
+            ("date_only", datetime(2025, 3, 3, 0, 0)), ("far", datetime(2025, 3, 3, 12, 0)))]
+        pairs = [(first.title, second.title) for first, second in find_conflicts(tasks, timedelta(hours=1))]
+        self.assertEqual(pairs, [("a", "b"), ("b", "c")]) # Not across midnight, not date-only tasks
+
+    def test_detect_conflicts_skips_closed_tasks(self):
+        self._task("open", datetime(2025, 3, 3, 9, 0))
+        self._task("done", datetime(2025, 3, 3, 9, 30), status=TaskStatus.DONE)
+        self._task("open_too", datetime(2025, 3, 5, 14, 0))
+        self._task("open_again", datetime(2025, 3, 5, 14, 45))
+        pairs = detect_conflicts(self.db, date(2025, 3, 3), date(2025, 3, 5), timedelta(hours=1))
+        self.assertEqual([(first.title, second.title) for first, second in pairs], [("open_too", "open_again")])
+
+    def test_new_task_conflicts_are_tagged_in_one_write(self):
+        stored = self._task("stored", datetime(2025, 3, 3, 9, 0))
+        unrelated = [self._task("old_a", datetime(2025, 3, 3, 15, 0)), self._task("old_b", datetime(2025, 3, 3, 15, 30))]
+        new = crud.create_tasks_bulk(self.db, [{"title": "new", "source": "test_new", "due_dt": datetime(2025, 3, 3, 9, 40)},
+                                               {"title": "untimed", "source": "test_untimed", "due_dt": None}], commit=False)
+
+        with patch.object(crud, "add_tag_to_tasks", wraps=crud.add_tag_to_tasks) as add_tag:
+            conflicting = tag_new_task_conflicts(self.db, new)
+        self.db.commit()
+
+        self.assertEqual(conflicting, {stored.id, new[0].id})
+        add_tag.assert_called_once()
+        self.assertEqual(crud.get_task(self.db, stored.id).tags, "#conflict")
+        self.assertEqual(crud.get_task(self.db, new[0].id).tags, "#conflict")
+        self.assertTrue(all(crud.get_task(self.db, task.id).tags is None for task in unrelated)) # Only pairs with a new task
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,8 +1,15 @@
+import json
+import time
 import unittest
 from datetime import datetime, date, timedelta
-from extract_nlp.classifiers import resolve_date
-# For mocking current date in tests if needed, though dateparser handles relative dates well.
-# from unittest.mock import patch
+import asyncio
+from unittest.mock import patch, MagicMock, AsyncMock
+import openai
+from extract_nlp.classifiers import resolve_date, TaskClassifier
+from extract_nlp.dates import DateResolver
+from extract_nlp.cache import ClassificationCache
+from extract_nlp.rate_limit import AdaptiveRateLimiter
+from extract_nlp.gate import PreClassifier, LogisticModel, extract_features, bulk_headers_of
 
 class TestDateResolver(unittest.TestCase):
 
@@ -120,6 +127,86 @@ class TestDateResolver(unittest.TestCase):
         # parsed_dt_auto_fr = resolve_date(french_date_str)
         # self.assertEqual(parsed_dt_auto_fr, datetime(2024, 8, 15))
 
+
+class TestDateResolverEngine(unittest.TestCase):
+    BASE = datetime(2024, 3, 13, 9, 41, 7) # A Wednesday
+
+    def resolve(self, resolver, text, **settings):
+        return resolver.resolve(text, {'RELATIVE_BASE': self.BASE, **settings})
+
+    @patch('extract_nlp.dates.dateparser.parse')
+    def test_fast_paths_resolve_common_shapes_without_dateparser(self, mock_parse):
+        resolver = DateResolver(languages=['en', 'ko'])
+        expected = {
+            "2024-03-20": datetime(2024, 3, 20),
+            "2024-03-20 14:30": datetime(2024, 3, 20, 14, 30),
+            "2024/3/20T09:05:30": datetime(2024, 3, 20, 9, 5, 30),
+            "tomorrow": datetime(2024, 3, 14, 9, 41, 7),
+            "Tomorrow at 3:30 p.m.": datetime(2024, 3, 14, 15, 30),
+            "3pm tomorrow": datetime(2024, 3, 14, 15, 0),
+            "next Monday": datetime(2024, 3, 18),
+            "next Wednesday 10:00": datetime(2024, 3, 20, 10, 0),
+            "this Wednesday": datetime(2024, 3, 13),
+            "in 3 days": datetime(2024, 3, 16, 9, 41, 7),
+            "내일 오후 3시": datetime(2024, 3, 14, 15, 0),
+            "모레 오전 9시 30분": datetime(2024, 3, 15, 9, 30),
+            "오늘 오후 3시 반까지": datetime(2024, 3, 13, 15, 30),
+            "다음주 월요일": datetime(2024, 3, 18),
+            "이번 주 금요일 18:00": datetime(2024, 3, 15, 18, 0),
+            "2시간 뒤": datetime(2024, 3, 13, 11, 41, 7),
+        }
+        for text, due in expected.items():
+            with self.subTest(text=text):
+                self.assertEqual(self.resolve(resolver, text), due)
+        self.assertIsNone(self.resolve(resolver, "2024-02-30"))
+        mock_parse.assert_not_called()
+        self.assertEqual(resolver.stats["fast_path"], len(expected) + 1)
+
+    @patch('extract_nlp.dates.dateparser.parse', return_value=datetime(2024, 3, 14, 3, 0))
+    def test_other_text_goes_to_dateparser_with_configured_languages(self, mock_parse):
+        resolver = DateResolver(languages=['en', 'ko'])
+        self.assertEqual(self.resolve(resolver, "내일 3시"), datetime(2024, 3, 14, 3, 0)) # No 오전/오후: ambiguous
+        mock_parse.assert_called_once_with("내일 3시", languages=['en', 'ko'], settings={'RELATIVE_BASE': self.BASE})
+        self.resolve(resolver, "15 août 2024", LANGUAGES=['fr'])
+        self.assertEqual(mock_parse.call_args.kwargs["languages"], ['fr'])
+        self.assertNotIn('LANGUAGES', mock_parse.call_args.kwargs["settings"])
+        # DATE_ORDER changes how dateparser reads even ISO dates, so the fast path steps aside.
+        self.resolve(resolver, "2024-03-20", DATE_ORDER='DMY')
+        self.assertEqual(mock_parse.call_count, 3)
+
+    @patch('extract_nlp.dates.dateparser.parse', return_value=datetime(2024, 8, 22, 10, 0))
+    def test_results_are_memoized_per_text_reference_date_and_settings(self, mock_parse):
+        resolver = DateResolver(languages=['en'], cache_size=2)
+        for _ in range(3):
+            self.assertEqual(self.resolve(resolver, "August 22 at 10"), datetime(2024, 8, 22, 10, 0))
+        self.assertEqual(mock_parse.call_count, 1)
+        self.assertEqual(resolver.stats["cache_hits"], 2)
+        self.resolve(resolver, "August 22 at 10", PREFER_DATES_FROM='future')
+        resolver.resolve("August 22 at 10", {'RELATIVE_BASE': self.BASE + timedelta(days=1)})
+        self.assertEqual(mock_parse.call_count, 3)
+        self.resolve(resolver, "August 22 at 10") # Evicted by the two entries above
+        self.assertEqual(mock_parse.call_count, 4)
+
+    @patch('extract_nlp.dates.dateparser.parse', return_value=datetime(2024, 8, 22, 10, 0))
+    def test_results_that_follow_the_clock_are_not_memoized_without_relative_base(self, mock_parse):
+        resolver = DateResolver(languages=['en'])
+        morning, afternoon = self.BASE, self.BASE.replace(hour=15)
+        with patch('extract_nlp.dates.datetime', wraps=datetime) as mock_datetime:
+            mock_datetime.now.side_effect = [morning, afternoon] * 4
+            self.assertEqual(resolver.resolve("in 2 hours"), datetime(2024, 3, 13, 11, 41, 7))
+            self.assertEqual(resolver.resolve("in 2 hours"), datetime(2024, 3, 13, 17, 41, 7))
+            self.assertEqual(resolver.resolve("tomorrow"), datetime(2024, 3, 14, 9, 41, 7))
+            self.assertEqual(resolver.resolve("tomorrow"), datetime(2024, 3, 14, 15, 41, 7))
+            resolver.resolve("August 22 at 10")
+            resolver.resolve("August 22 at 10") # dateparser's result may follow the clock too
+            self.assertEqual(mock_parse.call_count, 2)
+            self.assertEqual(resolver.stats["cache_hits"], 0)
+            # Shapes pinned to the date are still memoized for the day.
+            self.assertEqual(resolver.resolve("next Monday 10:00"), datetime(2024, 3, 18, 10, 0))
+            self.assertEqual(resolver.resolve("next Monday 10:00"), datetime(2024, 3, 18, 10, 0))
+        self.assertEqual(resolver.stats["cache_hits"], 1)
+
+
 if __name__ == '__main__':
     unittest.main()
 
@@ -242,6 +329,125 @@ class TestTaskClassifierLLM(unittest.TestCase):
         result = self.classifier.classify_task("Text leading to LLM returning invalid JSON", source_id="jsonerror1")
         self.assertIsNone(result)
 
+    def test_classify_task_accumulates_reported_token_usage(self):
+        for prompt_tokens in (120, 80):
+            mock_llm_response = self._prepare_mock_llm_response(is_task=False)
+            mock_llm_response.usage.prompt_tokens = prompt_tokens
+            mock_llm_response.usage.completion_tokens = 9
+            self.mock_openai_instance.chat.completions.create.return_value = mock_llm_response
+            self.classifier.classify_task("Lunch was great.", source_id="chat1")
+
+        self.assertEqual(self.classifier.usage, {"calls": 2, "prompt_tokens": 200, "completion_tokens": 18})
+
+    def test_classify_task_cache_hit_skips_api_call(self):
+        cache = ClassificationCache(":memory:")
+        self.classifier.cache = cache
+        self.mock_openai_instance.chat.completions.create.return_value = self._prepare_mock_llm_response(
+            is_task=True, task_type="meeting", title="Project Review", body_summary="Discuss Project X.")
+
+        first = self.classifier.classify_task("Team meeting next Monday 10 AM", source_id="email1")
+        second = self.classifier.classify_task("Team meeting next Monday 10 AM", source_id="email2")
+        self.classifier.classify_task("Team meeting next Tuesday 10 AM", source_id="email3")
+
+        self.assertEqual(second, dict(first, source_id="email2"))
+        self.assertEqual(self.mock_openai_instance.chat.completions.create.call_count, 2)
+        self.assertEqual(self.classifier.cache_stats, {"hits": 1, "misses": 2})
+
+        self.classifier.PROMPT_VERSION = "2" # A prompt change invalidates earlier entries
+        self.classifier.classify_task("Team meeting next Monday 10 AM", source_id="email4")
+        self.assertEqual(self.mock_openai_instance.chat.completions.create.call_count, 3)
+        cache.close()
+
+    def test_classify_tasks_returns_results_in_input_order_and_retries_429(self):
+        async def create(**kwargs):
+            text = kwargs["messages"][1]["content"]
+            if "slow" in text: await asyncio.sleep(0.05) # Finishes after the later items
+            return self._prepare_mock_llm_response(is_task=True, title=text.split("---\n")[1].split("\n")[0])
+        rate_limit_error = openai.RateLimitError(
+            "Rate limited", response=MagicMock(status_code=429, headers={"retry-after-ms": "10"}), body=None)
+        self.classifier.async_client = AsyncMock()
+        self.classifier.async_client.chat.completions.create = AsyncMock(side_effect=self._fail_once_then(rate_limit_error, create))
+        limiter = AdaptiveRateLimiter(max_concurrency=4)
+
+        results = self.classifier.classify_tasks(
+            [("slow item", "email1"), ("item 2", "email2"), ("item 3", "email3")], limiter=limiter)
+        self.classifier.close()
+
+        self.assertEqual([r["title"] for r in results], ["slow item", "item 2", "item 3"])
+        self.assertEqual([r["source_id"] for r in results], ["email1", "email2", "email3"])
+        self.assertEqual(self.classifier.retry_stats["rate_limited"], 1)
+        self.assertEqual(limiter.stats["rate_limited"], 1)
+        self.assertLess(limiter.concurrency_limit, 4)
+
+    def test_classify_task_async_does_not_retry_client_errors(self):
+        bad_request = openai.BadRequestError("Bad request", response=MagicMock(status_code=400, headers={}), body=None)
+        self.classifier.async_client = AsyncMock()
+        self.classifier.async_client.chat.completions.create = AsyncMock(side_effect=bad_request)
+
+        loop = asyncio.new_event_loop() # Not asyncio.run(), which resets the thread's default loop
+        try: result = loop.run_until_complete(self.classifier.classify_task_async("Any text", source_id="error2", max_retries=3))
+        finally: loop.close()
+
+        self.assertIsNone(result)
+        self.assertEqual(self.classifier.async_client.chat.completions.create.await_count, 1)
+
+    @staticmethod
+    def _fail_once_then(error, handler):
+        calls = []
+        async def side_effect(**kwargs):
+            calls.append(kwargs)
+            if len(calls) == 1: raise error
+            return await handler(**kwargs)
+        return side_effect
+
+    def _prepare_mock_batch_response(self, results):
+        mock_response = MagicMock()
+        mock_response.choices[0].message.function_call.arguments = json.dumps({"results": results})
+        return mock_response
+
+    def test_classify_batch_one_request_with_fallback_for_malformed_items(self):
+        batch_response = self._prepare_mock_batch_response([
+            {"index": 2, "is_task": True, "task_type": "meeting", "title": "Standup", "due_date_description": "10am"},
+            {"index": 0, "is_task": False},
+            {"index": 1, "is_task": True, "title": ""}, # Malformed: a task needs a title
+            {"index": 7, "is_task": False}, # No such input
+        ])
+        single_response = self._prepare_mock_llm_response(is_task=True, task_type="reminder", title="Pay rent")
+        self.mock_openai_instance.chat.completions.create.side_effect = [batch_response, single_response]
+
+        results = self.classifier.classify_batch(
+            [("lol ok", "kakao1"), ("pay rent by friday", "kakao2"), ("standup at 10am", "kakao3")])
+
+        self.assertIsNone(results[0])
+        self.assertEqual((results[1]["title"], results[1]["source_id"]), ("Pay rent", "kakao2"))
+        self.assertEqual((results[2]["title"], results[2]["type"], results[2]["due"]), ("Standup", "meeting", "10am"))
+        calls = self.mock_openai_instance.chat.completions.create.call_args_list
+        self.assertEqual(len(calls), 2)
+        self.assertEqual(calls[0].kwargs["function_call"], {"name": "extract_task_details_batch"})
+        self.assertIn("--- [2] ---\nstandup at 10am", calls[0].kwargs["messages"][1]["content"])
+        self.assertIn("pay rent by friday", calls[1].kwargs["messages"][1]["content"])
+        self.assertEqual(self.classifier.batch_stats, {"batches": 1, "batched_items": 3, "fallbacks": 1})
+
+    def test_classify_batch_null_title_only_sends_its_own_item_again(self):
+        batch_response = self._prepare_mock_batch_response([
+            {"index": 0, "is_task": True, "task_type": "meeting", "title": "Standup"},
+            {"index": 1, "is_task": True, "title": None}, # Malformed, but the rest of the batch stands
+            "not an entry",
+        ])
+        single_response = self._prepare_mock_llm_response(is_task=True, task_type="reminder", title="Pay rent")
+        self.mock_openai_instance.chat.completions.create.side_effect = [batch_response, single_response]
+
+        results = self.classifier.classify_batch([("standup at 10am", "kakao1"), ("pay rent by friday", "kakao2")])
+
+        self.assertEqual([result["title"] for result in results], ["Standup", "Pay rent"])
+        self.assertEqual(self.mock_openai_instance.chat.completions.create.call_count, 2)
+        self.assertEqual(self.classifier.batch_stats, {"batches": 1, "batched_items": 2, "fallbacks": 1})
+
+    def test_pack_batches_respects_size_and_token_limits(self):
+        items = [("short", "a"), ("short", "b"), ("x" * 400, "c"), ("short", "d"), ("short", "e")]
+        self.assertEqual(TaskClassifier.pack_batches(items, batch_size=2, max_batch_tokens=0), [[0, 1], [2, 3], [4]])
+        self.assertEqual(TaskClassifier.pack_batches(items, batch_size=10, max_batch_tokens=60), [[0, 1], [2], [3, 4]])
+
     def test_classify_task_minimal_valid_task_from_llm(self):
         # LLM says it's a task and provides only a title.
         # Other details like type, due, body are omitted by LLM.
@@ -261,3 +467,101 @@ class TestTaskClassifierLLM(unittest.TestCase):
         # Body should fallback to a snippet of the original input text
         self.assertEqual(result['body'], input_text[:250]) # As per current fallback logic in TaskClassifier
         self.assertEqual(result['confidence'], 0.90, "Confidence should be high if LLM confirms task with title.")
+
+
+class TestClassificationCache(unittest.TestCase):
+
+    def setUp(self):
+        self.cache = ClassificationCache(":memory:", ttl_s=60, max_entries=2)
+
+    def tearDown(self):
+        self.cache.close()
+
+    def test_key_depends_on_text_model_and_prompt_version(self):
+        keys = {ClassificationCache.make_key("text", "m1", "1"), ClassificationCache.make_key("text", "m2", "1"),
+                ClassificationCache.make_key("text", "m1", "2"), ClassificationCache.make_key("text ", "m1", "1")}
+        self.assertEqual(len(keys), 4)
+
+    def test_negative_results_and_ttl(self):
+        self.assertEqual(self.cache.get("k"), (False, None))
+        self.cache.put("k", None)
+        self.assertEqual(self.cache.get("k"), (True, None))
+        with patch('extract_nlp.cache.time.time', return_value=time.time() + 61):
+            self.assertEqual(self.cache.get("k"), (False, None))
+
+    def test_least_recently_used_entry_is_evicted(self):
+        self.cache.put("a", {"title": "A"})
+        self.cache.put("b", {"title": "B"})
+        with patch('extract_nlp.cache.time.time', return_value=time.time() + 1):
+            self.cache.get("a") # "b" is now the least recently used
+            self.cache.put("c", {"title": "C"})
+        self.assertEqual(self.cache.get("b"), (False, None))
+        self.assertEqual(self.cache.get("a"), (True, {"title": "A"}))
+        self.assertEqual(self.cache.get("c"), (True, {"title": "C"}))
+
+    def test_hits_do_not_write_and_expired_entries_are_purged_periodically(self):
+        cache = ClassificationCache(":memory:", ttl_s=60, max_entries=100, evict_interval=3)
+        rows = lambda: dict(cache._conn.execute("SELECT key, last_used_at FROM classification_cache").fetchall())
+        start = time.time()
+        with patch('extract_nlp.cache.time.time', return_value=start):
+            cache.put("old", {"title": "Old"})
+        with patch('extract_nlp.cache.time.time', return_value=start + 30):
+            self.assertEqual(cache.get("old"), (True, {"title": "Old"}))
+        self.assertEqual(rows(), {"old": start}) # The hit is only remembered
+        with patch('extract_nlp.cache.time.time', return_value=start + 61):
+            cache.put("x", None)
+            self.assertIn("old", rows())
+            cache.put("y", None) # Third put: expired entries are purged
+        self.assertEqual(set(rows()), {"x", "y"})
+        cache.close()
+
+
+
+class TestPreClassifier(unittest.TestCase):
+
+    def test_obvious_non_tasks_are_skipped_and_requests_pass(self):
+        gate = PreClassifier(threshold=0.25)
+        promo = gate.decide("(광고) 이번 주 특가! 전 품목 30% 할인 쿠폰", "Shop <no-reply@shop.example>", "주말 특가 이벤트",
+                            bulk_headers_of({"list-unsubscribe": "<mailto:u@shop.example>", "precedence": "bulk"}))
+        receipt = gate.decide("Thanks for your order. Your receipt is attached.", "orders@store.example", "Your order confirmation")
+        meeting = gate.decide("내일 오후 3시 회의 자료 확인 부탁드립니다.", "Kim <kim@company.example>", "Re: 주간 회의")
+        self.assertFalse(promo[0])
+        self.assertFalse(receipt[0])
+        self.assertTrue(meeting[0])
+        self.assertGreater(meeting[1], 0.8)
+        self.assertEqual(gate.stats["scored"], 3)
+        self.assertEqual(gate.stats["skipped"], 2)
+        self.assertAlmostEqual(gate.false_negatives_estimate(), promo[1] + receipt[1])
+
+    def test_precedence_header_counts_only_for_bulk_values(self):
+        self.assertEqual(bulk_headers_of({"precedence": "first-class", "subject": "hi"}), [])
+        self.assertEqual(bulk_headers_of({"precedence": "list", "list-id": "<team.example>"}), ["list-id", "precedence"])
+
+    def test_audited_messages_are_classified_and_drive_the_false_negative_estimate(self):
+        gate = PreClassifier(threshold=0.99, audit_rate=0.5, rng=MagicMock(random=MagicMock(side_effect=[0.1, 0.9, 0.9, 0.9])))
+        decisions = [gate.decide(f"Newsletter {i}", "news@list.example", "Weekly digest") for i in range(4)]
+        self.assertEqual([classify for classify, _, _ in decisions], [True, False, False, False])
+        self.assertTrue(decisions[0][2])
+        self.assertEqual(gate.stats["audited"], 1)
+        self.assertEqual(gate.stats["skipped"], 3)
+        self.assertEqual(gate.false_negatives_estimate(audited_tasks=1), 3.0)
+
+    def test_from_config_trains_on_past_outcomes(self):
+        outcome = lambda sender, subject, is_task: MagicMock(sender=sender, subject=subject, text_excerpt="", bulk_headers="",
+                                                             is_task=is_task)
+        outcomes = [outcome("alerts@bank.example", "Statement ready", False) for _ in range(20)] + \
+                   [outcome("boss@company.example", "Statement ready", True) for _ in range(20)]
+        with patch.multiple('config', CLASSIFIER_GATE_MODEL_ENABLED=True, CLASSIFIER_GATE_MODEL_MIN_SAMPLES=10,
+                            CLASSIFIER_GATE_THRESHOLD=0.5, CLASSIFIER_GATE_AUDIT_RATE=0.0):
+            gate = PreClassifier.from_config(outcomes=outcomes)
+        self.assertTrue(gate.trained)
+        self.assertLess(gate.score("", "alerts@bank.example", "Statement ready"), 0.5)
+        self.assertGreater(gate.score("", "boss@company.example", "Statement ready"), 0.5)
+        self.assertIsInstance(gate.model, LogisticModel)
+        self.assertIn("sender_domain:company.example", extract_features("", "boss@company.example"))
+
+    def test_from_config_keeps_hand_set_weights_without_enough_outcomes(self):
+        with patch.multiple('config', CLASSIFIER_GATE_MODEL_ENABLED=True, CLASSIFIER_GATE_MODEL_MIN_SAMPLES=200):
+            gate = PreClassifier.from_config(outcomes=[MagicMock(sender="", subject="", text_excerpt="x", bulk_headers="",
+                                                                 is_task=True)])
+        self.assertFalse(gate.trained)
@@ -1,11 +1,16 @@
+import hashlib
 import unittest
+import time
 from unittest.mock import patch, MagicMock, call, mock_open
 import os
 import json
 from datetime import datetime, timedelta
 import base64
 
-from ingestion.agents import GmailAgent
+from ingestion.agents import GmailAgent, HistoryIdExpiredError, _RateLimiter
+from ingestion.stub_transport import RecordedGmailTransport, build_stub_gmail_service, synthetic_message
+from ingestion.prefilter import GmailPrefilter
+from ingestion.service_cache import GmailServiceCache, gmail_service_cache
 from google.oauth2.credentials import Credentials
 from google.auth.transport.requests import Request as GoogleAuthRequest
 from googleapiclient.errors import HttpError
@@ -13,6 +18,7 @@ from persistence.models import SourceToken
 
 # --- New Imports for TestKakaoAgent ---
 from ingestion.agents import KakaoAgent
+from ingestion.kakao_session import KakaoSessionManager, KakaoSessionError
 from playwright.sync_api import Playwright, Browser, BrowserContext, Page, Error as PlaywrightError
 from typing import List, Dict, Optional as TypingOptional # Renamed to avoid conflict
 # --- End New Imports ---
@@ -25,6 +31,7 @@ def b64encode_str(s: str) -> str:
 class TestGmailAgent(unittest.TestCase):
 
     def setUp(self):
+        gmail_service_cache.clear()
         self.agent = GmailAgent(credentials_file=TEST_CREDS_FILE)
         dummy_creds_data = {
             "installed": {
@@ -40,6 +47,7 @@ class TestGmailAgent(unittest.TestCase):
             json.dump(dummy_creds_data, f)
 
     def tearDown(self):
+        gmail_service_cache.clear()
         if os.path.exists(TEST_CREDS_FILE):
             os.remove(TEST_CREDS_FILE)
 
@@ -86,7 +94,7 @@ class TestGmailAgent(unittest.TestCase):
         token_info = kwargs['token_info']
         self.assertEqual(token_info['access_token'], "new_mock_token_val")
         self.assertEqual(token_info['refresh_token'], "mock_refresh_token_val")
-        mock_build.assert_called_once_with('gmail', 'v1', credentials=mock_creds)
+        mock_build.assert_called_once_with('gmail', 'v1', credentials=mock_creds, static_discovery=True, cache_discovery=False)
         mock_db_session.close.assert_called_once()
 
     @patch('ingestion.agents.build')
@@ -130,9 +138,26 @@ class TestGmailAgent(unittest.TestCase):
             expiry=mock_db_src_token.expires_dt
         )
         mock_reconstructed_creds.refresh.assert_not_called()
-        mock_build.assert_called_once_with('gmail', 'v1', credentials=mock_reconstructed_creds)
+        mock_build.assert_called_once_with('gmail', 'v1', credentials=mock_reconstructed_creds, static_discovery=True, cache_discovery=False)
         mock_db_session.close.assert_called_once()
 
+    @patch('ingestion.agents.build')
+    @patch('ingestion.agents.SessionLocal')
+    def test_authenticate_reuses_cached_service(self, mock_session_local, mock_build):
+        cached_service = MagicMock()
+        cached_creds = MagicMock(spec=Credentials)
+        cached_creds.valid = True
+        cached_creds.expiry = datetime.utcnow() + timedelta(hours=1)
+        cached_creds.refresh_token = None
+        gmail_service_cache.put("cached_user", cached_service, cached_creds)
+
+        service = self.agent.authenticate_gmail(app_user_id="cached_user")
+
+        self.assertIs(service, cached_service)
+        self.assertIs(self.agent.credentials, cached_creds)
+        mock_session_local.assert_not_called()
+        mock_build.assert_not_called()
+
     @patch('ingestion.agents.persistence_crud.save_token')
     @patch('ingestion.agents.persistence_crud.get_token')
     @patch('ingestion.agents.build')
@@ -181,7 +206,7 @@ class TestGmailAgent(unittest.TestCase):
         args_save, kwargs_save = mock_save_token_db.call_args
         self.assertEqual(kwargs_save['token_info']['access_token'], "refreshed_token_val_after_call")
         self.assertEqual(kwargs_save['token_info']['client_id'], "test_client_id")
-        mock_build.assert_called_once_with('gmail', 'v1', credentials=mock_reconstructed_creds)
+        mock_build.assert_called_once_with('gmail', 'v1', credentials=mock_reconstructed_creds, static_discovery=True, cache_discovery=False)
         mock_db_session.close.assert_called_once()
 
     @patch('ingestion.agents.persistence_crud.save_token')
@@ -229,7 +254,7 @@ class TestGmailAgent(unittest.TestCase):
         mock_save_token_db.assert_called_once()
         args_save, kwargs_save = mock_save_token_db.call_args
         self.assertEqual(kwargs_save['token_info']['access_token'], "new_token_from_flow")
-        mock_build.assert_called_once_with('gmail', 'v1', credentials=mock_new_creds_from_flow)
+        mock_build.assert_called_once_with('gmail', 'v1', credentials=mock_new_creds_from_flow, static_discovery=True, cache_discovery=False)
         mock_db_session.close.assert_called_once()
 
     @patch.object(GmailAgent, 'authenticate_gmail')
@@ -270,8 +295,325 @@ class TestGmailAgent(unittest.TestCase):
         mock_resp = MagicMock(status=403)
         error_content = b'{"error": {"message": "Forbidden"}}'
         mock_service_instance.users().messages().list().execute.side_effect = HttpError(mock_resp, error_content)
-        emails = self.agent.fetch_messages()
+        # A failed listing is raised, not mistaken for an empty mailbox.
+        with self.assertRaises(HttpError):
+            self.agent.fetch_messages()
+
+    def test_iter_messages_raises_when_a_later_list_page_fails(self):
+        mock_service_instance = MagicMock()
+        self.agent.service = mock_service_instance
+        mock_service_instance.users().messages().list().execute.side_effect = [
+            {'messages': [{'id': 'm1'}], 'nextPageToken': 'p2'},
+            HttpError(MagicMock(status=500), b'{"error": {"message": "Backend Error"}}'),
+        ]
+        with patch.object(self.agent, '_fetch_details', return_value=[{'id': 'm1'}]):
+            email_iter = self.agent.iter_messages(page_size=1)
+            self.assertEqual(next(email_iter), {'id': 'm1'})
+            with self.assertRaises(HttpError):
+                next(email_iter)
+
+    def test_fetch_messages_batched_matches_sequential(self):
+        recorded = {m['id']: m for m in (synthetic_message(i, body_chars=200) for i in range(7))}
+
+        sequential_transport = RecordedGmailTransport(recorded)
+        self.agent.service = build_stub_gmail_service(sequential_transport)
+        sequential_emails = self.agent.fetch_messages(max_results=7)
+
+        batched_transport = RecordedGmailTransport(recorded)
+        self.agent.service = build_stub_gmail_service(batched_transport)
+        batched_emails = self.agent.fetch_messages(max_results=7, batch_size=3)
+
+        self.assertEqual(len(batched_emails), 7)
+        self.assertEqual(batched_emails, sequential_emails)
+        self.assertEqual(sequential_transport.round_trips, 1 + 7) # list + one get per message
+        self.assertEqual(batched_transport.round_trips, 1 + 3)    # list + ceil(7 / 3) batches
+
+    @patch('ingestion.agents.time.sleep')
+    def test_fetch_messages_batched_retries_partial_failure(self, mock_sleep):
+        recorded = {m['id']: m for m in (synthetic_message(i, body_chars=200) for i in range(4))}
+        transport = RecordedGmailTransport(recorded, fail_once={'synthetic000001': 429, 'synthetic000002': 503})
+        self.agent.service = build_stub_gmail_service(transport)
+
+        emails = self.agent.fetch_messages(max_results=4, batch_size=4)
+
+        self.assertEqual([e['id'] for e in emails], list(recorded.keys()))
+        self.assertEqual(transport.round_trips, 1 + 2) # list + initial batch + one retry batch
+        mock_sleep.assert_called_once_with(GmailAgent.BATCH_RETRY_BACKOFF_S)
+
+    @patch('ingestion.agents.time.sleep')
+    def test_fetch_messages_batched_drops_non_retryable_errors(self, mock_sleep):
+        recorded = {m['id']: m for m in (synthetic_message(i, body_chars=200) for i in range(3))}
+        transport = RecordedGmailTransport(recorded, fail_once={'synthetic000000': 404})
+        self.agent.service = build_stub_gmail_service(transport)
+
+        emails = self.agent.fetch_messages(max_results=3, batch_size=10)
+
+        self.assertEqual([e['id'] for e in emails], ['synthetic000001', 'synthetic000002'])
+        self.assertEqual(self.agent.failed_message_ids, {'synthetic000000'})
+        mock_sleep.assert_not_called()
+
+    def test_iter_messages_follows_page_tokens_lazily(self):
+        recorded = {m['id']: m for m in (synthetic_message(i, body_chars=100) for i in range(5))}
+        transport = RecordedGmailTransport(recorded)
+        self.agent.service = build_stub_gmail_service(transport)
+
+        email_iter = self.agent.iter_messages(page_size=2)
+        first = next(email_iter)
+        self.assertEqual(first['id'], 'synthetic000000')
+        self.assertEqual(transport.round_trips, 1 + 2, "Only the first page should have been fetched so far.")
+
+        remaining_ids = [e['id'] for e in email_iter]
+        self.assertEqual(remaining_ids, ['synthetic000001', 'synthetic000002', 'synthetic000003', 'synthetic000004'])
+        self.assertEqual(transport.round_trips, 3 + 5) # three list pages + one get per message
+
+    def test_iter_messages_stops_at_max_results(self):
+        recorded = {m['id']: m for m in (synthetic_message(i, body_chars=100) for i in range(10))}
+        transport = RecordedGmailTransport(recorded)
+        self.agent.service = build_stub_gmail_service(transport)
+
+        emails = list(self.agent.iter_messages(page_size=4, max_results=6, batch_size=10))
+
+        self.assertEqual(len(emails), 6)
+        self.assertEqual(transport.round_trips, 2 + 2) # pages of 4 and 2, one batch each
+
+    def test_fetch_messages_without_max_results_lists_full_pages(self):
+        recorded = {m['id']: m for m in (synthetic_message(i, body_chars=100) for i in range(3))}
+        transport = RecordedGmailTransport(recorded)
+        self.agent.service = build_stub_gmail_service(transport)
+
+        emails = self.agent.fetch_messages(max_results=None, batch_size=10)
+
+        self.assertEqual([e['id'] for e in emails], list(recorded))
+
+    def test_iter_messages_prefetches_the_next_page(self):
+        recorded = {m['id']: m for m in (synthetic_message(i, body_chars=100) for i in range(5))}
+        transport = RecordedGmailTransport(recorded)
+        self.agent.service = build_stub_gmail_service(transport)
+
+        email_iter = self.agent.iter_messages(page_size=2, batch_size=10, prefetch=True)
+        first = next(email_iter)
+        self.assertEqual(first['id'], 'synthetic000000')
+        for _ in range(100): # The second page is fetched in the background
+            if transport.round_trips == 4: break
+            time.sleep(0.01)
+        self.assertEqual(transport.round_trips, 2 + 2, "The next page is fetched while the first is processed.")
+
+        remaining_ids = [e['id'] for e in email_iter]
+        self.assertEqual(remaining_ids, ['synthetic000001', 'synthetic000002', 'synthetic000003', 'synthetic000004'])
+        self.assertEqual(transport.round_trips, 3 + 3) # three list pages, one batch each
+
+    def test_fetch_messages_concurrent_keeps_order_and_uses_per_thread_services(self):
+        recorded = {m['id']: m for m in (synthetic_message(i, body_chars=100) for i in range(12))}
+        transport = RecordedGmailTransport(recorded, latency_s=0.005)
+        self.agent.service = build_stub_gmail_service(transport)
+        built_services = []
+        def factory():
+            service = build_stub_gmail_service(transport)
+            built_services.append(service)
+            return service
+        self.agent.worker_service_factory = factory
+
+        emails = self.agent.fetch_messages(max_results=12, max_workers=4)
+
+        self.assertEqual([e['id'] for e in emails], list(recorded.keys()))
+        self.assertTrue(1 <= len(built_services) <= 4, "Each worker thread should build at most one service.")
+        self.assertNotIn(self.agent.service, built_services)
+
+    def test_fetch_messages_concurrent_drops_failed_messages(self):
+        recorded = {m['id']: m for m in (synthetic_message(i, body_chars=100) for i in range(3))}
+        transport = RecordedGmailTransport(recorded, fail_once={'synthetic000001': 500})
+        self.agent.service = build_stub_gmail_service(transport)
+        self.agent.worker_service_factory = lambda: build_stub_gmail_service(transport)
+
+        emails = self.agent.fetch_messages(max_results=3, max_workers=2)
+
+        self.assertEqual([e['id'] for e in emails], ['synthetic000000', 'synthetic000002'])
+
+    @patch('ingestion.agents.time.sleep')
+    @patch('ingestion.agents.time.monotonic', return_value=100.0)
+    def test_rate_limiter_spaces_requests(self, mock_monotonic, mock_sleep):
+        limiter = _RateLimiter(rate_per_s=10)
+        for _ in range(3):
+            limiter.acquire()
+        waits = [c.args[0] for c in mock_sleep.call_args_list]
+        self.assertEqual(len(waits), 2) # First call goes through immediately
+        self.assertAlmostEqual(waits[0], 0.1)
+        self.assertAlmostEqual(waits[1], 0.2)
+
+    def test_fetch_messages_since_history_follows_pages(self):
+        mock_service_instance = MagicMock()
+        self.agent.service = mock_service_instance
+        mock_service_instance.users().history().list().execute.side_effect = [
+            {'historyId': '120', 'nextPageToken': 'p2', 'history': [
+                {'messagesAdded': [{'message': {'id': 'm1'}}, {'message': {'id': 'm2'}}]}]},
+            {'historyId': '130', 'history': [
+                {'messagesAdded': [{'message': {'id': 'm2'}}]}, {'messagesAdded': [{'message': {'id': 'm3'}}]}]},
+        ]
+        with patch.object(self.agent, '_fetch_details_sequential', return_value=[{'id': 'm1'}, {'id': 'm2'}, {'id': 'm3'}]) as mock_fetch:
+            emails, latest_history_id = self.agent.fetch_messages_since_history('100')
+
+        self.assertEqual(latest_history_id, '130')
+        self.assertEqual(len(emails), 3)
+        mock_fetch.assert_called_once_with('me', ['m1', 'm2', 'm3'])
+        mock_service_instance.users().history().list.assert_called_with(
+            userId='me', startHistoryId='100', historyTypes=['messageAdded'], pageToken='p2')
+
+    def test_fetch_messages_since_history_no_changes_returns_latest_cursor(self):
+        mock_service_instance = MagicMock()
+        self.agent.service = mock_service_instance
+        mock_service_instance.users().history().list().execute.return_value = {'historyId': '101'}
+        emails, latest_history_id = self.agent.fetch_messages_since_history('100')
         self.assertEqual(emails, [])
+        self.assertEqual(latest_history_id, '101')
+
+    def test_fetch_messages_since_history_expired_cursor_raises(self):
+        mock_service_instance = MagicMock()
+        self.agent.service = mock_service_instance
+        mock_service_instance.users().history().list().execute.side_effect = HttpError(
+            MagicMock(status=404), b'{"error": {"message": "Requested entity was not found."}}')
+        with self.assertRaises(HistoryIdExpiredError):
+            self.agent.fetch_messages_since_history('1')
+
+    def test_fetch_messages_since_history_other_http_error_raises(self):
+        mock_service_instance = MagicMock()
+        self.agent.service = mock_service_instance
+        mock_service_instance.users().history().list().execute.side_effect = HttpError(
+            MagicMock(status=500), b'{"error": {"message": "Backend Error"}}')
+        with self.assertRaises(HttpError):
+            self.agent.fetch_messages_since_history('100')
+
+    def test_get_current_history_id(self):
+        mock_service_instance = MagicMock()
+        self.agent.service = mock_service_instance
+        mock_service_instance.users().getProfile().execute.return_value = {'emailAddress': 'me@example.com', 'historyId': 4242}
+        self.assertEqual(self.agent.get_current_history_id(), '4242')
+
+    def test_parse_email_parts_walks_nested_parts_in_document_order(self):
+        payload = {'mimeType': 'multipart/mixed', 'parts': [
+            {'mimeType': 'multipart/alternative', 'parts': [
+                {'mimeType': 'text/plain', 'body': {'data': b64encode_str('first')}},
+                {'mimeType': 'text/html', 'body': {'data': b64encode_str('<p>first</p>')}},
+            ]},
+            {'mimeType': 'application/pdf', 'filename': 'a.pdf', 'body': {'data': b64encode_str('%PDF-1.4')}},
+            {'mimeType': 'text/plain', 'body': {'data': b64encode_str('second')}},
+        ]}
+        plain, html = self.agent._parse_email_parts(payload)
+        self.assertEqual(plain, 'first\nsecond')
+        self.assertEqual(html, '<p>first</p>')
+
+    def test_parse_email_parts_skips_non_text_single_part_and_honors_charset(self):
+        binary_payload = {'mimeType': 'application/octet-stream', 'body': {'data': b64encode_str('binary')}}
+        self.assertEqual(self.agent._parse_email_parts(binary_payload), ('', ''))
+
+        euc_kr_data = base64.urlsafe_b64encode('회의 일정'.encode('euc-kr')).decode('ascii')
+        payload = {'mimeType': 'text/plain', 'body': {'data': euc_kr_data},
+                   'headers': [{'name': 'Content-Type', 'value': 'text/plain; charset="EUC-KR"'}]}
+        self.assertEqual(self.agent._parse_email_parts(payload), ('회의 일정', ''))
+
+    def test_parse_email_parts_caps_decoded_bytes(self):
+        payload = {'mimeType': 'multipart/alternative', 'parts': [
+            {'mimeType': 'text/plain', 'body': {'data': b64encode_str('a' * 100)}},
+            {'mimeType': 'text/html', 'body': {'data': b64encode_str('b' * 100)}},
+        ]}
+        plain, html = self.agent._parse_email_parts(payload, max_decoded_bytes=10)
+        self.assertEqual(plain, 'a' * 10)
+        self.assertEqual(html, '')
+
+    def test_fetch_messages_with_prefilter_fetches_only_survivors_in_full(self):
+        recorded = {m['id']: m for m in (
+            synthetic_message(i, body_chars=500, label_ids=['CATEGORY_PROMOTIONS'] if i % 2 else None)
+            for i in range(6))}
+        full_transport = RecordedGmailTransport(recorded)
+        self.agent.service = build_stub_gmail_service(full_transport)
+        full_emails = self.agent.fetch_messages(max_results=6, batch_size=10)
+
+        transport = RecordedGmailTransport(recorded)
+        agent = GmailAgent(credentials_file=TEST_CREDS_FILE)
+        agent.service = build_stub_gmail_service(transport)
+        agent.prefilter = GmailPrefilter(skip_labels=['CATEGORY_PROMOTIONS'])
+        emails = agent.fetch_messages(max_results=6, batch_size=10)
+
+        self.assertEqual([e['id'] for e in emails], ['synthetic000000', 'synthetic000002', 'synthetic000004'])
+        self.assertEqual(emails, [e for e in full_emails if e['id'] in {'synthetic000000', 'synthetic000002', 'synthetic000004'}])
+        self.assertEqual(transport.round_trips, 1 + 1 + 1) # list + metadata batch + full batch of survivors
+        self.assertEqual(agent.fetch_stats['prefilter_skipped'], 3)
+        self.assertGreater(agent.fetch_stats['skipped_size_estimate_bytes'], 0)
+        self.assertLess(transport.bytes_sent, full_transport.bytes_sent)
+
+    def test_prefilter_keeps_messages_whose_metadata_fetch_failed(self):
+        recorded = {m['id']: m for m in (synthetic_message(i, body_chars=100) for i in range(2))}
+        transport = RecordedGmailTransport(recorded, fail_once={'synthetic000001': 404})
+        self.agent.service = build_stub_gmail_service(transport)
+        self.agent.prefilter = GmailPrefilter(skip_labels=['SPAM'])
+        emails = self.agent.fetch_messages(max_results=2)
+        self.assertEqual([e['id'] for e in emails], ['synthetic000000', 'synthetic000001'])
+
+
+class TestGmailServiceCache(unittest.TestCase):
+
+    def _creds(self, expires_in_s, refresh_token=None):
+        creds = MagicMock(spec=Credentials)
+        creds.valid = True
+        creds.expiry = datetime.utcnow() + timedelta(seconds=expires_in_s)
+        creds.refresh_token = refresh_token
+        return creds
+
+    def test_entry_expires_refresh_ahead_of_token_expiry(self):
+        cache = GmailServiceCache(refresh_ahead_s=300, background_refresh=False)
+        cache.put("fresh", "service_fresh", self._creds(3600))
+        cache.put("stale", "service_stale", self._creds(200))
+        self.assertEqual(cache.get("fresh")[0], "service_fresh")
+        self.assertIsNone(cache.get("stale"))
+        self.assertIsNone(cache.get("missing"))
+
+    @patch('ingestion.service_cache.GoogleAuthRequest')
+    def test_background_refresh_updates_token_and_reschedules(self, mock_request):
+        cache = GmailServiceCache(refresh_ahead_s=300, background_refresh=False)
+        creds = self._creds(100, refresh_token="refresh")
+        on_refresh = MagicMock()
+        cache.put("user", "service", creds, on_refresh=on_refresh)
+        cache.background_refresh = True
+        with patch.object(cache, '_schedule_refresh') as mock_schedule:
+            cache._refresh("user", cache._entries["user"])
+        creds.refresh.assert_called_once_with(mock_request.return_value)
+        on_refresh.assert_called_once_with("user", creds)
+        mock_schedule.assert_called_once()
+
+    @patch('ingestion.service_cache.GoogleAuthRequest')
+    def test_failed_background_refresh_drops_entry(self, mock_request):
+        cache = GmailServiceCache(background_refresh=False)
+        creds = self._creds(3600, refresh_token="refresh")
+        creds.refresh.side_effect = Exception("invalid_grant")
+        cache.put("user", "service", creds)
+        cache._refresh("user", cache._entries["user"])
+        self.assertIsNone(cache.get("user"))
+
+
+class TestGmailPrefilter(unittest.TestCase):
+
+    def _metadata(self, sender, subject='Meeting tomorrow', labels=None):
+        return {'id': 'm1', 'labelIds': labels or ['INBOX'], 'sizeEstimate': 1000,
+                'payload': {'headers': [{'name': 'From', 'value': sender}, {'name': 'Subject', 'value': subject}]}}
+
+    def test_keeps_ordinary_mail(self):
+        prefilter = GmailPrefilter(skip_labels=['CATEGORY_PROMOTIONS'], skip_subject_patterns=[r'\bnewsletter\b'])
+        self.assertIsNone(prefilter.evaluate(self._metadata('Kim <kim@example.com>')))
+
+    def test_skips_denylisted_sender_by_address_and_domain(self):
+        prefilter = GmailPrefilter(sender_denylist=['noreply@shop.com', '@ads.example.org'])
+        self.assertIsNotNone(prefilter.evaluate(self._metadata('Shop <NoReply@shop.com>')))
+        self.assertIsNotNone(prefilter.evaluate(self._metadata('promo@mail.ads.example.org')))
+        self.assertIsNone(prefilter.evaluate(self._metadata('sales@shop.com')))
+
+    def test_skips_by_label_and_subject(self):
+        prefilter = GmailPrefilter(skip_labels=['category_social'], skip_subject_patterns=[r'^\s*[\(\[]광고[\)\]]'])
+        self.assertIn('CATEGORY_SOCIAL', prefilter.evaluate(self._metadata('a@b.com', labels=['CATEGORY_SOCIAL'])))
+        self.assertIsNotNone(prefilter.evaluate(self._metadata('a@b.com', subject='(광고) 주말 특가')))
+
+    def test_allowlist_overrides_other_rules(self):
+        prefilter = GmailPrefilter(sender_allowlist=['school.ac.kr'], sender_denylist=['school.ac.kr'],
+                                   skip_labels=['CATEGORY_PROMOTIONS'])
+        self.assertIsNone(prefilter.evaluate(self._metadata('notice@cs.school.ac.kr', labels=['CATEGORY_PROMOTIONS'])))
 
 if __name__ == '__main__':
     unittest.main()
@@ -445,70 +787,46 @@ class TestKakaoAgent(unittest.TestCase):
 
     def test_read_messages_success(self):
         self.agent.page = self.mock_page
-
-        # Create mock Locator objects for individual message elements
-        mock_msg_element1 = MagicMock(spec=Locator)
-        mock_msg_element2 = MagicMock(spec=Locator)
-
-        # Configure the main locator for message elements to return these mocks
-        self.mock_page.locator.return_value.all.return_value = [mock_msg_element1, mock_msg_element2]
-
-        # Configure sub-locators and their text_content for Message 1
-        # Ensure the sub-locator calls on mock_msg_element1 return distinct mocks for .locator()
-        mock_sender_loc1 = MagicMock(spec=Locator); mock_sender_loc1.text_content.return_value = "Alice"; mock_sender_loc1.count.return_value = 1
-        mock_text_loc1 = MagicMock(spec=Locator); mock_text_loc1.text_content.return_value = "Hello Bob"; mock_text_loc1.count.return_value = 1
-        mock_ts_loc1 = MagicMock(spec=Locator); mock_ts_loc1.text_content.return_value = "오후 1:00"; mock_ts_loc1.count.return_value = 1
-
-        def msg1_locator_side_effect(selector):
-            if selector == "span[data-testid='sender']": return mock_sender_loc1
-            if selector == "div[data-testid='message-text']": return mock_text_loc1
-            if selector == "span[data-testid='timestamp']": return mock_ts_loc1
-            return MagicMock(spec=Locator, count=0) # Default for unexpected selectors
-        mock_msg_element1.locator.side_effect = msg1_locator_side_effect
-
-        # Configure sub-locators and their text_content for Message 2
-        mock_sender_loc2 = MagicMock(spec=Locator); mock_sender_loc2.text_content.return_value = "Bob"; mock_sender_loc2.count.return_value = 1
-        mock_text_loc2 = MagicMock(spec=Locator); mock_text_loc2.text_content.return_value = "Hi Alice"; mock_text_loc2.count.return_value = 1
-        mock_ts_loc2 = MagicMock(spec=Locator); mock_ts_loc2.text_content.return_value = "오후 1:01"; mock_ts_loc2.count.return_value = 1
-
-        def msg2_locator_side_effect(selector):
-            if selector == "span[data-testid='sender']": return mock_sender_loc2
-            if selector == "div[data-testid='message-text']": return mock_text_loc2
-            if selector == "span[data-testid='timestamp']": return mock_ts_loc2
-            return MagicMock(spec=Locator, count=0)
-        mock_msg_element2.locator.side_effect = msg2_locator_side_effect
+        bubble_locator = self.mock_page.locator.return_value
+        bubble_locator.evaluate_all.return_value = [
+            {'sender': "Alice", 'text': "Hello Bob", 'timestamp': "오후 1:00"},
+            {'sender': "Bob", 'text': " Hi Alice ", 'timestamp': "오후 1:01"},
+        ]
 
         messages = self.agent.read_messages(num_messages_to_capture=2)
 
         self.assertEqual(len(messages), 2)
-        # Check main locator call
         self.mock_page.locator.assert_called_with("div[role='listitem'][aria-label*='message']")
+        bubble_locator.evaluate_all.assert_called_once() # One round trip for all bubbles
+        selectors = bubble_locator.evaluate_all.call_args[0][1]
+        self.assertEqual(selectors['sender'], KakaoAgent.CONCEPTUAL_SELECTORS["message_sender_selector"])
 
-        # Check details of first message
         self.assertEqual(messages[0]['sender'], "Alice")
         self.assertEqual(messages[0]['text'], "Hello Bob")
         self.assertEqual(messages[0]['timestamp_str'], "오후 1:00")
         self.assertTrue(messages[0]['id'].startswith("k_"))
-
-        # Check details of second message
         self.assertEqual(messages[1]['sender'], "Bob")
         self.assertEqual(messages[1]['text'], "Hi Alice")
         self.assertEqual(messages[1]['timestamp_str'], "오후 1:01")
 
-        # Verify calls to sub-locators for message 1
-        mock_msg_element1.locator.assert_any_call("span[data-testid='sender']")
-        mock_msg_element1.locator.assert_any_call("div[data-testid='message-text']")
-        mock_msg_element1.locator.assert_any_call("span[data-testid='timestamp']")
-
-        # Verify calls to sub-locators for message 2
-        mock_msg_element2.locator.assert_any_call("span[data-testid='sender']")
-        mock_msg_element2.locator.assert_any_call("div[data-testid='message-text']")
-        mock_msg_element2.locator.assert_any_call("span[data-testid='timestamp']")
+    def test_read_messages_repeated_messages_get_distinct_ids(self):
+        self.agent.page = self.mock_page
+        self.mock_page.locator.return_value.evaluate_all.return_value = [
+            {'sender': "Alice", 'text': "Standup moved to 10:30, please update your calendars", 'timestamp': "오후 1:00"},
+            {'sender': "Alice", 'text': "Standup moved to 10:30, please ignore the previous message", 'timestamp': "오후 1:00"},
+            {'sender': "Alice", 'text': "Standup moved to 10:30, please update your calendars", 'timestamp': "오후 1:00"},
+        ]
 
+        messages = self.agent.read_messages(num_messages_to_capture=5)
+        ids = [m['id'] for m in messages]
+        self.assertEqual(len(set(ids)), 3)
+        # The first occurrence keeps the id it had before ordinals were added
+        self.assertEqual(ids[0], "k_" + hashlib.sha1("Alice_오후 1:00_Standup moved to 10:30, please".encode('utf-8')).hexdigest()[:12])
+        self.assertEqual(self.agent._messages_after_mark(messages, ids[1], 5), messages[2:])
 
     def test_read_messages_locating_message_list_fails(self):
         self.agent.page = self.mock_page
-        self.mock_page.locator.return_value.all.side_effect = PlaywrightError("Cannot find message list container")
+        self.mock_page.locator.return_value.evaluate_all.side_effect = PlaywrightError("Cannot find message list container")
 
         messages = self.agent.read_messages()
         self.assertEqual(messages, [])
@@ -520,21 +838,157 @@ class TestKakaoAgent(unittest.TestCase):
 
     def test_read_messages_partial_extraction_failure(self):
         self.agent.page = self.mock_page
+        self.mock_page.locator.return_value.evaluate_all.return_value = [
+            {'sender': None, 'text': None, 'timestamp': "오후 3:00"}, # Bubble without sender or text
+            {'sender': "Charlie", 'text': "Lunch at noon", 'timestamp': None},
+        ]
+
+        messages = self.agent.read_messages(num_messages_to_capture=5)
+
+        self.assertEqual(len(messages), 1, "Bubble without sender and text should be skipped.")
+        self.assertEqual(messages[0]['timestamp_str'], "Unknown Time")
+
+    def _bubbles(self, *indices):
+        return [{'sender': "Dana", 'text': f"message {i}", 'timestamp': f"오전 9:{i:02d}"} for i in indices]
+
+    @patch('ingestion.agents.KakaoAgent._scroll_message_area_up')
+    def test_read_messages_since_mark_scrolls_until_mark_is_loaded(self, mock_scroll):
+        self.agent.page = self.mock_page
+        evaluate_all = self.mock_page.locator.return_value.evaluate_all
+        evaluate_all.return_value = self._bubbles(0, 1, 2, 3, 4)
+        mark_id = self.agent.read_messages(num_messages_to_capture=10)[1]['id'] # "message 1"
+
+        # Only 3..4 are visible at first; one scroll loads 0..2 while the list drops 4.
+        evaluate_all.reset_mock()
+        evaluate_all.side_effect = [self._bubbles(3, 4), self._bubbles(0, 1, 2, 3)]
+        messages = self.agent.read_messages(num_messages_to_capture=10, scroll_attempts=5, since_message_id=mark_id)
+
+        self.assertEqual([m['text'] for m in messages], ["message 2", "message 3", "message 4"])
+        mock_scroll.assert_called_once()
+        self.assertEqual(evaluate_all.call_count, 2)
+
+    @patch('ingestion.agents.KakaoAgent._scroll_message_area_up')
+    def test_read_messages_since_visible_mark_does_not_scroll(self, mock_scroll):
+        self.agent.page = self.mock_page
+        self.mock_page.locator.return_value.evaluate_all.return_value = self._bubbles(5, 6, 7)
+        mark_id = self.agent.read_messages()[2]['id']
+
+        messages = self.agent.read_messages(scroll_attempts=5, since_message_id=mark_id)
+
+        self.assertEqual(messages, [])
+        mock_scroll.assert_not_called()
+
+    def test_read_chats_uses_one_pool_page_per_chat(self):
+        self.agent.page, self.agent.context = self.mock_page, self.mock_context
+        self.mock_page.url = "about:blank"
+        second_page = MagicMock(spec=Page)
+        self.mock_context.new_page.return_value = second_page
+        self.mock_page.locator.return_value.evaluate_all.return_value = self._bubbles(1, 2)
+        second_page.locator.return_value.evaluate_all.return_value = self._bubbles(7)
+        second_page.get_by_role.return_value.first.click.side_effect = [None, PlaywrightError("Timeout")]
+
+        results = self.agent.read_chats(["Team", "Family"], pool_size=2)
+
+        self.assertEqual(list(results), ["Team", "Family"])
+        self.assertEqual([m['text'] for m in results["Team"][0]], ["message 1", "message 2"])
+        self.assertEqual([m['text'] for m in results["Family"][0]], ["message 7"])
+        self.assertIsNone(results["Family"][1])
+        self.assertEqual(self.agent.page_pool, [self.mock_page, second_page])
+        self.mock_context.new_page.assert_called_once() # Pages are reused on the next run
+
+        results = self.agent.read_chats(["Team", "Family"], pool_size=2)
+        self.assertIsNone(results["Team"][1])
+        self.assertEqual(results["Family"], ([], "Failed to select KakaoTalk chat: 'Family'."))
+        self.mock_context.new_page.assert_called_once()
+
+    def test_read_chats_failure_to_open_a_pool_page_fails_only_its_group(self):
+        self.agent.page, self.agent.context = self.mock_page, self.mock_context
+        self.mock_page.url = "about:blank"
+        self.mock_page.locator.return_value.evaluate_all.return_value = self._bubbles(1)
+        self.mock_context.new_page.side_effect = PlaywrightError("Target closed")
 
-        mock_msg_element_fail = MagicMock(spec=Locator)
-        self.mock_page.locator.return_value.all.return_value = [mock_msg_element_fail]
+        results = self.agent.read_chats(["a", "b", "c"], pool_size=2)
 
-        mock_sender_loc = MagicMock(spec=Locator); mock_sender_loc.text_content.return_value = "Charlie"; mock_sender_loc.count.return_value = 1
-        mock_text_loc_fail = MagicMock(spec=Locator); mock_text_loc_fail.text_content.side_effect = PlaywrightError("Cannot get text"); mock_text_loc_fail.count.return_value = 1 # text_content fails
-        mock_ts_loc = MagicMock(spec=Locator); mock_ts_loc.text_content.return_value = "오후 3:00"; mock_ts_loc.count.return_value = 1
+        self.assertEqual(list(results), ["a", "b", "c"])
+        self.assertEqual(results["a"], ([], "Playwright error reading KakaoTalk chat 'a': Target closed"))
+        self.assertEqual(results["b"], ([], "Playwright error reading KakaoTalk chat 'b': Target closed"))
+        self.assertEqual([m['text'] for m in results["c"][0]], ["message 1"]) # The next group reuses the first page
+        self.assertIsNone(results["c"][1])
 
-        def msg_fail_locator_side_effect(selector):
-            if selector == "span[data-testid='sender']": return mock_sender_loc
-            if selector == "div[data-testid='message-text']": return mock_text_loc_fail
-            if selector == "span[data-testid='timestamp']": return mock_ts_loc
-            return MagicMock(spec=Locator, count=0)
-        mock_msg_element_fail.locator.side_effect = msg_fail_locator_side_effect
+        self.mock_context.new_page.side_effect = RuntimeError("browser crashed")
+        results = self.agent.read_chats(["a", "b"], pool_size=2)
+        self.assertEqual(results["b"], ([], "Unexpected error reading KakaoTalk chat 'b': browser crashed"))
 
-        messages = self.agent.read_messages(num_messages_to_capture=1)
+    def test_is_healthy_probes_page_without_navigation(self):
+        self.assertFalse(self.agent.is_healthy()) # Not launched yet
+        self.agent.login(timeout_ms=2000)
+        self.mock_page.goto.reset_mock()
+        self.mock_page.is_closed.return_value = False
+        self.mock_browser.is_connected.return_value = True
+        self.mock_page.evaluate.return_value = "complete"
+        self.assertTrue(self.agent.is_healthy())
+        self.mock_page.goto.assert_not_called()
+
+        self.mock_page.evaluate.side_effect = PlaywrightError("Target closed")
+        self.assertFalse(self.agent.is_healthy())
+
+class TestKakaoSessionManager(unittest.TestCase):
+
+    def setUp(self):
+        self.mock_playwright = MagicMock()
+        self.playwright_factory = MagicMock(return_value=self.mock_playwright)
+        self.manager = KakaoSessionManager(playwright_factory=self.playwright_factory)
+
+    def tearDown(self):
+        self.manager.close()
+
+    @patch('ingestion.kakao_session.KakaoAgent')
+    def test_reuses_healthy_session_across_runs(self, MockKakaoAgent):
+        agent = MockKakaoAgent.return_value
+        agent.login.return_value = True
+        agent.is_healthy.return_value = True
+
+        first = self.manager.run(lambda a: a.read_messages())
+        second = self.manager.run(lambda a: a.read_messages())
+
+        self.assertEqual(first, second)
+        self.assertEqual(self.manager.launch_count, 1)
+        self.playwright_factory.assert_called_once()
+        agent.login.assert_called_once()
+        self.assertEqual(agent.read_messages.call_count, 2)
+
+    @patch('ingestion.kakao_session.KakaoAgent')
+    def test_relaunches_when_health_check_fails(self, MockKakaoAgent):
+        stale_agent, fresh_agent = MagicMock(), MagicMock()
+        stale_agent.login.return_value = fresh_agent.login.return_value = True
+        stale_agent.is_healthy.return_value = False
+        MockKakaoAgent.side_effect = [stale_agent, fresh_agent]
+
+        self.manager.run(lambda a: None)
+        used_agent = self.manager.run(lambda a: a)
+
+        self.assertIs(used_agent, fresh_agent)
+        stale_agent.close.assert_called_once()
+        self.mock_playwright.stop.assert_called_once()
+        self.assertEqual(self.manager.launch_count, 2)
+
+    @patch('ingestion.kakao_session.KakaoAgent')
+    def test_playwright_error_tears_down_session(self, MockKakaoAgent):
+        agent = MockKakaoAgent.return_value
+        agent.login.return_value = True
+
+        def failing_operation(a):
+            raise PlaywrightError("Target page, context or browser has been closed")
+        with self.assertRaises(PlaywrightError):
+            self.manager.run(failing_operation)
+
+        agent.close.assert_called_once()
+        self.assertIsNone(self.manager.agent)
+
+    @patch('ingestion.kakao_session.KakaoAgent')
+    def test_login_failure_raises_session_error(self, MockKakaoAgent):
+        MockKakaoAgent.return_value.login.return_value = False
+        with self.assertRaises(KakaoSessionError):
+            self.manager.run(lambda a: None)
+        self.assertIsNone(self.manager.agent)
 
-        self.assertEqual(len(messages), 0, "Message with partial extraction failure should be skipped.")
@@ -2,9 +2,14 @@ import unittest
 from unittest.mock import patch, MagicMock, ANY
 from datetime import date, timedelta, datetime as dt # dt for datetime objects
 
+import config
+from ingestion.agents import HistoryIdExpiredError
+from persistence.models import Task
+from extract_nlp.utils import generate_task_fingerprint
+
 # Modules to be tested or mocked
 try:
-    from main import run_gmail_ingestion_pipeline
+    from main import run_gmail_ingestion_pipeline, gmail_fetch_options, _process_kakaotalk_messages
     # If main.py imports other project modules directly at top level,
     # those might need mocking too if they have side effects on import or are slow.
 except ModuleNotFoundError:
@@ -16,6 +21,18 @@ except ModuleNotFoundError:
 
 class TestMainPipelineGmailFetching(unittest.TestCase):
 
+    def setUp(self):
+        # Keep pipeline runs from opening the on-disk classification cache.
+        self.cache_patch = patch('main.get_classification_cache', return_value=None)
+        self.cache_patch.start()
+        # Classify one email at a time unless a test opts into concurrent classification.
+        self.concurrency_patch = patch.multiple(config, CLASSIFIER_CONCURRENCY=1, CLASSIFIER_BATCH_SIZE=1)
+        self.concurrency_patch.start()
+
+    def tearDown(self):
+        self.cache_patch.stop()
+        self.concurrency_patch.stop()
+
     # Patching order is bottom-up for decorators.
     # Patches should target where the object is *looked up*, which is in 'main' module's namespace.
     @patch('main.date') # Mock datetime.date for controlling date.today()
@@ -46,8 +63,8 @@ class TestMainPipelineGmailFetching(unittest.TestCase):
         mock_auth_service = MagicMock()
         mock_agent_instance.authenticate_gmail.return_value = mock_auth_service
 
-        # Simulate fetch_messages returning a list with one dummy email
-        mock_agent_instance.fetch_messages.return_value = [
+        # Simulate iter_messages yielding one dummy email
+        mock_agent_instance.iter_messages.return_value = [
             {'id': 'email1', 'headers': {'subject': 'Test Email Today'}, 'body_plain': 'Test content for today'}
         ]
 
@@ -60,8 +77,9 @@ class TestMainPipelineGmailFetching(unittest.TestCase):
         }
 
         # Mock CRUD operations used after fetching
-        mock_crud_main.create_task.return_value = MagicMock(id=1, fingerprint="fp_test_main")
-        mock_crud_main.get_task_by_fingerprint.return_value = None
+        mock_crud_main.create_tasks_bulk.return_value = [MagicMock(id=1, fingerprint="fp_test_main", due_dt=None)]
+        mock_crud_main.get_task_ids_by_fingerprints.return_value = {}
+        mock_crud_main.get_sync_cursor.return_value = None # First run: no stored Gmail historyId yet
         # Mock for conflict detection part
         mock_crud_main.get_tasks_on_same_day_with_time.return_value = []
         mock_crud_main.update_task_tags.return_value = MagicMock()
@@ -83,9 +101,12 @@ class TestMainPipelineGmailFetching(unittest.TestCase):
         expected_yesterday = fixed_today - timedelta(days=1)
         expected_since_str = expected_yesterday.strftime("%Y/%m/%d")
 
-        mock_agent_instance.fetch_messages.assert_called_once_with(
+        mock_agent_instance.iter_messages.assert_called_once_with(
             since_date_str=expected_since_str,
-            max_results=500
+            max_results=500,
+            page_size=config.GMAIL_LIST_PAGE_SIZE,
+            prefetch=config.GMAIL_LIST_PREFETCH,
+            **gmail_fetch_options()
         )
 
         # Verify TaskClassifier was called because emails were "fetched"
@@ -94,10 +115,445 @@ class TestMainPipelineGmailFetching(unittest.TestCase):
 
         # Verify DB session handling and task creation attempt
         mock_session_local.assert_called_once() # Check that a session was initiated
-        mock_crud_main.create_task.assert_called()
+        mock_crud_main.create_tasks_bulk.assert_called() # One transaction for the fetched batch
         mock_db_session_instance.close.assert_called_once() # Check session was closed
 
 
+    def _setup_pipeline_mocks(self, MockGmailAgent, MockTaskClassifier, mock_crud_main, mock_session_local):
+        mock_agent_instance = MagicMock()
+        MockGmailAgent.return_value = mock_agent_instance
+        mock_agent_instance.authenticate_gmail.return_value = MagicMock()
+        mock_agent_instance.failed_message_ids = set()
+        mock_classifier_instance = MagicMock()
+        MockTaskClassifier.return_value = mock_classifier_instance
+        mock_classifier_instance.classify_task.return_value = None # Nothing classified as a task
+        mock_db_session_instance = MagicMock()
+        mock_session_local.return_value = mock_db_session_instance
+        return mock_agent_instance, mock_db_session_instance
+
+    @patch('main.GmailAgent')
+    @patch('main.TaskClassifier')
+    @patch('main.persistence_crud')
+    @patch('main.SessionLocal')
+    def test_run_gmail_pipeline_concurrent_classification_saves_in_mailbox_order(
+        self, mock_session_local, mock_crud_main, MockTaskClassifier, MockGmailAgent
+    ):
+        mock_agent_instance, _ = self._setup_pipeline_mocks(
+            MockGmailAgent, MockTaskClassifier, mock_crud_main, mock_session_local)
+        mock_agent_instance.iter_messages.return_value = [
+            {'id': f'email{i}', 'headers': {'subject': f'Subject {i}'}, 'body_plain': f'Body {i}'} for i in range(5)
+        ]
+        mock_classifier_instance = MockTaskClassifier.return_value
+        mock_classifier_instance.classify_tasks.side_effect = lambda items, limiter=None, batch_size=1: [
+            {"type": "other", "title": f"Task for {source_id}", "due": None, "body": text} for text, source_id in items
+        ]
+        mock_crud_main.get_sync_cursor.return_value = None
+        mock_crud_main.get_task_ids_by_fingerprints.return_value = {}
+        mock_crud_main.create_tasks_bulk.side_effect = lambda db, tasks_data, commit=True: [
+            MagicMock(due_dt=None) for _ in tasks_data]
+
+        with patch.object(config, 'CLASSIFIER_CONCURRENCY', 2): # Windows of 8 emails
+            result = run_gmail_ingestion_pipeline(app_user_id="test_user", incremental=False)
+
+        self.assertTrue(result["success"])
+        self.assertEqual(result["tasks_created"], 5)
+        mock_classifier_instance.classify_task.assert_not_called()
+        classified_ids = [source_id for _, source_id in mock_classifier_instance.classify_tasks.call_args.args[0]]
+        self.assertEqual(classified_ids, [f"gmail_email{i}" for i in range(5)])
+        mock_crud_main.create_tasks_bulk.assert_called_once_with(ANY, ANY, commit=False)
+        saved_rows = mock_crud_main.create_tasks_bulk.call_args.args[1]
+        saved_sources = [row["source"] for row in saved_rows]
+        self.assertEqual(saved_sources, [f"gmail_email{i}" for i in range(5)])
+        task_columns = set(Task.__table__.columns.keys())
+        for row in saved_rows: # create_tasks_bulk passes these straight to Task(**...)
+            self.assertLessEqual(set(row), task_columns)
+        mock_classifier_instance.close.assert_called_once()
+
+    @patch('main.AdaptiveRateLimiter')
+    @patch('main.GmailAgent')
+    @patch('main.TaskClassifier')
+    @patch('main.persistence_crud')
+    @patch('main.SessionLocal')
+    def test_run_gmail_pipeline_divides_rate_limits_by_share(
+        self, mock_session_local, mock_crud_main, MockTaskClassifier, MockGmailAgent, MockRateLimiter
+    ):
+        mock_agent_instance, _ = self._setup_pipeline_mocks(
+            MockGmailAgent, MockTaskClassifier, mock_crud_main, mock_session_local)
+        mock_agent_instance.iter_messages.return_value = [
+            {'id': 'email0', 'headers': {'subject': 'Subject 0'}, 'body_plain': 'Body 0'}]
+        MockTaskClassifier.return_value.classify_tasks.side_effect = lambda items, limiter=None, batch_size=1: [
+            None for _ in items]
+        MockRateLimiter.return_value.stats = {"peak_in_flight": 1, "rate_limited": 0, "wait_s": 0.0}
+        mock_crud_main.get_sync_cursor.return_value = None
+        mock_crud_main.get_task_ids_by_fingerprints.return_value = {}
+
+        with patch.object(config, 'CLASSIFIER_CONCURRENCY', 8), patch.object(config, 'CLASSIFIER_RPM_LIMIT', 3500), \
+                patch.object(config, 'CLASSIFIER_TPM_LIMIT', 200000):
+            result = run_gmail_ingestion_pipeline(app_user_id="test_user", incremental=False, rate_limit_share=4)
+
+        self.assertTrue(result["success"])
+        MockRateLimiter.assert_called_once_with(2, 875, 50000) # One of four concurrent account pipelines
+
+    @patch('main.GmailAgent')
+    @patch('main.TaskClassifier')
+    @patch('main.persistence_crud')
+    @patch('main.SessionLocal')
+    def test_run_gmail_pipeline_checks_window_fingerprints_with_one_lookup(
+        self, mock_session_local, mock_crud_main, MockTaskClassifier, MockGmailAgent
+    ):
+        mock_agent_instance, _ = self._setup_pipeline_mocks(
+            MockGmailAgent, MockTaskClassifier, mock_crud_main, mock_session_local)
+        mock_agent_instance.iter_messages.return_value = [
+            {'id': f'email{i}', 'headers': {'subject': f'Subject {i}'}, 'body_plain': f'Body {i}'} for i in range(4)
+        ]
+        titles = ["Send report", "Send report", "Book room", "Call Kim"] # email1 repeats email0; "Book room" is stored
+        MockTaskClassifier.return_value.classify_task.side_effect = [
+            {"title": title, "due": None, "body": "body"} for title in titles]
+        stored_fingerprint = generate_task_fingerprint("Book room", None)
+        mock_crud_main.get_sync_cursor.return_value = None
+        mock_crud_main.get_task_ids_by_fingerprints.return_value = {stored_fingerprint: 7}
+        mock_crud_main.create_tasks_bulk.side_effect = lambda db, tasks_data, commit=True: [
+            MagicMock(due_dt=None) for _ in tasks_data]
+
+        with patch.object(config, 'FINGERPRINT_INDEX', 'off'):
+            result = run_gmail_ingestion_pipeline(app_user_id="test_user", incremental=False)
+
+        self.assertEqual(result["tasks_created"], 2)
+        mock_crud_main.get_task_ids_by_fingerprints.assert_called_once()
+        self.assertIn(stored_fingerprint, mock_crud_main.get_task_ids_by_fingerprints.call_args.args[1])
+        mock_crud_main.get_task_by_fingerprint.assert_not_called()
+        saved_titles = [row["title"] for row in mock_crud_main.create_tasks_bulk.call_args.args[1]]
+        self.assertEqual(saved_titles, ["Send report", "Call Kim"])
+
+    @patch('main.GmailAgent')
+    @patch('main.TaskClassifier')
+    @patch('main.persistence_crud')
+    @patch('main.SessionLocal')
+    def test_run_gmail_pipeline_skips_processed_sources_and_records_outcomes(
+        self, mock_session_local, mock_crud_main, MockTaskClassifier, MockGmailAgent
+    ):
+        mock_agent_instance, mock_db = self._setup_pipeline_mocks(
+            MockGmailAgent, MockTaskClassifier, mock_crud_main, mock_session_local)
+        mock_agent_instance.iter_messages.return_value = [
+            {'id': 'seen', 'headers': {'subject': 'Old'}, 'body_plain': 'Already ingested last run'},
+            {'id': 'new_task', 'headers': {'subject': 'Report'}, 'body_plain': 'Send the report'},
+            {'id': 'failed', 'headers': {'subject': 'Hello'}, 'body_plain': 'Classification errors out'},
+            {'id': 'chatter', 'headers': {'subject': 'Hi'}, 'body_plain': 'Just saying hi'},
+            {'id': 'empty', 'headers': {'subject': 'Blank'}, 'body_plain': ''},
+        ]
+        mock_classifier_instance = MockTaskClassifier.return_value
+        mock_classifier_instance.failed_source_ids = {"gmail_failed"}
+        mock_classifier_instance.classify_task.side_effect = [{"title": "Send report", "due": None, "body": "b"}, None, None]
+        mock_crud_main.get_sync_cursor.return_value = None
+        mock_crud_main.get_processed_source_ids.return_value = {"gmail_seen"}
+        mock_crud_main.get_task_ids_by_fingerprints.return_value = {}
+        mock_crud_main.create_tasks_bulk.side_effect = lambda db, tasks_data, commit=True: [
+            MagicMock(due_dt=None) for _ in tasks_data]
+
+        with patch.object(config, 'PROCESSED_SOURCE_LEDGER_ENABLED', True):
+            result = run_gmail_ingestion_pipeline(app_user_id="ledger_user", incremental=False)
+
+        self.assertEqual(result["already_processed"], 1)
+        mock_crud_main.get_processed_source_ids.assert_called_once_with(
+            mock_db, ["gmail_seen", "gmail_new_task", "gmail_failed", "gmail_chatter", "gmail_empty"])
+        classified_ids = [c.kwargs["source_id"] for c in mock_classifier_instance.classify_task.call_args_list]
+        self.assertEqual(classified_ids, ["gmail_new_task", "gmail_failed", "gmail_chatter"])
+        mock_crud_main.record_processed_sources.assert_called_once_with(
+            mock_db, {"gmail_new_task": "task", "gmail_chatter": "not_task", "gmail_empty": "skipped"}, commit=False)
+
+    @patch('main.GmailAgent')
+    @patch('main.TaskClassifier')
+    @patch('main.persistence_crud')
+    @patch('main.SessionLocal')
+    def test_run_gmail_pipeline_gate_skips_promotions_and_records_outcomes(
+        self, mock_session_local, mock_crud_main, MockTaskClassifier, MockGmailAgent
+    ):
+        mock_agent_instance, mock_db = self._setup_pipeline_mocks(
+            MockGmailAgent, MockTaskClassifier, mock_crud_main, mock_session_local)
+        mock_agent_instance.iter_messages.return_value = [
+            {'id': 'promo', 'body_plain': '(광고) 주말 특가! 전 품목 50% 할인 쿠폰. 수신거부',
+             'headers': {'subject': '특가 이벤트', 'from': 'no-reply@shop.example', 'list-unsubscribe': '<mailto:u@shop.example>'}},
+            {'id': 'ask', 'body_plain': 'Could you send me the report by Friday?',
+             'headers': {'subject': 'Re: report', 'from': 'boss@company.example'}},
+        ]
+        mock_classifier_instance = MockTaskClassifier.return_value
+        mock_classifier_instance.failed_source_ids = set()
+        mock_classifier_instance.classify_task.return_value = None
+        mock_crud_main.get_sync_cursor.return_value = None
+        mock_crud_main.get_classification_outcomes.return_value = []
+
+        with patch.multiple(config, CLASSIFIER_GATE_ENABLED=True, CLASSIFIER_GATE_AUDIT_RATE=0.0,
+                            CLASSIFIER_GATE_RECORD_OUTCOMES=True, PROCESSED_SOURCE_LEDGER_ENABLED=True):
+            result = run_gmail_ingestion_pipeline(app_user_id="gate_user", incremental=False)
+
+        mock_classifier_instance.classify_task.assert_called_once_with(ANY, source_id="gmail_ask")
+        self.assertEqual(result["gate_skipped"], 1)
+        self.assertEqual(result["gate_skip_rate"], 0.5)
+        mock_crud_main.save_classification_outcome.assert_called_once_with(mock_db, "gmail_ask", ANY, commit=False)
+        outcome = mock_crud_main.save_classification_outcome.call_args.args[2]
+        self.assertFalse(outcome["is_task"])
+        self.assertEqual(outcome["sender"], "boss@company.example")
+        # The gated email is recorded apart from empty ones, as an outcome the ledger re-evaluates.
+        mock_crud_main.record_processed_sources.assert_called_once_with(
+            mock_db, {"gmail_promo": "gated", "gmail_ask": "not_task"}, commit=False)
+
+    @patch('main.GmailAgent')
+    @patch('main.TaskClassifier')
+    @patch('main.persistence_crud')
+    @patch('main.SessionLocal')
+    def test_run_gmail_pipeline_incremental_uses_stored_history_id(
+        self, mock_session_local, mock_crud_main, MockTaskClassifier, MockGmailAgent
+    ):
+        mock_agent_instance, mock_db = self._setup_pipeline_mocks(
+            MockGmailAgent, MockTaskClassifier, mock_crud_main, mock_session_local)
+        mock_crud_main.get_sync_cursor.return_value = MagicMock(cursor_value="1000")
+        mock_agent_instance.fetch_messages_since_history.return_value = (
+            [{'id': 'new1', 'headers': {'subject': 'New mail'}, 'body_plain': 'Hello'}], "1042")
+
+        result = run_gmail_ingestion_pipeline(app_user_id="inc_user", incremental=True)
+
+        self.assertTrue(result["success"])
+        self.assertEqual(result["sync_mode"], "incremental")
+        self.assertEqual(result["items_processed"], 1)
+        mock_agent_instance.fetch_messages_since_history.assert_called_once_with(
+            "1000", **gmail_fetch_options())
+        mock_agent_instance.iter_messages.assert_not_called()
+        mock_crud_main.save_sync_cursor.assert_called_once_with(
+            mock_db, user_identifier="inc_user", platform='gmail', cursor_value="1042")
+
+    @patch('main.GmailAgent')
+    @patch('main.TaskClassifier')
+    @patch('main.persistence_crud')
+    @patch('main.SessionLocal')
+    def test_run_gmail_pipeline_keeps_cursor_when_an_email_fails(
+        self, mock_session_local, mock_crud_main, MockTaskClassifier, MockGmailAgent
+    ):
+        mock_agent_instance, mock_db = self._setup_pipeline_mocks(
+            MockGmailAgent, MockTaskClassifier, mock_crud_main, mock_session_local)
+        mock_crud_main.get_sync_cursor.return_value = MagicMock(cursor_value="1000")
+        mock_crud_main.get_processed_source_ids.return_value = set()
+        mock_agent_instance.fetch_messages_since_history.return_value = (
+            [{'id': 'ok', 'headers': {'subject': 'Hi'}, 'body_plain': 'Hello'},
+             {'id': 'failed', 'headers': {'subject': 'Report'}, 'body_plain': 'Send the report'}], "1042")
+        MockTaskClassifier.return_value.failed_source_ids = {"gmail_failed"}
+
+        result = run_gmail_ingestion_pipeline(app_user_id="inc_user", incremental=True)
+
+        self.assertTrue(result["success"])
+        self.assertEqual(result["failed_items"], 1)
+        mock_crud_main.save_sync_cursor.assert_not_called()
+
+    @patch('main.GmailAgent')
+    @patch('main.TaskClassifier')
+    @patch('main.persistence_crud')
+    @patch('main.SessionLocal')
+    def test_run_gmail_pipeline_keeps_cursor_when_the_save_rolls_back(
+        self, mock_session_local, mock_crud_main, MockTaskClassifier, MockGmailAgent
+    ):
+        mock_agent_instance, mock_db = self._setup_pipeline_mocks(
+            MockGmailAgent, MockTaskClassifier, mock_crud_main, mock_session_local)
+        mock_crud_main.get_sync_cursor.return_value = MagicMock(cursor_value="1000")
+        mock_crud_main.get_processed_source_ids.return_value = set()
+        mock_agent_instance.fetch_messages_since_history.return_value = (
+            [{'id': 'new1', 'headers': {'subject': 'Report'}, 'body_plain': 'Send the report'}], "1042")
+        MockTaskClassifier.return_value.failed_source_ids = set()
+        MockTaskClassifier.return_value.classify_task.return_value = {"title": "Send report", "due": None, "body": "b"}
+        mock_crud_main.get_task_ids_by_fingerprints.return_value = {}
+        mock_crud_main.create_tasks_bulk.side_effect = RuntimeError("disk I/O error")
+
+        result = run_gmail_ingestion_pipeline(app_user_id="inc_user", incremental=True)
+
+        mock_db.rollback.assert_called()
+        self.assertEqual(result["failed_items"], 1)
+        mock_crud_main.save_sync_cursor.assert_not_called()
+
+    @patch('main.GmailAgent')
+    @patch('main.TaskClassifier')
+    @patch('main.persistence_crud')
+    @patch('main.SessionLocal')
+    def test_run_gmail_pipeline_skips_bodies_emptied_by_normalization(
+        self, mock_session_local, mock_crud_main, MockTaskClassifier, MockGmailAgent
+    ):
+        mock_agent_instance, _ = self._setup_pipeline_mocks(
+            MockGmailAgent, MockTaskClassifier, mock_crud_main, mock_session_local)
+        mock_crud_main.get_sync_cursor.return_value = MagicMock(cursor_value="1000")
+        mock_crud_main.get_processed_source_ids.return_value = set()
+        mock_agent_instance.fetch_messages_since_history.return_value = (
+            [{'id': 'quoted', 'headers': {'subject': 'Re: Lunch'}, 'body_plain': '> Lunch on Friday?\n> 12pm'}], "1042")
+        MockTaskClassifier.return_value.failed_source_ids = set()
+
+        with patch.object(config, 'NORMALIZER_STRIP_BOILERPLATE', True), \
+                patch.object(config, 'PROCESSED_SOURCE_LEDGER_ENABLED', True):
+            result = run_gmail_ingestion_pipeline(app_user_id="inc_user", incremental=True)
+
+        self.assertTrue(result["success"])
+        MockTaskClassifier.return_value.classify_task.assert_not_called()
+        mock_crud_main.record_processed_sources.assert_called_once_with(ANY, {"gmail_quoted": "skipped"}, commit=False)
+        mock_crud_main.save_sync_cursor.assert_called_once()
+
+    @patch('main.GmailAgent')
+    @patch('main.TaskClassifier')
+    @patch('main.persistence_crud')
+    @patch('main.SessionLocal')
+    def test_run_gmail_pipeline_keeps_cursor_when_a_detail_fetch_fails(
+        self, mock_session_local, mock_crud_main, MockTaskClassifier, MockGmailAgent
+    ):
+        mock_agent_instance, mock_db = self._setup_pipeline_mocks(
+            MockGmailAgent, MockTaskClassifier, mock_crud_main, mock_session_local)
+        mock_crud_main.get_sync_cursor.return_value = MagicMock(cursor_value="1000")
+        mock_crud_main.get_processed_source_ids.return_value = set()
+        mock_agent_instance.fetch_messages_since_history.return_value = (
+            [{'id': 'ok', 'headers': {'subject': 'Hi'}, 'body_plain': 'Hello'}], "1042")
+        mock_agent_instance.failed_message_ids = {"lost"} # Its batch item failed
+        MockTaskClassifier.return_value.failed_source_ids = set()
+
+        result = run_gmail_ingestion_pipeline(app_user_id="inc_user", incremental=True)
+
+        self.assertTrue(result["success"])
+        self.assertEqual(result["failed_items"], 1)
+        mock_crud_main.save_sync_cursor.assert_not_called()
+
+    @patch('main.GmailAgent')
+    @patch('main.TaskClassifier')
+    @patch('main.persistence_crud')
+    @patch('main.SessionLocal')
+    def test_run_gmail_pipeline_keeps_cursor_when_a_list_page_fails(
+        self, mock_session_local, mock_crud_main, MockTaskClassifier, MockGmailAgent
+    ):
+        mock_agent_instance, mock_db = self._setup_pipeline_mocks(
+            MockGmailAgent, MockTaskClassifier, mock_crud_main, mock_session_local)
+        mock_crud_main.get_sync_cursor.return_value = None # First run: lists the last day
+        mock_crud_main.get_processed_source_ids.return_value = set()
+        mock_agent_instance.get_current_history_id.return_value = "1042"
+        MockTaskClassifier.return_value.failed_source_ids = set()
+
+        def listing():
+            yield {'id': 'page1', 'headers': {'subject': 'Hi'}, 'body_plain': 'Hello'}
+            raise RuntimeError("Error listing messages (page 2)")
+        mock_agent_instance.iter_messages.return_value = listing()
+
+        result = run_gmail_ingestion_pipeline(app_user_id="first_user", incremental=True)
+
+        self.assertFalse(result["success"])
+        self.assertIn("page 2", result["error"])
+        mock_crud_main.save_sync_cursor.assert_not_called()
+
+    @patch('main.GmailAgent')
+    @patch('main.TaskClassifier')
+    @patch('main.persistence_crud')
+    @patch('main.SessionLocal')
+    def test_run_gmail_pipeline_history_listing_error_fails_the_run(
+        self, mock_session_local, mock_crud_main, MockTaskClassifier, MockGmailAgent
+    ):
+        mock_agent_instance, mock_db = self._setup_pipeline_mocks(
+            MockGmailAgent, MockTaskClassifier, mock_crud_main, mock_session_local)
+        mock_crud_main.get_sync_cursor.return_value = MagicMock(cursor_value="1000")
+        mock_agent_instance.fetch_messages_since_history.side_effect = RuntimeError("backend error")
+
+        result = run_gmail_ingestion_pipeline(app_user_id="inc_user", incremental=True)
+
+        self.assertFalse(result["success"])
+        self.assertIn("backend error", result["error"])
+        mock_crud_main.save_sync_cursor.assert_not_called()
+        mock_db.close.assert_called_once()
+
+    @patch('main.config.GMAIL_PREFILTER_ENABLED', True)
+    @patch('main.GmailAgent')
+    @patch('main.TaskClassifier')
+    @patch('main.persistence_crud')
+    @patch('main.SessionLocal')
+    def test_run_gmail_pipeline_reports_prefilter_bytes(
+        self, mock_session_local, mock_crud_main, MockTaskClassifier, MockGmailAgent
+    ):
+        mock_agent_instance, _ = self._setup_pipeline_mocks(
+            MockGmailAgent, MockTaskClassifier, mock_crud_main, mock_session_local)
+        mock_crud_main.get_sync_cursor.return_value = None
+        mock_agent_instance.iter_messages.return_value = iter([])
+        mock_agent_instance.fetch_stats = {'metadata_bytes': 1000, 'full_bytes': 30000,
+                                           'prefilter_skipped': 4, 'skipped_size_estimate_bytes': 20000}
+
+        result = run_gmail_ingestion_pipeline(app_user_id="prefilter_user", incremental=False)
+
+        self.assertIsNotNone(mock_agent_instance.prefilter)
+        self.assertEqual(result["prefilter_skipped"], 4)
+        self.assertEqual(result["bytes_fetched"], 31000)
+        self.assertEqual(result["bytes_saved_estimate"], 19000)
+        self.assertEqual(result["bytes_reduction_pct"], 38.0)
+
+    @patch('main.date')
+    @patch('main.GmailAgent')
+    @patch('main.TaskClassifier')
+    @patch('main.persistence_crud')
+    @patch('main.SessionLocal')
+    def test_run_gmail_pipeline_expired_history_id_falls_back_to_resync(
+        self, mock_session_local, mock_crud_main, MockTaskClassifier, MockGmailAgent, mock_date_main
+    ):
+        fixed_today = date(2024, 3, 15)
+        mock_date_main.today.return_value = fixed_today
+        mock_agent_instance, mock_db = self._setup_pipeline_mocks(
+            MockGmailAgent, MockTaskClassifier, mock_crud_main, mock_session_local)
+        mock_crud_main.get_sync_cursor.return_value = MagicMock(cursor_value="5")
+        mock_agent_instance.fetch_messages_since_history.side_effect = HistoryIdExpiredError("expired")
+        mock_agent_instance.get_current_history_id.return_value = "2000"
+        mock_agent_instance.iter_messages.return_value = iter([])
+
+        result = run_gmail_ingestion_pipeline(app_user_id="resync_user", incremental=True)
+
+        self.assertTrue(result["success"])
+        self.assertEqual(result["sync_mode"], "resync")
+        expected_since = (fixed_today - timedelta(days=config.GMAIL_RESYNC_DAYS)).strftime("%Y/%m/%d")
+        mock_agent_instance.iter_messages.assert_called_once_with(
+            since_date_str=expected_since, max_results=config.GMAIL_RESYNC_MAX_RESULTS,
+            page_size=config.GMAIL_LIST_PAGE_SIZE, prefetch=config.GMAIL_LIST_PREFETCH, **gmail_fetch_options())
+        mock_crud_main.save_sync_cursor.assert_called_once_with(
+            mock_db, user_identifier="resync_user", platform='gmail', cursor_value="2000")
+        mock_db.close.assert_called_once()
+
+
+class TestKakaoTalkMessageProcessing(unittest.TestCase):
+
+    def setUp(self):
+        self.summary = {"success": False, "cursor": "k_old", "chars_removed": 0, "tasks_created": 0,
+                        "already_processed": 0, "failed_items": 0, "error": None}
+        self.messages = [{"id": f"k_{n}", "text": f"message {n}"} for n in range(4)]
+        self.classifier = MagicMock(failed_source_ids={"kakaotalk_Team_k_2"})
+        self.classifier.classify_task.return_value = None
+        self.patches = [patch.multiple(config, CLASSIFIER_BATCH_SIZE=1, PROCESSED_SOURCE_LEDGER_ENABLED=False),
+                        patch('main.get_fingerprint_index', return_value=None)]
+        for p in self.patches: p.start()
+
+    def tearDown(self):
+        for p in self.patches: p.stop()
+
+    @patch('main.persistence_crud')
+    @patch('main.SessionLocal')
+    def test_cursor_stops_before_the_first_failed_message(self, mock_session_local, mock_crud_main):
+        mock_db = mock_session_local.return_value
+
+        _process_kakaotalk_messages("user", "Team", self.messages, self.classifier, self.summary)
+
+        self.assertTrue(self.summary["success"])
+        self.assertEqual(self.summary["failed_items"], 1)
+        self.assertEqual(self.summary["cursor"], "k_1")
+        mock_crud_main.save_sync_cursor.assert_called_once_with(
+            mock_db, user_identifier="user", platform="kakaotalk:Team", cursor_value="k_1")
+
+    @patch('main.persistence_crud')
+    @patch('main.SessionLocal')
+    def test_failed_save_keeps_the_cursor(self, mock_session_local, mock_crud_main):
+        self.classifier.failed_source_ids = set()
+        self.classifier.classify_task.return_value = {"title": "Book room", "due": None, "body": "b"}
+        mock_crud_main.get_task_ids_by_fingerprints.return_value = {}
+        mock_crud_main.create_tasks_bulk.side_effect = RuntimeError("database is locked")
+
+        _process_kakaotalk_messages("user", "Team", self.messages, self.classifier, self.summary)
+
+        self.assertFalse(self.summary["success"])
+        self.assertIn("database is locked", self.summary["error"])
+        self.assertEqual(self.summary["cursor"], "k_old")
+        mock_session_local.return_value.rollback.assert_called_once()
+        mock_crud_main.save_sync_cursor.assert_not_called()
+
+
 if __name__ == '__main__':
     unittest.main()
-```
@@ -1,12 +1,19 @@
+import os
+import shutil
+import sqlite3
+import tempfile
 import unittest
+from unittest.mock import patch
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker, Session as SQLAlchemySession # Alias to avoid clash if Session is used locally
 from datetime import datetime, timedelta
 
 # Adjust imports based on your project structure
 # Assuming 'persistence' is a top-level directory or in PYTHONPATH
-from persistence.models import Base, Task, TaskStatus
+from persistence.models import Base, Task, TaskStatus, SyncCursor, ProcessedSource
 from persistence import crud
+from persistence.database import begin_write, configure_sqlite_engine, create_app_engine
+import config
 
 class TestPersistenceCRUD(unittest.TestCase):
 
@@ -280,3 +287,194 @@ class TestPersistenceSourceTokenCRUD(unittest.TestCase):
         retrieved = crud.get_token(self.db, user_id, platform)
         self.assertIsNotNone(retrieved)
         self.assertEqual(retrieved.access_token, "minimal_access")
+
+    def test_get_token_user_ids_per_platform(self):
+        for user_id, platform in [("gmail_b", "gmail"), ("gmail_a", "gmail"), ("kakao_a", "kakaotalk")]:
+            crud.save_token(self.db, user_id, platform, {"access_token": "t", "expires_dt": datetime.utcnow()})
+        self.assertEqual(crud.get_token_user_ids(self.db, "gmail"), ["gmail_a", "gmail_b"])
+        self.assertEqual(crud.get_token_user_ids(self.db, "outlook"), [])
+
+
+class TestPersistenceSyncCursorCRUD(unittest.TestCase):
+
+    engine = None
+    SessionLocalTest = None
+
+    @classmethod
+    def setUpClass(cls):
+        cls.engine = create_engine("sqlite:///:memory:")
+        Base.metadata.create_all(cls.engine)
+        cls.SessionLocalTest = sessionmaker(autocommit=False, autoflush=False, bind=cls.engine)
+
+    @classmethod
+    def tearDownClass(cls):
+        Base.metadata.drop_all(cls.engine)
+        cls.engine.dispose()
+
+    def setUp(self):
+        self.connection = self.engine.connect()
+        self.trans = self.connection.begin()
+        self.db: SQLAlchemySession = self.SessionLocalTest(bind=self.connection)
+
+    def tearDown(self):
+        self.db.close()
+        self.trans.rollback()
+        self.connection.close()
+
+    def test_get_sync_cursor_not_found(self):
+        self.assertIsNone(crud.get_sync_cursor(self.db, "no_cursor_user", "gmail"))
+
+    def test_save_sync_cursor_create_then_advance(self):
+        created = crud.save_sync_cursor(self.db, "cursor_user", "gmail", 1000)
+        self.assertIsNotNone(created.id)
+        self.assertEqual(created.cursor_value, "1000")
+
+        advanced = crud.save_sync_cursor(self.db, "cursor_user", "gmail", "1042")
+        self.assertEqual(advanced.id, created.id, "Cursor row should be updated in place.")
+        self.assertEqual(crud.get_sync_cursor(self.db, "cursor_user", "gmail").cursor_value, "1042")
+        self.assertEqual(self.db.query(SyncCursor).filter(SyncCursor.user_id == "cursor_user").count(), 1)
+
+    def test_sync_cursors_are_per_user_and_platform(self):
+        crud.save_sync_cursor(self.db, "user_a", "gmail", "1")
+        crud.save_sync_cursor(self.db, "user_b", "gmail", "2")
+        crud.save_sync_cursor(self.db, "user_a", "other_platform", "3")
+        self.assertEqual(crud.get_sync_cursor(self.db, "user_a", "gmail").cursor_value, "1")
+        self.assertEqual(crud.get_sync_cursor(self.db, "user_b", "gmail").cursor_value, "2")
+        self.assertEqual(crud.get_sync_cursor(self.db, "user_a", "other_platform").cursor_value, "3")
+
+
+class TestPersistenceBulkWrites(unittest.TestCase):
+
+    engine = None
+    SessionLocalTest = None
+
+    @classmethod
+    def setUpClass(cls):
+        # Same transaction handling as the app engine, so SAVEPOINTs nest inside the test transaction.
+        cls.engine = configure_sqlite_engine(create_engine("sqlite:///:memory:"))
+        Base.metadata.create_all(cls.engine)
+        cls.SessionLocalTest = sessionmaker(autocommit=False, autoflush=False, bind=cls.engine)
+
+    @classmethod
+    def tearDownClass(cls):
+        Base.metadata.drop_all(cls.engine)
+        cls.engine.dispose()
+
+    def setUp(self):
+        self.connection = self.engine.connect()
+        self.trans = self.connection.begin()
+        self.db: SQLAlchemySession = self.SessionLocalTest(bind=self.connection)
+
+    def tearDown(self):
+        self.db.close()
+        if self.trans.is_active: # A session rollback in the test already ended it
+            self.trans.rollback()
+        self.connection.close()
+
+    def test_create_tasks_bulk_skips_failing_rows_and_keeps_the_rest(self):
+        crud.create_task(self.db, {"title": "Stored", "source": "test", "fingerprint": "fp_stored"})
+        rows = [
+            {"title": "Bulk 1", "source": "test", "fingerprint": "fp_1", "status": "TODO"},
+            {"title": "Duplicate", "source": "test", "fingerprint": "fp_stored"},
+            {"title": "Bulk 2", "source": "test", "fingerprint": "fp_2", "due_dt": datetime(2024, 3, 15, 14, 0)},
+        ]
+        created = crud.create_tasks_bulk(self.db, rows)
+
+        self.assertEqual([t.title if t else None for t in created], ["Bulk 1", None, "Bulk 2"])
+        self.assertTrue(all(t.id for t in created if t))
+        self.assertEqual(created[0].status, TaskStatus.TODO)
+        self.assertEqual(created[2].countdown_int, 0)
+        self.assertEqual(self.db.query(Task).count(), 3)
+        self.assertNotIn("status", rows[1], "The caller's dicts are not modified.")
+
+    def test_get_task_ids_by_fingerprints_looks_up_a_batch(self):
+        stored = crud.create_tasks_bulk(self.db, [{"title": f"T{i}", "source": "test", "fingerprint": f"fp_{i}"}
+                                                  for i in range(3)])
+        with patch.object(crud, "IN_QUERY_CHUNK", 2): # Two IN queries
+            found = crud.get_task_ids_by_fingerprints(self.db, ["fp_0", "fp_2", "fp_missing", None, "fp_0"])
+        self.assertEqual(found, {"fp_0": stored[0].id, "fp_2": stored[2].id})
+        self.assertEqual([row.fingerprint for row in crud.iter_task_fingerprints(self.db, after_id=stored[0].id)],
+                         ["fp_1", "fp_2"])
+
+    def test_processed_source_ledger_records_and_looks_up_a_batch(self):
+        self.assertEqual(crud.record_processed_sources(self.db, {"gmail_a": "task", "gmail_b": "not_task"}), 2)
+        crud.record_processed_sources(self.db, {"gmail_b": "task", "kakaotalk_chat_7": "skipped", "gmail_promo": "gated"},
+                                      commit=False)
+        with patch.object(crud, "IN_QUERY_CHUNK", 2):
+            found = crud.get_processed_source_ids(self.db, ["gmail_a", "gmail_b", "gmail_new", "kakaotalk_chat_7", "gmail_promo"])
+        self.assertEqual(found, {"gmail_a", "gmail_b", "kakaotalk_chat_7"}, "Gated messages are evaluated again.")
+        rows = {row.source_id: row.outcome for row in self.db.query(ProcessedSource)}
+        self.assertEqual(rows, {"gmail_a": "task", "gmail_b": "task", "kakaotalk_chat_7": "skipped", "gmail_promo": "gated"})
+
+    def test_bulk_rows_and_tags_share_one_uncommitted_transaction(self):
+        created = crud.create_tasks_bulk(self.db, [{"title": "A", "source": "test"}, {"title": "B", "source": "test"}],
+                                         commit=False)
+        crud.update_task_tags(self.db, created[0].id, "#conflict", commit=False)
+        crud.update_task_tags(self.db, created[0].id, "#urgent", commit=False)
+        self.assertEqual(crud.get_task(self.db, created[0].id).tags, "#conflict,#urgent")
+        self.db.rollback()
+        self.assertEqual(self.db.query(Task).count(), 0, "Nothing was committed before the caller's commit.")
+
+
+class TestSQLiteConnectionProfile(unittest.TestCase):
+
+    def setUp(self):
+        self.db_dir = tempfile.mkdtemp(prefix="profile_test_")
+        self.database_url = f"sqlite:///{os.path.join(self.db_dir, 'agenda.db')}"
+
+    def tearDown(self):
+        shutil.rmtree(self.db_dir, ignore_errors=True)
+
+    def _pragmas(self, engine, *names):
+        try:
+            with engine.connect() as conn:
+                return [conn.exec_driver_sql(f"PRAGMA {name}").scalar() for name in names]
+        finally:
+            engine.dispose()
+
+    def test_performance_profile_applies_pragmas_and_sizes_pool(self):
+        engine = create_app_engine(self.database_url, profile="performance")
+        self.assertEqual(engine.pool.size(), config.DB_POOL_SIZE)
+        journal_mode, synchronous, busy_timeout, cache_size = self._pragmas(
+            engine, "journal_mode", "synchronous", "busy_timeout", "cache_size")
+        self.assertEqual(journal_mode, "wal")
+        self.assertEqual(synchronous, 1) # NORMAL
+        self.assertEqual(busy_timeout, config.SQLITE_BUSY_TIMEOUT_MS)
+        self.assertEqual(cache_size, -config.SQLITE_CACHE_SIZE_MB * 1024)
+
+    def test_legacy_profile_keeps_sqlite_defaults_but_waits_for_locks(self):
+        journal_mode, synchronous, busy_timeout = self._pragmas(create_app_engine(self.database_url, profile="legacy"),
+                                                                "journal_mode", "synchronous", "busy_timeout")
+        self.assertEqual(journal_mode, "delete")
+        self.assertEqual(synchronous, 2) # FULL
+        self.assertEqual(busy_timeout, config.SQLITE_BUSY_TIMEOUT_MS)
+
+    def test_begin_write_replaces_a_stale_read_snapshot_with_the_write_lock(self):
+        engine = create_app_engine(self.database_url, profile="performance")
+        try:
+            Base.metadata.create_all(engine)
+            SessionLocalTest = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+            reader, other = SessionLocalTest(), SessionLocalTest()
+            self.assertIsNone(crud.get_sync_cursor(reader, "user", "gmail")) # Opens a deferred read transaction
+            crud.save_sync_cursor(other, "user", "kakaotalk:Team", "k_1") # Another account commits meanwhile
+
+            begin_write(reader)
+            probe = sqlite3.connect(os.path.join(self.db_dir, 'agenda.db'), timeout=0)
+            with self.assertRaises(sqlite3.OperationalError): # The write lock is already held
+                probe.execute("BEGIN IMMEDIATE")
+            probe.close()
+            crud.save_sync_cursor(reader, "user", "gmail", "1042") # Would fail with SQLITE_BUSY on the old snapshot
+            reader.close(); other.close()
+            with SessionLocalTest() as check:
+                self.assertEqual(check.query(SyncCursor).count(), 2)
+        finally:
+            engine.dispose()
+
+    def test_in_memory_database_is_shared_within_a_thread(self):
+        engine = create_app_engine("sqlite:///:memory:", profile="performance")
+        try:
+            Base.metadata.create_all(engine)
+            with engine.connect() as conn:
+                self.assertEqual(conn.exec_driver_sql("SELECT count(*) FROM tasks").scalar(), 0)
+        finally:
+            engine.dispose()
@@ -0,0 +1,136 @@
+import unittest
+from unittest.mock import patch
+
+from preprocessing.budget import budget_content, estimate_tokens
+
+from preprocessing.normalizer import (
+    HTML_BACKENDS, html_to_plaintext, normalize, normalize_with_stats, remove_emojis, strip_boilerplate
+)
+
+
+class TestHtmlToPlaintext(unittest.TestCase):
+
+    SAMPLES = [
+        "<h1>Hello</h1><p>This is a test with <a href='#'>a link</a>.</p>",
+        "<html><head><title>Digest</title><style>p{color:red}</style><script>var a='<p>x</p>';</script></head>"
+        "<body><!--[if mso]><table><![endif]--><p>Due &amp; owed: 5&#37; by Fri&nbsp;5pm</p>"
+        "<img src='https://t.example.com/open.gif' width='1' height='1'><template><p>hidden</p></template></body></html>",
+        "a<!-- c -->b <![CDATA[cdata]]> &copyright &bogus; &#x41;&#0; < not a tag",
+        "<div><style>x</style>unclosed <b>bold",
+    ]
+
+    def test_backends_produce_identical_text(self):
+        for sample in self.SAMPLES:
+            with self.subTest(sample=sample):
+                self.assertEqual(HTML_BACKENDS['streaming'](sample), HTML_BACKENDS['beautifulsoup'](sample))
+
+    def test_streaming_backend_drops_non_text_markup(self):
+        text = html_to_plaintext(self.SAMPLES[1], backend='streaming')
+        self.assertEqual(text, "Digest\nDue & owed: 5% by Fri\xa05pm")
+
+    def test_backends_drop_hidden_elements_and_tracking_pixels(self):
+        html = ("<div style='display:none;max-height:0'>Preheader: <b>50% off</b> today</div>"
+                "<p>Please review the contract by Friday.</p><div hidden><div>open tracker</div>tracking id</div>"
+                "<span style='visibility: hidden !important'>spacer</span><p>Thanks"
+                "<img src='https://t.example.com/o.gif' width='1' height='1' alt='pixel'>"
+                "<img src='https://t.example.com/p.gif' style='width:1px;height:1px'></p>")
+        for backend in HTML_BACKENDS:
+            with self.subTest(backend=backend):
+                self.assertEqual(html_to_plaintext(html, backend=backend), "Please review the contract by Friday.\nThanks")
+
+    def test_empty_and_unknown_backend(self):
+        self.assertEqual(html_to_plaintext("", backend='streaming'), "")
+        with patch('builtins.print'):
+            self.assertEqual(html_to_plaintext("<p>Hi</p>", backend='nope'), "Hi")
+
+    @patch('preprocessing.normalizer.config')
+    def test_normalize_uses_configured_backend(self, mock_config):
+        mock_config.NORMALIZER_HTML_BACKEND = 'streaming'
+        with patch.dict(HTML_BACKENDS, {'streaming': lambda html: "streamed"}), patch('builtins.print'):
+            self.assertEqual(normalize("<p>Hi</p>"), "streamed")
+        self.assertEqual(normalize("plain <b>text</b>", content_type='text/plain'), "plain <b>text</b>")
+
+
+class TestCleaningStage(unittest.TestCase):
+
+    def test_remove_emojis_handles_sequences(self):
+        self.assertEqual(remove_emojis("Hi 👋🏽 family 👨‍👩‍👧 🇰🇷 1️⃣ ❤️!"), "Hi  family   1 !")
+        self.assertEqual(remove_emojis("회의 내일 10시 (ㅋㅋ) → 확인"), "회의 내일 10시 (ㅋㅋ) → 확인")
+
+    def test_strip_boilerplate_cuts_reply_chain_and_signature(self):
+        text = ("Please submit the report by Friday 5pm ✅\n\nThanks,\nDana\n-- \nDana Kim | PM\n"
+                "On Mon, May 1, 2024 at 3:00 PM John <j@example.com>\nwrote:\n> Can you send the report?")
+        cleaned, removed = strip_boilerplate(text)
+        self.assertEqual(cleaned, "Please submit the report by Friday 5pm\n\nThanks,\nDana")
+        self.assertEqual(removed, len(text) - len(cleaned))
+
+    def test_strip_boilerplate_drops_quotes_korean_headers_and_footers(self):
+        text = "회의는 내일 10시입니다.\n> 이전 메시지\n2024년 5월 1일 (수) 오후 3:00, 홍길동 <a@b.com>님이 작성:\n> 원문"
+        self.assertEqual(strip_boilerplate(text)[0], "회의는 내일 10시입니다.")
+        footer = "Sale ends Sunday.\nYou are receiving this email because you signed up.\nUnsubscribe | Preferences"
+        self.assertEqual(strip_boilerplate(footer)[0], "Sale ends Sunday.")
+        outlook = "Moved to 3pm.\nFrom: Bob Lee\nSent: Monday, May 1\nSubject: Sync"
+        self.assertEqual(strip_boilerplate(outlook)[0], "Moved to 3pm.")
+
+    def test_strip_boilerplate_only_cuts_footers_at_the_end(self):
+        body = "\n".join(f"Item {i}: the venue changed, please confirm by Friday." for i in range(12))
+        for header in ("Unsubscribe | View in browser", "You are receiving this email because you joined.\n수신거부"):
+            with self.subTest(header=header):
+                self.assertEqual(strip_boilerplate(f"{header}\n{body}")[0], f"{header}\n{body}")
+                self.assertEqual(strip_boilerplate(f"Welcome!\n{header}\n{body}")[0], f"Welcome!\n{header}\n{body}")
+        self.assertEqual(strip_boilerplate("Unsubscribe\nPlease confirm by Friday."),
+                         ("Unsubscribe\nPlease confirm by Friday.", 0))
+
+    def test_strip_boilerplate_keeps_ordinary_lines(self):
+        text = "From: the design team, new mockups are ready.\nOn Friday we review them."
+        self.assertEqual(strip_boilerplate(text), (text, 0))
+        self.assertEqual(strip_boilerplate(""), ("", 0))
+
+    def test_strip_boilerplate_keeps_on_sentences_before_header_like_lines(self):
+        for text in ("Agenda:\nOn Monday we meet\nDate: 3pm in room 4", "Plan\nOn Monday we meet\nwrote: nothing yet"):
+            with self.subTest(text=text):
+                self.assertEqual(strip_boilerplate(text), (text, 0))
+        attribution = "Sounds good.\nOn Mon, May 1, 2024 at 3:00 PM John Doe\nwrote:\n> Lunch?"
+        self.assertEqual(strip_boilerplate(attribution)[0], "Sounds good.")
+
+    @patch('preprocessing.normalizer.config')
+    def test_normalize_with_stats_respects_toggle(self, mock_config):
+        mock_config.NORMALIZER_HTML_BACKEND = 'streaming'
+        mock_config.NORMALIZER_STRIP_BOILERPLATE = True
+        html = "<p>Submit by Friday 🙏</p><blockquote><p>On Mon, John wrote:</p><p>old</p></blockquote>"
+        self.assertEqual(normalize_with_stats(html), ("Submit by Friday", 26))
+        mock_config.NORMALIZER_STRIP_BOILERPLATE = False
+        self.assertEqual(normalize_with_stats(html), ("Submit by Friday \nOn Mon, John wrote:\nold", 1))
+
+
+
+class TestTokenBudget(unittest.TestCase):
+
+    def test_content_within_budget_is_unchanged(self):
+        content, tokens, trimmed = budget_content("Submit the report by Friday.", subject="Report", sender="a@b.com",
+                                                  max_tokens=100)
+        self.assertEqual(content, "Subject: Report\nFrom: a@b.com\n\nSubmit the report by Friday.")
+        self.assertEqual((tokens, trimmed), (estimate_tokens(content), 0))
+
+    def test_keeps_header_leading_and_task_paragraphs_in_order(self):
+        filler = [f"Story {i}: our marketing numbers grew again this quarter across regions." for i in range(40)]
+        body = "\n\n".join(["Welcome to the weekly digest."] + filler[:20] +
+                            ["Please submit the survey by Friday 5pm."] + filler[20:] + ["회의는 내일 10시입니다."])
+        content, tokens, trimmed = budget_content(body, subject="Weekly digest", sender="news@example.com", max_tokens=60)
+
+        self.assertEqual(content, "Subject: Weekly digest\nFrom: news@example.com\n\nWelcome to the weekly digest.\n"
+                                  "Please submit the survey by Friday 5pm.\n회의는 내일 10시입니다.")
+        self.assertLessEqual(tokens, 60)
+        self.assertEqual(trimmed, estimate_tokens(f"Subject: Weekly digest\nFrom: news@example.com\n\n{body}") - tokens)
+
+    def test_oversized_leading_paragraph_is_truncated(self):
+        content, tokens, trimmed = budget_content("word " * 500, max_tokens=20)
+        self.assertTrue(content.startswith("word word"))
+        self.assertLessEqual(tokens, 20)
+        self.assertGreater(trimmed, 0)
+        self.assertEqual(budget_content("word " * 500, max_tokens=0)[2], 0) # Budgeting disabled
+
+
+
+if __name__ == '__main__':
+    unittest.main()
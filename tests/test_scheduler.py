@@ -2,6 +2,7 @@ import unittest
 from unittest.mock import patch, MagicMock, call
 import sys
 import logging
+import threading
 import datetime # For datetime objects in test and mock returns
 
 # Attempt to import the module to be tested
@@ -101,6 +102,34 @@ class TestSchedulerJobs(unittest.TestCase):
         self.assertIn("✅ \\*KakaoTalk \\(Experimental\\)\\*: Succeeded", sent_message)
 
 
+    @patch('scheduler.jobs.TelegramNotifier')
+    @patch('scheduler.jobs.run_kakaotalk_ingestion_pipeline')
+    @patch('scheduler.jobs.run_gmail_ingestion_pipeline')
+    @patch('scheduler.jobs.logger')
+    def test_scheduled_job_reports_each_kakaotalk_chat(
+        self, mock_logger, mock_run_gmail, mock_run_kakaotalk, MockTelegramNotifier
+    ):
+        mock_notifier_instance = MagicMock()
+        MockTelegramNotifier.return_value = mock_notifier_instance
+        mock_run_gmail.return_value = {"success": True, "source": "Gmail", "tasks_created": 0, "items_processed": 0, "error": None}
+        mock_run_kakaotalk.return_value = {
+            "success": False, "source": "KakaoTalk (Experimental)", "tasks_created": 1, "items_processed": 3,
+            "error": "Family: Failed to select chat", "chats": [
+                {"success": True, "source": "KakaoTalk (Team)", "chat": "Team", "cursor": "k_abc123",
+                 "tasks_created": 1, "items_processed": 3, "error": None},
+                {"success": False, "source": "KakaoTalk (Family)", "chat": "Family", "cursor": None,
+                 "tasks_created": 0, "items_processed": 0, "error": "Failed to select chat"},
+            ]
+        }
+
+        scheduler_jobs.scheduled_job()
+
+        sent_message = mock_notifier_instance.send_message.call_args[0][0]
+        self.assertIn("Status: 2 succeeded, 1 failed\\.", sent_message)
+        self.assertIn("✅ *KakaoTalk \\(Team\\)*: Succeeded \\(3 new, cursor k\\_abc123\\)", sent_message)
+        self.assertIn("⚠️ *KakaoTalk \\(Family\\)*: Failed \\(Error: _Failed to select chat_\\)", sent_message)
+        self.assertNotIn("KakaoTalk \\(Experimental\\)", sent_message)
+
     @patch('scheduler.jobs.TelegramNotifier')
     @patch('scheduler.jobs.run_kakaotalk_ingestion_pipeline')
     @patch('scheduler.jobs.run_gmail_ingestion_pipeline')
@@ -181,6 +210,47 @@ class TestSchedulerJobs(unittest.TestCase):
         self.assertTrue(any("Notification system not available. Skipping consolidated notification." in msg for msg in log_messages))
 
 
+    @patch('scheduler.jobs.persistence_crud')
+    @patch('scheduler.jobs.SessionLocal')
+    def test_discover_gmail_accounts_falls_back_to_default_user(self, mock_session_local, mock_crud):
+        mock_crud.get_token_user_ids.return_value = ["alice", "bob"]
+        self.assertEqual(scheduler_jobs.discover_gmail_accounts(), ["alice", "bob"])
+        mock_crud.get_token_user_ids.assert_called_once_with(mock_session_local.return_value, platform='gmail')
+
+        mock_crud.get_token_user_ids.return_value = []
+        self.assertEqual(scheduler_jobs.discover_gmail_accounts(), [scheduler_jobs.DEFAULT_GMAIL_USER_ID])
+        mock_crud.get_token_user_ids.side_effect = Exception("no such table: source_tokens")
+        self.assertEqual(scheduler_jobs.discover_gmail_accounts(), [scheduler_jobs.DEFAULT_GMAIL_USER_ID])
+
+    @patch('scheduler.jobs.run_gmail_ingestion_pipeline')
+    @patch('scheduler.jobs.logger')
+    def test_gmail_accounts_run_concurrently_with_isolated_failures(self, mock_logger, mock_run_gmail):
+        barrier = threading.Barrier(3, timeout=5)
+
+        def fake_pipeline(app_user_id, rate_limit_share=1):
+            self.assertEqual(rate_limit_share, 3) # The classifier rate limits are split across the accounts
+            barrier.wait() # Deadlocks (and times out) unless all three accounts run at once
+            if app_user_id == "bob":
+                raise Exception("Token revoked")
+            return {"success": True, "source": "Gmail", "tasks_created": 1, "items_processed": 2, "error": None}
+        mock_run_gmail.side_effect = fake_pipeline
+
+        results = scheduler_jobs.run_gmail_pipelines_for_accounts(["alice", "bob", "carol"], max_concurrency=3)
+
+        self.assertEqual([r["account"] for r in results], ["alice", "bob", "carol"])
+        self.assertEqual([r["success"] for r in results], [True, False, True])
+        self.assertEqual(results[1]["error"], "Token revoked")
+        self.assertEqual(results[0]["source"], "Gmail (alice)")
+
+    @patch('scheduler.jobs.run_gmail_ingestion_pipeline')
+    @patch('scheduler.jobs.logger')
+    def test_single_gmail_account_keeps_plain_source_name(self, mock_logger, mock_run_gmail):
+        mock_run_gmail.return_value = {"success": True, "source": "Gmail", "tasks_created": 0, "error": None}
+        results = scheduler_jobs.run_gmail_pipelines_for_accounts(["only_user"])
+        mock_run_gmail.assert_called_once_with(app_user_id="only_user")
+        self.assertEqual(results[0]["source"], "Gmail")
+
+
 if __name__ == '__main__':
     # This allows running this test file directly, e.g., `python tests/test_scheduler.py`
     # For imports to work correctly, ensure project root is in PYTHONPATH or run as module.